@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+
+"""OCI Compute benchmark suite.
+
+Run oci-compute operations against the local fake OCI endpoint (fake_oci.py)
+and report wall time, API call counts and peak RSS for each scenario.
+
+Each scenario runs in its own process so that its peak RSS is measured in
+isolation; the fake endpoint runs in the main process and counts the calls.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import argparse
+import json
+import os
+import resource
+from statistics import median
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_oci import COMPARTMENT_ID, FakeOci, SHAPE, write_config
+import startup
+from terminaltables import AsciiTable
+
+# Subscribed regions, all served by the fake endpoint
+REGIONS = ('us-ashburn-1', 'us-phoenix-1', 'eu-frankfurt-1', 'uk-london-1', 'ap-tokyo-1')
+
+# Scenario functions, called with the OciCompute instance and the options
+SCENARIOS = {}
+
+
+def scenario(func):
+    """Register a scenario."""
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def _provision_kwargs(options):
+    return {
+        'compartment_id': COMPARTMENT_ID,
+        'shape': SHAPE,
+        'availability_domain': 'AD-1',
+        'vcn_name': 'fake-vcn',
+        'vcn_compartment_id': None,
+        'subnet_name': 'Public Subnet',
+        'ssh_authorized_keys_file': options.config_file,
+    }
+
+
+@scenario
+def list_platform(oci, options):
+    return len(oci.list_platform(COMPARTMENT_ID))
+
+
+@scenario
+def list_custom(oci, options):
+    return len(oci.list_custom(COMPARTMENT_ID))
+
+
+@scenario
+def list_market(oci, options):
+    return len(oci.list_market())
+
+
+@scenario
+def instance_list(oci, options):
+    return len(oci.instance_list(COMPARTMENT_ID))
+
+
+@scenario
+def instance_list_fleet(oci, options):
+    from oci_compute.fanout import merge_iterators
+
+    scopes = oci.fleet_scopes(COMPARTMENT_ID, regions=['all'], recursive=True)
+    return len(list(merge_iterators(
+        scopes,
+        lambda scope: scope[0].query_instances([compartment.id for compartment in scope[1]]),
+        oci.max_workers)))
+
+
+@scenario
+def instance_query_fleet(oci, options):
+    scopes = oci.fleet_scopes(COMPARTMENT_ID, recursive=True)
+    return len(list(oci.query_instances([compartment.id for compartment in scopes[0][1]],
+                                        name_prefix='instance-1',
+                                        state='RUNNING',
+                                        vnics=False)))
+
+
+@scenario
+def provision_platform(oci, options):
+    return oci.provision_platform('bench-platform',
+                                  operating_system='Oracle Linux',
+                                  operating_system_version='8',
+                                  **_provision_kwargs(options)) is not None
+
+
+@scenario
+def provision_custom(oci, options):
+    return oci.provision_custom('bench-custom',
+                                custom_image_name='custom-image-000000',
+                                **_provision_kwargs(options)) is not None
+
+
+@scenario
+def provision_market(oci, options):
+    return oci.provision_market('bench-market',
+                                market_image_name='Marketplace image 000000',
+                                **_provision_kwargs(options)) is not None
+
+
+@scenario
+def provision_bulk(oci, options):
+    results = oci.provision_platform('bench-bulk',
+                                     operating_system='Oracle Linux',
+                                     operating_system_version='8',
+                                     count=options.count,
+                                     **_provision_kwargs(options))
+    return len([instance for _, instance, _ in results if instance])
+
+
+def _bulk_action(oci, options, action_name):
+    instance_ids = [instance[0] for instance in oci.instance_list(COMPARTMENT_ID)[:options.count]]
+    results = oci.instance_actions(action_name, COMPARTMENT_ID, instance_ids, wait=True)
+    return len([result for result in results if not result[3]])
+
+
+@scenario
+def bulk_shutdown(oci, options):
+    return _bulk_action(oci, options, 'shutdown')
+
+
+@scenario
+def bulk_start(oci, options):
+    return _bulk_action(oci, options, 'start')
+
+
+def _plan_groups(options, web_count):
+    from oci_compute.plan import parse_plan
+
+    defaults = dict((key.replace('_', '-'), value) for key, value in _provision_kwargs(options).items() if value)
+    return parse_plan({
+        'defaults': defaults,
+        'groups': {
+            'web': {'display-name': 'plan-web-{{001..{:03d}}}'.format(web_count),
+                    'operating-system': 'Oracle Linux',
+                    'operating-system-version': '8'},
+            'batch': {'display-name': 'plan-batch-{{001..{:03d}}}'.format(options.count),
+                      'source': 'custom',
+                      'image-name': 'custom-image-000000',
+                      'state': 'stopped'},
+        },
+    })
+
+
+@scenario
+def apply_plan(oci, options):
+    """Create 2*count web and count stopped batch instances, then scale web down to count."""
+    from oci_compute.plan import FleetPlan
+
+    applied = 0
+    for web_count in (2 * options.count, options.count):
+        fleet = FleetPlan(oci, _plan_groups(options, web_count))
+        fleet.refresh()
+        applied += len([result for result in fleet.apply() if not result.error])
+    return applied
+
+
+@scenario
+def apply_serial(oci, options):
+    """Same changes as apply_plan, one provision/terminate call at a time."""
+    applied = 0
+    for i in range(1, 2 * options.count + 1):
+        applied += oci.provision_platform('serial-web-{:03d}'.format(i),
+                                          operating_system='Oracle Linux',
+                                          operating_system_version='8',
+                                          **_provision_kwargs(options)) is not None
+    for i in range(1, options.count + 1):
+        instance = oci.provision_custom('serial-batch-{:03d}'.format(i),
+                                        custom_image_name='custom-image-000000',
+                                        **_provision_kwargs(options))
+        if instance:
+            applied += not oci.instance_actions('shutdown', COMPARTMENT_ID, [instance.id], wait=True)[0][3]
+    for i in range(options.count + 1, 2 * options.count + 1):
+        # Each call looks the instance up again, as `instance terminate` does
+        instance_ids = [row[0] for row in oci.instance_list(COMPARTMENT_ID, 'serial-web-{:03d}'.format(i))]
+        applied += len([result for result in oci.instance_actions('terminate', COMPARTMENT_ID, instance_ids, wait=True)
+                        if not result[3]])
+    return applied
+
+
+class _PeakThreads(object):
+    """Sample the number of threads of the process."""
+
+    def __init__(self):
+        import threading
+
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        import threading
+
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+@scenario
+def async_provision(oci, options):
+    """Provision count single instances concurrently from coroutines, waiting for each."""
+    import asyncio
+
+    from oci_compute.aio import AsyncOciCompute
+
+    async def provision():
+        async with AsyncOciCompute(oci=oci, max_threads=options.max_workers) as aoci:
+            return await asyncio.gather(*(aoci.provision_platform('async-{:03d}'.format(i),
+                                                                  operating_system='Oracle Linux',
+                                                                  operating_system_version='8',
+                                                                  **_provision_kwargs(options))
+                                          for i in range(1, options.count + 1)))
+
+    with _PeakThreads() as threads:
+        instances = asyncio.run(provision())
+    return '{} running, {} threads'.format(len([instance for instance in instances if instance]), threads.peak)
+
+
+@scenario
+def threaded_provision(oci, options):
+    """Same as async_provision, with a thread per synchronous provision_platform call."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def provision(i):
+        return oci.fork().provision_platform('threaded-{:03d}'.format(i),
+                                             operating_system='Oracle Linux',
+                                             operating_system_version='8',
+                                             **_provision_kwargs(options))
+
+    with _PeakThreads() as threads, ThreadPoolExecutor(max_workers=options.count) as executor:
+        instances = list(executor.map(provision, range(1, options.count + 1)))
+    return '{} running, {} threads'.format(len([instance for instance in instances if instance]), threads.peak)
+
+
+def run_child(options):
+    """Run a scenario in this process and print its measurements."""
+    from oci_compute.oci_compute import OciCompute
+
+    start = time.time()
+    oci = OciCompute(options.config_file,
+                     'DEFAULT',
+                     max_workers=options.max_workers,
+                     use_cache=options.cache,
+                     service_endpoint=options.endpoint,
+                     query_backend=options.query_backend)
+    result = SCENARIOS[options.child](oci, options)
+    wall = time.time() - start
+    print(json.dumps({
+        'wall': wall,
+        'result': result,
+        # ru_maxrss is in KB on Linux
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def run_scenario(name, fake, endpoint, options):
+    """Run a scenario in a child process, return its measurements."""
+    runs = []
+    for _ in range(options.runs):
+        fake.reset_counters()
+        args = [sys.executable, os.path.abspath(__file__),
+                '--child', name,
+                '--endpoint', endpoint,
+                '--config-file', options.config_file,
+                '--count', str(options.count),
+                '--max-workers', str(options.max_workers),
+                '--query-backend', options.query_backend]
+        if options.cache:
+            args.append('--cache')
+        process = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if process.returncode:
+            # Failed run: keep the last line of the error
+            error = process.stderr.decode().strip().splitlines() or ['failed']
+            run = {'wall': 0.0, 'rss': 0.0, 'result': 'failed: {}'.format(error[-1][:60])}
+        else:
+            run = json.loads(process.stdout.decode().strip().splitlines()[-1])
+        run['calls'] = sum(fake.calls.values())
+        run['errors'] = sum(fake.errors.values())
+        run['connections'] = fake.connections
+        run['operations'] = dict(fake.calls)
+        runs.append(run)
+    return {
+        'wall': median(run['wall'] for run in runs),
+        'calls': runs[-1]['calls'],
+        'errors': runs[-1]['errors'],
+        'connections': runs[-1]['connections'],
+        'rss': max(run['rss'] for run in runs),
+        'result': runs[-1]['result'],
+        'operations': runs[-1]['operations'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='oci-compute benchmarks against a fake OCI endpoint')
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO',
+                        help='scenarios to run: cold_start, {} (default: all)'.format(', '.join(SCENARIOS)))
+    parser.add_argument('--images', type=int, default=50000, help='number of images in the catalog')
+    parser.add_argument('--instances', type=int, default=2000, help='number of instances in the compartment')
+    parser.add_argument('--listings', type=int, default=500, help='number of Marketplace listings')
+    parser.add_argument('--compartments', type=int, default=0,
+                        help='number of subcompartments (instances are spread over them)')
+    parser.add_argument('--regions', type=int, default=3, choices=range(1, len(REGIONS) + 1),
+                        metavar='{{1..{}}}'.format(len(REGIONS)), help='number of subscribed regions')
+    parser.add_argument('--page-size', type=int, default=100, help='maximum number of items per page')
+    parser.add_argument('--latency', type=float, default=0.02, help='latency added to each call (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of injected 429/503 errors')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='requests per second above which the endpoint returns 429 (default: no limit)')
+    parser.add_argument('--boot-time', type=float, default=1.0, help='duration of transient lifecycle states')
+    parser.add_argument('--count', type=int, default=20, help='number of instances for bulk scenarios')
+    parser.add_argument('--max-workers', type=int, default=8, help='OciCompute max_workers')
+    parser.add_argument('--runs', type=int, default=1, help='number of runs per scenario (median reported)')
+    parser.add_argument('--query-backend', default='auto', choices=('auto', 'search', 'list'),
+                        help='OciCompute query_backend')
+    parser.add_argument('--cache', action='store_true', help='enable the OciCompute on-disk cache')
+    parser.add_argument('--json', metavar='FILE', help='also write the results as JSON')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--endpoint', help=argparse.SUPPRESS)
+    parser.add_argument('--config-file', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        run_child(options)
+        return 0
+
+    unknown = set(options.scenarios) - set(SCENARIOS) - {'cold_start'}
+    if unknown:
+        parser.error('Unknown scenario(s): {}'.format(', '.join(sorted(unknown))))
+    names = options.scenarios or ['cold_start'] + list(SCENARIOS)
+
+    fake = FakeOci(images=options.images,
+                   instances=options.instances,
+                   listings=options.listings,
+                   compartments=options.compartments,
+                   regions=REGIONS[:options.regions],
+                   page_size=options.page_size,
+                   latency=options.latency,
+                   error_rate=options.error_rate,
+                   rate_limit=options.rate_limit,
+                   boot_time=options.boot_time)
+    endpoint = fake.start()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        options.config_file, rc_file = write_config(directory)
+        if options.cache:
+            os.environ['XDG_CACHE_HOME'] = directory
+        for name in names:
+            if name == 'cold_start':
+                for command, args in (('help', ['--help']),
+                                      ('list custom', ['--config-file', options.config_file, '--rc-file', rc_file,
+                                                       '--no-cache', 'list', 'custom'])):
+                    results['cold_start ({})'.format(command)] = {
+                        'wall': median(startup.run(args) for _ in range(options.runs)),
+                        'calls': 0, 'errors': 0, 'connections': 0, 'rss': None, 'result': None, 'operations': {},
+                    }
+            else:
+                results[name] = run_scenario(name, fake, endpoint, options)
+    fake.stop()
+
+    table = AsciiTable(
+        [('Scenario', 'Wall (s)', 'API calls', 'Errors', 'Connections', 'Peak RSS (MB)', 'Result')]
+        + [(name,
+            '{:.3f}'.format(result['wall']),
+            result['calls'],
+            result['errors'],
+            result['connections'],
+            '{:.1f}'.format(result['rss']) if result['rss'] else '-',
+            result['result'] if result['result'] is not None else '-')
+           for name, result in results.items()])
+    table.title = 'oci-compute benchmarks'
+    print(table.table)
+
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""OCI Compute golden boot volume benchmark.
+
+Measure the time until provisioned instances are ready (SSH up) against a
+fake OCI endpoint where instances launched from an image spend a long setup
+at first boot (software installed by cloud-init), while clones of a golden
+boot volume have it installed already. Launching from the image is compared
+with cloning the golden boot volume replicated to the Availability Domain,
+and with restoring the golden backup in an Availability Domain it is not
+replicated to. The golden image is prepared ahead of time, untimed.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import argparse
+from statistics import median
+import sys
+import tempfile
+import time
+
+from fake_oci import COMPARTMENT_ID, FakeOci, SHAPE, write_config
+
+GOLDEN_NAME = 'bench'
+
+
+def prepare(oci, options):
+    """Provision the golden instance, create its golden image and replicate it to AD-2."""
+    builder = oci.provision_platform('golden-builder', COMPARTMENT_ID, 'Oracle Linux', '8', SHAPE, 'AD-1',
+                                     'fake-vcn', None, 'Public Subnet', options.config_file)
+    oci.create_golden(COMPARTMENT_ID, GOLDEN_NAME, instance_id=builder.id)
+    oci.replicate_golden(COMPARTMENT_ID, GOLDEN_NAME, ['AD-2'])
+
+
+def image(availability_domain):
+    """Return a scenario launching the instances from the image."""
+    def scenario(oci, options, display_name, readiness):
+        return oci.provision_platform(display_name, COMPARTMENT_ID, 'Oracle Linux', '8', SHAPE, availability_domain,
+                                      'fake-vcn', None, 'Public Subnet', options.config_file, readiness=readiness)
+
+    return scenario
+
+
+def clone(availability_domain):
+    """Return a scenario launching the instances from clones of the golden image."""
+    def scenario(oci, options, display_name, readiness):
+        return oci.provision_clone(display_name, COMPARTMENT_ID, GOLDEN_NAME, SHAPE, availability_domain,
+                                   'fake-vcn', None, 'Public Subnet', options.config_file, readiness=readiness)
+
+    return scenario
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the time to ready of image launches and golden clones')
+    parser.add_argument('--count', type=int, default=10, help='number of instances per scenario')
+    parser.add_argument('--boot-time', type=float, default=5.0, help='time until the instances are running')
+    parser.add_argument('--ssh-delay', type=float, default=5.0, help='average time from running to SSH up (+/- 50%%)')
+    parser.add_argument('--setup-delay', type=float, default=60.0,
+                        help='first boot setup of the instances launched from the image, before SSH is up')
+    parser.add_argument('--clone-time', type=float, default=3.0, help='time until a boot volume clone is available')
+    parser.add_argument('--restore-time', type=float, default=15.0,
+                        help='time until a boot volume restored from a backup is available')
+    parser.add_argument('--latency', type=float, default=0.02, help='latency added to each call (seconds)')
+    options = parser.parse_args()
+
+    from oci_compute.oci_compute import OciCompute
+    from oci_compute.readiness import ReadinessProbe
+
+    scenarios = (('image', image('AD-1')),
+                 ('clone', clone('AD-2')),
+                 ('restore', clone('AD-3')))
+    fake = FakeOci(images=100, instances=0, latency=options.latency, boot_time=options.boot_time,
+                   ssh_delay=options.ssh_delay, setup_delay=options.setup_delay, clone_time=options.clone_time,
+                   restore_time=options.restore_time)
+    endpoint = fake.start()
+    with tempfile.TemporaryDirectory() as directory:
+        options.config_file, _ = write_config(directory)
+        oci = OciCompute(options.config_file, 'DEFAULT', service_endpoint=endpoint, use_cache=False)
+        prepare(oci, options)
+        for name, scenario in scenarios:
+            fake.reset_counters()
+            start = time.time()
+            results = scenario(oci, options, '{}-{{001..{:03d}}}'.format(name, options.count),
+                               ReadinessProbe(port=fake.ssh_port, banner=True))
+            wall = time.time() - start
+            times = [timing.ready for timing in oci.launch_timings if timing.ready is not None]
+            print('{:7}: {}/{} ready in {:.1f}s, time to ready median {:.1f}s, max {:.1f}s, {} boot volumes '
+                  'created'.format(name, len([instance for _, instance, _ in results if instance]), options.count,
+                                   wall, median(times) if times else 0, max(times) if times else 0,
+                                   fake.calls['create_boot_volume']))
+    fake.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""OCI Compute daemon benchmark.
+
+Measure repeated oci-compute invocations against a fake OCI endpoint, run in
+their own process (--no-daemon) and forwarded to an `oci-compute serve`
+daemon.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import argparse
+import os
+from statistics import median
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_oci import FakeOci, write_config
+
+# Runs oci-compute with all the SDK clients pointing to the fake endpoint
+_RUNNER = '''
+import functools, sys
+from oci_compute import cli
+cli.OciCompute = functools.partial(cli.OciCompute, service_endpoint=sys.argv[1])
+sys.argv = ['oci-compute'] + sys.argv[2:]
+cli.main()
+'''
+
+
+def run(endpoint, args, env):
+    """Run oci-compute once, return the elapsed time."""
+    start = time.time()
+    subprocess.run([sys.executable, '-c', _RUNNER, endpoint] + args,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env, check=True)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure oci-compute invocations with and without daemon')
+    parser.add_argument('--runs', type=int, default=10, help='number of runs per command')
+    parser.add_argument('--images', type=int, default=1000, help='number of images in the catalog')
+    parser.add_argument('--instances', type=int, default=100, help='number of instances in the compartment')
+    parser.add_argument('--latency', type=float, default=0.02, help='latency added to each call (seconds)')
+    options = parser.parse_args()
+
+    fake = FakeOci(images=options.images, instances=options.instances, latency=options.latency)
+    endpoint = fake.start()
+    with tempfile.TemporaryDirectory() as directory:
+        config_file, rc_file = write_config(directory)
+        env = dict(os.environ, OCI_COMPUTE_SOCKET=os.path.join(directory, 'daemon.sock'))
+        common = ['--config-file', config_file, '--rc-file', rc_file]
+        commands = {
+            'list custom': common + ['list', 'custom'],
+            'instance list': common + ['instance', 'list'],
+        }
+        results = {name: {} for name in commands}
+        for name, args in commands.items():
+            results[name]['local'] = [run(endpoint, ['--no-daemon'] + args, env) for _ in range(options.runs)]
+
+        server = subprocess.Popen([sys.executable, '-c', _RUNNER, endpoint] + common + ['serve'],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+        try:
+            while not os.path.exists(env['OCI_COMPUTE_SOCKET']):
+                time.sleep(0.05)
+            for name, args in commands.items():
+                results[name]['daemon'] = [run(endpoint, args, env) for _ in range(options.runs)]
+        finally:
+            server.terminate()
+            server.wait()
+    fake.stop()
+
+    for name, timings in results.items():
+        print('{:14}: local median {:.3f}s, daemon median {:.3f}s (first {:.3f}s)'.format(
+            name, median(timings['local']), median(timings['daemon']), timings['daemon'][0]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
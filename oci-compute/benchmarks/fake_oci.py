@@ -0,0 +1,856 @@
+#!/usr/bin/env python3
+
+"""Local stand-in for the OCI endpoints used by OciCompute.
+
+FakeOci is a small HTTP server emulating the Compute, Blockstorage,
+VirtualNetwork, Identity, Marketplace, Resource Search and WorkRequests API
+calls made by oci-compute, with
+synthetic catalogs, configurable latency and page size, and injected
+429/5xx errors. Point the SDK clients to it with the OciCompute
+service_endpoint parameter.
+
+Authentication is not checked. Instances go through their lifecycle states
+based on elapsed time; optionally, launched instances serve an SSH banner on
+a local port some time after they are running. The capacity and boot time
+of each Availability Domain can be set to emulate scarce capacity. Launched
+instances get a boot volume, which can be cloned, backed up and restored;
+instances launched from an image spend an optional setup time at first boot
+that instances launched from a boot volume do not.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import re
+import socketserver
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+REGION = 'us-ashburn-1'
+TENANCY_ID = 'ocid1.tenancy.oc1..fake'
+COMPARTMENT_ID = 'ocid1.compartment.oc1..fake'
+SHAPE = 'VM.Standard2.1'
+PLATFORM_OS = ('Oracle Linux', 'Canonical Ubuntu', 'CentOS', 'Windows')
+
+_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def _time(index):
+    return (_EPOCH + timedelta(hours=index)).isoformat()
+
+
+def write_config(directory, region=REGION):
+    """Write an OCI config and an oci-compute rc file with a throw-away API key.
+
+    Returns:
+        Tuple (config file, rc file).
+
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_file = os.path.join(directory, 'key.pem')
+    with open(key_file, 'wb') as f:
+        f.write(key.private_bytes(encoding=serialization.Encoding.PEM,
+                                  format=serialization.PrivateFormat.TraditionalOpenSSL,
+                                  encryption_algorithm=serialization.NoEncryption()))
+    config_file = os.path.join(directory, 'config')
+    with open(config_file, 'w') as f:
+        f.write('[DEFAULT]\n'
+                'user=ocid1.user.oc1..fake\n'
+                'fingerprint=00:00:00:00:00:00:00:00:00:00:00:00:00:00:00:00\n'
+                'tenancy={}\n'
+                'region={}\n'
+                'key_file={}\n'.format(TENANCY_ID, region, key_file))
+    rc_file = os.path.join(directory, 'rc')
+    with open(rc_file, 'w') as f:
+        f.write('[DEFAULT]\n'
+                'compartment-id={}\n'
+                'vcn-name=fake-vcn\n'
+                'operating-system-version=8\n'
+                'ssh-authorized-keys-file={}\n'.format(COMPARTMENT_ID, config_file))
+    return config_file, rc_file
+
+
+class FakeOci(object):
+    """Fake OCI endpoint."""
+
+    def __init__(self,
+                 images=1000,
+                 instances=100,
+                 listings=200,
+                 compartments=0,
+                 regions=(REGION,),
+                 page_size=100,
+                 latency=0.0,
+                 error_rate=0.0,
+                 rate_limit=0.0,
+                 boot_time=1.0,
+                 ssh_delay=None,
+                 capacity=None,
+                 boot_times=None,
+                 start_time=None,
+                 clone_time=None,
+                 restore_time=None,
+                 backup_time=None,
+                 setup_delay=0.0,
+                 seed=0):
+        """Build the synthetic catalogs.
+
+        Parameters:
+            images: number of images (half platform, half custom)
+            instances: number of instances, spread over the compartments
+            compartments: number of subcompartments of COMPARTMENT_ID
+            regions: subscribed regions (all served by this endpoint)
+            listings: number of free Marketplace listings
+            page_size: default (and maximum) number of items per page
+            latency: delay added to each call (seconds)
+            error_rate: probability of an injected 429 or 503 response
+            rate_limit: requests per second above which 429 responses are
+                        returned (token bucket, no limit when 0)
+            boot_time: time spent in transient lifecycle states (seconds)
+            ssh_delay: when set, launched instances get a loopback public IP
+                       and serve an SSH banner on ssh_port about ssh_delay
+                       seconds (+/- 50%) after they are running
+            capacity: dictionary {Availability Domain suffix (e.g. 'AD-1'):
+                      instances which can still be launched}; launches
+                      beyond are rejected with "Out of host capacity"
+                      (unlimited for the other Availability Domains)
+            boot_times: dictionary {Availability Domain suffix: boot_time}
+                        for the instances launched there
+            start_time: time spent starting or stopping an existing
+                        instance (default: boot_time)
+            clone_time: time until a boot volume clone is available
+                        (default: boot_time)
+            restore_time: time until a boot volume restored from a backup
+                          is available (default: clone_time)
+            backup_time: time until a boot volume backup is available
+                         (default: clone_time)
+            setup_delay: time added to ssh_delay at the first boot of the
+                         instances launched from an image (software
+                         installed by cloud-init); instances launched from a
+                         boot volume have it installed already
+            seed: random seed for injected errors and SSH delays
+
+        """
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._tokens = rate_limit
+        self._refilled = time.time()
+        self.boot_time = boot_time
+        self.capacity = dict(capacity or {})
+        self.boot_times = dict(boot_times or {})
+        self.start_time = boot_time if start_time is None else start_time
+        self.clone_time = boot_time if clone_time is None else clone_time
+        self.restore_time = self.clone_time if restore_time is None else restore_time
+        self.backup_time = self.clone_time if backup_time is None else backup_time
+        self.setup_delay = setup_delay
+        self.ssh_delay = ssh_delay
+        self.ssh_port = None
+        # Instances serving SSH, by public IP
+        self._ssh_instances = {}
+        self._ssh_random = random.Random(seed)
+        self._ssh_server = None
+        self.calls = Counter()
+        self.errors = Counter()
+        # Accepted TCP connections
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+        self.images = []
+        for i in range(images):
+            if i % 2:
+                operating_system = PLATFORM_OS[i // 2 % len(PLATFORM_OS)]
+                version = str(6 + i // 8 % 4)
+                name = '{}-{}-{}'.format(operating_system.replace(' ', '-'), version, i)
+            else:
+                operating_system, version, name = 'Custom', 'Custom', 'custom-image-{:06d}'.format(i)
+            self.images.append({
+                'id': 'ocid1.image.oc1..{}'.format(i),
+                'compartmentId': COMPARTMENT_ID,
+                'displayName': name,
+                'operatingSystem': operating_system,
+                'operatingSystemVersion': version,
+                'lifecycleState': 'AVAILABLE',
+                'timeCreated': _time(i),
+            })
+        self.compartments = [{
+            'id': '{}-{}'.format(COMPARTMENT_ID, i),
+            'compartmentId': COMPARTMENT_ID,
+            'name': 'compartment-{}'.format(i),
+            'description': 'Synthetic compartment {}'.format(i),
+            'lifecycleState': 'ACTIVE',
+            'timeCreated': _time(i),
+        } for i in range(compartments)]
+        compartment_ids = [COMPARTMENT_ID] + [compartment['id'] for compartment in self.compartments]
+        self.regions = regions
+        self.instances = {}
+        self.vnics = {}
+        self.attachments = []
+        self.boot_volumes = {}
+        self.boot_volume_backups = {}
+        self.boot_volume_attachments = []
+        for i in range(instances):
+            self._add_instance('instance-{}'.format(i), 'RUNNING', compartment_ids[i % len(compartment_ids)])
+        self.listings = [{
+            'id': 'listing-{}'.format(i),
+            'name': 'Marketplace image {:06d}'.format(i),
+            'shortDescription': 'Synthetic listing {}'.format(i),
+            'publisher': {'id': 'publisher-{}'.format(i % 10), 'name': 'Publisher {}'.format(i % 10)},
+            'pricingTypes': ['FREE'],
+        } for i in range(listings)]
+
+    """Server management."""
+
+    def start(self):
+        """Start serving in a background thread, return the endpoint URL."""
+        fake = self
+
+        class Handler(_Handler):
+            oci = fake
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        if self.ssh_delay is not None:
+            # A single listener answers for all the loopback addresses
+            class SshHandler(_SshHandler):
+                oci = fake
+
+            self._ssh_server = socketserver.ThreadingTCPServer(('0.0.0.0', 0), SshHandler)
+            self._ssh_server.daemon_threads = True
+            self.ssh_port = self._ssh_server.server_address[1]
+            threading.Thread(target=self._ssh_server.serve_forever, daemon=True).start()
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def stop(self):
+        """Stop serving."""
+        for server in (self._server, self._ssh_server):
+            if server:
+                server.shutdown()
+                server.server_close()
+
+    def reset_counters(self):
+        """Reset call, error and connection counters."""
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+            self.connections = 0
+
+    """Resources."""
+
+    def _add_instance(self, display_name, state, compartment_id=COMPARTMENT_ID, shape=SHAPE,
+                      availability_domain='fake:US-ASHBURN-AD-1'):
+        index = len(self.instances)
+        instance_id = 'ocid1.instance.oc1..{}'.format(index)
+        self.instances[instance_id] = {
+            'id': instance_id,
+            'compartmentId': compartment_id,
+            'displayName': display_name,
+            'availabilityDomain': availability_domain,
+            'region': REGION,
+            'shape': shape,
+            'lifecycleState': state,
+            'timeCreated': _time(index),
+            'freeformTags': {},
+            # Transition: (target state, time)
+            '_next': None,
+            # Entity tag version, for conditional updates
+            '_version': 1,
+        }
+        vnic_id = 'ocid1.vnic.oc1..{}'.format(index)
+        self.vnics[vnic_id] = {
+            'id': vnic_id,
+            'compartmentId': compartment_id,
+            'availabilityDomain': availability_domain,
+            'isPrimary': True,
+            'lifecycleState': 'AVAILABLE',
+            'privateIp': '10.{}.{}.{}'.format(index // 65536 % 256, index // 256 % 256, index % 256),
+            'publicIp': '192.0.{}.{}'.format(index // 256 % 256, index % 256),
+            'subnetId': 'ocid1.subnet.oc1..fake',
+        }
+        if self.ssh_delay is not None and state != 'RUNNING':
+            public_ip = '127.{}.{}.{}'.format(1 + index // 65536 % 254, index // 256 % 256, index % 256)
+            self.vnics[vnic_id]['publicIp'] = public_ip
+            self._ssh_instances[public_ip] = self.instances[instance_id]
+        self.attachments.append({
+            'id': 'ocid1.vnicattachment.oc1..{}'.format(index),
+            'compartmentId': compartment_id,
+            'availabilityDomain': availability_domain,
+            'instanceId': instance_id,
+            'vnicId': vnic_id,
+            'lifecycleState': 'ATTACHED',
+            'timeCreated': _time(index),
+        })
+        return self.instances[instance_id]
+
+    def _add_boot_volume(self, compartment_id, availability_domain, display_name, image_id, freeform_tags=None):
+        volume_id = 'ocid1.bootvolume.oc1..{}'.format(len(self.boot_volumes))
+        self.boot_volumes[volume_id] = {
+            'id': volume_id,
+            'compartmentId': compartment_id,
+            'availabilityDomain': availability_domain,
+            'displayName': display_name,
+            'imageId': image_id,
+            'sizeInGBs': 47,
+            'sizeInMBs': 47 * 1024,
+            'lifecycleState': 'AVAILABLE',
+            'timeCreated': datetime.now(timezone.utc).isoformat(),
+            'freeformTags': freeform_tags or {},
+            '_next': None,
+            # Instance the volume is attached to
+            '_instance_id': None,
+        }
+        return self.boot_volumes[volume_id]
+
+    def _attach_boot_volume(self, volume, instance):
+        volume['_instance_id'] = instance['id']
+        self.boot_volume_attachments.append({
+            'id': 'ocid1.bootvolumeattachment.oc1..{}'.format(len(self.boot_volume_attachments)),
+            'compartmentId': instance['compartmentId'],
+            'availabilityDomain': instance['availabilityDomain'],
+            'instanceId': instance['id'],
+            'bootVolumeId': volume['id'],
+            'displayName': 'Remote boot attachment for instance',
+            'lifecycleState': 'ATTACHED',
+            'timeCreated': instance['timeCreated'],
+        })
+
+    def _ad_setting(self, settings, availability_domain, default=None):
+        """Return the setting of an Availability Domain, from a dictionary keyed by suffix."""
+        for suffix, value in settings.items():
+            if availability_domain.endswith(suffix):
+                return value
+        return default
+
+    def _transition(self, instance, transient, target):
+        instance['lifecycleState'] = transient
+        boot_time = self.boot_time
+        setup_delay = 0
+        if transient == 'PROVISIONING':
+            boot_time = self._ad_setting(self.boot_times, instance['availabilityDomain'], boot_time)
+            setup_delay = instance.get('_setup_delay', 0)
+        elif transient in ('STARTING', 'STOPPING'):
+            boot_time = self.start_time
+        instance['_next'] = (target, time.time() + boot_time)
+        instance['_ssh_at'] = None
+        if target == 'RUNNING' and self.ssh_delay is not None:
+            instance['_ssh_at'] = (instance['_next'][1] + self.ssh_delay * self._ssh_random.uniform(0.5, 1.5)
+                                   + setup_delay)
+
+    def ssh_ready(self, address):
+        """Return True if the instance with this public IP serves SSH."""
+        instance = self._ssh_instances.get(address)
+        return bool(instance and instance.get('_ssh_at') and time.time() >= instance['_ssh_at'])
+
+    def _public(self, resource):
+        """Return the public view of an instance or volume, applying due transitions."""
+        if resource['_next'] and time.time() >= resource['_next'][1]:
+            resource['lifecycleState'] = resource['_next'][0]
+            resource['_next'] = None
+        return {key: value for key, value in resource.items() if not key.startswith('_')}
+
+    def _page(self, items, query):
+        """Return a page of items and the next page token."""
+        limit = min(int(query.get('limit', self.page_size)), self.page_size)
+        start = int(query.get('page', 0))
+        next_page = str(start + limit) if start + limit < len(items) else None
+        return items[start:start + limit], next_page
+
+    def _take_token(self):
+        """Return True if a request is within the rate limit."""
+        now = time.time()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def handle(self, method, path, query, body):
+        """Dispatch a request.
+
+        The If-Match request header, if any, is passed in the query as
+        'if-match'.
+
+        Returns:
+            Tuple (operation, status, payload, next page, response headers).
+
+        """
+        for route_method, pattern, operation in _ROUTES:
+            if method != route_method:
+                continue
+            match = pattern.fullmatch(path)
+            if match:
+                with self._lock:
+                    self.calls[operation] += 1
+                    if self.rate_limit and not self._take_token():
+                        self.errors[429] += 1
+                        return operation, 429, {'code': 'TooManyRequests', 'message': 'Rate limit exceeded'}, None
+                    if self.error_rate and self._random.random() < self.error_rate:
+                        status = self._random.choice((429, 503))
+                        self.errors[status] += 1
+                        return operation, status, {'code': 'Injected', 'message': 'Injected error'}, None
+                    result = getattr(self, operation)(query, body, *match.groups())
+                status, payload = result[:2]
+                return (operation, status, payload, result[2] if len(result) > 2 else None,
+                        result[3] if len(result) > 3 else {})
+        return 'unknown', 404, {'code': 'NotFound', 'message': 'Unknown path {}'.format(path)}, None, {}
+
+    """Compute."""
+
+    def list_images(self, query, body):
+        images = self.images
+        if 'operatingSystem' in query:
+            images = [i for i in images if i['operatingSystem'] == query['operatingSystem']]
+        if 'operatingSystemVersion' in query:
+            images = [i for i in images if i['operatingSystemVersion'] == query['operatingSystemVersion']]
+        if query.get('sortBy') == 'DISPLAYNAME':
+            images = sorted(images, key=lambda i: i['displayName'], reverse=query.get('sortOrder') == 'DESC')
+        elif query.get('sortBy') == 'TIMECREATED':
+            images = sorted(images, key=lambda i: i['timeCreated'], reverse=query.get('sortOrder') != 'ASC')
+        return (200,) + self._page(images, query)
+
+    def get_image(self, query, body, image_id):
+        for image in self.images:
+            if image['id'] == image_id:
+                return 200, image
+        return 200, dict(self.images[0], id=image_id)
+
+    def get_image_shape_compatibility_entry(self, query, body, image_id, shape):
+        return 200, {'imageId': image_id, 'shape': shape}
+
+    def list_instances(self, query, body):
+        instances = [self._public(i) for i in self.instances.values()
+                     if i['compartmentId'] == query.get('compartmentId')]
+        if 'displayName' in query:
+            instances = [i for i in instances if i['displayName'] == query['displayName']]
+        return (200,) + self._page(instances, query)
+
+    def get_instance(self, query, body, instance_id):
+        if instance_id not in self.instances:
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Not found'}
+        instance = self.instances[instance_id]
+        return 200, self._public(instance), None, {'etag': str(instance['_version'])}
+
+    def update_instance(self, query, body, instance_id):
+        if instance_id not in self.instances:
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Not found'}
+        instance = self.instances[instance_id]
+        if query.get('if-match') not in (None, str(instance['_version'])):
+            self.errors[412] += 1
+            return 412, {'code': 'PreconditionFailed', 'message': 'The resource has been modified'}
+        for key in ('displayName', 'freeformTags', 'metadata'):
+            if key in body:
+                instance[key] = body[key]
+        instance['_version'] += 1
+        return 200, self._public(instance), None, {'etag': str(instance['_version'])}
+
+    def launch_instance(self, query, body):
+        availability_domain = body['availabilityDomain']
+        source = body.get('sourceDetails') or {}
+        boot_volume = None
+        if source.get('sourceType') == 'bootVolume':
+            boot_volume = self.boot_volumes.get(source.get('bootVolumeId'))
+            if not boot_volume:
+                return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Boot volume not found'}
+            if self._public(boot_volume)['lifecycleState'] != 'AVAILABLE' or boot_volume['_instance_id']:
+                return 409, {'code': 'Conflict', 'message': 'Boot volume is not available'}
+            if boot_volume['availabilityDomain'] != availability_domain:
+                return 400, {'code': 'InvalidParameter',
+                             'message': 'Boot volume is not in availability domain {}'.format(availability_domain)}
+        for suffix, available in self.capacity.items():
+            if availability_domain.endswith(suffix):
+                if available <= 0:
+                    self.errors['capacity'] += 1
+                    return 500, {'code': 'InternalError', 'message': 'Out of host capacity.'}
+                self.capacity[suffix] -= 1
+        instance = self._add_instance(body['displayName'], 'PROVISIONING', body['compartmentId'], body['shape'],
+                                      availability_domain)
+        instance['faultDomain'] = body.get('faultDomain') or 'FAULT-DOMAIN-1'
+        instance['metadata'] = body.get('metadata') or {}
+        instance['freeformTags'] = body.get('freeformTags') or {}
+        instance['timeCreated'] = datetime.now(timezone.utc).isoformat()
+        if boot_volume:
+            instance['imageId'] = boot_volume['imageId']
+        else:
+            instance['imageId'] = source.get('imageId')
+            instance['_setup_delay'] = self.setup_delay
+            boot_volume = self._add_boot_volume(body['compartmentId'], availability_domain,
+                                                '{} (Boot Volume)'.format(body['displayName']), instance['imageId'])
+        self._attach_boot_volume(boot_volume, instance)
+        self._transition(instance, 'PROVISIONING', 'RUNNING')
+        return 200, self._public(instance)
+
+    def create_compute_capacity_report(self, query, body):
+        available = self._ad_setting(self.capacity, body['availabilityDomain'])
+        return 200, {
+            'compartmentId': body['compartmentId'],
+            'availabilityDomain': body['availabilityDomain'],
+            'shapeAvailabilities': [dict(
+                shape,
+                availableCount=available,
+                availabilityStatus='AVAILABLE' if available is None or available > 0 else 'OUT_OF_HOST_CAPACITY',
+            ) for shape in body.get('shapeAvailabilities', [])],
+            'timeCreated': _time(0),
+        }
+
+    def instance_action(self, query, body, instance_id):
+        if instance_id not in self.instances:
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Not found'}
+        instance = self.instances[instance_id]
+        if query.get('action') == 'START':
+            self._transition(instance, 'STARTING', 'RUNNING')
+        else:
+            self._transition(instance, 'STOPPING', 'STOPPED')
+        return 200, self._public(instance)
+
+    def terminate_instance(self, query, body, instance_id):
+        if instance_id not in self.instances:
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Not found'}
+        self._transition(self.instances[instance_id], 'TERMINATING', 'TERMINATED')
+        if query.get('preserveBootVolume') != 'true':
+            for volume in self.boot_volumes.values():
+                if volume['_instance_id'] == instance_id:
+                    volume['lifecycleState'], volume['_next'] = 'TERMINATED', None
+        for attachment in self.boot_volume_attachments:
+            if attachment['instanceId'] == instance_id:
+                attachment['lifecycleState'] = 'DETACHED'
+        return 204, None
+
+    def list_vnic_attachments(self, query, body):
+        attachments = [a for a in self.attachments if a['compartmentId'] == query.get('compartmentId')]
+        if 'instanceId' in query:
+            attachments = [a for a in attachments if a['instanceId'] == query['instanceId']]
+        return (200,) + self._page(attachments, query)
+
+    def list_boot_volume_attachments(self, query, body):
+        attachments = [a for a in self.boot_volume_attachments if a['compartmentId'] == query.get('compartmentId')
+                       and a['availabilityDomain'] == query.get('availabilityDomain')]
+        for key in ('instanceId', 'bootVolumeId'):
+            if key in query:
+                attachments = [a for a in attachments if a[key] == query[key]]
+        return (200,) + self._page(attachments, query)
+
+    def get_app_catalog_listing_resource_version(self, query, body, listing_id, version):
+        return 200, {
+            'listingId': listing_id,
+            'listingResourceId': 'ocid1.image.oc1..1',
+            'listingResourceVersion': version,
+            'availableRegions': [REGION],
+            'compatibleShapes': [SHAPE],
+            'timePublished': _time(0),
+        }
+
+    def list_app_catalog_subscriptions(self, query, body):
+        return 200, [{'listingId': query.get('listingId'), 'compartmentId': query.get('compartmentId')}], None
+
+    """Blockstorage."""
+
+    def list_boot_volumes(self, query, body):
+        volumes = [self._public(v) for v in self.boot_volumes.values()
+                   if v['compartmentId'] == query.get('compartmentId')]
+        if 'availabilityDomain' in query:
+            volumes = [v for v in volumes if v['availabilityDomain'] == query['availabilityDomain']]
+        return (200,) + self._page(volumes, query)
+
+    def get_boot_volume(self, query, body, volume_id):
+        if volume_id not in self.boot_volumes:
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Not found'}
+        return 200, self._public(self.boot_volumes[volume_id])
+
+    def create_boot_volume(self, query, body):
+        source = body.get('sourceDetails') or {}
+        if source.get('type') == 'bootVolume':
+            origin = self.boot_volumes.get(source.get('id'))
+            if origin and origin['availabilityDomain'] != body['availabilityDomain']:
+                return 400, {'code': 'InvalidParameter',
+                             'message': 'A boot volume can only be cloned within its availability domain'}
+            transient, clone_time = 'PROVISIONING', self.clone_time
+        else:
+            origin = self.boot_volume_backups.get(source.get('id'))
+            transient, clone_time = 'RESTORING', self.restore_time
+        if not origin or self._public(origin)['lifecycleState'] != 'AVAILABLE':
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Source not found or not available'}
+        volume = self._add_boot_volume(body['compartmentId'], body['availabilityDomain'], body.get('displayName'),
+                                       origin['imageId'], body.get('freeformTags'))
+        volume['lifecycleState'] = transient
+        volume['_next'] = ('AVAILABLE', time.time() + clone_time)
+        return 200, self._public(volume)
+
+    def delete_boot_volume(self, query, body, volume_id):
+        volume = self.boot_volumes.get(volume_id)
+        if not volume:
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Not found'}
+        instance = self.instances.get(volume['_instance_id'])
+        if instance and self._public(instance)['lifecycleState'] != 'TERMINATED':
+            return 409, {'code': 'Conflict', 'message': 'Boot volume is attached'}
+        volume['lifecycleState'], volume['_next'] = 'TERMINATED', None
+        return 204, None
+
+    def list_boot_volume_backups(self, query, body):
+        backups = [self._public(b) for b in self.boot_volume_backups.values()
+                   if b['compartmentId'] == query.get('compartmentId')]
+        for key in ('bootVolumeId', 'displayName'):
+            if key in query:
+                backups = [b for b in backups if b[key] == query[key]]
+        return (200,) + self._page(backups, query)
+
+    def get_boot_volume_backup(self, query, body, backup_id):
+        if backup_id not in self.boot_volume_backups:
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Not found'}
+        return 200, self._public(self.boot_volume_backups[backup_id])
+
+    def create_boot_volume_backup(self, query, body):
+        volume = self.boot_volumes.get(body['bootVolumeId'])
+        if not volume or self._public(volume)['lifecycleState'] != 'AVAILABLE':
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Boot volume not found or not available'}
+        backup_id = 'ocid1.bootvolumebackup.oc1..{}'.format(len(self.boot_volume_backups))
+        self.boot_volume_backups[backup_id] = {
+            'id': backup_id,
+            'bootVolumeId': volume['id'],
+            'compartmentId': volume['compartmentId'],
+            'displayName': body.get('displayName'),
+            'freeformTags': body.get('freeformTags') or {},
+            'imageId': volume['imageId'],
+            'sizeInGBs': volume['sizeInGBs'],
+            'sourceType': 'MANUAL',
+            'type': body.get('type') or 'INCREMENTAL',
+            'lifecycleState': 'CREATING',
+            'timeCreated': datetime.now(timezone.utc).isoformat(),
+            '_next': ('AVAILABLE', time.time() + self.backup_time),
+        }
+        return 200, self._public(self.boot_volume_backups[backup_id])
+
+    def delete_boot_volume_backup(self, query, body, backup_id):
+        backup = self.boot_volume_backups.get(backup_id)
+        if not backup:
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Not found'}
+        backup['lifecycleState'], backup['_next'] = 'TERMINATED', None
+        return 204, None
+
+    """Virtual Network."""
+
+    def get_vnic(self, query, body, vnic_id):
+        if vnic_id not in self.vnics:
+            return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Not found'}
+        return 200, self.vnics[vnic_id]
+
+    def list_vcns(self, query, body):
+        return 200, [{'id': 'ocid1.vcn.oc1..fake', 'displayName': query.get('displayName', 'fake-vcn'),
+                      'compartmentId': query.get('compartmentId'), 'lifecycleState': 'AVAILABLE'}], None
+
+    def list_subnets(self, query, body):
+        return 200, [{'id': 'ocid1.subnet.oc1..fake', 'displayName': query.get('displayName', 'Public Subnet'),
+                      'compartmentId': query.get('compartmentId'), 'vcnId': query.get('vcnId'),
+                      'lifecycleState': 'AVAILABLE'}], None
+
+    """Identity."""
+
+    def list_availability_domains(self, query, body):
+        return 200, [{'name': 'fake:US-ASHBURN-AD-{}'.format(i), 'compartmentId': query.get('compartmentId')}
+                     for i in (1, 2, 3)], None
+
+    def list_compartments(self, query, body):
+        return (200,) + self._page(self.compartments, query)
+
+    def list_region_subscriptions(self, query, body, tenancy_id):
+        return 200, [{'regionKey': region[:3].upper(), 'regionName': region, 'status': 'READY',
+                      'isHomeRegion': region == self.regions[0]} for region in self.regions], None
+
+    def get_tenancy(self, query, body, tenancy_id):
+        return 200, {'id': tenancy_id, 'name': 'fake'}
+
+    """Marketplace."""
+
+    def list_listings(self, query, body):
+        return (200,) + self._page(self.listings, query)
+
+    def list_packages(self, query, body, listing_id):
+        return 200, [{'listingId': listing_id, 'packageVersion': '1.0', 'packageType': 'IMAGE',
+                      'timeCreated': _time(0)}], None
+
+    def get_package(self, query, body, listing_id, version):
+        return 200, {
+            'listingId': listing_id,
+            'version': version,
+            'packageType': 'IMAGE',
+            'timeCreated': _time(0),
+            'appCatalogListingId': 'ocid1.appcataloglisting.oc1..{}'.format(listing_id),
+            'appCatalogListingResourceVersion': version,
+        }
+
+    def list_agreements(self, query, body, listing_id, version):
+        return 200, [{'id': 'agreement-1', 'contentUrl': 'https://example.com', 'prompt': 'Agreement'}], None
+
+    def list_accepted_agreements(self, query, body):
+        return 200, [{'id': 'accepted-1',
+                      'agreementId': 'agreement-1',
+                      'listingId': query.get('listingId'),
+                      'packageVersion': query.get('packageVersion'),
+                      'compartmentId': query.get('compartmentId')}], None
+
+    """Resource Search."""
+
+    def search_resources(self, query, body):
+        """Structured queries: compartmentId, displayName and lifeCycleState conditions only."""
+        match = re.match(r'query (\w+) resources(?: where (.*))?$', body['query'])
+        if not match:
+            return 400, {'code': 'InvalidParameter', 'message': 'Unsupported query'}
+        resource_type, where = match.groups()
+        if resource_type == 'instance':
+            resources = [self._public(i) for i in self.instances.values()]
+        else:
+            resources = [i for i in self.images if i['operatingSystem'] == 'Custom']
+        for field, operator, values in _search_conditions(where or ''):
+            if operator == '=~':
+                resources = [r for r in resources if values[0].lower() in r[field].lower()]
+            elif operator == '!=':
+                resources = [r for r in resources if r[field] not in values]
+            else:
+                resources = [r for r in resources if r[field] in values]
+        items, next_page = self._page([{
+            'resourceType': resource_type.capitalize(),
+            'identifier': r['id'],
+            'compartmentId': r['compartmentId'],
+            'displayName': r['displayName'],
+            'availabilityDomain': r.get('availabilityDomain'),
+            'lifecycleState': r['lifecycleState'],
+            'timeCreated': r['timeCreated'],
+        } for r in resources], query)
+        return 200, {'items': items}, next_page
+
+    """Work requests."""
+
+    def list_work_requests(self, query, body):
+        return 200, [], None
+
+    def get_work_request(self, query, body, work_request_id):
+        return 404, {'code': 'NotAuthorizedOrNotFound', 'message': 'Not found'}
+
+
+# Structured query condition: field, operator, quoted value
+_SEARCH_CONDITION = re.compile(r"(compartmentId|displayName|lifeCycleState) (=~|!=|=) '((?:[^'\\]|\\.)*)'")
+_SEARCH_FIELDS = {'compartmentId': 'compartmentId', 'displayName': 'displayName', 'lifeCycleState': 'lifecycleState'}
+
+
+def _search_conditions(where):
+    """Return the (field, operator, values) conditions of a where clause.
+
+    Conditions on the same field and operator are or-ed together (e.g. a
+    list of compartments), the others are and-ed.
+    """
+    conditions = {}
+    for field, operator, value in _SEARCH_CONDITION.findall(where):
+        value = re.sub(r'\\(.)', r'\1', value)
+        conditions.setdefault((_SEARCH_FIELDS[field], operator), []).append(value)
+    return [(field, operator, values) for (field, operator), values in conditions.items()]
+
+
+# Routes: (method, path pattern, operation)
+_ROUTES = [(method, re.compile(pattern), operation) for method, pattern, operation in (
+    ('GET', r'/20160918/images', 'list_images'),
+    ('GET', r'/20160918/images/([^/]+)', 'get_image'),
+    ('GET', r'/20160918/images/([^/]+)/shapes/([^/]+)', 'get_image_shape_compatibility_entry'),
+    ('GET', r'/20160918/instances', 'list_instances'),
+    ('POST', r'/20160918/instances', 'launch_instance'),
+    ('GET', r'/20160918/instances/([^/]+)', 'get_instance'),
+    ('POST', r'/20160918/instances/([^/]+)', 'instance_action'),
+    ('PUT', r'/20160918/instances/([^/]+)', 'update_instance'),
+    ('DELETE', r'/20160918/instances/([^/]+)', 'terminate_instance'),
+    ('POST', r'/20160918/computeCapacityReports', 'create_compute_capacity_report'),
+    ('GET', r'/20160918/vnicAttachments', 'list_vnic_attachments'),
+    ('GET', r'/20160918/bootVolumeAttachments', 'list_boot_volume_attachments'),
+    ('GET', r'/20160918/bootVolumes', 'list_boot_volumes'),
+    ('POST', r'/20160918/bootVolumes', 'create_boot_volume'),
+    ('GET', r'/20160918/bootVolumes/([^/]+)', 'get_boot_volume'),
+    ('DELETE', r'/20160918/bootVolumes/([^/]+)', 'delete_boot_volume'),
+    ('GET', r'/20160918/bootVolumeBackups', 'list_boot_volume_backups'),
+    ('POST', r'/20160918/bootVolumeBackups', 'create_boot_volume_backup'),
+    ('GET', r'/20160918/bootVolumeBackups/([^/]+)', 'get_boot_volume_backup'),
+    ('DELETE', r'/20160918/bootVolumeBackups/([^/]+)', 'delete_boot_volume_backup'),
+    ('GET', r'/20160918/appCatalogListings/([^/]+)/resourceVersions/([^/]+)',
+     'get_app_catalog_listing_resource_version'),
+    ('GET', r'/20160918/appCatalogSubscriptions', 'list_app_catalog_subscriptions'),
+    ('GET', r'/20160918/vnics/([^/]+)', 'get_vnic'),
+    ('GET', r'/20160918/vcns', 'list_vcns'),
+    ('GET', r'/20160918/subnets', 'list_subnets'),
+    ('GET', r'/20160918/availabilityDomains', 'list_availability_domains'),
+    ('GET', r'/20160918/compartments', 'list_compartments'),
+    ('GET', r'/20160918/tenancies/([^/]+)', 'get_tenancy'),
+    ('GET', r'/20160918/tenancies/([^/]+)/regionSubscriptions', 'list_region_subscriptions'),
+    ('GET', r'/20160918/workRequests', 'list_work_requests'),
+    ('GET', r'/20160918/workRequests/([^/]+)', 'get_work_request'),
+    ('GET', r'/20181001/listings', 'list_listings'),
+    ('GET', r'/20181001/listings/([^/]+)/packages', 'list_packages'),
+    ('GET', r'/20181001/listings/([^/]+)/packages/([^/]+)', 'get_package'),
+    ('GET', r'/20181001/listings/([^/]+)/packages/([^/]+)/agreements', 'list_agreements'),
+    ('GET', r'/20181001/acceptedAgreements', 'list_accepted_agreements'),
+    ('POST', r'/20180409/resources', 'search_resources'),
+)]
+
+
+class _SshHandler(socketserver.BaseRequestHandler):
+    """Send the SSH banner if the instance is ready, close the connection otherwise."""
+
+    oci = None
+
+    def handle(self):
+        address = self.request.getsockname()[0]
+        if address.startswith('127.') and self.oci.ssh_ready(address):
+            self.request.sendall(b'SSH-2.0-FakeOci\r\n')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP request handler, dispatching to the FakeOci instance."""
+
+    oci = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        with self.oci._lock:
+            self.oci.connections += 1
+        super().setup()
+
+    def _handle(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        if self.headers.get('if-match'):
+            query['if-match'] = self.headers['if-match']
+        if self.oci.latency:
+            time.sleep(self.oci.latency)
+        _, status, payload, next_page, headers = self.oci.handle(self.command, url.path, query, body)
+        data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('opc-request-id', 'fake')
+        if next_page:
+            self.send_header('opc-next-page', next_page)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
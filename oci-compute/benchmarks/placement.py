@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""OCI Compute placement benchmark.
+
+Measure the time until provisioned instances are running when capacity is
+scarce, against a fake OCI endpoint: the first Availability Domain is out of
+capacity, the second has capacity for half of the instances and boots them
+slowly, the third one has capacity. Provisioning one Availability Domain
+after the other (retrying by hand the instances which failed) is compared
+with the failover, capacity check and hedging of the placement policy.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import argparse
+from statistics import median
+import sys
+import tempfile
+import time
+
+from fake_oci import COMPARTMENT_ID, FakeOci, SHAPE, write_config
+
+AVAILABILITY_DOMAINS = ('AD-1', 'AD-2', 'AD-3')
+
+
+def _provision(oci, options, display_name, availability_domain, running, start, placement=None):
+    """Provision, recording the time to Running of each instance from start."""
+    def callback(name, instance, error):
+        if instance:
+            running[name] = time.time() - start
+
+    return oci.provision_platform(display_name,
+                                  COMPARTMENT_ID,
+                                  'Oracle Linux',
+                                  '8',
+                                  SHAPE,
+                                  availability_domain,
+                                  'fake-vcn',
+                                  None,
+                                  'Public Subnet',
+                                  options.config_file,
+                                  callback=callback,
+                                  placement=placement)
+
+
+def manual(oci, options):
+    """Provision in each Availability Domain in turn, relaunching the instances which failed."""
+    start = time.time()
+    running = {}
+    remaining = options.count
+    for attempt, availability_domain in enumerate(AVAILABILITY_DOMAINS):
+        if not remaining:
+            break
+        results = _provision(oci, options, 'manual{}-{{001..{:03d}}}'.format(attempt, remaining),
+                             availability_domain, running, start)
+        remaining = len([instance for _, instance, _ in results if not instance])
+    return time.time() - start, running
+
+
+def policy(name, **kwargs):
+    """Return a scenario provisioning all the instances at once with a placement policy."""
+    def scenario(oci, options):
+        from oci_compute.placement import PlacementPolicy
+
+        start = time.time()
+        running = {}
+        _provision(oci, options, '{}-{{001..{:03d}}}'.format(name, options.count), AVAILABILITY_DOMAINS[0],
+                   running, start, PlacementPolicy(availability_domains=AVAILABILITY_DOMAINS[1:], **kwargs))
+        return time.time() - start, running
+
+    return scenario
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the time to Running when capacity is scarce')
+    parser.add_argument('--count', type=int, default=20, help='number of instances')
+    parser.add_argument('--boot-time', type=float, default=5.0, help='time until the instances are running')
+    parser.add_argument('--slow-boot-time', type=float, default=20.0,
+                        help='time until the instances are running in the second Availability Domain')
+    parser.add_argument('--latency', type=float, default=0.02, help='latency added to each call (seconds)')
+    options = parser.parse_args()
+
+    from oci_compute.oci_compute import OciCompute
+
+    scenarios = (('manual', manual),
+                 ('failover', policy('failover')),
+                 ('capacity check', policy('check', capacity_check=True)),
+                 ('hedge 2', policy('hedge', hedge=2)))
+    with tempfile.TemporaryDirectory() as directory:
+        options.config_file, _ = write_config(directory)
+        for name, scenario in scenarios:
+            fake = FakeOci(images=100, instances=0, latency=options.latency, boot_time=options.boot_time,
+                           capacity={'AD-1': 0, 'AD-2': options.count // 2},
+                           boot_times={'AD-2': options.slow_boot_time})
+            endpoint = fake.start()
+            oci = OciCompute(options.config_file, 'DEFAULT', service_endpoint=endpoint, use_cache=False)
+            wall, running = scenario(oci, options)
+            times = list(running.values())
+            terminated = fake.calls['terminate_instance']
+            print('{:14}: {}/{} running in {:.1f}s, time to Running median {:.1f}s, max {:.1f}s, '
+                  '{} launch calls ({} out of capacity), {} hedged instances terminated'.format(
+                      name, len(running), options.count, wall, median(times) if times else 0,
+                      max(times) if times else 0, fake.calls['launch_instance'], fake.errors['capacity'],
+                      terminated))
+            fake.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""OCI Compute readiness benchmark.
+
+Measure the time until provisioned instances accept SSH connections, against
+a fake OCI endpoint whose instances serve SSH some time after they are
+running: concurrent readiness probe of oci-compute, and a pipeline polling
+the instances one after the other with a fixed sleep.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import argparse
+from statistics import median
+import socket
+import sys
+import tempfile
+import time
+
+from fake_oci import COMPARTMENT_ID, FakeOci, SHAPE, write_config
+
+
+def _provision(oci, options, prefix, readiness=None):
+    return oci.provision_platform('{}-{{001..{:03d}}}'.format(prefix, options.count),
+                                  COMPARTMENT_ID,
+                                  'Oracle Linux',
+                                  '8',
+                                  SHAPE,
+                                  'AD-1',
+                                  'fake-vcn',
+                                  None,
+                                  'Public Subnet',
+                                  options.config_file,
+                                  readiness=readiness)
+
+
+def _lags(fake, start, ready_at):
+    """Return the detection lags: time between SSH up and detected ready."""
+    instances = {instance['displayName']: instance for instance in fake.instances.values()}
+    return [start + ready - instances[display_name]['_ssh_at'] for display_name, ready in ready_at.items()]
+
+
+def probe(oci, fake, options):
+    """Provision with the readiness probe."""
+    from oci_compute.readiness import ReadinessProbe
+
+    start = time.time()
+    results = _provision(oci, options, 'probe', ReadinessProbe(port=fake.ssh_port, banner=True))
+    wall = time.time() - start
+    ready_at = {timing.display_name: timing.ready for timing in oci.launch_timings if timing.ready is not None}
+    return wall, len([instance for _, instance, _ in results if instance]), _lags(fake, start, ready_at)
+
+
+def _ssh_banner(address, port):
+    try:
+        with socket.create_connection((address, port), timeout=3) as sock:
+            return sock.recv(64).startswith(b'SSH-')
+    except OSError:
+        return False
+
+
+def sleep_loop(oci, fake, options):
+    """Provision, then poll each instance in turn with a fixed sleep."""
+    start = time.time()
+    results = _provision(oci, options, 'loop')
+    instances = [instance for _, instance, _ in results if instance]
+    ready_at = {}
+    for instance, vnic in zip(instances, oci.get_vnics(COMPARTMENT_ID, instances)):
+        while not _ssh_banner(vnic.public_ip, fake.ssh_port):
+            time.sleep(options.sleep)
+        ready_at[instance.display_name] = time.time() - start
+    return time.time() - start, len(ready_at), _lags(fake, start, ready_at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the time until provisioned instances accept SSH')
+    parser.add_argument('--count', type=int, default=20, help='number of instances')
+    parser.add_argument('--boot-time', type=float, default=5.0, help='time until the instances are running')
+    parser.add_argument('--ssh-delay', type=float, default=20.0,
+                        help='average time from running to SSH up (+/- 50%%)')
+    parser.add_argument('--sleep', type=float, default=10.0, help='sleep between attempts of the polling loop')
+    parser.add_argument('--latency', type=float, default=0.02, help='latency added to each call (seconds)')
+    options = parser.parse_args()
+
+    from oci_compute.oci_compute import OciCompute
+
+    fake = FakeOci(images=100, instances=0, latency=options.latency, boot_time=options.boot_time,
+                   ssh_delay=options.ssh_delay)
+    endpoint = fake.start()
+    with tempfile.TemporaryDirectory() as directory:
+        options.config_file, _ = write_config(directory)
+        for name, scenario in (('probe', probe), ('sleep loop', sleep_loop)):
+            oci = OciCompute(options.config_file, 'DEFAULT', service_endpoint=endpoint, use_cache=False)
+            wall, ready, lags = scenario(oci, fake, options)
+            print('{:10}: {} ready in {:.1f}s, detection lag median {:.1f}s, max {:.1f}s'.format(
+                name, ready, wall, median(lags) if lags else 0, max(lags) if lags else 0))
+    fake.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
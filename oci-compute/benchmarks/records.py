@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""OCI Compute records benchmark.
+
+Compare the SDK models with the compact records of oci_compute.records for
+large image catalogs and instance fleets:
+- memory per record, measured with tracemalloc once the whole catalog is
+  retrieved (pages are deserialized as the SDK does);
+- sort throughput, sorting by display name and creation time as the list
+  commands do.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import argparse
+import gc
+import json
+from operator import attrgetter
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fake_oci import FakeOci, write_config
+import oci
+from oci_compute.records import image_record, instance_record
+from terminaltables import AsciiTable
+
+# Items per deserialized page
+PAGE_SIZE = 100
+
+SORT_KEY = attrgetter('display_name', 'time_created')
+
+
+def pages(base_client, items, model):
+    """Deserialize items page by page, as retrieved by the SDK."""
+    for start in range(0, len(items), PAGE_SIZE):
+        payload = json.dumps(items[start:start + PAGE_SIZE]).encode('utf-8')
+        yield base_client.deserialize_response_data(payload, 'list[{}]'.format(model))
+
+
+def measure(base_client, items, model, record):
+    """Return (bytes per record, sorted records per second)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    if record:
+        data = [record(item) for page in pages(base_client, items, model) for item in page]
+    else:
+        data = [item for page in pages(base_client, items, model) for item in page]
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    sorted(data, key=SORT_KEY)
+    elapsed = time.perf_counter() - start
+    return size / len(data), len(data) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare SDK models and compact records')
+    parser.add_argument('--images', type=int, default=50000, help='number of images')
+    parser.add_argument('--instances', type=int, default=20000, help='number of instances')
+    options = parser.parse_args()
+
+    fake = FakeOci(images=options.images, instances=options.instances, listings=0)
+    catalogs = (
+        ('images', fake.images, 'Image', image_record),
+        ('instances', [fake._instance(instance) for instance in fake.instances.values()], 'Instance',
+         instance_record),
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        config_file, _ = write_config(directory)
+        base_client = oci.core.ComputeClient(oci.config.from_file(config_file)).base_client
+
+        rows = []
+        for name, items, model, record in catalogs:
+            sdk_size, sdk_rate = measure(base_client, items, model, None)
+            record_size, record_rate = measure(base_client, items, model, record)
+            rows.append((name,
+                         len(items),
+                         '{:.0f}'.format(sdk_size),
+                         '{:.0f}'.format(record_size),
+                         '{:.0f}'.format(sdk_rate),
+                         '{:.0f}'.format(record_rate)))
+
+    table = AsciiTable([('Catalog', 'Records', 'SDK (B/rec)', 'Record (B/rec)', 'SDK sort (rec/s)',
+                         'Record sort (rec/s)')] + rows)
+    table.title = 'oci-compute records'
+    print(table.table)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
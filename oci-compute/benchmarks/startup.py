@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""OCI Compute startup benchmark.
+
+Measure the cold start time of the oci-compute command and check it against
+its budget:
+- `oci-compute --help`: time to display the help;
+- `oci-compute list custom`: time until the first API request is about to be
+  sent (the process is stopped at that point, no request is made).
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import argparse
+from statistics import median
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_oci import write_config
+
+# Startup budgets (seconds, median of the runs)
+BUDGETS = {
+    'help': 0.3,
+    'list custom': 1.0,
+}
+
+# Output of the runner when the first request is about to be sent, followed
+# by the elapsed time
+_REQUEST = 'first request after '
+
+# Runs oci-compute and stops it when it resolves the first API endpoint
+_RUNNER = '''
+import os, socket, sys, time
+start = float(sys.argv[1])
+
+def getaddrinfo(*args, **kwargs):
+    sys.stdout.write('%s{:.6f}'.format(time.time() - start))
+    sys.stdout.flush()
+    os._exit(0)
+
+socket.getaddrinfo = getaddrinfo
+from oci_compute.cli import cli
+cli(sys.argv[2:])
+''' % _REQUEST
+
+
+def run(args):
+    """Run oci-compute once, return the elapsed time, None if the command failed."""
+    start = time.time()
+    result = subprocess.run([sys.executable, '-c', _RUNNER, str(start)] + args,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    elapsed = time.time() - start
+    output = result.stdout.decode()
+    if output.startswith(_REQUEST):
+        # Time until the first request
+        return float(output[len(_REQUEST):])
+    if result.returncode == 0 and output:
+        # Command completed without request
+        return elapsed
+    error = result.stderr.decode().strip().splitlines()
+    print('oci-compute {} failed (exit status {}): {}'.format(' '.join(args), result.returncode,
+                                                              error[-1] if error else 'no output'),
+          file=sys.stderr)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure oci-compute startup time')
+    parser.add_argument('--runs', type=int, default=5, help='number of runs per command')
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_file, rc_file = write_config(directory)
+        common = ['--config-file', config_file, '--rc-file', rc_file, '--no-cache']
+        commands = {
+            'help': ['--help'],
+            'list custom': common + ['list', 'custom'],
+        }
+        failed = False
+        for name, args in commands.items():
+            timings = [run(args) for _ in range(options.runs)]
+            if None in timings:
+                failed = True
+                print('{:12}: {} of {} runs failed (budget {:.3f}s) FAILED'.format(
+                    name, timings.count(None), options.runs, BUDGETS[name]))
+                continue
+            status = 'OK' if median(timings) <= BUDGETS[name] else 'OVER BUDGET'
+            failed = failed or status != 'OK'
+            print('{:12}: median {:.3f}s, min {:.3f}s (budget {:.3f}s) {}'.format(
+                name, median(timings), min(timings), BUDGETS[name], status))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""OCI Compute warm pool benchmark.
+
+Measure the time until provisioned instances are running for a series of
+ephemeral test environments (provision, use, terminate), against a fake OCI
+endpoint where booting a new instance takes much longer than starting a
+stopped one. Launching every environment from the image is compared with
+handing out instances from a warm pool, maintained between the environments
+as a cron job would.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import argparse
+import os
+from statistics import median
+import sys
+import tempfile
+import time
+
+from fake_oci import COMPARTMENT_ID, FakeOci, SHAPE, write_config
+
+
+def run(oci, options, pool=None):
+    """Provision, use and terminate the environments in turn.
+
+    Returns:
+        List of the times to Running of the instances.
+
+    """
+    times = []
+    for environment in range(options.environments):
+        start = time.time()
+        results = oci.provision_platform('env{}-{{1..{}}}'.format(environment, options.count),
+                                         COMPARTMENT_ID,
+                                         'Oracle Linux',
+                                         '8',
+                                         SHAPE,
+                                         'AD-1',
+                                         'fake-vcn',
+                                         None,
+                                         'Public Subnet',
+                                         options.config_file,
+                                         callback=lambda name, instance, error: instance and times.append(
+                                             time.time() - start),
+                                         pool=pool)
+        # The environment is used, then terminated; the pool is maintained
+        # meanwhile
+        time.sleep(options.interval / 2)
+        if pool:
+            oci.maintain_pools(pool, COMPARTMENT_ID)
+        time.sleep(options.interval / 2)
+        oci.instance_actions('terminate', COMPARTMENT_ID,
+                             [instance.id for _, instance, _ in results if instance])
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the time to Running with and without a warm pool')
+    parser.add_argument('--environments', type=int, default=5, help='number of environments provisioned in turn')
+    parser.add_argument('--count', type=int, default=4, help='number of instances per environment')
+    parser.add_argument('--boot-time', type=float, default=8.0, help='time until new instances are running')
+    parser.add_argument('--start-time', type=float, default=1.0,
+                        help='time until stopped instances are running (and stopped)')
+    parser.add_argument('--interval', type=float, default=24.0, help='time each environment is used')
+    parser.add_argument('--latency', type=float, default=0.02, help='latency added to each call (seconds)')
+    options = parser.parse_args()
+
+    from oci_compute.oci_compute import OciCompute
+    from oci_compute.pool import WarmPool
+
+    with tempfile.TemporaryDirectory() as directory:
+        options.config_file, _ = write_config(directory)
+        pool = WarmPool(size=options.count, warm_up=options.boot_time + 1,
+                        pool_file=os.path.join(directory, 'warm-pools.json'))
+        for name, scenario_pool in (('launch', None), ('warm pool', pool)):
+            fake = FakeOci(images=100, instances=0, latency=options.latency, boot_time=options.boot_time,
+                           start_time=options.start_time)
+            endpoint = fake.start()
+            oci = OciCompute(options.config_file, 'DEFAULT', service_endpoint=endpoint, use_cache=False)
+            times = run(oci, options, scenario_pool)
+            line = '{:9}: {} running, time to Running median {:.1f}s, max {:.1f}s, {} launch calls'.format(
+                name, len(times), median(times) if times else 0, max(times) if times else 0,
+                fake.calls['launch_instance'])
+            if scenario_pool:
+                stats = oci.pool_stats(pool, COMPARTMENT_ID)[0]
+                line += ', {} hits / {} requests, {} pooled instances left'.format(
+                    stats.hits, stats.hits + stats.misses, stats.ready + stats.warming)
+                oci.maintain_pools(pool, COMPARTMENT_ID, drain=True)
+            print(line)
+            fake.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,9 +4,15 @@
 
 Import classes, exceptions and enums
 """
-import pkg_resources
+try:
+    from importlib.metadata import version
+except ImportError:  # Python < 3.8
+    from pkg_resources import get_distribution
+
+    def version(distribution_name):
+        return get_distribution(distribution_name).version
 
 try:
-    __version__ = pkg_resources.get_distribution('setuptools').version
+    __version__ = version('oci-compute')
 except Exception:
     __version__ = 'unknown'
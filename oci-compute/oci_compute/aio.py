@@ -0,0 +1,707 @@
+#!/usr/bin/env python3
+
+"""OCI Compute asyncio interface.
+
+AsyncOciCompute wraps an OciCompute instance for asyncio applications:
+- the SDK is synchronous: its calls run in a bounded thread pool, shared by
+  all the coroutines, instead of blocking the event loop;
+- provisioning is driven by the event loop: the lookups, launches and waits
+  only use the thread pool for their individual calls;
+- listings are async iterators, retrieving the results page by page;
+- waits for lifecycle states do not hold any thread: they are served by a
+  single polling task, which lists the instances of each compartment once
+  per tick whatever the number of waiting coroutines;
+- Marketplace agreements are never prompted for.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from threading import Lock
+import time
+
+from .oci_compute import (expand_display_names, INSTANCE_ACTIONS, LIST_PAGE_SIZE, OciCompute, stale_resolution,
+                          StaleResolutionError)
+from .placement import out_of_capacity, PlacementError
+from .readiness import ReadinessError
+from .waiter import BACKOFF_FACTOR, FAST_INTERVAL, FAST_WINDOW, MAX_INTERVAL, MAX_WAIT_SECONDS, WaitError
+
+
+class AsyncLifecycleWaiter(object):
+    """Wait for instances to reach a lifecycle state, from coroutines.
+
+    All the waits are served by a single polling task, started on demand and
+    stopped when nothing is waited for. A wait which is cancelled (or times
+    out) is simply forgotten.
+    """
+
+    def __init__(self,
+                 list_states,
+                 fast_interval=FAST_INTERVAL,
+                 fast_window=FAST_WINDOW,
+                 max_interval=MAX_INTERVAL):
+        """Initialise the waiter.
+
+        Parameters:
+            list_states: coroutine function called with a compartment OCID
+                         and the OCIDs of the instances waited for in it,
+                         returning {instance_id: instance} for (at least)
+                         these instances
+            fast_interval: polling interval while a wait is in its fast
+                           window
+            fast_window: duration of the fast polling window of a wait
+            max_interval: maximum polling interval
+
+        """
+        self._list_states = list_states
+        self._fast_interval = fast_interval
+        self._fast_window = fast_window
+        self._max_interval = max_interval
+        # Pending waits: {compartment_id: {instance_id: [(states, future, start)]}}
+        self._pending = {}
+        self._task = None
+
+    @property
+    def pending(self):
+        """Return the number of pending waits."""
+        return sum(len(waits) for instances in self._pending.values() for waits in instances.values())
+
+    async def wait(self, compartment_id, instance_id, states, max_wait_seconds=MAX_WAIT_SECONDS):
+        """Wait until an instance reaches one of the given states.
+
+        Parameters:
+            compartment_id: the compartment OCID of the instance
+            instance_id: the instance OCID
+            states: list of target lifecycle states
+            max_wait_seconds: give up after this delay
+
+        Returns:
+            The instance (records.InstanceRecord).
+
+        Raises:
+            WaitError: the instance was terminated or the wait timed out.
+
+        """
+        loop = asyncio.get_running_loop()
+        entry = ([state.upper() for state in states], loop.create_future(), time.time())
+        self._pending.setdefault(compartment_id, {}).setdefault(instance_id, []).append(entry)
+        if self._task is None:
+            self._task = loop.create_task(self._poll())
+        try:
+            return await asyncio.wait_for(entry[1], max_wait_seconds)
+        except asyncio.TimeoutError:
+            raise WaitError('Timed out waiting for {}'.format(instance_id))
+        finally:
+            self._discard(compartment_id, instance_id, entry)
+
+    def _discard(self, compartment_id, instance_id, entry):
+        instances = self._pending.get(compartment_id, {})
+        waits = instances.get(instance_id, [])
+        if entry in waits:
+            waits.remove(entry)
+        if not waits:
+            instances.pop(instance_id, None)
+        if not instances:
+            self._pending.pop(compartment_id, None)
+        if not self._pending and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _check(self, compartment_id, instances):
+        """Complete the waits of a compartment reaching their state."""
+        for instance_id, waits in list(self._pending.get(compartment_id, {}).items()):
+            # Newly launched instances might not be listed yet
+            instance = instances.get(instance_id)
+            if instance is None:
+                continue
+            state = instance.lifecycle_state.upper()
+            for states, future, _ in waits:
+                if future.done():
+                    continue
+                if state in states:
+                    future.set_result(instance)
+                elif state == 'TERMINATED':
+                    future.set_exception(WaitError('{} is {}'.format(instance_id, state)))
+
+    async def _poll(self):
+        interval = self._fast_interval
+        while self._pending:
+            for compartment_id in list(self._pending):
+                # Completed while the previous compartments were polled
+                if compartment_id not in self._pending:
+                    continue
+                try:
+                    instances = await self._list_states(compartment_id, list(self._pending[compartment_id]))
+                except Exception:
+                    # Transient error: try again at next tick
+                    continue
+                self._check(compartment_id, instances)
+            # Poll fast while a wait is in its fast window, then back off
+            now = time.time()
+            if any(now - start < self._fast_window
+                   for instances in self._pending.values() for waits in instances.values()
+                   for _, _, start in waits):
+                interval = self._fast_interval
+            else:
+                interval = min(self._max_interval, interval * BACKOFF_FACTOR)
+            await asyncio.sleep(interval)
+
+    def close(self):
+        """Stop polling; pending waits are cancelled."""
+        for instances in self._pending.values():
+            for waits in instances.values():
+                for _, future, _ in waits:
+                    future.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class _AsyncIterator(object):
+    """Async iterator over a synchronous iterable, advanced in a thread pool.
+
+    Items are retrieved by chunks of a page, so that a thread is only used
+    while a page is retrieved.
+    """
+
+    def __init__(self, executor, factory, chunk=LIST_PAGE_SIZE):
+        """Initialise the iterator.
+
+        Parameters:
+            executor: the thread pool
+            factory: function returning the synchronous iterable
+            chunk: number of items retrieved at once
+
+        """
+        self._executor = executor
+        self._factory = factory
+        self._chunk = chunk
+        self._iterator = None
+        self._buffer = deque()
+        self._done = False
+        # Running retrieval (concurrent.futures.Future)
+        self._running = None
+
+    def __aiter__(self):
+        return self
+
+    def _next_chunk(self):
+        if self._iterator is None:
+            self._iterator = iter(self._factory())
+        return list(islice(self._iterator, self._chunk))
+
+    async def __anext__(self):
+        if not self._buffer and not self._done:
+            self._running = self._executor.submit(self._next_chunk)
+            try:
+                chunk = await asyncio.wrap_future(self._running)
+            except asyncio.CancelledError:
+                await self.aclose()
+                raise
+            except BaseException:
+                self._done = True
+                raise
+            self._running = None
+            self._done = len(chunk) < self._chunk
+            self._buffer.extend(chunk)
+        if not self._buffer:
+            await self.aclose()
+            raise StopAsyncIteration
+        return self._buffer.popleft()
+
+    async def aclose(self):
+        """Stop the iteration, closing the synchronous iterator."""
+        self._done = True
+        self._buffer.clear()
+
+        def close(*_):
+            close_iterator = getattr(self._iterator, 'close', None)
+            if close_iterator:
+                self._executor.submit(close_iterator)
+
+        if self._running is not None and not self._running.done():
+            # The generator cannot be closed while it runs
+            self._running.add_done_callback(close)
+        else:
+            close()
+        self._running = None
+
+
+class AsyncOciCompute(object):
+    """Awaitable interface to OciCompute.
+
+    Methods have the same parameters as their OciCompute equivalent, unless
+    noted. The OciCompute instance can be shared with synchronous code.
+    """
+
+    def __init__(self, config_file=None, profile=None, oci=None, max_threads=None, **kwargs):
+        """Initialise the class.
+
+        Parameters:
+            config_file, profile, kwargs: OciCompute parameters, when oci is
+                                          not given
+            oci: the OciCompute instance to use
+            max_threads: size of the thread pool running the SDK calls
+                         (default: the maximum number of requests in flight
+                         of the request scheduler)
+
+        """
+        self._oci = oci or OciCompute(config_file, profile, **kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=max_threads or self._oci.scheduler.max_in_flight)
+        self._waiter = AsyncLifecycleWaiter(lambda compartment_id, instance_ids: self._run(
+            self._oci.instance_states, compartment_id, instance_ids))
+
+    @property
+    def oci(self):
+        """Return the OciCompute instance."""
+        return self._oci
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a synchronous function in the thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def _iterate(self, func, *args, **kwargs):
+        return _AsyncIterator(self._executor, partial(func, *args, **kwargs))
+
+    async def close(self):
+        """Stop the waits and the thread pool."""
+        self._waiter.close()
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    """Listings."""
+
+    async def resolve_compartment(self, compartment):
+        return await self._run(self._oci.resolve_compartment, compartment)
+
+    async def list_platform(self, compartment_id):
+        return await self._run(self._oci.list_platform, compartment_id)
+
+    async def list_custom(self, compartment_id):
+        return await self._run(self._oci.list_custom, compartment_id)
+
+    async def list_market(self, name=None, publisher=None, shape=None, region=None):
+        return await self._run(self._oci.list_market, name, publisher, shape, region)
+
+    async def instance_list(self, compartment_id, display_name=None):
+        return await self._run(self._oci.instance_list, compartment_id, display_name)
+
+    async def get_vnic(self, compartment_id, instance):
+        return await self._run(self._oci.get_vnic, compartment_id, instance)
+
+    async def get_vnics(self, compartment_id, instances, compartment_wide=None):
+        return await self._run(self._oci.get_vnics, compartment_id, instances, compartment_wide)
+
+    def iter_images(self, compartment_id, custom=None, limit=None):
+        """Async iterator over images, see OciCompute.iter_images."""
+        return self._iterate(self._oci.iter_images, compartment_id, custom, limit)
+
+    def iter_listings(self, limit=None):
+        """Async iterator over Marketplace listings, see OciCompute.iter_listings."""
+        return self._iterate(self._oci.iter_listings, limit)
+
+    def iter_instances(self, compartment_id, display_name=None, limit=None, vnics=True, name_prefix=None,
+                       state=None):
+        """Async iterator over instances, see OciCompute.iter_instances."""
+        return self._iterate(self._oci.iter_instances, compartment_id, display_name, limit, vnics, name_prefix,
+                             state)
+
+    def query_instances(self, compartment_ids, **kwargs):
+        """Async iterator over instances of several compartments, see OciCompute.query_instances."""
+        return self._iterate(self._oci.query_instances, compartment_ids, **kwargs)
+
+    def query_images(self, compartment_ids, **kwargs):
+        """Async iterator over images of several compartments, see OciCompute.query_images."""
+        return self._iterate(self._oci.query_images, compartment_ids, **kwargs)
+
+    """Waits."""
+
+    async def wait_for_instance(self, compartment_id, instance_id, state, max_wait_seconds=MAX_WAIT_SECONDS):
+        """Wait for an instance to reach a lifecycle state.
+
+        Cancelling the coroutine stops the wait; no thread is used while
+        waiting.
+
+        Returns:
+            The instance (records.InstanceRecord).
+
+        Raises:
+            waiter.WaitError: the instance was terminated or the wait timed
+                              out.
+
+        """
+        return await self._waiter.wait(compartment_id, instance_id, [state], max_wait_seconds)
+
+    """Provisioning."""
+
+    async def _ready(self, compartment_id, instance, readiness):
+        """Wait until a running instance is ready, on the event loop; an unready instance is terminated."""
+        vnic = await self.get_vnic(compartment_id, instance)
+        try:
+            await readiness.ready(readiness.address(vnic))
+        except ReadinessError as e:
+            raise await self._run(self._oci._unready, instance, e) from e
+        return instance
+
+    async def _rounds(self, waiter):
+        """Wait for the resources of a LifecycleWaiter: each poll runs in the thread pool."""
+        rounds = waiter.rounds()
+        while True:
+            delay = await self._run(next, rounds, None)
+            if delay is None:
+                return
+            await asyncio.sleep(delay)
+
+    async def _clone_golden(self, view, golden, launch_instance_details, display_names):
+        """Clone a golden boot volume for each instance, see OciCompute._clone_golden."""
+        compartment_id = launch_instance_details.compartment_id
+        clones = await asyncio.gather(*(self._run(view._create_clone, golden, compartment_id,
+                                                  launch_instance_details.availability_domain, display_name)
+                                        for display_name in display_names))
+        clones = dict(zip(display_names, clones))
+        waiter = await self._run(view._clones_waiter, compartment_id, clones)
+        await self._rounds(waiter)
+        return await self._run(view._clone_sources, display_names, clones, waiter.results)
+
+    async def _pool_handout(self, view, pool, launch_instance_details, display_names):
+        """Hand out pooled instances and start refilling the pool, see OciCompute._pool_handout."""
+        key, instances, available = await self._run(view._pool_candidates, pool, launch_instance_details)
+        lock = Lock()
+        names = display_names[:len(available)]
+        taken = await asyncio.gather(*(self._run(view._take_pooled, key, available, lock, display_name,
+                                                 launch_instance_details.freeform_tags)
+                                       for display_name in names))
+        pooled = {display_name: instance for display_name, instance in zip(names, taken) if instance}
+        await self._run(view._pool_handed_out, pool, key, launch_instance_details, display_names, instances, pooled)
+        return pooled
+
+    async def _launch(self, view, launch_instance_details, display_name, pooled, sources):
+        """Launch an instance, unless it was handed out from the warm pool.
+
+        Returns:
+            (display_name, instance, error) tuple.
+
+        """
+        instance = pooled.get(display_name)
+        if instance is None:
+            try:
+                instance, _ = await self._run(view._launch_named, launch_instance_details, display_name,
+                                              view._placements, sources=sources)
+            except Exception as e:
+                view._echo_message_kv(display_name, 'Launch failed: {}'.format(getattr(e, 'message', e)))
+                return display_name, None, e
+        view._echo_message_kv(display_name, instance.lifecycle_state)
+        return display_name, instance, None
+
+    async def _provision(self, graph_name, graph_args, display_name, compartment_id, shape, availability_domain,
+                         vcn_name, vcn_compartment_id, subnet_name, ssh_authorized_keys_file, cloud_init_file=None,
+                         count=None, wait=True, readiness=None, placement=None, pool=None, clone=False):
+        """Provision from the event loop, see OciCompute._provision_image.
+
+        The lookup graph, the launches and the waits are driven by the event
+        loop: only their individual calls run in the thread pool. Cancelling
+        the coroutine stops the provisioning, the requests already sent are
+        not undone.
+
+        Parameters:
+            graph_name: the OciCompute method returning the image lookup graph
+            graph_args: its arguments
+
+        """
+        # Concurrent provisionings each need their own view
+        view = self._oci.fork()
+        args = (view, graph_name, graph_args, display_name, compartment_id, shape, availability_domain, vcn_name,
+                vcn_compartment_id, subnet_name, ssh_authorized_keys_file, cloud_init_file, count, wait, readiness,
+                placement, pool, clone)
+        try:
+            return await self._provision_once(*args)
+        except StaleResolutionError as e:
+            await self._run(view._forget_resolutions, e)
+            return await self._provision_once(*args)
+
+    async def _provision_once(self, view, graph_name, graph_args, display_name, compartment_id, shape,
+                              availability_domain, vcn_name, vcn_compartment_id, subnet_name,
+                              ssh_authorized_keys_file, cloud_init_file, count, wait, readiness, placement, pool,
+                              clone):
+        display_names = expand_display_names(display_name, count)
+        graph = getattr(view, graph_name)(*graph_args)
+        view._add_launch_lookups(graph, compartment_id, shape, availability_domain, vcn_name, vcn_compartment_id,
+                                 subnet_name, placement)
+        results = await graph.run_async(self._run)
+        prepared = await self._run(view._prepare_launch, graph, results, compartment_id, display_names, shape,
+                                   ssh_authorized_keys_file, cloud_init_file, clone)
+        if not prepared:
+            return None
+        launch_instance_details, golden = prepared
+
+        sources = await self._clone_golden(view, golden, launch_instance_details, display_names) if clone else None
+        pooled = await self._pool_handout(view, pool, launch_instance_details, display_names) if pool else {}
+        launches = list(await asyncio.gather(*(self._launch(view, launch_instance_details, display_name, pooled,
+                                                            sources)
+                                               for display_name in display_names)))
+        if sources:
+            await self._run(view._discard_clones, sources, launches)
+        # Cached resolutions are presumably stale if every launch got rejected
+        if view._resolution_hits and all(stale_resolution(error) for _, _, error in launches):
+            raise StaleResolutionError(launches[0][2].code)
+
+        if len(display_names) == 1:
+            _, instance, error = launches[0]
+            if error:
+                clone_failed = sources is not None and error is sources[display_names[0]]
+                if not (clone_failed or isinstance(error, PlacementError) or out_of_capacity(error)):
+                    raise error
+                view._echo_error('Instance launch failed: {}'.format(getattr(error, 'message', error)))
+                return None
+            if not wait:
+                return instance
+            instance = await self.wait_for_instance(compartment_id, instance.id, 'RUNNING')
+            return await self._ready(compartment_id, instance, readiness) if readiness else instance
+        if not wait:
+            return launches
+
+        async def running(display_name, instance, error):
+            if error:
+                return display_name, None, error
+            try:
+                instance = await self.wait_for_instance(compartment_id, instance.id, 'RUNNING')
+                if readiness:
+                    instance = await self._ready(compartment_id, instance, readiness)
+                return display_name, instance, None
+            except (WaitError, ReadinessError) as e:
+                return display_name, None, e
+
+        return list(await asyncio.gather(*(running(*launch) for launch in launches)))
+
+    async def provision_platform(self,
+                                 display_name,
+                                 compartment_id,
+                                 operating_system,
+                                 operating_system_version,
+                                 shape,
+                                 availability_domain,
+                                 vcn_name,
+                                 vcn_compartment_id,
+                                 subnet_name,
+                                 ssh_authorized_keys_file,
+                                 cloud_init_file=None,
+                                 count=None,
+                                 wait=True,
+                                 readiness=None,
+                                 placement=None,
+                                 pool=None):
+        """Provision platform image, see OciCompute.provision_platform.
+
+        With readiness (readiness.ReadinessProbe), running instances are
+        probed from the event loop.
+
+        With placement (placement.PlacementPolicy), launches fail over to the
+        next placement with capacity; they are not hedged, as the instances
+        are waited for from the event loop.
+
+        With pool (pool.WarmPool), instances are handed out from the warm
+        pool first; the pool is refilled in the background, without being
+        waited for (see OciCompute._pool_handout).
+
+        Returns:
+            The instance (None if the lookups failed), or a list of
+            (display_name, instance, error) tuples for bulk provisioning.
+
+        Raises:
+            waiter.WaitError: a single instance did not reach the Running
+                              state.
+            readiness.ReadinessError: a single instance was not ready in
+                                      time (it is terminated).
+
+        """
+        return await self._provision('_platform_graph',
+                                     (compartment_id, operating_system, operating_system_version, shape),
+                                     display_name=display_name,
+                                     compartment_id=compartment_id,
+                                     shape=shape,
+                                     availability_domain=availability_domain,
+                                     vcn_name=vcn_name,
+                                     vcn_compartment_id=vcn_compartment_id,
+                                     subnet_name=subnet_name,
+                                     ssh_authorized_keys_file=ssh_authorized_keys_file,
+                                     cloud_init_file=cloud_init_file,
+                                     count=count,
+                                     wait=wait,
+                                     readiness=readiness,
+                                     placement=placement,
+                                     pool=pool)
+
+    async def provision_custom(self,
+                               display_name,
+                               compartment_id,
+                               custom_image_name,
+                               shape,
+                               availability_domain,
+                               vcn_name,
+                               vcn_compartment_id,
+                               subnet_name,
+                               ssh_authorized_keys_file,
+                               cloud_init_file=None,
+                               count=None,
+                               wait=True,
+                               readiness=None,
+                               placement=None,
+                               pool=None):
+        """Provision Custom image, see provision_platform."""
+        return await self._provision('_custom_graph', (compartment_id, custom_image_name, shape),
+                                     display_name=display_name,
+                                     compartment_id=compartment_id,
+                                     shape=shape,
+                                     availability_domain=availability_domain,
+                                     vcn_name=vcn_name,
+                                     vcn_compartment_id=vcn_compartment_id,
+                                     subnet_name=subnet_name,
+                                     ssh_authorized_keys_file=ssh_authorized_keys_file,
+                                     cloud_init_file=cloud_init_file,
+                                     count=count,
+                                     wait=wait,
+                                     readiness=readiness,
+                                     placement=placement,
+                                     pool=pool)
+
+    async def provision_market(self,
+                               display_name,
+                               compartment_id,
+                               market_image_name,
+                               shape,
+                               availability_domain,
+                               vcn_name,
+                               vcn_compartment_id,
+                               subnet_name,
+                               ssh_authorized_keys_file,
+                               cloud_init_file=None,
+                               count=None,
+                               wait=True,
+                               accept_agreements=False,
+                               readiness=None,
+                               placement=None,
+                               pool=None):
+        """Provision Marketplace image, see provision_platform.
+
+        Agreements are never prompted for: when they are not accepted yet,
+        they are accepted if accept_agreements is True, otherwise the
+        provisioning fails (None is returned).
+        """
+        return await self._provision('_market_graph',
+                                     (compartment_id, market_image_name, shape, bool(accept_agreements)),
+                                     display_name=display_name,
+                                     compartment_id=compartment_id,
+                                     shape=shape,
+                                     availability_domain=availability_domain,
+                                     vcn_name=vcn_name,
+                                     vcn_compartment_id=vcn_compartment_id,
+                                     subnet_name=subnet_name,
+                                     ssh_authorized_keys_file=ssh_authorized_keys_file,
+                                     cloud_init_file=cloud_init_file,
+                                     count=count,
+                                     wait=wait,
+                                     readiness=readiness,
+                                     placement=placement,
+                                     pool=pool)
+
+    async def provision_clone(self,
+                              display_name,
+                              compartment_id,
+                              golden_name,
+                              shape,
+                              availability_domain,
+                              vcn_name,
+                              vcn_compartment_id,
+                              subnet_name,
+                              ssh_authorized_keys_file,
+                              cloud_init_file=None,
+                              count=None,
+                              wait=True,
+                              readiness=None):
+        """Provision clones of a golden image, see provision_platform.
+
+        The boot volume clones are waited for from the event loop, before
+        the launch.
+        """
+        return await self._provision('_clone_graph', (compartment_id, golden_name),
+                                     display_name=display_name,
+                                     compartment_id=compartment_id,
+                                     shape=shape,
+                                     availability_domain=availability_domain,
+                                     vcn_name=vcn_name,
+                                     vcn_compartment_id=vcn_compartment_id,
+                                     subnet_name=subnet_name,
+                                     ssh_authorized_keys_file=ssh_authorized_keys_file,
+                                     cloud_init_file=cloud_init_file,
+                                     count=count,
+                                     wait=wait,
+                                     readiness=readiness,
+                                     clone=True)
+
+    """Instance actions."""
+
+    async def instance_actions(self, action_name, compartment_id, instance_ids, wait=False):
+        """Perform an action on several instances concurrently.
+
+        See OciCompute.instance_actions; elapsed times are measured from the
+        call.
+
+        Returns:
+            List of (instance_id, state, elapsed, error) tuples in the
+            instance_ids order. state is None when the action failed.
+
+        """
+        start = time.time()
+        results = await self._run(self._oci.instance_actions, action_name, compartment_id, instance_ids)
+        if not wait:
+            return results
+        target_state = INSTANCE_ACTIONS[action_name][1]
+
+        async def completed(instance_id, state, elapsed, error):
+            if error:
+                return instance_id, state, elapsed, error
+            try:
+                instance = await self.wait_for_instance(compartment_id, instance_id, target_state)
+            except WaitError as e:
+                return instance_id, None, time.time() - start, e
+            return instance_id, instance.lifecycle_state, time.time() - start, None
+
+        return list(await asyncio.gather(*(completed(*result) for result in results)))
+
+    async def _instance_action(self, action_name, compartment_id, instance_id, wait):
+        _, state, _, error = (await self.instance_actions(action_name, compartment_id, [instance_id], wait))[0]
+        if error:
+            raise error
+        return state
+
+    async def instance_terminate(self, compartment_id, instance_id, wait=False):
+        """Terminate Compute Instance.
+
+        Unlike OciCompute.instance_terminate, the compartment is needed to
+        wait; errors are raised.
+
+        Returns:
+            The resulting lifecycle state.
+
+        """
+        return await self._instance_action('terminate', compartment_id, instance_id, wait)
+
+    async def instance_start(self, compartment_id, instance_id, wait=False):
+        """Start Compute Instance, see instance_terminate."""
+        return await self._instance_action('start', compartment_id, instance_id, wait)
+
+    async def instance_shutdown(self, compartment_id, instance_id, wait=False):
+        """Shutdown Compute Instance, see instance_terminate."""
+        return await self._instance_action('shutdown', compartment_id, instance_id, wait)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+"""OCI Compute response cache.
+
+ResponseCache helper class to persist SDK responses on disk.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from hashlib import sha256
+import json
+import os
+import pickle
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non POSIX platforms
+    fcntl = None
+
+# Default cache location
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', '~/.cache'), 'oci-compute')
+
+# Maximum size of the cache directory (bytes)
+CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+# Time to live per resource type (seconds)
+CACHE_TTL = {
+    'images': 3600,
+    # Compartment tree and region subscriptions, for fleet queries
+    'compartments': 3600,
+    'listings': 86400,
+    # Name to OCID resolutions; validated lazily at launch time
+    'resolution': 7 * 86400,
+    'image-resolution': 86400,
+    # Marketplace index; freshness is managed by the index itself
+    'market-index': 30 * 86400,
+    # Accepted Marketplace agreements and App Catalog subscriptions, per
+    # listing version; validated lazily at launch time
+    'agreements': 30 * 86400,
+    'subscriptions': 30 * 86400,
+}
+
+# Cache entries file extension
+_ENTRY_SUFFIX = '.cache'
+
+
+def _signature(stat):
+    """Return what identifies a version of an entry file."""
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class ResponseCache(object):
+    """Size-bounded on-disk cache with per-resource TTL.
+
+    Each entry is stored in its own file, written atomically so that parallel
+    CLI runs can safely share the cache. Entry access time is tracked with the
+    file mtime and used for LRU eviction when the cache exceeds its maximum
+    size.
+
+    Long-running processes can also keep the entries in memory: an entry is
+    then only read from disk if its file was replaced (e.g. by another
+    process) since it was loaded.
+    """
+
+    def __init__(self,
+                 cache_dir=CACHE_DIR,
+                 max_size=CACHE_MAX_SIZE,
+                 ttl=None,
+                 enabled=True,
+                 refresh=False,
+                 memory=False):
+        """Initialise the cache.
+
+        Parameters:
+            cache_dir: directory where entries are stored
+            max_size: maximum size of the cache in bytes
+            ttl: dictionary of per-resource TTLs overriding CACHE_TTL
+            enabled: when False, the cache is neither read nor written
+            refresh: when True, cached entries are ignored but new responses
+                     are still stored
+            memory: keep the entries in memory as well
+
+        """
+        self._cache_dir = os.path.expandvars(os.path.expanduser(cache_dir))
+        self._max_size = max_size
+        self._ttl = dict(CACHE_TTL)
+        if ttl:
+            self._ttl.update(ttl)
+        self._enabled = enabled
+        self._refresh = refresh
+        # {key: (file signature, creation time, value)} when memory is True
+        self._memory = {} if memory else None
+        if self._enabled:
+            try:
+                os.makedirs(self._cache_dir, mode=0o700, exist_ok=True)
+            except OSError:
+                self._enabled = False
+
+    @property
+    def enabled(self):
+        """Return True if the cache is in use."""
+        return self._enabled
+
+    @staticmethod
+    def key(*parts):
+        """Build a cache key from its parts (must be JSON serializable)."""
+        return sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self._cache_dir, key + _ENTRY_SUFFIX)
+
+    def get(self, resource, key):
+        """Return the cached value or None if missing or expired.
+
+        Parameters:
+            resource: resource type, used to select the TTL
+            key: the entry key (see key())
+
+        """
+        if not self._enabled or self._refresh:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = self._memory.get(key) if self._memory is not None else None
+                if entry is not None and entry[0] == _signature(os.fstat(f.fileno())):
+                    created, value = entry[1:]
+                else:
+                    created, value = pickle.load(f)
+                if time.time() - created > self._ttl.get(resource, 0):
+                    if self._memory is not None:
+                        self._memory.pop(key, None)
+                    return None
+                # Record access for LRU eviction
+                try:
+                    os.utime(f.fileno() if os.utime in os.supports_fd else path)
+                except OSError:
+                    pass
+                if self._memory is not None:
+                    self._memory[key] = (_signature(os.fstat(f.fileno())), created, value)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Corrupted entry
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, resource, key, value):
+        """Store a value in the cache.
+
+        Parameters:
+            resource: resource type, used to select the TTL
+            key: the entry key (see key())
+            value: the value to store (must be picklable)
+
+        """
+        if not self._enabled:
+            return
+        tmp_path = None
+        created = time.time()
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((created, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                signature = _signature(os.fstat(f.fileno()))
+            os.replace(tmp_path, self._path(key))
+            if self._memory is not None:
+                self._memory[key] = (signature, created, value)
+        except Exception:
+            if tmp_path:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+            return
+        self._evict()
+
+    def delete(self, key):
+        """Remove an entry from the cache."""
+        if self._memory is not None:
+            self._memory.pop(key, None)
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        if self._memory is not None:
+            self._memory.clear()
+        for entry in self._entries():
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def _entries(self):
+        try:
+            return [entry for entry in os.scandir(self._cache_dir) if entry.name.endswith(_ENTRY_SUFFIX)]
+        except OSError:
+            return []
+
+    def _evict(self):
+        """Remove least recently used entries when the cache is too large.
+
+        Eviction is skipped if another process is already evicting.
+        """
+        lock_file = None
+        try:
+            if fcntl:
+                lock_file = open(os.path.join(self._cache_dir, '.lock'), 'w')
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            entries = []
+            for entry in self._entries():
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size = sum(entry[1] for entry in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self._max_size:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                if self._memory is not None:
+                    self._memory.pop(os.path.basename(path)[:-len(_ENTRY_SUFFIX)], None)
+                total_size -= size
+        except OSError:
+            pass
+        finally:
+            if lock_file:
+                lock_file.close()
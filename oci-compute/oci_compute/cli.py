@@ -10,13 +10,30 @@ https://oss.oracle.com/licenses/upl
 
 SPDX-License-Identifier: UPL-1.0
 """
+from collections import Counter
+from itertools import chain, islice
+import json
+import os
 from os.path import expanduser, expandvars
+from statistics import median
+import sys
+import time
 
 import click
 from terminaltables import AsciiTable
 
-from .oci_compute import OciCompute
+from . import daemon
+from .connections import ConnectionPools, KEEP_ALIVE
+from .fanout import merge_iterators
+from .instrument import Instrumentation
+from .oci_compute import expand_display_names, instance_row, MAX_WORKERS, OciCompute
+from .placement import PlacementPolicy, short_name
+from .pool import hit_rate, MAX_IDLE, WarmPool
+from .plan import (ACTION_CREATE, ACTION_SHUTDOWN, ACTION_START, ACTION_TERMINATE, ACTIONS, FleetPlan, load_plan,
+                   PlanError)
 from .rc_file import RcFile
+from .scheduler import MAX_IN_FLIGHT, RequestScheduler
+from .search import BACKEND_AUTO, BACKENDS
 
 # Parameters default values
 CONFIG_FILE = '~/.oci/config'
@@ -56,6 +73,73 @@ def get_default_rc(variable):
     return click.get_current_context().obj['rc_file'].get_default_rc(variable)
 
 
+def get_global_rc(ctx, variable, param_type, default):
+    """Get the rc file value of a global option, validated, or its default.
+
+    Global options are parsed before the rc file is loaded: their defaults
+    cannot come from the rc file (see get_default_rc).
+    """
+    value = ctx.obj['rc_file'].get_default_rc(variable)
+    if value is None:
+        return default
+    try:
+        return param_type.convert(value, None, ctx)
+    except click.BadParameter as e:
+        raise click.BadParameter('{} (rc file)'.format(e.message), param_hint="'{}'".format(variable))
+
+
+def get_oci(ctx, profile=None):
+    """Return the OciCompute instance, creating it on first use.
+
+    Deferring the instantiation keeps help and completion fast as they do not
+    need the SDK.
+
+    Parameters:
+        profile: return the instance for another config profile, sharing the
+                 instrumentation, the request scheduler and the connection
+                 pools of the main instance
+
+    """
+    obj = ctx.find_root().obj
+    # The daemon provides its warm instances (see daemon.OciComputePool)
+    factory = obj.get('oci_factory', OciCompute)
+    if 'oci' not in obj:
+        try:
+            obj['oci'] = factory(**obj['oci_kwargs'])
+        except Exception as e:
+            click.echo('Could not get configuration: {}'.format(e), err=True)
+            ctx.exit(1)
+    if profile is None or profile == obj['oci'].profile:
+        return obj['oci']
+    profiles = obj.setdefault('oci_profiles', {})
+    if profile not in profiles:
+        try:
+            profiles[profile] = factory(**dict(obj['oci_kwargs'],
+                                               profile=profile,
+                                               instrumentation=obj['oci'].instrumentation,
+                                               scheduler=obj['oci'].scheduler,
+                                               connections=obj['oci'].connections))
+        except Exception as e:
+            click.echo('Could not get configuration for profile {}: {}'.format(profile, e), err=True)
+            ctx.exit(1)
+    return profiles[profile]
+
+
+def resolve_compartment(ctx, param, value):
+    """Resolve compartment names to OCIDs (click callback).
+
+    The value as given is kept in the context meta data, to be resolved in
+    other profiles (see fleet_scopes).
+    """
+    ctx.meta['oci_compute.{}'.format(param.name)] = value
+    if not value:
+        return value
+    compartment_id = get_oci(ctx).resolve_compartment(value)
+    if not compartment_id:
+        raise click.BadParameter('No compartment found matching "{}"'.format(value))
+    return compartment_id
+
+
 # Options common to all provisioners
 provision_options = [
     click.option(
@@ -85,7 +169,8 @@ provision_options = [
         default=lambda: get_default_rc('vcn-compartment-id'),
         show_default=RcFile.get_default('vcn-compartment-id'),
         required=False,
-        help='The OCID of the VCN compartment, if different from the Instance compartment',
+        callback=resolve_compartment,
+        help='The OCID or name of the VCN compartment, if different from the Instance compartment',
     ),
     click.option(
         '--vcn-name',
@@ -99,28 +184,125 @@ provision_options = [
         default=lambda: get_default_rc('availability-domain'),
         show_default=RcFile.get_default('availability-domain'),
         required=True,
-        help='The availability domain of the instance',
+        help='The availability domain of the instance. '
+             'A comma-separated list like "AD-1,AD-2" is tried in order when out of capacity',
     ),
     click.option(
         '--shape',
         default=lambda: get_default_rc('shape'),
         show_default=RcFile.get_default('shape'),
         required=True,
-        help='The shape of the instance',
+        help='The shape of the instance. '
+             'A comma-separated list of compatible shapes is tried in order when out of capacity',
     ),
     click.option(
         '--compartment-id',
         default=lambda: get_default_rc('compartment-id'),
         show_default=RcFile.get_default('compartment-id'),
         required=True,
-        help='The OCID of the compartment',
+        callback=resolve_compartment,
+        help='The OCID or name of the compartment',
     ),
     click.option(
         '--display-name',
         default=lambda: get_default_rc('display-name'),
         show_default=RcFile.get_default('display-name'),
         required=True,
-        help='The display name of the created image',
+        help='The display name of the created instance. '
+             'For bulk provisioning, may contain a range like "web-{01..40}"',
+    ),
+    click.option(
+        '--count',
+        default=None,
+        type=click.IntRange(min=1),
+        help='Number of instances to provision concurrently  [default: 1 or display name range size]',
+    ),
+    click.option(
+        '--no-wait',
+        is_flag=True,
+        help='Return as soon as the instances are launched (see the wait command)',
+    ),
+]
+
+# Options of the placement of provision commands (see placement_policy), in
+# addition to --availability-domain and --shape
+placement_options = [
+    click.option(
+        '--fault-domain',
+        default=lambda: get_default_rc('fault-domain'),
+        show_default=RcFile.get_default('fault-domain'),
+        help='The fault domain of the instance, or a comma-separated list tried in order  [default: any]',
+    ),
+    click.option(
+        '--hedge',
+        default=1,
+        show_default=True,
+        type=click.IntRange(min=1),
+        help='Launch each instance on this number of placements at once, '
+             'keep the first one running and terminate the others',
+    ),
+    click.option(
+        '--capacity-check',
+        is_flag=True,
+        help='Order the placements with the compute capacity report before launching',
+    ),
+]
+
+# Options of the readiness stage of provision commands (see readiness_probe)
+readiness_options = [
+    click.option(
+        '--wait-ready',
+        is_flag=True,
+        help='Once running, wait until the instances accept connections on --ready-port',
+    ),
+    click.option(
+        '--ready-port',
+        default=lambda: get_default_rc('ready-port'),
+        show_default=RcFile.get_default('ready-port'),
+        type=click.IntRange(min=1, max=65535),
+        help='The port probed by --wait-ready (SSH banner expected on port 22)',
+    ),
+    click.option(
+        '--ready-private-ip',
+        is_flag=True,
+        help='Probe the private IP of the instances  [default: public IP, if any]',
+    ),
+    click.option(
+        '--wait-cloud-init',
+        is_flag=True,
+        help='Also wait for cloud-init to complete, checked over SSH with the ssh client (implies --wait-ready)',
+    ),
+    click.option(
+        '--ssh-user',
+        default=lambda: get_default_rc('ssh-user'),
+        show_default=RcFile.get_default('ssh-user'),
+        help='The user logging in for the cloud-init check',
+    ),
+    click.option(
+        '--ready-timeout',
+        default=lambda: get_default_rc('ready-timeout'),
+        show_default=RcFile.get_default('ready-timeout'),
+        type=click.FloatRange(min=1),
+        help='Seconds to wait for the instances to be ready, once running',
+    ),
+]
+
+# Options of the warm pool of provision commands (see warm_pool)
+pool_options = [
+    click.option(
+        '--warm-pool',
+        default=lambda: get_default_rc('warm-pool'),
+        show_default=RcFile.get_default('warm-pool'),
+        type=click.IntRange(min=0),
+        help='Hand out instances from a pool of this number of stopped instances of the same image, shape, '
+             'subnet and metadata, refilled in the background (0: no pool)',
+    ),
+    click.option(
+        '--warm-pool-max-age',
+        default=lambda: get_default_rc('warm-pool-max-age'),
+        show_default=RcFile.get_default('warm-pool-max-age'),
+        type=click.FloatRange(min=0),
+        help='Hours after which pooled instances are evicted',
     ),
 ]
 
@@ -131,6 +313,11 @@ instance_options = [
         is_flag=True,
         help='Do NOT ask for confirmation (potentially dangerous!)'
     ),
+    click.option(
+        '--confirm-each',
+        is_flag=True,
+        help='Ask for confirmation for each instance (Default is to confirm once for all instances)'
+    ),
     click.option(
         '--wait',
         is_flag=True,
@@ -147,7 +334,44 @@ instance_options = [
         default=lambda: get_default_rc('compartment-id'),
         show_default=RcFile.get_default('compartment-id'),
         required=True,
-        help='The OCID of the compartment',
+        callback=resolve_compartment,
+        help='The OCID or name of the compartment',
+    ),
+]
+
+
+# Options common to list commands
+output_options = [
+    click.option(
+        '--output',
+        default='table',
+        show_default=True,
+        type=click.Choice(['table', 'ndjson', 'tsv']),
+        help='Output format. ndjson and tsv rows are displayed as soon as they are retrieved',
+    ),
+    click.option(
+        '--limit',
+        default=None,
+        type=click.IntRange(min=1),
+        help='Stop after this number of rows',
+    ),
+]
+
+
+# Options common to fleet list commands (see fleet_scopes)
+fleet_options = [
+    click.option(
+        '--regions',
+        default=None,
+        callback=lambda ctx, param, value: [item.strip() for item in value.split(',')] if value else None,
+        help='Comma separated list of regions to query, or "all" for all subscribed regions  '
+             '[default: profile region]',
+    ),
+    click.option(
+        '--profiles',
+        default=None,
+        callback=lambda ctx, param, value: [item.strip() for item in value.split(',')] if value else None,
+        help='Comma separated list of config profiles to query  [default: --profile]',
     ),
 ]
 
@@ -161,22 +385,406 @@ def shared_options(option_list):
     return _shared_options
 
 
-def display_ip(ctx, compartment_id, instance):
-    """Display public/private IP for the instance."""
+def unique(rows):
+    """Filter out duplicate rows, preserving order."""
+    seen = set()
+    for row in rows:
+        if row not in seen:
+            seen.add(row)
+            yield row
+
+
+def display_rows(ctx, rows, columns, title, empty, output, limit):
+    """Display list command rows.
+
+    Parameters:
+        rows: iterator of row tuples
+        columns: list of (key, header) tuples, one per row field; fields
+                 without header are not displayed in tables
+        title: table title
+        empty: message displayed when there is no row
+        output: 'table', or 'ndjson'/'tsv' to stream the rows
+        limit: maximum number of rows
+
+    """
+    rows = islice(rows, limit)
+    if output == 'table':
+        visible = [index for index, (_, header) in enumerate(columns) if header]
+        rows = sorted(tuple(row[index] for index in visible) for row in rows)
+        if rows:
+            table = AsciiTable([tuple(columns[index][1] for index in visible)] + rows)
+            table.title = title
+            click.echo(table.table)
+        else:
+            click.echo(empty, err=True)
+        if ctx.meta.get('oci_compute.failed'):
+            ctx.exit(1)
+        return
+
+    keys = [key for key, _ in columns]
+    count = 0
+    try:
+        for row in rows:
+            if output == 'ndjson':
+                click.echo(json.dumps(dict(zip(keys, row)), default=str))
+            else:
+                click.echo('\t'.join(str(value) for value in row))
+            count += 1
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into head): stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        ctx.exit(0)
+    if not count:
+        click.echo(empty, err=True)
+    if ctx.meta.get('oci_compute.failed'):
+        ctx.exit(1)
+
+
+def fleet_scopes(ctx, compartment_id, regions=None, profiles=None, recursive=False):
+    """Return the scopes of a fleet query and their columns.
+
+    Parameters:
+        compartment_id: the compartment OCID (resolved in the main profile)
+        regions, profiles: lists from the fleet_options
+        recursive: include the subcompartments
+
+    Returns:
+        Tuple (scopes, columns, scope_row): the (OciCompute, compartments)
+        scopes (see OciCompute.fleet_scopes), the profile, region and
+        compartment columns displayed when they vary, and a function
+        returning the column values for a scope and a record.
+
+    """
+    oci = get_oci(ctx)
+    scopes = []
+    for profile in profiles or [oci.profile]:
+        profile_oci = get_oci(ctx, profile)
+        profile_compartment_id = compartment_id
+        if profile_oci is not oci:
+            profile_compartment_id = profile_oci.resolve_compartment(ctx.meta['oci_compute.compartment_id'])
+            if not profile_compartment_id:
+                raise click.BadParameter('No compartment found matching "{}" in profile {}'.format(
+                    ctx.meta['oci_compute.compartment_id'], profile), param_hint="'--compartment-id'")
+        scopes.extend(profile_oci.fleet_scopes(profile_compartment_id, regions, recursive))
+    names = {compartment.id: compartment.name for _, compartments in scopes for compartment in compartments}
+
+    getters = []
+    if len(set(view.profile for view, _ in scopes)) > 1:
+        getters.append((('profile', 'Profile'), lambda scope, record: scope[0].profile))
+    if len(set(view.region for view, _ in scopes)) > 1:
+        getters.append((('region', 'Region'), lambda scope, record: scope[0].region))
+    if recursive:
+        getters.append((('compartment', 'Compartment'),
+                        lambda scope, record: names.get(record.compartment_id, record.compartment_id)))
+
+    def scope_row(scope, record):
+        return tuple(getter(scope, record) for _, getter in getters)
+
+    return scopes, [column for column, _ in getters], scope_row
+
+
+def compartment_ids(scope):
+    """Return the compartment OCIDs of a fleet scope."""
+    return [compartment.id for compartment in scope[1]]
+
+
+def iter_fleet(ctx, scopes, iterate):
+    """Iterate concurrently over the scopes of a fleet query.
+
+    With several scopes, failed scopes are reported and skipped; the command
+    exit status is then 1.
+
+    Yields:
+        (scope, item) tuples.
+
+    """
+    if len(scopes) == 1:
+        for item in iterate(scopes[0]):
+            yield scopes[0], item
+        return
+
+    def on_error(scope, error):
+        view, _ = scope
+        click.echo('Could not list {} / {}: {}'.format(
+            view.profile, view.region, getattr(error, 'message', error)), err=True)
+        ctx.meta['oci_compute.failed'] = True
+
+    yield from merge_iterators(scopes, iterate, get_oci(ctx).max_workers, on_error)
+
+
+def split_list(value):
+    """Split a comma-separated option value."""
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def placement_policy(shape, availability_domain, fault_domain, hedge, capacity_check, no_wait):
+    """Return the shape, availability domain and PlacementPolicy of the placement options.
+
+    The policy is None when a single placement is requested.
+    """
+    shapes = split_list(shape)
+    availability_domains = split_list(availability_domain)
+    fault_domains = split_list(fault_domain)
+    if not shapes:
+        raise click.BadParameter('no shape', param_hint="'--shape'")
+    if not availability_domains:
+        raise click.BadParameter('no availability domain', param_hint="'--availability-domain'")
+    if hedge > 1 and no_wait:
+        raise click.BadParameter('cannot be used with --no-wait', param_hint="'--hedge'")
+    if len(shapes) == 1 and len(availability_domains) == 1 and not fault_domains and hedge == 1 and not capacity_check:
+        return shapes[0], availability_domains[0], None
+    return shapes[0], availability_domains[0], PlacementPolicy(availability_domains=availability_domains[1:],
+                                                               shapes=shapes[1:],
+                                                               fault_domains=fault_domains,
+                                                               hedge=hedge,
+                                                               capacity_check=capacity_check)
+
+
+def pool_policy(size, max_age):
+    """Return the WarmPool of the pool options, None when not requested."""
+    return WarmPool(size=size, max_age=max_age * 3600) if size else None
+
+
+def readiness_probe(wait_ready, ready_port, ready_private_ip, wait_cloud_init, ssh_user, ready_timeout,
+                    ssh_authorized_keys_file, no_wait):
+    """Return the ReadinessProbe of the readiness options, None when not requested."""
+    if not (wait_ready or wait_cloud_init):
+        return None
+    if no_wait:
+        raise click.BadParameter('cannot be used with --no-wait', param_hint="'--wait-ready' / '--wait-cloud-init'")
+    # asyncio is only loaded when needed
+    from .readiness import ReadinessProbe
+
+    # Log in with the private key of the authorized key, if next to it
+    identity_file = None
+    if wait_cloud_init and ssh_authorized_keys_file.endswith('.pub'):
+        identity_file = ssh_authorized_keys_file[:-len('.pub')]
+        if not os.path.isfile(identity_file):
+            identity_file = None
+    return ReadinessProbe(port=ready_port,
+                          private_ip=ready_private_ip,
+                          cloud_init=wait_cloud_init,
+                          ssh_user=ssh_user,
+                          identity_file=identity_file,
+                          timeout=ready_timeout)
+
+
+def format_seconds(value):
+    """Format a duration for display, '-' when not available."""
+    return '{:.1f}'.format(value) if value is not None else '-'
+
+
+def timing_columns(readiness):
+    """Return the LaunchTiming fields and titles displayed after provisioning with readiness."""
+    columns = [('launched', 'Launch (s)'), ('running', 'Running (s)'), ('port_open', 'Port open (s)')]
+    if readiness.cloud_init:
+        columns.append(('ready', 'Ready (s)'))
+    return columns
+
+
+def display_ip(ctx, compartment_id, instance, readiness=None, placement=None, pool=None):
+    """Display public/private IP for the instance, its placement and timings with readiness."""
     if not instance:
         ctx.exit(1)
 
-    vnic = ctx.obj['oci'].get_vnic(compartment_id, instance)
+    oci = get_oci(ctx)
+    vnic = oci.get_vnics(compartment_id, [instance])[0]
     if not vnic:
         ctx.exit(1)
 
-    table = AsciiTable((('Private IP', vnic.private_ip),
-                        ('Public IP', vnic.public_ip)))
+    rows = [('Private IP', vnic.private_ip),
+            ('Public IP', vnic.public_ip)]
+    if placement:
+        rows.extend(placement_row(instance))
+    if pool:
+        rows.append(('Warm pool', 'Hit' if oci.pool_hits else 'Miss'))
+    if readiness and oci.launch_timings:
+        timing = oci.launch_timings[0]
+        rows.extend((title, format_seconds(getattr(timing, field))) for field, title in timing_columns(readiness))
+    table = AsciiTable(rows)
     table.inner_heading_row_border = False
     table.title = 'Instance provisioned'
     click.echo(table.table)
 
 
+def placement_row(instance):
+    """Return the (title, value) pairs of the placement of an instance."""
+    return [('AD', short_name(instance.availability_domain)),
+            ('Fault domain', instance.fault_domain or '-'),
+            ('Shape', instance.shape)]
+
+
+def check_display_name(display_name, count):
+    """Validate the display name pattern for bulk provisioning."""
+    try:
+        return len(expand_display_names(display_name, count)) > 1
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="'--display-name' / '--count'")
+
+
+def provision_callback():
+    """Return a callback streaming bulk provisioning results.
+
+    The callback runs while the other instances are waited for: the IPs of
+    the instances are only resolved once they are all running, see
+    display_results.
+    """
+    def callback(display_name, instance, error):
+        if instance:
+            click.echo('{}: {}'.format(display_name, instance.lifecycle_state.title()))
+        else:
+            click.echo('{}: Failed - {}'.format(display_name, getattr(error, 'message', error)), err=True)
+    return callback
+
+
+def display_results(ctx, compartment_id, result, bulk, wait, readiness=None, placement=None, pool=None):
+    """Display provisioning outcome (single instance or bulk)."""
+    if not bulk:
+        if wait:
+            display_ip(ctx, compartment_id, result, readiness, placement, pool)
+            return
+        if not result:
+            ctx.exit(1)
+        result = [(result.display_name, result, None)]
+    if not result:
+        ctx.exit(1)
+
+    failed = [display_name for display_name, instance, error in result if not instance]
+    # VNICs of all the running instances at once
+    running = [instance for _, instance, _ in result if instance] if wait else []
+    vnics = dict(zip((instance.id for instance in running), get_oci(ctx).get_vnics(compartment_id, running)))
+    columns = timing_columns(readiness) if readiness else []
+    timings = {timing.display_name: timing for timing in get_oci(ctx).launch_timings} if readiness else {}
+
+    pool_hits = set(get_oci(ctx).pool_hits) if pool else set()
+
+    def placement_cells(instance):
+        if not placement:
+            return ()
+        return tuple(value for _, value in placement_row(instance)) if instance else ('', '', '')
+
+    def ip_cells(instance):
+        if not wait:
+            return ()
+        vnic = vnics.get(instance.id) if instance else None
+        return (vnic.private_ip, vnic.public_ip) if vnic else ('', '')
+
+    table = AsciiTable(
+        [('Name', 'State') + (('Private IP', 'Public IP') if wait else ())
+         + (('AD', 'Fault domain', 'Shape') if placement else ()) + (('Warm pool',) if pool else ())
+         + tuple(title for _, title in columns) + ('Error',)]
+        + [(display_name,
+            instance.lifecycle_state.title() if instance else 'Failed')
+           + ip_cells(instance)
+           + placement_cells(instance)
+           + (('Hit' if display_name in pool_hits else 'Miss',) if pool else ())
+           + tuple(format_seconds(getattr(timings.get(display_name), field, None)) for field, _ in columns)
+           + (getattr(error, 'code', error) if error else '',)
+           for display_name, instance, error in result])
+    table.title = 'Instances {}: {}/{}'.format(
+        'ready' if readiness else 'provisioned' if wait else 'launched',
+        len(result) - len(failed),
+        len(result))
+    click.echo(table.table)
+    if failed:
+        ctx.exit(1)
+
+
+def report_instrumentation(ctx, stats, trace):
+    """Display the API call statistics and/or write the trace file."""
+    oci = ctx.obj.get('oci')
+    if not oci:
+        return
+    instrumentation = oci.instrumentation
+    if trace:
+        instrumentation.write_trace(trace)
+    if not stats:
+        return
+
+    summary = instrumentation.summary()
+    table = AsciiTable(
+        [('Operation', 'Calls', 'Pages', 'Retries', 'Errors', 'KB', 'Time (s)', 'Max (s)')]
+        + [(operation,
+            calls,
+            pages,
+            retries,
+            errors,
+            '{:.1f}'.format(size / 1024),
+            '{:.3f}'.format(total),
+            '{:.3f}'.format(maximum))
+           for operation, calls, pages, retries, errors, size, total, maximum in summary])
+    table.title = 'API calls: {} ({} requests)'.format(
+        sum(row[1] for row in summary),
+        sum(row[2] + row[3] for row in summary))
+    click.echo(table.table, err=True)
+
+    phases = instrumentation.phase_summary()
+    if phases:
+        table = AsciiTable(
+            [('Phase', 'Count', 'Time (s)')]
+            + [(phase, count, '{:.3f}'.format(total)) for phase, count, total in phases])
+        table.title = 'Phases'
+        click.echo(table.table, err=True)
+
+    scheduler = oci.scheduler.stats()
+    if scheduler.requests:
+        table = AsciiTable(
+            [('Service', 'Region', 'Requests', 'Throttled', '5xx', 'Rate (req/s)', 'Circuit')]
+            + [(service.service,
+                service.region,
+                service.requests,
+                service.throttled,
+                service.server_errors,
+                '{:.1f}'.format(service.rate) if service.rate is not None else '-',
+                service.circuit)
+               for service in oci.scheduler.service_stats()])
+        table.title = 'Requests: {} retries, max queue {}, waited {:.3f}s, backoff {:.3f}s'.format(
+            scheduler.retries, scheduler.max_queued, scheduler.wait_time, scheduler.backoff_time)
+        click.echo(table.table, err=True)
+
+    connections = oci.connections.stats()
+    if connections.endpoints:
+        table = AsciiTable(
+            [('Endpoint', 'Hits', 'Misses', 'Handshakes', 'Expired', 'Discarded')]
+            + [(endpoint.endpoint,
+                endpoint.hits,
+                endpoint.misses,
+                endpoint.handshakes,
+                endpoint.expired,
+                endpoint.discarded)
+               for endpoint in oci.connections.endpoint_stats()])
+        table.title = 'Connections: {} handshakes, {} reused'.format(connections.handshakes, connections.hits)
+        click.echo(table.table, err=True)
+
+    tasks = oci.task_timings
+    if tasks:
+        table = AsciiTable(
+            [('Task', 'Requires', 'Start (s)', 'Time (s)', 'Status')]
+            + [(task.name,
+                ', '.join(task.requires),
+                '{:.3f}'.format(task.start) if task.start is not None else '-',
+                '{:.3f}'.format(task.duration),
+                task.status)
+               for task in sorted(tasks, key=lambda task: (task.start is None, task.start or 0))])
+        table.title = 'Provisioning tasks'
+        click.echo(table.table, err=True)
+
+    placements = oci.placement_stats
+    if placements:
+        table = AsciiTable(
+            [('Shape', 'AD', 'Fault domain', 'Capacity', 'Launched', 'Out of capacity', 'Cancelled')]
+            + [(placement.shape,
+                short_name(placement.availability_domain),
+                placement.fault_domain or '-',
+                placement.capacity or '-',
+                placement.launched,
+                placement.out_of_capacity,
+                placement.cancelled)
+               for placement in placements])
+        table.title = 'Placements'
+        click.echo(table.table, err=True)
+
+
 """ Main entry point for the CLI.
 """
 
@@ -209,18 +817,93 @@ def display_ip(ctx, compartment_id, instance):
     type=ExpandedPath(),
     help='The path to the OCI Provision specific configuration file',
 )
+@click.option(
+    '--max-workers',
+    default=MAX_WORKERS,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help='Maximum number of concurrent API calls',
+)
+@click.option(
+    '--max-in-flight',
+    default=MAX_IN_FLIGHT,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help='Maximum number of requests in flight, all services included',
+)
+@click.option(
+    '--pool-size',
+    default=None,
+    type=click.IntRange(min=1),
+    help='HTTP connections kept alive per endpoint  [default: pool-size in the rc file, or --max-in-flight]',
+)
+@click.option(
+    '--keep-alive',
+    default=None,
+    type=click.FloatRange(min=0),
+    help='Seconds idle HTTP connections are kept  [default: keep-alive in the rc file, or {:g}]'.format(KEEP_ALIVE),
+)
+@click.option(
+    '--refresh',
+    is_flag=True,
+    help='Ignore cached image and listing catalogs (the cache is updated)',
+)
+@click.option(
+    '--no-cache',
+    is_flag=True,
+    help='Do not use the image and listing catalogs cache',
+)
+@click.option(
+    '--query-backend',
+    default=BACKEND_AUTO,
+    show_default=True,
+    type=click.Choice(BACKENDS),
+    help='Backend for instance and image queries: Resource Search, list calls, or search for queries '
+         'spanning several compartments',
+)
+@click.option(
+    '--stats',
+    is_flag=True,
+    help='Display API call statistics when the command completes',
+)
+@click.option(
+    '--trace',
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help='Write the API calls and phases to this file (Chrome trace-event JSON)',
+)
+@click.option(
+    '--no-daemon',
+    is_flag=True,
+    help='Run the command in this process even if an oci-compute daemon is running',
+)
 @click.pass_context
-def cli(ctx, verbose, config_file, profile, rc_file):
+def cli(ctx, verbose, config_file, profile, rc_file, max_workers, max_in_flight, pool_size, keep_alive, refresh,
+        no_cache, query_backend, stats, trace, no_daemon):
     """Provision Oracle Cloud Infrastructure compute instances through the Python SDK."""
     ctx.ensure_object(dict)
     ctx.obj['rc_file'] = RcFile(rc_file, profile)
-    try:
-        ctx.obj['oci'] = OciCompute(config_file=config_file,
-                                    profile=profile,
-                                    verbose=verbose)
-    except Exception as e:
-        click.echo('Could not get configuration: {}'.format(e), err=True)
-        ctx.exit(1)
+    if pool_size is None:
+        pool_size = get_global_rc(ctx, 'pool-size', click.IntRange(min=1), max_in_flight)
+    if keep_alive is None:
+        keep_alive = get_global_rc(ctx, 'keep-alive', click.FloatRange(min=0), KEEP_ALIVE)
+    # The OciCompute instance is created on first use (see get_oci)
+    ctx.obj['oci_kwargs'] = {
+        'config_file': config_file,
+        'profile': profile,
+        'verbose': verbose,
+        'max_workers': max_workers,
+        'use_cache': not no_cache,
+        'refresh_cache': refresh,
+        'query_backend': query_backend,
+        'scheduler': RequestScheduler(max_in_flight=max_in_flight),
+        'connections': ConnectionPools(pool_size=pool_size, keep_alive=keep_alive),
+    }
+    # In the daemon, commands needing other scheduler or connection settings are run locally
+    if 'oci_check' in ctx.obj:
+        ctx.obj['oci_check'](ctx.obj['oci_kwargs']['scheduler'], ctx.obj['oci_kwargs']['connections'])
+    if stats or trace:
+        ctx.call_on_close(lambda: report_instrumentation(ctx, stats, trace))
 
 
 """ List command.
@@ -238,64 +921,111 @@ def list():
     default=lambda: get_default_rc('compartment-id'),
     show_default=RcFile.get_default('compartment-id'),
     required=True,
-    help='The OCID of the compartment',
+    callback=resolve_compartment,
+    help='The OCID or name of the compartment',
 )
+@shared_options(fleet_options)
+@shared_options(output_options)
 @list.command(
     name='platform',
     help='List Platform Images',
 )
 @click.pass_context
-def list_platform(ctx, compartment_id):
-    oci = ctx.obj['oci']
-    images = oci.list_platform(compartment_id)
-    if images:
-        table = AsciiTable(
-            [('Operating System', 'Operating System version')] + images)
-        table.title = 'Platform images'
-        click.echo(table.table)
-    else:
-        click.echo('No image found', err=True)
+def list_platform(ctx, compartment_id, regions, profiles, output, limit):
+    scopes, columns, scope_row = fleet_scopes(ctx, compartment_id, regions, profiles)
+    display_rows(ctx,
+                 unique(scope_row(scope, image) + (image.operating_system, image.operating_system_version)
+                        for scope, image in iter_fleet(
+                            ctx, scopes,
+                            lambda scope: scope[0].query_images(compartment_ids(scope), custom=False))),
+                 columns
+                 + [('operating_system', 'Operating System'),
+                    ('operating_system_version', 'Operating System version')],
+                 'Platform images',
+                 'No image found',
+                 output,
+                 limit)
 
 
+@click.option(
+    '--name',
+    default=None,
+    help='Only list images whose name contains this string',
+)
+@click.option(
+    '--recursive',
+    is_flag=True,
+    help='Include the subcompartments',
+)
 @click.option(
     '--compartment-id',
     default=lambda: get_default_rc('compartment-id'),
     show_default=RcFile.get_default('compartment-id'),
     required=True,
-    help='The OCID of the compartment',
+    callback=resolve_compartment,
+    help='The OCID or name of the compartment',
 )
+@shared_options(fleet_options)
+@shared_options(output_options)
 @list.command(
     name='custom',
     help='List Custom Images',
 )
 @click.pass_context
-def list_custom(ctx, compartment_id):
-    oci = ctx.obj['oci']
-    images = oci.list_custom(compartment_id)
-    if images:
-        table = AsciiTable(
-            [('Display name', 'Time created')] + images)
-        table.title = 'Custom images'
-        click.echo(table.table)
-    else:
-        click.echo('No image found', err=True)
+def list_custom(ctx, compartment_id, recursive, name, regions, profiles, output, limit):
+    scopes, columns, scope_row = fleet_scopes(ctx, compartment_id, regions, profiles, recursive)
+    display_rows(ctx,
+                 unique(scope_row(scope, image) + (image.display_name, image.time_created)
+                        for scope, image in iter_fleet(
+                            ctx, scopes,
+                            lambda scope: scope[0].query_images(compartment_ids(scope), custom=True, name=name,
+                                                                limit=limit))),
+                 columns
+                 + [('display_name', 'Display name'),
+                    ('time_created', 'Time created')],
+                 'Custom images',
+                 'No image found',
+                 output,
+                 limit)
 
 
+@click.option(
+    '--region',
+    default=None,
+    help='Only list images available in this region',
+)
+@click.option(
+    '--shape',
+    default=None,
+    help='Only list images compatible with this shape',
+)
+@click.option(
+    '--publisher',
+    default=None,
+    help='Only list images from publishers matching this name',
+)
+@click.option(
+    '--name',
+    default=None,
+    help='Only list images matching this name',
+)
+@shared_options(output_options)
 @list.command(
     name='market',
     help='List free Marketplace Images',
 )
 @click.pass_context
-def list_market(ctx):
-    oci = ctx.obj['oci']
-    listings = oci.list_market()
-    if listings:
-        table = AsciiTable(
-            [('Publisher', 'Name')] + listings)
-        table.title = 'Free Marketplace images'
-        click.echo(table.table)
-    else:
-        click.echo('No image found', err=True)
+def list_market(ctx, output, limit, name, publisher, shape, region):
+    oci = get_oci(ctx)
+    display_rows(ctx,
+                 unique((listing.publisher.name, listing.name)
+                        for listing, _ in oci.search_market(name, publisher, shape, region)),
+                 [('publisher', 'Publisher'),
+                  ('name', 'Name')],
+                 'Free Marketplace images',
+                 'No image found',
+                 output,
+                 limit)
 
 
 """ Provision command.
@@ -310,6 +1040,9 @@ def provision(ctx):
 
 
 @shared_options(provision_options)
+@shared_options(placement_options)
+@shared_options(readiness_options)
+@shared_options(pool_options)
 @click.option(
     '--operating-system-version',
     default=lambda: get_default_rc('operating-system-version'),
@@ -340,8 +1073,27 @@ def provision_platform(ctx,
                        vcn_compartment_id,
                        subnet_name,
                        ssh_authorized_keys_file,
-                       cloud_init_file):
-    oci = ctx.obj['oci']
+                       cloud_init_file,
+                       count,
+                       no_wait,
+                       fault_domain,
+                       hedge,
+                       capacity_check,
+                       wait_ready,
+                       ready_port,
+                       ready_private_ip,
+                       wait_cloud_init,
+                       ssh_user,
+                       ready_timeout,
+                       warm_pool,
+                       warm_pool_max_age):
+    bulk = check_display_name(display_name, count)
+    readiness = readiness_probe(wait_ready, ready_port, ready_private_ip, wait_cloud_init, ssh_user, ready_timeout,
+                                ssh_authorized_keys_file, no_wait)
+    shape, availability_domain, placement = placement_policy(shape, availability_domain, fault_domain, hedge,
+                                                             capacity_check, no_wait)
+    pool = pool_policy(warm_pool, warm_pool_max_age)
+    oci = get_oci(ctx)
     instance = oci.provision_platform(display_name,
                                       compartment_id,
                                       operating_system,
@@ -352,11 +1104,20 @@ def provision_platform(ctx,
                                       vcn_compartment_id,
                                       subnet_name,
                                       ssh_authorized_keys_file,
-                                      cloud_init_file)
-    display_ip(ctx, compartment_id, instance)
+                                      cloud_init_file,
+                                      count=count,
+                                      callback=provision_callback(),
+                                      wait=not no_wait,
+                                      readiness=readiness,
+                                      placement=placement,
+                                      pool=pool)
+    display_results(ctx, compartment_id, instance, bulk, not no_wait, readiness, placement, pool)
 
 
 @shared_options(provision_options)
+@shared_options(placement_options)
+@shared_options(readiness_options)
+@shared_options(pool_options)
 @click.option(
     '--image-name',
     default=lambda: get_default_rc('custom-image-name'),
@@ -379,8 +1140,27 @@ def provision_custom(ctx,
                      vcn_compartment_id,
                      subnet_name,
                      ssh_authorized_keys_file,
-                     cloud_init_file):
-    oci = ctx.obj['oci']
+                     cloud_init_file,
+                     count,
+                     no_wait,
+                     fault_domain,
+                     hedge,
+                     capacity_check,
+                     wait_ready,
+                     ready_port,
+                     ready_private_ip,
+                     wait_cloud_init,
+                     ssh_user,
+                     ready_timeout,
+                     warm_pool,
+                     warm_pool_max_age):
+    bulk = check_display_name(display_name, count)
+    readiness = readiness_probe(wait_ready, ready_port, ready_private_ip, wait_cloud_init, ssh_user, ready_timeout,
+                                ssh_authorized_keys_file, no_wait)
+    shape, availability_domain, placement = placement_policy(shape, availability_domain, fault_domain, hedge,
+                                                             capacity_check, no_wait)
+    pool = pool_policy(warm_pool, warm_pool_max_age)
+    oci = get_oci(ctx)
     instance = oci.provision_custom(display_name,
                                     compartment_id,
                                     image_name,
@@ -390,11 +1170,20 @@ def provision_custom(ctx,
                                     vcn_compartment_id,
                                     subnet_name,
                                     ssh_authorized_keys_file,
-                                    cloud_init_file)
-    display_ip(ctx, compartment_id, instance)
+                                    cloud_init_file,
+                                    count=count,
+                                    callback=provision_callback(),
+                                    wait=not no_wait,
+                                    readiness=readiness,
+                                    placement=placement,
+                                    pool=pool)
+    display_results(ctx, compartment_id, instance, bulk, not no_wait, readiness, placement, pool)
 
 
 @shared_options(provision_options)
+@shared_options(placement_options)
+@shared_options(readiness_options)
+@shared_options(pool_options)
 @click.option(
     '--image-name',
     default=lambda: get_default_rc('market-image-name'),
@@ -414,9 +1203,28 @@ def provision_market(ctx,
                      vcn_compartment_id,
                      subnet_name,
                      ssh_authorized_keys_file,
-                     cloud_init_file):
+                     cloud_init_file,
+                     count,
+                     no_wait,
+                     fault_domain,
+                     hedge,
+                     capacity_check,
+                     wait_ready,
+                     ready_port,
+                     ready_private_ip,
+                     wait_cloud_init,
+                     ssh_user,
+                     ready_timeout,
+                     warm_pool,
+                     warm_pool_max_age):
     """Provision a free Martketplace Image."""
-    oci = ctx.obj['oci']
+    bulk = check_display_name(display_name, count)
+    readiness = readiness_probe(wait_ready, ready_port, ready_private_ip, wait_cloud_init, ssh_user, ready_timeout,
+                                ssh_authorized_keys_file, no_wait)
+    shape, availability_domain, placement = placement_policy(shape, availability_domain, fault_domain, hedge,
+                                                             capacity_check, no_wait)
+    pool = pool_policy(warm_pool, warm_pool_max_age)
+    oci = get_oci(ctx)
     instance = oci.provision_market(display_name,
                                     compartment_id,
                                     image_name,
@@ -426,8 +1234,173 @@ def provision_market(ctx,
                                     vcn_compartment_id,
                                     subnet_name,
                                     ssh_authorized_keys_file,
-                                    cloud_init_file)
-    display_ip(ctx, compartment_id, instance)
+                                    cloud_init_file,
+                                    count=count,
+                                    callback=provision_callback(),
+                                    wait=not no_wait,
+                                    readiness=readiness,
+                                    placement=placement,
+                                    pool=pool)
+    display_results(ctx, compartment_id, instance, bulk, not no_wait, readiness, placement, pool)
+
+
+@shared_options(provision_options)
+@shared_options(readiness_options)
+@click.option(
+    '--golden-name',
+    default=lambda: get_default_rc('golden-name'),
+    required=True,
+    help='The golden image name (see the golden command)',
+)
+@provision.command(
+    name='clone',
+    help='Provision clones of a golden boot volume',
+)
+@click.pass_context
+def provision_clone(ctx,
+                    golden_name,
+                    display_name,
+                    compartment_id,
+                    shape,
+                    availability_domain,
+                    vcn_name,
+                    vcn_compartment_id,
+                    subnet_name,
+                    ssh_authorized_keys_file,
+                    cloud_init_file,
+                    count,
+                    no_wait,
+                    wait_ready,
+                    ready_port,
+                    ready_private_ip,
+                    wait_cloud_init,
+                    ssh_user,
+                    ready_timeout):
+    bulk = check_display_name(display_name, count)
+    readiness = readiness_probe(wait_ready, ready_port, ready_private_ip, wait_cloud_init, ssh_user, ready_timeout,
+                                ssh_authorized_keys_file, no_wait)
+    shape, availability_domain, placement = placement_policy(shape, availability_domain, None, 1, False, no_wait)
+    if placement:
+        raise click.BadParameter('a golden boot volume is cloned within a single availability domain',
+                                 param_hint="'--shape' / '--availability-domain'")
+    oci = get_oci(ctx)
+    instance = oci.provision_clone(display_name,
+                                   compartment_id,
+                                   golden_name,
+                                   shape,
+                                   availability_domain,
+                                   vcn_name,
+                                   vcn_compartment_id,
+                                   subnet_name,
+                                   ssh_authorized_keys_file,
+                                   cloud_init_file,
+                                   count=count,
+                                   callback=provision_callback(),
+                                   wait=not no_wait,
+                                   readiness=readiness)
+    display_results(ctx, compartment_id, instance, bulk, not no_wait, readiness)
+
+
+""" Apply command.
+"""
+
+
+@cli.command()
+@click.argument(
+    'plan_file',
+    type=click.Path(exists=True, dir_okay=False),
+)
+@click.option(
+    '--dry-run',
+    is_flag=True,
+    help='Display the plan without applying it',
+)
+@click.option(
+    '--force',
+    is_flag=True,
+    help='Do NOT ask for confirmation (potentially dangerous!)'
+)
+@click.pass_context
+def apply(ctx, plan_file, dry_run, force):
+    """Reconcile instance groups with a plan file.
+
+    The plan file (YAML or JSON) describes groups of instances: image
+    source, shape, placement, count and state. Missing instances are
+    created, instances are started or shut down, and instances no longer
+    part of their group are terminated.
+    """
+    try:
+        groups = load_plan(plan_file, get_default_rc)
+    except PlanError as e:
+        click.echo('Invalid plan: {}'.format(e), err=True)
+        ctx.exit(1)
+    oci = get_oci(ctx)
+
+    # Compartment names are resolved once
+    compartments = {}
+    for value in {group.compartment_id for group in groups} | {group.vcn_compartment_id for group in groups}:
+        if value:
+            compartments[value] = oci.resolve_compartment(value)
+            if not compartments[value]:
+                click.echo('Invalid plan: no compartment found matching "{}"'.format(value), err=True)
+                ctx.exit(1)
+    groups = [group._replace(compartment_id=compartments[group.compartment_id],
+                             vcn_compartment_id=compartments.get(group.vcn_compartment_id))
+              for group in groups]
+
+    start = time.time()
+    fleet = FleetPlan(oci, groups)
+    try:
+        changes = fleet.refresh()
+    except PlanError as e:
+        click.echo('Invalid plan: {}'.format(e), err=True)
+        ctx.exit(1)
+    if not changes:
+        click.echo('Nothing to do: {} instance(s) up to date'.format(fleet.unchanged))
+        return
+
+    counts = Counter(change.action for change in changes)
+    table = AsciiTable(
+        [('Action', 'Group', 'Name', 'State')]
+        + [(change.action.title(), change.group, change.display_name, (change.state or '-').title())
+           for change in changes])
+    click.echo(table.table)
+    click.echo('Plan: {} to create, {} to start, {} to shut down, {} to terminate, {} unchanged'.format(
+        counts[ACTION_CREATE], counts[ACTION_START], counts[ACTION_SHUTDOWN], counts[ACTION_TERMINATE],
+        fleet.unchanged))
+    if dry_run:
+        return
+    if not force and not click.confirm('Apply {} change(s)'.format(len(changes))):
+        click.echo("Good thing I asked; I won't apply the plan...")
+        return
+
+    with click.progressbar(length=len(changes), label='Applying plan', show_pos=True) as progress:
+        results = fleet.apply(callback=lambda _: progress.update(1))
+
+    failed = [result for result in results if result.error]
+    if failed:
+        table = AsciiTable(
+            [('Action', 'Name', 'Error')]
+            + [(result.change.action.title(),
+                result.change.display_name,
+                getattr(result.error, 'message', result.error))
+               for result in failed])
+        table.title = 'Failed changes'
+        click.echo(table.table)
+    table = AsciiTable(
+        [('Action', 'Changes', 'Failed', 'Median (s)', 'Max (s)')]
+        + [(action.title(),
+            len(action_results),
+            len([result for result in action_results if result.error]),
+            '{:.1f}'.format(median(result.elapsed for result in action_results)),
+            '{:.1f}'.format(max(result.elapsed for result in action_results)))
+           for action, action_results in ((action, [result for result in results if result.change.action == action])
+                                          for action in ACTIONS)
+           if action_results])
+    table.title = 'Applied: {}/{} in {:.1f}s'.format(len(results) - len(failed), len(changes), time.time() - start)
+    click.echo(table.table)
+    if failed or len(results) != len(changes):
+        ctx.exit(1)
 
 
 """ Instance command.
@@ -441,6 +1414,23 @@ def instance(ctx):
     pass
 
 
+@click.option(
+    '--recursive',
+    is_flag=True,
+    help='Include the subcompartments',
+)
+@click.option(
+    '--state',
+    default=None,
+    type=click.Choice(['RUNNING', 'STOPPED', 'PROVISIONING', 'STARTING', 'STOPPING', 'TERMINATING'],
+                      case_sensitive=False),
+    help='Only list instances in this lifecycle state',
+)
+@click.option(
+    '--name-prefix',
+    default=None,
+    help='Only list instances whose display name starts with this prefix',
+)
 @click.option(
     '--display-name',
     default=None,
@@ -452,47 +1442,99 @@ def instance(ctx):
     default=lambda: get_default_rc('compartment-id'),
     show_default=RcFile.get_default('compartment-id'),
     required=True,
-    help='The OCID of the compartment',
+    callback=resolve_compartment,
+    help='The OCID or name of the compartment',
 )
+@shared_options(fleet_options)
+@shared_options(output_options)
 @instance.command(
     name='list',
     help='List compute instances',
 )
 @click.pass_context
-def instance_list(ctx, compartment_id, display_name):
-    oci = ctx.obj['oci']
-    instances = oci.instance_list(compartment_id, display_name)
-    if instances:
-        table = AsciiTable(
-            [('Name', 'AD', 'Time Created', 'State', 'Private IP', 'Public IP')]
-            + sorted(instance[1:] for instance in instances))
-        table.title = 'Compute Instances'
-        click.echo(table.table)
-    else:
-        click.echo('No instance found', err=True)
-
-
-def instance_action(action_name, action, oci, compartment_id, display_name, wait, force):
+def instance_list(ctx, compartment_id, display_name, name_prefix, state, recursive, regions, profiles, output, limit):
+    scopes, columns, scope_row = fleet_scopes(ctx, compartment_id, regions, profiles, recursive)
+    display_rows(ctx,
+                 (scope_row(scope, instance) + instance_row(instance, vnic)
+                  for scope, (instance, vnic) in iter_fleet(
+                      ctx, scopes,
+                      lambda scope: scope[0].query_instances(compartment_ids(scope),
+                                                             display_name,
+                                                             name_prefix,
+                                                             state,
+                                                             limit=limit))),
+                 columns
+                 + [('id', None),
+                    ('display_name', 'Name'),
+                    ('availability_domain', 'AD'),
+                    ('time_created', 'Time Created'),
+                    ('lifecycle_state', 'State'),
+                    ('private_ip', 'Private IP'),
+                    ('public_ip', 'Public IP')],
+                 'Compute Instances',
+                 'No instance found',
+                 output,
+                 limit)
+
+
+def instance_action(ctx, action_name, compartment_id, display_name, wait, force, confirm_each):
+    """Run an action concurrently on all matching instances."""
+    oci = get_oci(ctx)
     instances = oci.instance_list(compartment_id, display_name)
 
     if not instances:
         click.echo('No instance found', err=True)
-    else:
-        for instance_id, display_name, ad, time_created, state, private_ip, public_ip in instances:
-            table = AsciiTable((
-                ('Created', time_created),
-                ('Private IP', private_ip),
-                ('Public IP', public_ip)))
-            table.inner_heading_row_border = False
-            table.title = '{} instance: {}'.format(action_name.title(), display_name)
-            click.echo(table.table)
-            if force or click.confirm('{} this instance'.format(action_name.title())):
-                action(instance_id, wait)
-                click.echo('{} {}'.format(
-                    action_name.title(),
-                    'completed' if wait else 'requested'))
+        return
+
+    table = AsciiTable(
+        [('Name', 'Created', 'Private IP', 'Public IP')]
+        + [(name, time_created, private_ip, public_ip)
+           for _, name, _, time_created, _, private_ip, public_ip in instances])
+    table.title = '{} instance(s): {}'.format(action_name.title(), display_name)
+    click.echo(table.table)
+
+    selected = []
+    if force:
+        selected = instances
+    elif confirm_each:
+        for instance in instances:
+            if click.confirm('{} instance {} ({})'.format(action_name.title(), instance[1], instance[3])):
+                selected.append(instance)
             else:
-                click.echo("Good thing I asked; I won't {} {}...".format(action_name.lower(), display_name))
+                click.echo("Good thing I asked; I won't {} {}...".format(action_name.lower(), instance[1]))
+    elif click.confirm('{} {} instance(s)'.format(action_name.title(), len(instances))):
+        selected = instances
+    else:
+        click.echo("Good thing I asked; I won't {} {}...".format(action_name.lower(), display_name))
+    if not selected:
+        return
+
+    names = {instance[0]: instance[1] for instance in selected}
+    with click.progressbar(length=len(selected),
+                           label='{} {}'.format(action_name.title(), 'in progress' if wait else 'requests'),
+                           show_pos=True) as progress:
+        results = oci.instance_actions(action_name,
+                                       compartment_id,
+                                       [instance[0] for instance in selected],
+                                       wait=wait,
+                                       callback=lambda *_: progress.update(1))
+
+    failed = [result for result in results if result[3]]
+    table = AsciiTable(
+        [('Name', 'State', 'Time (s)', 'Error')]
+        + [(names[instance_id],
+            state.title() if state else 'Failed',
+            '{:.1f}'.format(elapsed),
+            getattr(error, 'message', error) if error else '')
+           for instance_id, state, elapsed, error in results])
+    table.title = '{} {}: {}/{}'.format(
+        action_name.title(),
+        'completed' if wait else 'requested',
+        len(results) - len(failed),
+        len(results))
+    click.echo(table.table)
+    if failed:
+        ctx.exit(1)
 
 
 @shared_options(instance_options)
@@ -501,9 +1543,8 @@ def instance_action(action_name, action, oci, compartment_id, display_name, wait
     help='Terminate compute instances',
 )
 @click.pass_context
-def instance_terminate(ctx, compartment_id, display_name, wait, force):
-    oci = ctx.obj['oci']
-    instance_action('terminate', oci.instance_terminate, oci, compartment_id, display_name, wait, force)
+def instance_terminate(ctx, compartment_id, display_name, wait, force, confirm_each):
+    instance_action(ctx, 'terminate', compartment_id, display_name, wait, force, confirm_each)
 
 
 @shared_options(instance_options)
@@ -512,9 +1553,8 @@ def instance_terminate(ctx, compartment_id, display_name, wait, force):
     help='Start compute instances',
 )
 @click.pass_context
-def instance_start(ctx, compartment_id, display_name, wait, force):
-    oci = ctx.obj['oci']
-    instance_action('start', oci.instance_start, oci, compartment_id, display_name, wait, force)
+def instance_start(ctx, compartment_id, display_name, wait, force, confirm_each):
+    instance_action(ctx, 'start', compartment_id, display_name, wait, force, confirm_each)
 
 
 @shared_options(instance_options)
@@ -523,13 +1563,434 @@ def instance_start(ctx, compartment_id, display_name, wait, force):
     help='Shutdown compute instances',
 )
 @click.pass_context
-def instance_shutdown(ctx, compartment_id, display_name, wait, force):
-    oci = ctx.obj['oci']
-    instance_action('shutdown', oci.instance_shutdown, oci, compartment_id, display_name, wait, force)
+def instance_shutdown(ctx, compartment_id, display_name, wait, force, confirm_each):
+    instance_action(ctx, 'shutdown', compartment_id, display_name, wait, force, confirm_each)
+
+
+""" Pool command.
+"""
+
+
+# Options common to pool commands
+pool_command_options = [
+    click.option(
+        '--max-age',
+        default=lambda: get_default_rc('warm-pool-max-age'),
+        show_default=RcFile.get_default('warm-pool-max-age'),
+        type=click.FloatRange(min=0),
+        help='Hours after which pooled instances are evicted',
+    ),
+    click.option(
+        '--compartment-id',
+        default=lambda: get_default_rc('compartment-id'),
+        show_default=RcFile.get_default('compartment-id'),
+        required=True,
+        callback=resolve_compartment,
+        help='The OCID or name of the compartment',
+    ),
+]
+
+
+def display_maintenance(ctx, results, title):
+    """Display the outcome of a pool maintenance."""
+    if not results:
+        click.echo('No warm pool found', err=True)
+        return
+    table = AsciiTable(
+        [('Pool', 'Stopped', 'Evicted', 'Launched', 'Errors')]
+        + [(maintenance.key,
+            maintenance.stopped,
+            maintenance.evicted,
+            maintenance.launched,
+            '; '.join(str(getattr(error, 'message', error)) for error in maintenance.errors))
+           for maintenance in results])
+    table.title = title
+    click.echo(table.table)
+    if any(maintenance.errors for maintenance in results):
+        ctx.exit(1)
+
+
+@cli.group()
+@click.pass_context
+def pool(ctx):
+    """Manage warm instance pools."""
+    pass
+
+
+@shared_options(pool_command_options)
+@pool.command(
+    name='status',
+    help='Show the warm pools and their hit rates',
+)
+@click.pass_context
+def pool_status(ctx, compartment_id, max_age):
+    stats = get_oci(ctx).pool_stats(WarmPool(max_age=max_age * 3600), compartment_id)
+    if not stats:
+        click.echo('No warm pool found', err=True)
+        return
+    table = AsciiTable(
+        [('Pool', 'Shape', 'AD', 'Size', 'Ready', 'Warming', 'Hits', 'Misses', 'Hit rate', 'Launched', 'Evicted',
+          'Last used')]
+        + [(pool.key,
+            pool.shape or '-',
+            short_name(pool.availability_domain) or '-',
+            pool.size if pool.size is not None else '-',
+            pool.ready,
+            pool.warming,
+            pool.hits,
+            pool.misses,
+            '{:.0%}'.format(hit_rate(pool)) if hit_rate(pool) is not None else '-',
+            pool.launched,
+            pool.evicted,
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(pool.last_used)) if pool.last_used else '-')
+           for pool in stats])
+    table.title = 'Warm pools: {} ready, {} hits / {} requests'.format(
+        sum(pool.ready for pool in stats),
+        sum(pool.hits for pool in stats),
+        sum(pool.hits + pool.misses for pool in stats))
+    click.echo(table.table)
+
+
+@shared_options(pool_command_options)
+@click.option(
+    '--max-idle',
+    default=MAX_IDLE / 3600,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help='Hours without provisioning after which a pool is drained',
+)
+@pool.command(
+    name='maintain',
+    help='Stop warmed up instances, evict old ones and refill the warm pools (e.g. from cron)',
+)
+@click.pass_context
+def pool_maintain(ctx, compartment_id, max_age, max_idle):
+    results = get_oci(ctx).maintain_pools(WarmPool(max_age=max_age * 3600, max_idle=max_idle * 3600),
+                                          compartment_id)
+    display_maintenance(ctx, results, 'Warm pools maintained: {}'.format(len(results)))
+
+
+@shared_options(pool_command_options)
+@click.option(
+    '--pool',
+    'keys',
+    multiple=True,
+    help='The pool to drain (can be repeated)  [default: all the pools of the compartment]',
+)
+@click.option(
+    '--force',
+    is_flag=True,
+    help='Do NOT ask for confirmation (potentially dangerous!)'
+)
+@pool.command(
+    name='drain',
+    help='Terminate the pooled instances and forget the warm pools',
+)
+@click.pass_context
+def pool_drain(ctx, compartment_id, max_age, keys, force):
+    policy = WarmPool(max_age=max_age * 3600)
+    stats = [pool for pool in get_oci(ctx).pool_stats(policy, compartment_id) if not keys or pool.key in keys]
+    if not stats:
+        click.echo('No warm pool found', err=True)
+        return
+    count = sum(pool.ready + pool.warming for pool in stats)
+    if not force and not click.confirm('Drain {} pool(s), terminating {} instance(s)'.format(len(stats), count)):
+        click.echo("Good thing I asked; I won't drain the pools...")
+        return
+    results = get_oci(ctx).maintain_pools(policy, compartment_id, keys=[pool.key for pool in stats], drain=True)
+    display_maintenance(ctx, results, 'Warm pools drained: {}'.format(len(results)))
+
+
+""" Golden command.
+"""
+
+
+# Options common to golden commands
+golden_options = [
+    click.option(
+        '--name',
+        default=lambda: get_default_rc('golden-name'),
+        required=True,
+        help='The golden image name',
+    ),
+    click.option(
+        '--compartment-id',
+        default=lambda: get_default_rc('compartment-id'),
+        show_default=RcFile.get_default('compartment-id'),
+        required=True,
+        callback=resolve_compartment,
+        help='The OCID or name of the compartment',
+    ),
+]
+
+
+def display_golden(ctx, images, title):
+    """Display golden images, exit with an error when there is none."""
+    if not images:
+        ctx.exit(1)
+    table = AsciiTable(
+        [('Name', 'Replicas', 'Backup', 'Size (GB)', 'Created')]
+        + [(image.name,
+            ', '.join('{}{}'.format(short_name(availability_domain),
+                                    '' if replica.lifecycle_state == 'AVAILABLE'
+                                    else ' ({})'.format(replica.lifecycle_state.title()))
+                      for availability_domain, replica in sorted(image.replicas.items())) or '-',
+            image.backup.lifecycle_state.title() if image.backup else '-',
+            next((volume.size_in_gbs for volume in image.replicas.values() if volume.size_in_gbs), '-'),
+            min(volume.time_created for volume in chain(image.replicas.values(), [image.backup]) if volume))
+           for image in images])
+    table.title = title
+    click.echo(table.table)
+
+
+@cli.group()
+@click.pass_context
+def golden(ctx):
+    """Manage golden boot volumes."""
+    pass
+
+
+@click.option(
+    '--compartment-id',
+    default=lambda: get_default_rc('compartment-id'),
+    show_default=RcFile.get_default('compartment-id'),
+    required=True,
+    callback=resolve_compartment,
+    help='The OCID or name of the compartment',
+)
+@golden.command(
+    name='list',
+    help='List the golden images and the availability domains they are replicated to',
+)
+@click.pass_context
+def golden_list(ctx, compartment_id):
+    images = get_oci(ctx).golden_images(compartment_id)
+    if not images:
+        click.echo('No golden image found', err=True)
+        return
+    display_golden(ctx, [images[name] for name in sorted(images)], 'Golden images')
+
+
+@shared_options(golden_options)
+@click.option(
+    '--boot-volume-id',
+    default=None,
+    help='The boot volume OCID, instead of --instance-name',
+)
+@click.option(
+    '--instance-name',
+    default=None,
+    help='The display name of the prepared instance',
+)
+@golden.command(
+    name='create',
+    help='Create a golden image from the boot volume of a prepared instance (stop it first for a consistent copy)',
+)
+@click.pass_context
+def golden_create(ctx, name, compartment_id, boot_volume_id, instance_name):
+    if bool(instance_name) == bool(boot_volume_id):
+        raise click.UsageError('One of --instance-name or --boot-volume-id is required')
+    oci = get_oci(ctx)
+    instance_id = None
+    if instance_name:
+        instances = oci.instance_list(compartment_id, instance_name)
+        if len(instances) != 1:
+            raise click.BadParameter('{} instances found'.format(len(instances)), param_hint="'--instance-name'")
+        instance_id = instances[0][0]
+    image = oci.create_golden(compartment_id, name, instance_id=instance_id, boot_volume_id=boot_volume_id)
+    display_golden(ctx, [image] if image else [], 'Golden image created')
+
+
+@shared_options(golden_options)
+@click.option(
+    '--availability-domain',
+    required=True,
+    help='Comma-separated list of the availability domains to replicate to, like "AD-2,AD-3"',
+)
+@golden.command(
+    name='replicate',
+    help='Replicate a golden image to availability domains, ahead of provisioning',
+)
+@click.pass_context
+def golden_replicate(ctx, name, compartment_id, availability_domain):
+    availability_domains = split_list(availability_domain)
+    if not availability_domains:
+        raise click.BadParameter('no availability domain', param_hint="'--availability-domain'")
+    image = get_oci(ctx).replicate_golden(compartment_id, name, availability_domains)
+    display_golden(ctx, [image] if image else [], 'Golden image replicated')
+    if any(replica.lifecycle_state != 'AVAILABLE' for replica in image.replicas.values()):
+        ctx.exit(1)
+
+
+@shared_options(golden_options)
+@click.option(
+    '--force',
+    is_flag=True,
+    help='Do NOT ask for confirmation (potentially dangerous!)'
+)
+@golden.command(
+    name='delete',
+    help='Delete the boot volumes and backup of a golden image',
+)
+@click.pass_context
+def golden_delete(ctx, name, compartment_id, force):
+    if not force and not click.confirm('Delete golden image {}'.format(name)):
+        click.echo("Good thing I asked; I won't delete {}...".format(name))
+        return
+    deleted = get_oci(ctx).delete_golden(compartment_id, name)
+    if deleted is None:
+        ctx.exit(1)
+    click.echo('Golden image {} deleted: {} boot volume(s) and backup(s)'.format(name, deleted))
+
+
+""" Wait command.
+"""
+
+
+@cli.command(
+    name='wait',
+    help='Wait for instances or work requests',
+)
+@click.option(
+    '--compartment-id',
+    default=lambda: get_default_rc('compartment-id'),
+    show_default=RcFile.get_default('compartment-id'),
+    required=True,
+    callback=resolve_compartment,
+    help='The OCID or name of the compartment',
+)
+@click.option(
+    '--display-name',
+    multiple=True,
+    help='The display name of the instances to wait for (can be repeated)',
+)
+@click.option(
+    '--state',
+    default='RUNNING',
+    show_default=True,
+    type=click.Choice(['RUNNING', 'STOPPED', 'TERMINATED'], case_sensitive=False),
+    help='The lifecycle state to wait for',
+)
+@click.option(
+    '--work-request-id',
+    multiple=True,
+    help='The OCID of a work request to wait for (can be repeated)',
+)
+@click.option(
+    '--max-wait-seconds',
+    default=None,
+    type=click.IntRange(min=1),
+    help='Maximum time to wait  [default: 1200]',
+)
+@click.pass_context
+def wait(ctx, compartment_id, display_name, state, work_request_id, max_wait_seconds):
+    if not display_name and not work_request_id:
+        raise click.UsageError('At least one --display-name or --work-request-id is required')
+    oci = get_oci(ctx)
+
+    def callback(resource_id, name, resource_state, elapsed, error):
+        click.echo('{}: {} ({:.0f}s)'.format(name, resource_state.title() if not error else error, elapsed))
+
+    results = oci.wait_for(compartment_id,
+                           display_names=display_name,
+                           state=state,
+                           work_request_ids=work_request_id,
+                           max_wait_seconds=max_wait_seconds,
+                           callback=callback)
+    if not results:
+        click.echo('Nothing to wait for', err=True)
+        ctx.exit(1)
+    if any(result[4] for result in results):
+        ctx.exit(1)
+
+
+""" Serve command.
+"""
+
+
+@cli.command()
+@click.option(
+    '--socket',
+    'socket_path',
+    default=None,
+    type=click.Path(dir_okay=False),
+    help='The path of the daemon socket  [default: ${} or $XDG_RUNTIME_DIR/oci-compute-<uid>.sock]'.format(
+        daemon.SOCKET_ENV),
+)
+@click.option(
+    '--idle-timeout',
+    default=0,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help='Exit after this number of seconds without command (0: never)',
+)
+@click.pass_context
+def serve(ctx, socket_path, idle_timeout):
+    """Run commands of other oci-compute processes with warm clients.
+
+    While the daemon runs, oci-compute commands are forwarded to it through
+    a Unix domain socket, saving the SDK start-up, client creation and
+    connection set-up of each invocation. Commands run one at a time: while
+    the daemon is busy, or when their --max-in-flight, --pool-size or
+    --keep-alive differ from the serve options, commands run locally.
+    """
+    pool = daemon.OciComputePool(OciCompute,
+                                 Instrumentation(),
+                                 ctx.obj['oci_kwargs']['scheduler'],
+                                 ctx.obj['oci_kwargs']['connections'])
+    try:
+        # Load the SDK and the configuration before the first command
+        pool.get(**ctx.obj['oci_kwargs'])
+    except Exception as e:
+        click.echo('Could not get configuration: {}'.format(e), err=True)
+    server = daemon.Daemon(cli, pool, socket_path=socket_path, idle_timeout=idle_timeout)
+    click.echo('Serving on {}'.format(server.socket_path), err=True)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        click.echo('Could not serve: {}'.format(e), err=True)
+        ctx.exit(1)
+    click.echo('Served {} command(s)'.format(server.commands), err=True)
 
 
 """Main.
 """
 
-if __name__ == '__main__':
+
+def split_global_options(argv):
+    """Split a command line into its global options and its command.
+
+    Returns:
+        Tuple (options, command): the arguments before the command name,
+        and the command name followed by its own arguments.
+
+    """
+    # Global options followed by a value, e.g. '--profile serve'
+    with_value = set(opt for param in cli.params if isinstance(param, click.Option) and not param.is_flag
+                     for opt in param.opts)
+    position = 0
+    while position < len(argv):
+        argument = argv[position]
+        if argument == '--':
+            return argv[:position], argv[position + 1:]
+        if not argument.startswith('-'):
+            break
+        position += 2 if argument in with_value else 1
+    return argv[:position], argv[position:]
+
+
+def main():
+    """Entry point: run the command in the daemon if one is running, else locally."""
+    argv = sys.argv[1:]
+    options, command = split_global_options(argv)
+    if '--no-daemon' not in options and command[:1] != ['serve']:
+        status = daemon.forward(argv)
+        if status is not None:
+            sys.exit(status)
     cli()
+
+
+if __name__ == '__main__':
+    main()
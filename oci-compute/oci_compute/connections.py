@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+"""OCI Compute HTTP connection pools.
+
+ConnectionPools helper class sharing the HTTP connections of all the SDK
+clients. Each SDK client otherwise has its own session and connection pools:
+the clients of a command (and the composite operations built on them) would
+each establish their own connections to the same endpoints, and concurrent
+requests beyond the default pool size would not be kept alive.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import namedtuple
+import threading
+import time
+
+from .scheduler import MAX_IN_FLIGHT
+
+# Connections kept alive per endpoint: requests in flight beyond this number
+# use connections which are closed afterwards
+POOL_SIZE = MAX_IN_FLIGHT
+
+# Idle connections are reused for this number of seconds, then closed before
+# the server (or a load balancer on the way) drops them
+KEEP_ALIVE = 50.0
+
+# Maximum number of endpoints (service, region) with pooled connections
+MAX_ENDPOINTS = 64
+
+# Pool counters, all endpoints included: hits are requests sent on a pooled
+# connection, misses requests which needed a new connection; handshakes are
+# the connections established (TCP and TLS handshakes), expired the idle
+# connections closed after the keep-alive delay and discarded the connections
+# closed because the pool was full.
+PoolStats = namedtuple('PoolStats', [
+    'endpoints',
+    'hits',
+    'misses',
+    'handshakes',
+    'expired',
+    'discarded',
+])
+
+# Counters of an endpoint (scheme://host:port)
+EndpointStats = namedtuple('EndpointStats', [
+    'endpoint',
+    'hits',
+    'misses',
+    'handshakes',
+    'expired',
+    'discarded',
+])
+
+_COUNTERS = EndpointStats._fields[1:]
+
+
+def _counting_pool_class(pool_class, pools):
+    """Return a subclass of a urllib3 connection pool class updating the counters of pools."""
+
+    class Connection(pool_class.ConnectionCls):
+
+        def connect(self):
+            pools._count(self.oci_compute_endpoint, 'handshakes')
+            return super().connect()
+
+    class Pool(pool_class):
+
+        ConnectionCls = Connection
+
+        def _new_conn(self):
+            connection = super()._new_conn()
+            connection.oci_compute_endpoint = '{}://{}:{}'.format(self.scheme, self.host, self.port)
+            return connection
+
+        def _get_conn(self, timeout=None):
+            connection = super()._get_conn(timeout)
+            endpoint = connection.oci_compute_endpoint
+            released = getattr(connection, 'oci_compute_released', None)
+            if connection.sock is not None and released is not None and time.monotonic() - released > pools.keep_alive:
+                connection.close()
+                pools._count(endpoint, 'expired')
+            pools._count(endpoint, 'hits' if connection.sock is not None else 'misses')
+            return connection
+
+        def _put_conn(self, connection):
+            if connection is not None:
+                connection.oci_compute_released = time.monotonic()
+                if self.pool is not None and self.pool.full():
+                    pools._count(connection.oci_compute_endpoint, 'discarded')
+            super()._put_conn(connection)
+
+    Pool.__name__ = 'Shared' + pool_class.__name__
+    return Pool
+
+
+class ConnectionPools(object):
+    """HTTP connection pools shared by the SDK clients.
+
+    There is one pool per endpoint, shared by all the clients mounted on it:
+    share the ConnectionPools between OciCompute instances (region views and
+    other profiles share it by default).
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, keep_alive=KEEP_ALIVE, max_endpoints=MAX_ENDPOINTS):
+        """Initialise the pools.
+
+        Parameters:
+            pool_size: connections kept alive per endpoint; should not be
+                       lower than the maximum number of requests in flight
+            keep_alive: idle connections are closed after this number of
+                        seconds
+            max_endpoints: maximum number of endpoints with pooled
+                           connections; the least recently used are closed
+
+        """
+        self._pool_size = pool_size
+        self._keep_alive = keep_alive
+        self._max_endpoints = max_endpoints
+        self._lock = threading.Lock()
+        self._adapter = None
+        # {endpoint: {counter: value}}
+        self._counters = {}
+
+    @property
+    def pool_size(self):
+        """Return the number of connections kept alive per endpoint."""
+        return self._pool_size
+
+    @property
+    def keep_alive(self):
+        """Return the keep-alive delay of idle connections (seconds)."""
+        return self._keep_alive
+
+    def _count(self, endpoint, counter):
+        with self._lock:
+            counters = self._counters.get(endpoint)
+            if counters is None:
+                counters = self._counters[endpoint] = dict.fromkeys(_COUNTERS, 0)
+            counters[counter] += 1
+
+    def _shared_adapter(self, adapter_class):
+        """Return the transport adapter of the pools, created from the adapter class of the SDK."""
+        with self._lock:
+            if self._adapter is None:
+                pools = self
+
+                class SharedAdapter(adapter_class):
+
+                    def init_poolmanager(self, *args, **kwargs):
+                        super().init_poolmanager(*args, **kwargs)
+                        self.poolmanager.pool_classes_by_scheme = {
+                            scheme: _counting_pool_class(pool_class, pools)
+                            for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items()}
+
+                    def close(self):
+                        # The SDK closes the session of a client to reset its
+                        # connections: broken connections are dropped by the
+                        # pools, the others are kept for the other clients
+                        pass
+
+                    def close_pools(self):
+                        super().close()
+
+                self._adapter = SharedAdapter(pool_connections=self._max_endpoints, pool_maxsize=self._pool_size)
+            return self._adapter
+
+    def mount(self, base_client):
+        """Send the requests of an SDK client through the shared pools.
+
+        Parameters:
+            base_client: the SDK BaseClient of the client
+
+        """
+        session = base_client.session
+        adapter = self._shared_adapter(type(session.get_adapter('https://')))
+        for prefix in ('https://', 'http://'):
+            session.mount(prefix, adapter)
+
+    def close(self):
+        """Close the pooled connections."""
+        with self._lock:
+            adapter = self._adapter
+        if adapter is not None:
+            adapter.close_pools()
+
+    def reset_stats(self):
+        """Reset the counters."""
+        with self._lock:
+            self._counters = {}
+
+    def stats(self):
+        """Return the pool counters (PoolStats)."""
+        endpoints = self.endpoint_stats()
+        return PoolStats(len(endpoints), *(sum(getattr(endpoint, counter) for endpoint in endpoints)
+                                           for counter in _COUNTERS))
+
+    def endpoint_stats(self):
+        """Return the counters of each endpoint (list of EndpointStats)."""
+        with self._lock:
+            return [EndpointStats(endpoint, **counters) for endpoint, counters in sorted(self._counters.items())]
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+
+"""OCI Compute daemon.
+
+Run oci-compute commands in a long-running process which keeps its
+OciCompute instances warm (SDK loaded, clients and connection pools, caches
+in memory), and forward the commands of the oci-compute entry point to it
+over a Unix domain socket.
+
+Protocol: newline delimited JSON frames. The client sends the request
+({'version', 'argv', 'cwd', 'env', 'tty'}); the daemon answers with
+'started' (or 'fallback' when it cannot run the command: the client then
+runs it locally), streams the 'out' and 'err' output, asks for a line of
+input with 'read' (answered with 'data'), and ends with the 'exit' status.
+A 'fallback' may also follow 'started', before any output, when the global
+options of the command do not match the daemon.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import OrderedDict
+import io
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import traceback
+
+from . import __version__
+
+# Environment variable overriding the default socket path
+SOCKET_ENV = 'OCI_COMPUTE_SOCKET'
+
+# Environment variables read when the modules are imported: commands of
+# clients with other values run locally
+STARTUP_ENV = ('XDG_CACHE_HOME',)
+
+# Number of OciCompute instances kept by the daemon: the least recently used
+# ones are dropped
+MAX_INSTANCES = 8
+
+# Seconds to wait for the answer to the request (the daemon answers at once,
+# running the command or not)
+HANDSHAKE_TIMEOUT = 5.0
+
+
+class Fallback(Exception):
+    """The daemon cannot run the command: the client runs it locally."""
+
+
+def default_socket_path():
+    """Return the daemon socket path."""
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp'
+    return os.path.join(runtime_dir, 'oci-compute-{}.sock'.format(os.getuid()))
+
+
+class _Connection(object):
+    """JSON frames over a stream socket."""
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._reader = sock.makefile('rb')
+        self._lock = threading.Lock()
+
+    def send(self, **frame):
+        data = (json.dumps(frame) + '\n').encode('utf-8')
+        with self._lock:
+            self._sock.sendall(data)
+
+    def receive(self):
+        """Return the next frame, None when the peer is gone."""
+        line = self._reader.readline()
+        return json.loads(line.decode('utf-8')) if line else None
+
+    def close(self):
+        self._reader.close()
+        self._sock.close()
+
+
+class _OutputStream(io.TextIOBase):
+    """Text stream sending what is written to the client."""
+
+    encoding = 'utf-8'
+
+    def __init__(self, connection, name, tty):
+        self._connection = connection
+        self._name = name
+        self._tty = tty
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if not isinstance(text, str):
+            raise TypeError('write() argument must be str, not {}'.format(type(text).__name__))
+        if text:
+            self._connection.send(**{self._name: text})
+        return len(text)
+
+    def isatty(self):
+        return self._tty
+
+
+class _InputStream(io.TextIOBase):
+    """Text stream reading lines from the client (e.g. confirmation prompts)."""
+
+    encoding = 'utf-8'
+
+    def __init__(self, connection, tty):
+        self._connection = connection
+        self._tty = tty
+
+    def readable(self):
+        return True
+
+    def readline(self, size=-1):
+        self._connection.send(read=True)
+        frame = self._connection.receive()
+        return frame.get('data', '') if frame else ''
+
+    def isatty(self):
+        return self._tty
+
+
+class OciComputePool(object):
+    """OciCompute instances of the daemon, one per configuration.
+
+    All the instances share the instrumentation, the request scheduler and
+    the connection pools of the daemon, and keep their cache entries in
+    memory. An instance is replaced when its config file is modified, and
+    only the MAX_INSTANCES most recently used instances are kept. Commands
+    with other scheduler or connection pool settings are run locally (see
+    check).
+
+    The work the commands do not wait for (warm pool refills) is deferred
+    until the daemon has answered the client (see run_deferred).
+    """
+
+    def __init__(self, factory, instrumentation, scheduler, connections):
+        """Initialise the pool.
+
+        Parameters:
+            factory: the OciCompute class (or a function with the same
+                     parameters)
+            instrumentation: the Instrumentation object of the daemon
+            scheduler: the RequestScheduler of the daemon
+            connections: the ConnectionPools of the daemon
+
+        """
+        self._factory = factory
+        self._instrumentation = instrumentation
+        self._scheduler = scheduler
+        self._connections = connections
+        self._instances = OrderedDict()
+        self._deferred = []
+
+    def get(self, **kwargs):
+        """Return the OciCompute instance for these parameters."""
+        kwargs = dict(kwargs,
+                      instrumentation=self._instrumentation,
+                      scheduler=self._scheduler,
+                      connections=self._connections,
+                      memory_cache=True,
+                      background=self._defer)
+        try:
+            modified = os.stat(kwargs['config_file']).st_mtime_ns
+        except OSError:
+            modified = None
+        key = (modified,) + tuple(sorted((name, value) for name, value in kwargs.items()
+                                         if name not in ('instrumentation', 'scheduler', 'connections',
+                                                         'background')))
+        instance = self._instances.get(key)
+        if instance is None:
+            instance = self._instances[key] = self._factory(**kwargs)
+            while len(self._instances) > MAX_INSTANCES:
+                self._instances.popitem(last=False)
+        else:
+            self._instances.move_to_end(key)
+        return instance
+
+    def _defer(self, function, *args):
+        """Keep background work of the current command for run_deferred (OciCompute background runner)."""
+        self._deferred.append((function, args))
+
+    def run_deferred(self):
+        """Run the background work of the last command, in order."""
+        deferred, self._deferred = self._deferred, []
+        for function, args in deferred:
+            try:
+                function(*args)
+            except Exception:
+                traceback.print_exc()
+
+    def check(self, scheduler, connections):
+        """Raise Fallback if a command needs other settings than the shared scheduler and connection pools.
+
+        Parameters:
+            scheduler: the RequestScheduler built from the command options
+            connections: the ConnectionPools built from the command options
+
+        """
+        if scheduler.max_in_flight != self._scheduler.max_in_flight:
+            raise Fallback('max-in-flight {} (daemon: {})'.format(scheduler.max_in_flight,
+                                                                  self._scheduler.max_in_flight))
+        if connections.pool_size != self._connections.pool_size:
+            raise Fallback('pool-size {} (daemon: {})'.format(connections.pool_size, self._connections.pool_size))
+        if connections.keep_alive != self._connections.keep_alive:
+            raise Fallback('keep-alive {:g} (daemon: {:g})'.format(connections.keep_alive,
+                                                                   self._connections.keep_alive))
+
+    def reset(self):
+        """Forget the statistics of the previous command."""
+        self._instrumentation.reset()
+        self._scheduler.reset_stats()
+        self._connections.reset_stats()
+        for instance in self._instances.values():
+            instance.reset_task_timings()
+
+
+def _peer_uid(sock):
+    """Return the user id of the peer process, None if not available."""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    _, uid, _ = struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+    return uid
+
+
+class Daemon(object):
+    """Serve oci-compute commands on a Unix domain socket.
+
+    Each connection is served by its own thread. Commands run one at a
+    time, in the working directory and with the environment of the client:
+    a client arriving while a command runs gets a 'fallback' answer at once
+    and runs its command locally. The background work of a command runs
+    once its client has the exit status, with the same working directory
+    and environment, and the output of the daemon.
+    """
+
+    def __init__(self, command, pool, socket_path=None, idle_timeout=None):
+        """Initialise the daemon.
+
+        Parameters:
+            command: the click command running the requests (the cli group)
+            pool: the OciComputePool
+            socket_path: the socket path (default: default_socket_path())
+            idle_timeout: exit after this number of seconds without command
+
+        """
+        self._command = command
+        self._pool = pool
+        self._socket_path = socket_path or default_socket_path()
+        self._idle_timeout = idle_timeout
+        self._running = threading.Lock()
+        self._env = dict((name, os.environ.get(name)) for name in STARTUP_ENV)
+        self.commands = 0
+
+    @property
+    def socket_path(self):
+        """Return the socket path."""
+        return self._socket_path
+
+    def _bind(self):
+        """Return the listening socket, replacing a stale socket file."""
+        if os.path.exists(self._socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self._socket_path)
+            except OSError:
+                os.unlink(self._socket_path)
+            else:
+                raise OSError('A daemon is already listening on {}'.format(self._socket_path))
+            finally:
+                probe.close()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            server.bind(self._socket_path)
+        finally:
+            os.umask(umask)
+        server.listen(16)
+        return server
+
+    def serve(self):
+        """Serve commands until interrupted or idle."""
+        server = self._bind()
+        server.settimeout(self._idle_timeout or None)
+        try:
+            while True:
+                try:
+                    sock, _ = server.accept()
+                except socket.timeout:
+                    if self._running.locked():
+                        continue
+                    return
+                threading.Thread(target=self._serve_connection, args=(sock,),
+                                 name='oci-compute-daemon-connection').start()
+        finally:
+            server.close()
+            try:
+                os.unlink(self._socket_path)
+            except OSError:
+                pass
+
+    def _serve_connection(self, sock):
+        connection = _Connection(sock)
+        try:
+            uid = _peer_uid(sock)
+            if uid is not None and uid != os.getuid():
+                return
+            sock.settimeout(HANDSHAKE_TIMEOUT)
+            request = connection.receive()
+            sock.settimeout(None)
+            if not request:
+                return
+            if request.get('version') != __version__:
+                connection.send(fallback='daemon version {}'.format(__version__))
+                return
+            env = request.get('env') or {}
+            for name, value in self._env.items():
+                if env.get(name) != value:
+                    connection.send(fallback='{} differs from the daemon'.format(name))
+                    return
+            if not self._running.acquire(blocking=False):
+                connection.send(fallback='daemon busy')
+                return
+            try:
+                self._handle(connection, request)
+            finally:
+                self._running.release()
+        except (OSError, ValueError):
+            # Client went away or sent garbage
+            pass
+        finally:
+            connection.close()
+
+    def _handle(self, connection, request):
+        """Run a command: the standard streams, working directory and environment are the client's."""
+        connection.send(started=True)
+        stdin_tty, stdout_tty, stderr_tty = request.get('tty') or (False, False, False)
+        streams = sys.stdin, sys.stdout, sys.stderr
+        cwd = os.getcwd()
+        environ = dict(os.environ)
+        sys.stdin = _InputStream(connection, stdin_tty)
+        sys.stdout = _OutputStream(connection, 'out', stdout_tty)
+        sys.stderr = _OutputStream(connection, 'err', stderr_tty)
+        status = 0
+        try:
+            try:
+                os.chdir(request['cwd'])
+                if request.get('env') is not None:
+                    os.environ.clear()
+                    os.environ.update(request['env'])
+                self._pool.reset()
+                self._command.main(args=request['argv'], prog_name='oci-compute',
+                                   obj={'oci_factory': self._pool.get, 'oci_check': self._pool.check})
+            except Fallback as e:
+                # Raised before the command produced any output
+                status = None
+                reason = str(e)
+            except SystemExit as e:
+                if isinstance(e.code, int) or e.code is None:
+                    status = e.code or 0
+                else:
+                    sys.stderr.write('{}\n'.format(e.code))
+                    status = 1
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except Exception:
+                traceback.print_exc()
+                status = 1
+            finally:
+                sys.stdin, sys.stdout, sys.stderr = streams
+            if status is None:
+                connection.send(fallback=reason)
+                return
+            self.commands += 1
+            connection.send(exit=status)
+        finally:
+            # Still in the working directory and environment of the client
+            self._pool.run_deferred()
+            os.chdir(cwd)
+            if os.environ != environ:
+                os.environ.clear()
+                os.environ.update(environ)
+
+
+def forward(argv, socket_path=None):
+    """Run a command in the daemon, if one is running.
+
+    The output of the command is written to the standard output and error
+    streams as it is produced; input is read from the standard input when
+    the command prompts. The command is not run by the daemon when it does
+    not answer within HANDSHAKE_TIMEOUT, is busy with another command, or
+    runs with other global settings.
+
+    Parameters:
+        argv: the command line arguments
+        socket_path: the daemon socket (default: default_socket_path())
+
+    Returns:
+        The exit status of the command, or None if it was not run by a
+        daemon.
+
+    """
+    path = socket_path or default_socket_path()
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(HANDSHAKE_TIMEOUT)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    connection = _Connection(sock)
+    started = False
+    try:
+        connection.send(version=__version__,
+                        argv=argv,
+                        cwd=os.getcwd(),
+                        env=dict(os.environ),
+                        tty=[stream.isatty() for stream in (sys.stdin, sys.stdout, sys.stderr)])
+        while True:
+            frame = connection.receive()
+            if frame is None:
+                if not started:
+                    return None
+                sys.stderr.write('oci-compute: connection to the daemon lost\n')
+                return 1
+            if 'out' in frame:
+                sys.stdout.write(frame['out'])
+                sys.stdout.flush()
+            elif 'err' in frame:
+                sys.stderr.write(frame['err'])
+                sys.stderr.flush()
+            elif 'read' in frame:
+                connection.send(data=sys.stdin.readline())
+            elif 'started' in frame:
+                started = True
+                # Commands may run for long
+                sock.settimeout(None)
+            elif 'exit' in frame:
+                return frame['exit']
+            elif 'fallback' in frame:
+                return None
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into head): stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except OSError:
+        if not started:
+            return None
+        sys.stderr.write('oci-compute: connection to the daemon lost\n')
+        return 1
+    finally:
+        connection.close()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""OCI Compute fan-out helper.
+
+Run several listings concurrently (compartments, regions, profiles) and merge
+their results into a single stream.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from concurrent.futures import ThreadPoolExecutor
+from queue import Full, Queue
+from threading import Event
+
+# Items buffered per worker before the producers block
+QUEUE_DEPTH = 100
+
+# Polling interval of blocked producers (seconds)
+_POLL = 0.1
+
+# End of a producer: (_DONE, scope, exception or None)
+_DONE = object()
+
+
+def merge_iterators(scopes, iterate, max_workers=8, on_error=None):
+    """Iterate concurrently over several scopes, yielding items as they come.
+
+    Each scope is iterated in its own worker thread. Items are yielded in the
+    order they are produced, so the first results are available as soon as
+    the fastest scope returns them. Closing the iterator (e.g. once a limit
+    is reached) stops all producers.
+
+    Parameters:
+        scopes: list of scopes, e.g. (OciCompute, compartment_id) tuples
+        iterate: function called with a scope, returning an iterable
+        max_workers: number of scopes iterated concurrently
+        on_error: function called with (scope, exception) when a scope
+                  fails; the other scopes are still iterated. The exception
+                  is raised when on_error is None.
+
+    Yields:
+        (scope, item) tuples.
+
+    """
+    queue = Queue(maxsize=max_workers * QUEUE_DEPTH)
+    stop = Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                queue.put(entry, timeout=_POLL)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce(scope):
+        if stop.is_set():
+            return
+        iterable = None
+        error = None
+        try:
+            iterable = iterate(scope)
+            for item in iterable:
+                if not put((scope, item)):
+                    return
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close:
+                close()
+        put((_DONE, scope, error))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for scope in scopes:
+            executor.submit(produce, scope)
+        remaining = len(scopes)
+        while remaining:
+            entry = queue.get()
+            if entry[0] is _DONE:
+                remaining -= 1
+                _, scope, error = entry
+                if error is not None:
+                    if on_error is None:
+                        raise error
+                    on_error(scope, error)
+                continue
+            yield entry
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""OCI Compute golden boot volumes.
+
+Catalog of golden boot volumes: boot volumes of prepared instances (software
+installed and warmed up), cloned to provision new instances instead of
+creating their boot volume from an image. A golden image has a boot volume
+(replica) per Availability Domain it is replicated to, and a boot volume
+backup from which the replicas are restored; they are identified by a
+freeform tag whose value is the golden image name.
+
+A boot volume can only be cloned within its Availability Domain: instances
+are provisioned from the replica of their Availability Domain when there is
+one, otherwise from the backup (slower).
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import namedtuple
+
+# Freeform tag of the golden boot volumes and backups; its value is the
+# golden image name
+GOLDEN_TAG = 'oci-compute-golden'
+
+# Display name of the golden boot volumes and backups
+GOLDEN_DISPLAY_NAME = 'oci-compute-golden-{}'
+
+# Lifecycle states of the golden boot volumes and backups in the catalog
+GOLDEN_STATES = ('PROVISIONING', 'RESTORING', 'CREATING', 'REQUEST_RECEIVED', 'AVAILABLE')
+
+# A golden boot volume (kind 'volume') or boot volume backup (kind
+# 'backup'); availability_domain is None for a backup
+GoldenVolume = namedtuple('GoldenVolume', [
+    'name',
+    'id',
+    'kind',
+    'availability_domain',
+    'lifecycle_state',
+    'size_in_gbs',
+    'time_created',
+])
+
+
+class GoldenImage(namedtuple('GoldenImage', ['name', 'replicas', 'backup'])):
+    """A golden image: its replicas {Availability Domain: GoldenVolume} and its backup (GoldenVolume or None)."""
+
+    __slots__ = ()
+
+    def source(self, availability_domain):
+        """Return the GoldenVolume to clone in an Availability Domain, None if there is none.
+
+        The replica of the Availability Domain is preferred, the backup is
+        used otherwise; only available volumes are returned.
+        """
+        replica = self.replicas.get(availability_domain)
+        if replica and replica.lifecycle_state == 'AVAILABLE':
+            return replica
+        if self.backup and self.backup.lifecycle_state == 'AVAILABLE':
+            return self.backup
+        return None
+
+
+def golden_volume(resource, kind):
+    """Return the GoldenVolume of a tagged SDK BootVolume or BootVolumeBackup."""
+    return GoldenVolume((resource.freeform_tags or {}).get(GOLDEN_TAG),
+                        resource.id,
+                        kind,
+                        getattr(resource, 'availability_domain', None) if kind == 'volume' else None,
+                        resource.lifecycle_state,
+                        getattr(resource, 'size_in_gbs', None),
+                        resource.time_created)
+
+
+def golden_catalog(boot_volumes, backups):
+    """Return the golden images of tagged boot volumes and backups: {name: GoldenImage}.
+
+    Parameters:
+        boot_volumes: SDK BootVolume list
+        backups: SDK BootVolumeBackup list
+
+    When a golden image has several volumes in an Availability Domain (or
+    several backups), the newest available one is used.
+    """
+    volumes = [golden_volume(resource, 'volume') for resource in boot_volumes
+               if GOLDEN_TAG in (resource.freeform_tags or {}) and resource.lifecycle_state in GOLDEN_STATES]
+    volumes.extend(golden_volume(resource, 'backup') for resource in backups
+                   if GOLDEN_TAG in (resource.freeform_tags or {}) and resource.lifecycle_state in GOLDEN_STATES)
+    # Oldest and unavailable first, so that the newest available one wins
+    volumes.sort(key=lambda volume: (volume.lifecycle_state == 'AVAILABLE', volume.time_created))
+    catalog = {}
+    for volume in volumes:
+        image = catalog.setdefault(volume.name, GoldenImage(volume.name, {}, None))
+        if volume.kind == 'volume':
+            image.replicas[volume.availability_domain] = volume
+        else:
+            catalog[volume.name] = image._replace(backup=volume)
+    return catalog
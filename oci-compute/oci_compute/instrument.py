@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+
+"""OCI Compute instrumentation.
+
+Instrumentation helper class recording the SDK calls made by OciCompute
+(operation, latency, pages, retries, response size) and the phases of the
+operations (image lookup, agreement check, launch, wait...).
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import wraps
+import json
+import threading
+import time
+
+# An SDK call. A paginated list call records one CallRecord per page; page is
+# True for the continuation pages. retry is True when the call repeats the
+# previous (failed) call of the thread, e.g. pagination retries. attempts is
+# the number of HTTP requests sent (client retry strategy included) and bytes
+# the total size of the responses.
+CallRecord = namedtuple('CallRecord', [
+    'client',
+    'operation',
+    'start',
+    'duration',
+    'page',
+    'retry',
+    'attempts',
+    'bytes',
+    'status',
+    'error',
+    'phase',
+    'thread',
+])
+
+# A phase of an operation; parent is the name of the enclosing phase
+PhaseRecord = namedtuple('PhaseRecord', [
+    'name',
+    'start',
+    'duration',
+    'parent',
+    'error',
+    'thread',
+])
+
+# Operation name for requests sent outside of a client method (e.g. by the
+# SDK waiters)
+POLL_OPERATION = 'poll'
+
+
+def _response_bytes(headers):
+    try:
+        return int((headers or {}).get('content-length', 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+class InstrumentedClient(object):
+    """SDK client proxy recording the calls made through its methods."""
+
+    def __init__(self, client, name, instrumentation):
+        """Initialise the proxy."""
+        self._client = client
+        self._name = name
+        self._instrumentation = instrumentation
+
+    def __getattr__(self, attr):
+        """Return the client attribute, wrapping its public methods."""
+        value = getattr(self._client, attr)
+        if attr.startswith('_') or not callable(value):
+            return value
+        wrapped = self._instrumentation.wrap_method(self._name, value)
+        # Cache the wrapper: __getattr__ is not called for instance attributes
+        setattr(self, attr, wrapped)
+        return wrapped
+
+
+class Instrumentation(object):
+    """Record SDK calls and operation phases.
+
+    Listeners registered with add_listener are called synchronously with each
+    CallRecord and PhaseRecord as it completes, possibly from worker threads.
+    Times are in seconds; start times are relative to the creation of the
+    Instrumentation object.
+    """
+
+    def __init__(self):
+        """Initialise the instrumentation."""
+        self._start = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._listeners = []
+        self._calls = []
+        self._phases = []
+        self._threads = {}
+
+    def add_listener(self, listener):
+        """Register a function called with each CallRecord/PhaseRecord."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Unregister a listener."""
+        self._listeners.remove(listener)
+
+    @property
+    def calls(self):
+        """Return the list of recorded calls."""
+        with self._lock:
+            return list(self._calls)
+
+    @property
+    def phases(self):
+        """Return the list of recorded phases."""
+        with self._lock:
+            return list(self._phases)
+
+    def reset(self):
+        """Discard the recorded calls and phases."""
+        with self._lock:
+            self._calls = []
+            self._phases = []
+
+    def _thread(self):
+        """Return a small integer identifying the current thread."""
+        ident = threading.get_ident()
+        thread = self._threads.get(ident)
+        if thread is None:
+            with self._lock:
+                thread = self._threads.setdefault(ident, (len(self._threads), threading.current_thread().name))
+        return thread[0]
+
+    def _phase_stack(self):
+        stack = getattr(self._local, 'phases', None)
+        if stack is None:
+            stack = self._local.phases = []
+        return stack
+
+    def _record(self, record):
+        with self._lock:
+            (self._calls if isinstance(record, CallRecord) else self._phases).append(record)
+        for listener in list(self._listeners):
+            listener(record)
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager recording a phase.
+
+        Phases are tracked per thread and can be nested.
+        """
+        stack = self._phase_stack()
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        start = time.time()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            stack.pop()
+            self._record(PhaseRecord(name, start - self._start, time.time() - start, parent, error, self._thread()))
+
+    def current_phase(self):
+        """Return the name of the innermost phase of the current thread."""
+        stack = self._phase_stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def nested(self, parent):
+        """Context manager nesting the phases of the current thread under parent.
+
+        Used by worker threads so that their phases are attributed to the
+        phase of the thread which submitted the work (see current_phase).
+        The parent phase itself is not recorded again.
+        """
+        stack = self._phase_stack()
+        stack.append(parent)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def wrap(self, name, client):
+        """Return an instrumented proxy for an SDK client.
+
+        The HTTP requests of the client are also hooked to count retries and
+        response sizes, and to record the requests sent by the SDK waiters.
+        """
+        base_client = client.base_client
+        request = base_client.request
+
+        @wraps(request)
+        def instrumented_request(*args, **kwargs):
+            call = getattr(self._local, 'call', None)
+            if call is None:
+                # Not sent by a client method (e.g. oci.wait_until polling)
+                return self._call(name, kwargs.get('operation_name') or POLL_OPERATION, False,
+                                  instrumented_request, args, kwargs)
+            call['attempts'] += 1
+            try:
+                response = request(*args, **kwargs)
+            except Exception as e:
+                call['bytes'] += _response_bytes(getattr(e, 'headers', None))
+                raise
+            call['bytes'] += _response_bytes(response.headers)
+            return response
+
+        base_client.request = instrumented_request
+        return InstrumentedClient(client, name, self)
+
+    def wrap_method(self, client_name, method):
+        """Return a wrapper recording the calls to an SDK client method."""
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            return self._call(client_name, method.__name__, bool(kwargs.get('page')), method, args, kwargs)
+        return wrapper
+
+    def _call(self, client_name, operation, page, func, args, kwargs):
+        if getattr(self._local, 'call', None) is not None:
+            # Nested call, accounted for by the outer one
+            return func(*args, **kwargs)
+        call = self._local.call = {'attempts': 0, 'bytes': 0}
+        signature = (client_name, operation, args, kwargs)
+        retry = getattr(self._local, 'failed', None) == signature
+        self._local.failed = None
+        stack = self._phase_stack()
+        start = time.time()
+        status = error = None
+        try:
+            response = func(*args, **kwargs)
+            status = getattr(response, 'status', None)
+            return response
+        except Exception as e:
+            status = getattr(e, 'status', None)
+            error = getattr(e, 'code', None) or type(e).__name__
+            self._local.failed = signature
+            raise
+        finally:
+            self._local.call = None
+            self._record(CallRecord(client_name,
+                                    operation,
+                                    start - self._start,
+                                    time.time() - start,
+                                    page,
+                                    retry,
+                                    max(call['attempts'], 1),
+                                    call['bytes'],
+                                    status,
+                                    error,
+                                    stack[-1] if stack else None,
+                                    self._thread()))
+
+    def summary(self):
+        """Summarise the recorded calls per operation.
+
+        Returns:
+            List of (operation, calls, pages, retries, errors, bytes, total
+            time, max time) tuples, by decreasing total time. Paginated list
+            operations count as a single call; retried calls are counted as
+            retries only.
+
+        """
+        operations = {}
+        for call in self.calls:
+            stats = operations.setdefault('{}.{}'.format(call.client, call.operation), [0, 0, 0, 0, 0, 0.0, 0.0])
+            if call.retry:
+                stats[2] += 1
+            elif not call.page:
+                stats[0] += 1
+            if not call.retry:
+                stats[1] += 1
+            stats[2] += call.attempts - 1
+            stats[3] += 1 if call.error else 0
+            stats[4] += call.bytes
+            stats[5] += call.duration
+            stats[6] = max(stats[6], call.duration)
+        return sorted(((operation,) + tuple(stats) for operation, stats in operations.items()),
+                      key=lambda summary: -summary[6])
+
+    def phase_summary(self):
+        """Summarise the recorded phases.
+
+        Returns:
+            List of (phase, count, total time) tuples in order of first
+            occurrence.
+
+        """
+        phases = {}
+        for phase in sorted(self.phases, key=lambda phase: phase.start):
+            stats = phases.setdefault(phase.name, [0, 0.0])
+            stats[0] += 1
+            stats[1] += phase.duration
+        return [(name,) + tuple(stats) for name, stats in phases.items()]
+
+    def trace_events(self):
+        """Return the recorded calls and phases as Chrome trace events."""
+        events = []
+        for phase in self.phases:
+            events.append({
+                'name': phase.name,
+                'cat': 'phase',
+                'ph': 'X',
+                'ts': phase.start * 1e6,
+                'dur': phase.duration * 1e6,
+                'pid': 1,
+                'tid': phase.thread,
+                'args': {'error': str(phase.error)} if phase.error else {},
+            })
+        for call in self.calls:
+            events.append({
+                'name': '{}.{}'.format(call.client, call.operation),
+                'cat': 'api',
+                'ph': 'X',
+                'ts': call.start * 1e6,
+                'dur': call.duration * 1e6,
+                'pid': 1,
+                'tid': call.thread,
+                'args': {
+                    'page': call.page,
+                    'retry': call.retry,
+                    'attempts': call.attempts,
+                    'bytes': call.bytes,
+                    'status': call.status,
+                    'error': call.error,
+                },
+            })
+        events.sort(key=lambda event: (event['ts'], -event['dur']))
+        with self._lock:
+            threads = list(self._threads.values())
+        events.extend({
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': 1,
+            'tid': tid,
+            'args': {'name': thread_name},
+        } for tid, thread_name in threads)
+        return events
+
+    def write_trace(self, path):
+        """Write the Chrome trace-event JSON file (chrome://tracing, Perfetto)."""
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, f)
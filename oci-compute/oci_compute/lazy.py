@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+"""OCI Compute lazy import helper.
+
+Defer the import of heavy modules (the OCI SDK) until they are actually used.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Return a module which is only loaded on first attribute access.
+
+    Parameters:
+        name: the module name
+
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError('No module named {}'.format(name), name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+"""OCI Compute Marketplace index.
+
+MarketIndex helper class keeping a local, searchable index of the free
+Marketplace listings with their latest package and Application Catalog
+details.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from threading import Lock
+import time
+
+from .lazy import lazy_import
+
+oci = lazy_import('oci')
+
+# Listings are synchronised when the index is older than this (seconds)
+SYNC_INTERVAL = 86400
+
+# Listing details are fetched again after this delay (seconds)
+DETAILS_TTL = 86400
+
+# Index format version, older indexes are discarded
+INDEX_VERSION = 1
+
+# Latest package of a listing and its Application Catalog counterpart. Note
+# that the listing_id/version are different in the Marketplace and in the
+# Application Catalog! image is only retrieved when needed.
+MarketDetails = namedtuple('MarketDetails', [
+    'package',
+    'resource_version',
+    'image',
+    'time_retrieved',
+])
+
+
+def _summary_hash(listing):
+    return sha256(str(listing).encode('utf-8')).hexdigest()
+
+
+class MarketIndex(object):
+    """Local index of the free Marketplace listings.
+
+    The listing summaries are synchronised as a whole (the Marketplace does
+    not report modification times), but the details of a listing (latest
+    package, Application Catalog resource version, available regions and
+    compatible shapes) are only fetched again when its summary changed or
+    its details expired.
+
+    The index state is a plain picklable object (see dump/load) so that the
+    caller can persist it.
+    """
+
+    def __init__(self,
+                 marketplace_client,
+                 compute_client,
+                 max_workers=8,
+                 sync_interval=SYNC_INTERVAL,
+                 details_ttl=DETAILS_TTL):
+        """Initialise an empty index.
+
+        Parameters:
+            marketplace_client: SDK MarketplaceClient
+            compute_client: SDK ComputeClient (or function returning it)
+            max_workers: number of concurrent detail lookups
+            sync_interval: maximum age of the listing summaries
+            details_ttl: maximum age of the listing details
+
+        """
+        self._marketplace_client = marketplace_client
+        self._compute_client = compute_client
+        self._max_workers = max_workers
+        self._sync_interval = sync_interval
+        self._details_ttl = details_ttl
+        self._lock = Lock()
+        # {listing_id: (summary hash, listing summary)}
+        self._listings = {}
+        # {listing_id: MarketDetails}
+        self._details = {}
+        self._synced = 0
+        self.modified = False
+
+    def dump(self):
+        """Return the index state."""
+        with self._lock:
+            return (INDEX_VERSION, self._synced, dict(self._listings), dict(self._details))
+
+    def load(self, state):
+        """Restore the index state (see dump)."""
+        try:
+            version, synced, listings, details = state
+        except (TypeError, ValueError):
+            return
+        if version != INDEX_VERSION:
+            return
+        with self._lock:
+            self._synced, self._listings, self._details = synced, listings, details
+
+    @property
+    def stale(self):
+        """Return True if the listings need to be synchronised."""
+        return time.time() - self._synced > self._sync_interval
+
+    def sync(self):
+        """Synchronise the listing summaries.
+
+        Details of new, changed or removed listings are discarded.
+
+        Returns:
+            Tuple (added, changed, removed) listing counts.
+
+        """
+        listings = {}
+        for listing in oci.pagination.list_call_get_all_results_generator(
+                self._marketplace_client.list_listings, 'record', pricing=['FREE']):
+            listings[listing.id] = (_summary_hash(listing), listing)
+        with self._lock:
+            added = changed = 0
+            for listing_id, (summary_hash, _) in listings.items():
+                current = self._listings.get(listing_id)
+                if current is None:
+                    added += 1
+                elif current[0] != summary_hash:
+                    changed += 1
+                    self._details.pop(listing_id, None)
+            removed = set(self._listings) - set(listings)
+            for listing_id in removed:
+                self._details.pop(listing_id, None)
+            self._listings = listings
+            self._synced = time.time()
+            self.modified = True
+        return added, changed, len(removed)
+
+    def find(self, name=None, publisher=None):
+        """Return the listings matching name and publisher.
+
+        Parameters:
+            name: substring of the listing name
+            publisher: substring of the publisher name (case insensitive)
+
+        Returns:
+            List of listing summaries.
+
+        """
+        publisher = publisher.lower() if publisher else None
+        return [listing for _, listing in self._listings.values()
+                if (not name or name in listing.name)
+                and (not publisher or publisher in listing.publisher.name.lower())]
+
+    def _compute(self):
+        return self._compute_client() if callable(self._compute_client) else self._compute_client
+
+    def _fetch_details(self, listing_id):
+        packages = self._marketplace_client.list_packages(listing_id,
+                                                          sort_by='TIMERELEASED',
+                                                          sort_order='DESC').data
+        if not packages:
+            return None
+        package = self._marketplace_client.get_package(listing_id, packages[0].package_version).data
+        if not package:
+            return None
+        resource_version = self._compute().get_app_catalog_listing_resource_version(
+            package.app_catalog_listing_id,
+            package.app_catalog_listing_resource_version).data
+        if not resource_version:
+            return None
+        return MarketDetails(package, resource_version, None, time.time())
+
+    def _fresh(self, details, image=False):
+        return (details is not None
+                and time.time() - details.time_retrieved <= self._details_ttl
+                and (details.image is not None or not image))
+
+    def has_details(self, listing_id, image=False):
+        """Return True if the index has fresh details for the listing."""
+        return self._fresh(self._details.get(listing_id), image)
+
+    def details(self, listing_id, image=False, refresh=False):
+        """Return the details of a listing, fetching them if needed.
+
+        Parameters:
+            listing_id: the listing OCID
+            image: also retrieve the image
+            refresh: ignore the indexed details
+
+        Returns:
+            MarketDetails, None if the listing has no package.
+
+        """
+        details = None if refresh else self._details.get(listing_id)
+        if self._fresh(details, image):
+            return details
+        if not self._fresh(details):
+            details = self._fetch_details(listing_id)
+        if details and image and details.image is None:
+            image = self._compute().get_image(details.resource_version.listing_resource_id).data
+            details = details._replace(image=image)
+        with self._lock:
+            if details:
+                self._details[listing_id] = details
+            else:
+                self._details.pop(listing_id, None)
+            self.modified = True
+        return details
+
+    def fetch_details(self, listing_ids):
+        """Fetch concurrently the details missing or expired for listings.
+
+        Listings whose details cannot be retrieved are skipped.
+        """
+        missing = [listing_id for listing_id in listing_ids if not self._fresh(self._details.get(listing_id))]
+
+        def fetch(listing_id):
+            try:
+                self.details(listing_id)
+            except (oci.exceptions.ServiceError, oci.exceptions.RequestException):
+                pass
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+                list(executor.map(fetch, missing))
+
+    def search(self, name=None, publisher=None, shape=None, region=None):
+        """Return the listings matching all the given criteria.
+
+        Shape and region criteria require the listing details, which are
+        fetched (concurrently) when missing.
+
+        Parameters:
+            name: substring of the listing name
+            publisher: substring of the publisher name (case insensitive)
+            shape: compatible shape
+            region: available region (e.g. 'us-ashburn-1')
+
+        Returns:
+            List of (listing summary, MarketDetails) tuples; details are None
+            when neither shape nor region is given.
+
+        """
+        listings = self.find(name, publisher)
+        if not shape and not region:
+            return [(listing, None) for listing in listings]
+        self.fetch_details([listing.id for listing in listings])
+        results = []
+        for listing in listings:
+            details = self._details.get(listing.id)
+            if not details:
+                continue
+            if shape and shape not in details.resource_version.compatible_shapes:
+                continue
+            if region and region not in details.resource_version.available_regions:
+                continue
+            results.append((listing, details))
+        return results
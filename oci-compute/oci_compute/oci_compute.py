@@ -10,16 +10,184 @@ https://oss.oracle.com/licenses/upl
 
 SPDX-License-Identifier: UPL-1.0
 """
+from collections import Counter, namedtuple
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from copy import copy
+from functools import wraps
+from itertools import chain, islice
 from os.path import basename
+import re
 import sys
+from threading import Lock
+import time
 
 from click import confirm, echo, secho
-import oci
+
+from .cache import ResponseCache
+from .connections import ConnectionPools
+from .fanout import merge_iterators
+from .golden import GOLDEN_DISPLAY_NAME, GOLDEN_TAG, golden_catalog, golden_volume
+from .instrument import Instrumentation
+from .lazy import lazy_import
+from .market_index import MarketIndex
+from .placement import format_placement, out_of_capacity, PlacementError, short_name
+from .pool import POOL_DISPLAY_NAME, POOL_STATES, POOL_TAG, PoolMaintenance, pool_profile, profile_key
+from .records import (CompartmentRecord, compartment_record, image_record, instance_record, summary_image_record,
+                      summary_instance_record, vnic_record)
+from .scheduler import RequestScheduler
+from .search import BACKEND_AUTO, BACKEND_LIST, BACKEND_SEARCH, SEARCH_BATCH, structured_query
+from .task_graph import TaskGraph
+from .waiter import LifecycleWaiter, list_pages, use_get
+
+oci = lazy_import('oci')
 
 
 # OS name for Custom images
 CUSTOM_OS = ('Custom', 'Zero')
 
+# Default number of concurrent SDK calls
+MAX_WORKERS = 8
+
+# The instance iterator requests pages of `limit` instances when the limit is
+# below this size
+LIST_PAGE_SIZE = 100
+
+# Above this number of instances, VNIC attachments are retrieved for the whole
+# compartment in a single (paginated) call instead of once per instance
+COMPARTMENT_WIDE_THRESHOLD = 4
+
+# Instance actions: (SDK action, target lifecycle state). Termination has its
+# own API call.
+INSTANCE_ACTIONS = {
+    'terminate': (None, 'TERMINATED'),
+    'start': ('START', 'RUNNING'),
+    'shutdown': ('SOFTSTOP', 'STOPPED'),
+}
+
+# Launch errors which may denote a stale cached resolution: OCID not found,
+# or authorization errors for cached agreements and subscriptions (see
+# stale_resolution)
+STALE_OCID_STATUS = (401, 403)
+STALE_OCID_CODE = 'NotAuthorizedOrNotFound'
+
+# Display name range pattern for bulk provisioning, e.g. 'web-{01..40}'
+DISPLAY_NAME_RANGE = re.compile(r'\{(\d+)\.\.(\d+)\}')
+
+# Timings of a provisioned instance, in seconds from the start of the launch
+# phase: launch request completed, Running state, port open and ready (see
+# readiness.ProbeResult); None when not reached or not waited for
+LaunchTiming = namedtuple('LaunchTiming', [
+    'display_name',
+    'launched',
+    'running',
+    'port_open',
+    'ready',
+])
+
+
+def instance_row(instance, vnic):
+    """Return the instance list row for an instance and its primary VNIC.
+
+    Returns:
+        Tuple (id, display name, AD, time created, state, private IP, public
+        IP).
+
+    """
+    return (
+        instance.id,
+        instance.display_name,
+        instance.availability_domain[-4:],
+        instance.time_created.strftime("%Y-%m-%d %H:%M:%S %Z"),
+        instance.lifecycle_state.title(),
+        vnic.private_ip if vnic else 'None',
+        vnic.public_ip if vnic else 'None'
+    )
+
+
+def expand_display_names(display_name, count=None):
+    """Expand a display name pattern for bulk provisioning.
+
+    A '{first..last}' range in the display name is expanded, keeping the
+    zero padding of its bounds (e.g. 'web-{01..40}'). Without range, names
+    are suffixed with a sequence number when count is greater than 1.
+
+    Parameters:
+        display_name: display name or display name pattern, or list of
+                      display names (returned as is)
+        count: number of instances (default: range size, or 1)
+
+    Returns:
+        List of display names.
+
+    """
+    if isinstance(display_name, (list, tuple)):
+        return list(display_name)
+    match = DISPLAY_NAME_RANGE.search(display_name)
+    if match:
+        first, last = int(match.group(1)), int(match.group(2))
+        if last < first:
+            raise ValueError('Invalid range in display name "{}"'.format(display_name))
+        width = len(match.group(1))
+        names = ['{}{:0{}d}{}'.format(display_name[:match.start()], i, width, display_name[match.end():])
+                 for i in range(first, last + 1)]
+        if count is not None and count != len(names):
+            raise ValueError('Display name "{}" expands to {} names but count is {}'.format(
+                display_name, len(names), count))
+        return names
+    if not count or count == 1:
+        return [display_name]
+    width = len(str(count))
+    return ['{}-{:0{}d}'.format(display_name, i, width) for i in range(1, count + 1)]
+
+
+def stale_resolution(error):
+    """Return True if a launch error may denote a stale cached resolution.
+
+    Capacity, limit and parameter errors do not: retrying with fresh lookups
+    would fail the same way.
+    """
+    if not isinstance(error, oci.exceptions.ServiceError) or out_of_capacity(error):
+        return False
+    return error.status in STALE_OCID_STATUS or (error.status == 404 and error.code == STALE_OCID_CODE)
+
+
+class StaleResolutionError(Exception):
+    """Launch rejected while using cached name to OCID resolutions."""
+
+    pass
+
+
+def _resolution_retry(func):
+    """Retry provisioning with fresh lookups when a cached OCID is rejected.
+
+    Cached resolutions are not validated upfront: if the launch fails while
+    using some of them, they are invalidated and the whole provisioning is
+    attempted once more with fresh lookups.
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        self._resolution_hits = []
+        try:
+            return func(self, *args, **kwargs)
+        except StaleResolutionError as e:
+            self._forget_resolutions(e)
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self._resolution_bypass = False
+    return wrapper
+
+
+def _phased(name):
+    """Record the decorated method as an instrumentation phase."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self._phase(name):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
 
 class OciCompute(object):
     """Interface with the OCI SDK."""
@@ -27,22 +195,243 @@ class OciCompute(object):
     def __init__(self,
                  config_file,
                  profile,
-                 verbose=False):
+                 verbose=False,
+                 max_workers=MAX_WORKERS,
+                 use_cache=True,
+                 refresh_cache=False,
+                 service_endpoint=None,
+                 instrumentation=None,
+                 query_backend=BACKEND_AUTO,
+                 scheduler=None,
+                 memory_cache=False,
+                 connections=None,
+                 background=None):
         """Initialise the class.
 
-        Config files are read and validated, SDK clients are instantiated.
+        Config files are read and validated. SDK clients are instantiated on
+        first use.
+
+        Parameters:
+            use_cache: keep image and listing catalogs in the on-disk cache
+            refresh_cache: ignore cached entries (they are still updated)
+            service_endpoint: endpoint for all the SDK clients instead of the
+                              regional service endpoints (e.g. for testing)
+            instrumentation: Instrumentation object recording the SDK calls
+                             and the operation phases (a new one is created
+                             by default)
+            query_backend: default backend of the instance and image queries
+                           (search.BACKEND_AUTO, BACKEND_SEARCH or
+                           BACKEND_LIST), see query_instances
+            scheduler: RequestScheduler through which the requests of the
+                       SDK clients are sent (a new one is created by
+                       default); share it between instances used
+                       concurrently
+            memory_cache: also keep the cache entries in memory, for
+                          long-running processes (see daemon)
+            connections: ConnectionPools shared by the SDK clients (new
+                         pools are created by default); share them between
+                         instances used concurrently
+            background: function(function, *args) running the work nobody
+                        waits for (warm pool refills); by default each runs
+                        in its own thread
+
         """
         self._verbose = verbose
+        self._max_workers = max_workers
+        self._query_backend = query_backend
         self._cli = format(basename(sys.argv[0]))
+        self._profile = profile
 
         # Load OCI config file
         self._config = oci.config.from_file(config_file, profile)
 
-        # Instantiate clients
-        self._compute_client = oci.core.ComputeClient(self._config)
-        self._identity_client = oci.identity.IdentityClient(self._config)
-        self._virtual_network_client = oci.core.VirtualNetworkClient(self._config)
-        self._marketplace_client = oci.marketplace.MarketplaceClient(self._config)
+        self._cache = ResponseCache(enabled=use_cache, refresh=refresh_cache, memory=memory_cache)
+        # Cached resolutions used during the current provisioning
+        self._resolution_hits = []
+        self._resolution_bypass = False
+        # Local Marketplace index, loaded on first use
+        self._market_index = None
+        # Task and instance timings, placements and warm pool hand-outs of
+        # the last provisioning
+        self._task_timings = []
+        self._launch_timings = {}
+        self._placements = None
+        self._pool_hits = []
+
+        # All SDK clients are instrumented, and their requests scheduled
+        self._instrumentation = instrumentation or Instrumentation()
+        self._scheduler = scheduler or RequestScheduler()
+        # All SDK clients share the HTTP connections
+        self._connections = connections or ConnectionPools()
+        # Runner of the work nobody waits for
+        self._background = background or self._detached
+
+        # SDK clients, instantiated on first use
+        self._client_kwargs = {'service_endpoint': service_endpoint} if service_endpoint else {}
+        self._clients = {}
+        self._clients_lock = Lock()
+        # OciCompute views on other regions (see for_region), shared by all
+        # the views
+        self._regions = {}
+        # Number of pages of the last instance listing of each compartment
+        # (see instance_states), shared by the views on the region
+        self._list_pages = {}
+
+    """SDK clients."""
+
+    def _client(self, name, client_class):
+        """Return the named SDK client, instantiating it if needed.
+
+        Parameters:
+            name: client name
+            client_class: function returning the SDK client class; only called
+                          when the client is instantiated so that the SDK
+                          service module is imported on first use
+
+        """
+        client = self._clients.get(name)
+        if client is None:
+            with self._clients_lock:
+                client = self._clients.get(name)
+                if client is None:
+                    sdk_client = client_class()(self._config,
+                                                **dict(self._client_kwargs, **RequestScheduler.client_kwargs()))
+                    self._connections.mount(sdk_client.base_client)
+                    client = self._instrumentation.wrap(name, sdk_client)
+                    # Each attempt goes through the instrumentation
+                    self._scheduler.wrap(name, self.region, sdk_client.base_client)
+                    self._clients[name] = client
+        return client
+
+    @property
+    def profile(self):
+        """Return the config profile name."""
+        return self._profile
+
+    @property
+    def max_workers(self):
+        """Return the maximum number of concurrent SDK calls."""
+        return self._max_workers
+
+    @property
+    def region(self):
+        """Return the region of the SDK clients."""
+        return self._config.get('region')
+
+    def for_region(self, region):
+        """Return an OciCompute view on another region.
+
+        The view has its own SDK clients (and connection pools) for that
+        region, and shares the configuration, cache and instrumentation.
+        Views are kept so that connections are reused across calls.
+
+        Parameters:
+            region: the region name (e.g. 'eu-frankfurt-1')
+
+        """
+        if region == self.region:
+            return self
+        with self._clients_lock:
+            view = self._regions.get(region)
+            if view is None:
+                view = copy(self)
+                view._config = dict(self._config, region=region)
+                view._clients = {}
+                view._clients_lock = Lock()
+                view._resolution_hits = []
+                view._market_index = None
+                view._task_timings = []
+                view._list_pages = {}
+                view._launch_timings = {}
+                view._placements = None
+                view._pool_hits = []
+                self._regions[region] = view
+        return view
+
+    def fork(self):
+        """Return a view for concurrent operations.
+
+        Provisioning keeps per-operation state (cached resolutions used,
+        task timings): operations running concurrently in several threads
+        must each use their own view. The view shares the SDK clients,
+        configuration, cache, instrumentation and scheduler.
+        """
+        view = copy(self)
+        view._resolution_hits = []
+        view._resolution_bypass = False
+        view._task_timings = []
+        view._launch_timings = {}
+        view._placements = None
+        view._pool_hits = []
+        return view
+
+    @property
+    def _compute_client(self):
+        return self._client('compute', lambda: oci.core.ComputeClient)
+
+    @property
+    def _compute_composite(self):
+        # Composite operations on the compute client, kept with the clients
+        composite = self._clients.get('compute_composite')
+        if composite is None:
+            composite = oci.core.ComputeClientCompositeOperations(self._compute_client)
+            composite = self._clients.setdefault('compute_composite', composite)
+        return composite
+
+    @property
+    def _identity_client(self):
+        return self._client('identity', lambda: oci.identity.IdentityClient)
+
+    @property
+    def _virtual_network_client(self):
+        return self._client('virtual_network', lambda: oci.core.VirtualNetworkClient)
+
+    @property
+    def _marketplace_client(self):
+        return self._client('marketplace', lambda: oci.marketplace.MarketplaceClient)
+
+    @property
+    def _search_client(self):
+        return self._client('search', lambda: oci.resource_search.ResourceSearchClient)
+
+    @property
+    def _work_request_client(self):
+        return self._client('work_request', lambda: oci.work_requests.WorkRequestClient)
+
+    @property
+    def _blockstorage_client(self):
+        return self._client('blockstorage', lambda: oci.core.BlockstorageClient)
+
+    """Instrumentation."""
+
+    @property
+    def instrumentation(self):
+        """Return the Instrumentation object.
+
+        Use its add_listener method to be called back with each SDK call and
+        operation phase.
+        """
+        return self._instrumentation
+
+    @property
+    def scheduler(self):
+        """Return the RequestScheduler of the SDK requests.
+
+        Its stats and service_stats methods return the throttling counters.
+        """
+        return self._scheduler
+
+    @property
+    def connections(self):
+        """Return the ConnectionPools of the SDK clients.
+
+        Its stats and endpoint_stats methods return the pool counters.
+        """
+        return self._connections
+
+    def _phase(self, name):
+        """Return a context manager recording an operation phase."""
+        return self._instrumentation.phase(name)
 
     """Helpers to display messages."""
 
@@ -70,6 +459,87 @@ class OciCompute(object):
         if self._verbose or force:
             echo(message, nl=nl)
 
+    def _cached_call(self, resource, list_func, *args, paginate=True, record=None, **kwargs):
+        """Call an SDK list method through the response cache.
+
+        Parameters:
+            resource: resource type (see cache.CACHE_TTL)
+            list_func: the SDK list method
+            paginate: retrieve all pages (True) or only the first one (False)
+            record: function converting each SDK model to a compact record
+                    (see records), applied before caching
+            args, kwargs: list method arguments
+
+        Returns:
+            The response data.
+
+        """
+        if paginate:
+            return list(self._iter_cached(resource, list_func, *args, record=record, **kwargs))
+        key = ResponseCache.key(self._profile, self._config.get('region'), list_func.__name__, args, kwargs)
+        data = None if self._resolution_bypass else self._cache.get(resource, key)
+        if data is None:
+            data = list_func(*args, **kwargs).data
+            if record:
+                data = [record(item) for item in data]
+            self._cache.set(resource, key, data)
+        elif record:
+            data = [record(item) for item in data]
+        return data
+
+    def _iter_cached(self, resource, list_func, *args, record=None, **kwargs):
+        """Iterate over the records of an SDK list method through the cache.
+
+        Records are yielded as the pages are retrieved. The result is only
+        cached when the iteration completes.
+
+        Parameters:
+            resource: resource type (see cache.CACHE_TTL)
+            list_func: the SDK list method
+            record: function converting each SDK model to a compact record
+                    (see records); the SDK models of a page are dropped
+                    before the next page is retrieved
+            args, kwargs: list method arguments
+
+        """
+        key = ResponseCache.key(self._profile, self._config.get('region'), list_func.__name__, args, kwargs)
+        data = None if self._resolution_bypass else self._cache.get(resource, key)
+        if data is not None:
+            yield from (map(record, data) if record else data)
+            return
+        data = []
+        for item in oci.pagination.list_call_get_all_results_generator(list_func, 'record', *args, **kwargs):
+            if record:
+                item = record(item)
+            data.append(item)
+            yield item
+        self._cache.set(resource, key, data)
+
+    def _resolve(self, resource, key_parts, lookup):
+        """Resolve a name to an OCI resource through the resolution cache.
+
+        Parameters:
+            resource: resource type (see cache.CACHE_TTL)
+            key_parts: tuple identifying the name to resolve
+            lookup: function performing the actual lookup
+
+        Returns:
+            The resolved resource or None if it cannot be found.
+
+        """
+        key = ResponseCache.key(self._profile, self._config.get('region'), 'resolve', key_parts)
+        if not self._resolution_bypass:
+            value = self._cache.get(resource, key)
+            if value is not None:
+                self._echo_message_kv('Cached resolution', ' / '.join(str(part) for part in key_parts))
+                self._resolution_hits.append(key)
+                return value
+        value = lookup()
+        if value is not None:
+            self._cache.set(resource, key, value)
+        return value
+
+    @_phased('availability domain lookup')
     def _get_availability_domain(self, compartment_id, availability_domain):
         """Retrieve matching Availability Domain name.
 
@@ -79,16 +549,20 @@ class OciCompute(object):
 
         """
         self._echo_header('Retrieving Availability Domain')
-        availability_domains = oci.pagination.list_call_get_all_results(
-            self._identity_client.list_availability_domains,
-            compartment_id
-        ).data
 
-        ad_match = [ad for ad in availability_domains if availability_domain.upper() in ad.name]
+        def lookup():
+            availability_domains = oci.pagination.list_call_get_all_results(
+                self._identity_client.list_availability_domains,
+                compartment_id
+            ).data
+            ad_match = [ad for ad in availability_domains if availability_domain.upper() in ad.name]
+            return ad_match[0] if ad_match else None
+
+        ad_match = self._resolve('resolution', ('ad', compartment_id, availability_domain.upper()), lookup)
 
         if ad_match:
-            self._echo_message_kv('Name', ad_match[0].name)
-            return ad_match[0]
+            self._echo_message_kv('Name', ad_match.name)
+            return ad_match
         else:
             self._echo_error('No AD found matching "{}"'.format(availability_domain))
             return None
@@ -97,6 +571,7 @@ class OciCompute(object):
         """Wait animation for oci.wait_until."""
         self._echo('.', nl=False)
 
+    @_phased('subnet lookup')
     def _get_subnet(self, compartment_id, vcn_name, subnet_name):
         """Retrieve the matching subnet in a VCN.
 
@@ -106,38 +581,130 @@ class OciCompute(object):
             compartment_id: Compartment OCID
 
         """
-        self._echo_header('Retrieving VCN')
-        vcns = self._virtual_network_client.list_vcns(compartment_id, display_name=vcn_name).data
+        self._echo_header('Retrieving VCN and subnet')
 
-        if not vcns:
-            self._echo_error('No matching VCN for "{}"'.format(vcn_name))
-            return None
+        def lookup():
+            vcns = self._virtual_network_client.list_vcns(compartment_id, display_name=vcn_name).data
 
-        vcn = vcns[0]
-        self._echo_message_kv('Name', vcn.display_name)
+            if not vcns:
+                self._echo_error('No matching VCN for "{}"'.format(vcn_name))
+                return None
 
-        self._echo_header('Retrieving subnet')
-        subnets = self._virtual_network_client.list_subnets(compartment_id,
-                                                            vcn_id=vcn.id,
-                                                            display_name=subnet_name).data
+            vcn = vcns[0]
+            self._echo_message_kv('Name', vcn.display_name)
 
-        if not subnets:
-            self._echo_error('No matching subnet for "{}"'.format(subnet_name))
-            return None
-        else:
-            subnet = subnets[0]
+            subnets = self._virtual_network_client.list_subnets(compartment_id,
+                                                                vcn_id=vcn.id,
+                                                                display_name=subnet_name).data
+
+            if not subnets:
+                self._echo_error('No matching subnet for "{}"'.format(subnet_name))
+                return None
+            return subnets[0]
+
+        subnet = self._resolve('resolution', ('subnet', compartment_id, vcn_name, subnet_name), lookup)
+        if subnet:
             self._echo_message_kv('Subnet', subnet.display_name)
-            return subnet
+        return subnet
 
+    @_phased('placement lookup')
+    def _get_placements(self, policy, compartment_id, shape, image, subnet, availability_domains):
+        """Return the candidate placements of a provisioning.
+
+        Parameters:
+            policy: placement.PlacementPolicy
+            compartment_id: Compartment OCID
+            shape: the shape of the provisioning (compatible with the image)
+            image: the image to launch
+            subnet: the subnet of the instances
+            availability_domains: the Availability Domains, in order
+
+        Returns:
+            placement.Placements, None if there is no candidate.
+
+        """
+        self._echo_header('Selecting placements')
+        shapes = [shape]
+        for alternate in policy.shapes(shape)[1:]:
+            try:
+                self._compute_client.get_image_shape_compatibility_entry(image.id, alternate)
+            except oci.exceptions.ServiceError as e:
+                if e.status != 404:
+                    raise
+                self._echo_message_kv('Incompatible shape', alternate)
+                continue
+            shapes.append(alternate)
+
+        names = [availability_domain.name for availability_domain in availability_domains]
+        # Subnets are either regional or specific to an Availability Domain
+        subnet_ad = getattr(subnet, 'availability_domain', None)
+        if subnet_ad and subnet_ad in names and len(names) > 1:
+            self._echo_message_kv('Subnet restricted to', subnet_ad)
+            names = [subnet_ad]
+
+        placements = policy.placements(shapes, names)
+        if policy.capacity_check:
+            self._check_capacity(compartment_id, placements)
+        if not placements.candidates:
+            self._echo_error('No placement available')
+            return None
+        for placement in placements.candidates:
+            self._echo_message_kv('Placement', format_placement(placement))
+        return placements
+
+    @_phased('capacity check')
+    def _check_capacity(self, compartment_id, placements):
+        """Order placements by capacity, with the compute capacity report.
+
+        One report is requested per Availability Domain, concurrently. The
+        placements of an Availability Domain whose report is not available
+        keep their order.
+        """
+        self._echo_header('Checking capacity')
+        by_availability_domain = {}
+        for placement in placements.candidates:
+            by_availability_domain.setdefault(placement.availability_domain, []).append(placement)
+
+        def report(availability_domain):
+            candidates = by_availability_domain[availability_domain]
+            details = oci.core.models.CreateComputeCapacityReportDetails(
+                compartment_id=compartment_id,
+                availability_domain=availability_domain,
+                shape_availabilities=[oci.core.models.CreateCapacityReportShapeAvailabilityDetails(
+                    instance_shape=placement.shape,
+                    fault_domain=placement.fault_domain) for placement in candidates])
+            statuses = {}
+            for availability in self._compute_client.create_compute_capacity_report(details).data.shape_availabilities:
+                statuses[(availability.instance_shape, availability.fault_domain)] = availability.availability_status
+                statuses.setdefault((availability.instance_shape, None), availability.availability_status)
+            return {placement: statuses.get((placement.shape, placement.fault_domain)) for placement in candidates}
+
+        capacity = {}
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {executor.submit(report, availability_domain): availability_domain
+                       for availability_domain in by_availability_domain}
+            for future in as_completed(futures):
+                try:
+                    capacity.update(future.result())
+                except oci.exceptions.ServiceError as e:
+                    self._echo_error('No capacity report for {}: {}'.format(short_name(futures[future]), e.message))
+        for placement in placements.candidates:
+            self._echo_message_kv(format_placement(placement), capacity.get(placement) or 'Not reported')
+        placements.order_by_capacity(capacity)
+
+    @_phased('agreement check')
     def _market_agreements(self,
                            compartment_id,
                            listing_id,
                            version):
-        """Ensure image Terms Of Use are accepted.
+        """Return the image Terms Of Use which are not accepted yet.
 
         For Marketplace images, the various Terms Of Use need to be accepted.
-        This method search for already accepted TOU and prompt for acceptance if
-        needed.
+        This method search for already accepted TOU; the others are accepted
+        with _accept_agreements.
+
+        Acceptance is recorded in the cache, per compartment, listing and
+        version.
 
         Parameters:
             compartment_id: the unique identifier for the compartment.
@@ -145,10 +712,17 @@ class OciCompute(object):
             version: the version of the package.
 
         Returns:
-            True if TOU are accepted. False otherwise.
+            List of the agreements not accepted yet, empty if they all are.
 
         """
         self._echo_header('Checking agreements acceptance')
+        key = ResponseCache.key(self._profile, self._config.get('region'), 'agreements',
+                                compartment_id, listing_id, version)
+        if not self._resolution_bypass and self._cache.get('agreements', key):
+            self._echo_message('Agreements already accepted (cached)')
+            self._resolution_hits.append(key)
+            return []
+
         agreements = self._marketplace_client.list_agreements(listing_id, version).data
         accepted_agreements = self._marketplace_client.list_accepted_agreements(
             compartment_id,
@@ -162,32 +736,65 @@ class OciCompute(object):
             if not agreement_match:
                 not_accepted.append(agreement)
 
-        if not_accepted:
-            self._echo_message('This image is subject to the following agreement(s):', force=True)
-            for agreement in not_accepted:
-                self._echo_message('- {}'.format(agreement.prompt), force=True)
-                self._echo_message('  Link: {}'.format(agreement.content_url), force=True)
-            if confirm('I have reviewed and accept the above agreement(s)'):
-                self._echo_message('Accepting agreement(s)')
-                for agreement in not_accepted:
-                    agreement_detail = self._marketplace_client.get_agreement(
-                        listing_id,
-                        version,
-                        agreement.id).data
-                    accepted_agreement_details = oci.marketplace.models.CreateAcceptedAgreementDetails(
-                        agreement_id=agreement.id,
-                        compartment_id=compartment_id,
-                        listing_id=listing_id,
-                        package_version=version,
-                        signature=agreement_detail.signature)
-                    self._marketplace_client.create_accepted_agreement(accepted_agreement_details)
-            else:
-                self._echo_error('Agreements not accepted')
-                return False
-        else:
+        if not not_accepted:
             self._echo_message('Agreements already accepted')
+            self._cache.set('agreements', key, True)
+        return not_accepted
+
+    @_phased('agreement acceptance')
+    def _accept_agreements(self,
+                           compartment_id,
+                           listing_id,
+                           version,
+                           not_accepted,
+                           accept=None):
+        """Accept image Terms Of Use.
+
+        The agreements are displayed, then the user is prompted for
+        acceptance: this must run on the calling thread, not in a task graph
+        worker.
+
+        Parameters:
+            compartment_id: the unique identifier for the compartment.
+            listing_id: the unique identifier for the listing.
+            version: the version of the package.
+            not_accepted: the agreements to accept, see _market_agreements.
+            accept: accept the TOU without prompting (True), refuse them
+                    (False) or prompt (None).
+
+        Returns:
+            True if TOU are accepted. False otherwise.
+
+        """
+        self._echo_message('This image is subject to the following agreement(s):', force=True)
+        for agreement in not_accepted:
+            self._echo_message('- {}'.format(agreement.prompt), force=True)
+            self._echo_message('  Link: {}'.format(agreement.content_url), force=True)
+        if accept is None:
+            accept = confirm('I have reviewed and accept the above agreement(s)')
+        if not accept:
+            self._echo_error('Agreements not accepted')
+            return False
+
+        self._echo_message('Accepting agreement(s)')
+        for agreement in not_accepted:
+            agreement_detail = self._marketplace_client.get_agreement(
+                listing_id,
+                version,
+                agreement.id).data
+            accepted_agreement_details = oci.marketplace.models.CreateAcceptedAgreementDetails(
+                agreement_id=agreement.id,
+                compartment_id=compartment_id,
+                listing_id=listing_id,
+                package_version=version,
+                signature=agreement_detail.signature)
+            self._marketplace_client.create_accepted_agreement(accepted_agreement_details)
+        key = ResponseCache.key(self._profile, self._config.get('region'), 'agreements',
+                                compartment_id, listing_id, version)
+        self._cache.set('agreements', key, True)
         return True
 
+    @_phased('app catalog subscription')
     def _app_catalog_subscribe(self,
                                compartment_id,
                                listing_id,
@@ -198,6 +805,9 @@ class OciCompute(object):
         Application Catalog. We do not prompt for the TOU as we already agreed
         in the Marketplace.
 
+        The subscription is recorded in the cache, per compartment, listing
+        and version.
+
         Parameters:
             compartment_id: the unique identifier for the compartment.
             listing_id: the OCID of the listing.
@@ -205,6 +815,13 @@ class OciCompute(object):
 
         """
         self._echo_header('Checking Application Catalog subscription')
+        key = ResponseCache.key(self._profile, self._config.get('region'), 'subscription',
+                                compartment_id, listing_id, resource_version)
+        if not self._resolution_bypass and self._cache.get('subscriptions', key):
+            self._echo_message('Already subscribed (cached)')
+            self._resolution_hits.append(key)
+            return
+
         app_catalog_subscriptions = self._compute_client.list_app_catalog_subscriptions(
             compartment_id=compartment_id,
             listing_id=listing_id
@@ -226,35 +843,172 @@ class OciCompute(object):
                 time_retrieved=app_catalog_listing_agreements.time_retrieved
             )
             self._compute_client.create_app_catalog_subscription(app_catalog_subscription_detail).data
+        self._cache.set('subscriptions', key, True)
 
-    def _provision_image(self,
-                         image,
-                         compartment_id,
-                         display_name,
-                         shape,
-                         availability_domain,
-                         vcn_name,
-                         vcn_compartment_id,
-                         subnet_name,
-                         ssh_authorized_keys_file,
-                         cloud_init_file):
-        """Actual image provisioning."""
-        self._echo_header('Image selected:')
-        self._echo_message_kv('Name', image.display_name)
-        self._echo_message_kv('Created', image.time_created)
-        self._echo_message_kv('Operating System', image.operating_system)
-        self._echo_message_kv('Operating System version', image.operating_system_version)
-
-        availability_domain = self._get_availability_domain(compartment_id, availability_domain)
-        if not availability_domain:
-            return None
+    def _forget_resolutions(self, error):
+        """Invalidate the cached resolutions used by a rejected launch, see _resolution_retry.
 
-        subnet = self._get_subnet(vcn_compartment_id if vcn_compartment_id else compartment_id, vcn_name, subnet_name)
-        if not subnet:
+        The next lookups bypass the cache.
+        """
+        self._echo_message('Launch failed with cached resolutions ({}), retrying with fresh lookups'.format(error))
+        for key in self._resolution_hits:
+            self._cache.delete(key)
+        self._resolution_hits = []
+        self._resolution_bypass = True
+
+    def _task_graph(self):
+        """Return a TaskGraph for the lookups of an operation.
+
+        Tasks run in worker threads; their phases are nested under the
+        current phase.
+        """
+        parent = self._instrumentation.current_phase()
+        return TaskGraph(max_workers=self._max_workers,
+                         context=lambda name: self._instrumentation.nested(parent))
+
+    @property
+    def task_timings(self):
+        """Return the task timings of the last provisioning.
+
+        Returns:
+            List of task_graph.TaskTiming in completion order.
+
+        """
+        return list(self._task_timings)
+
+    @property
+    def launch_timings(self):
+        """Return the instance timings of the last provisioning.
+
+        Returns:
+            List of LaunchTiming in display name order.
+
+        """
+        return sorted(self._launch_timings.values())
+
+    @property
+    def placement_stats(self):
+        """Return the placements of the last provisioning with a placement policy.
+
+        Returns:
+            List of placement.PlacementStats in order of preference (empty
+            without placement policy).
+
+        """
+        return self._placements.stats() if self._placements else []
+
+    @property
+    def pool_hits(self):
+        """Return the display names of the instances handed out from a warm pool by the last provisioning."""
+        return list(self._pool_hits)
+
+    def reset_task_timings(self):
+        """Forget the task and instance timings, placements and pool hand-outs of the last provisioning."""
+        self._task_timings = []
+        self._launch_timings = {}
+        self._placements = None
+        self._pool_hits = []
+
+    def _launch_timing(self, display_name, start, **events):
+        """Record instance events (time.time() values) of the current provisioning."""
+        timing = self._launch_timings.get(display_name) or LaunchTiming(display_name, None, None, None, None)
+        self._launch_timings[display_name] = timing._replace(
+            **{event: at - start if at is not None else None for event, at in events.items()})
+
+    def _probe_instance(self, readiness, compartment_id, instance, callback=None):
+        """Probe a running instance in the background (see readiness.ReadinessProbe.add)."""
+        resolve = self._vnic_resolver(compartment_id)
+        readiness.add(instance.display_name, lambda: readiness.address(resolve(instance)), callback)
+
+    def _unready(self, instance, error):
+        """Terminate an instance which was not ready in time, without waiting.
+
+        Returns:
+            readiness.ReadinessError with the probe error, and whether the
+            instance was terminated or left running.
+
+        """
+        from .readiness import ReadinessError
+        try:
+            self._compute_client.terminate_instance(instance.id)
+        except oci.exceptions.ServiceError as e:
+            return ReadinessError('{}; could not terminate instance {}: {}'.format(error, instance.id, e.message))
+        return ReadinessError('{}; instance {} terminated'.format(error, instance.id))
+
+    def _add_launch_lookups(self, graph, compartment_id, shape, availability_domain, vcn_name, vcn_compartment_id,
+                            subnet_name, placement=None):
+        """Add the Availability Domain, subnet and placement lookups of a provisioning to its graph.
+
+        The graph holds the image lookup tasks; see _provision_image.
+        """
+        availability_domains = placement.availability_domains(availability_domain) if placement else [
+            availability_domain]
+        availability_domain_tasks = ['availability domain'] + [
+            'availability domain {}'.format(name) for name in availability_domains[1:]]
+        for task, name in zip(availability_domain_tasks, availability_domains):
+            graph.add(task, lambda name=name: self._get_availability_domain(compartment_id, name))
+        graph.add('subnet',
+                  lambda: self._get_subnet(vcn_compartment_id if vcn_compartment_id else compartment_id,
+                                           vcn_name,
+                                           subnet_name))
+        if placement:
+            graph.add('placement',
+                      lambda image, subnet, *availability_domains: self._get_placements(
+                          placement, compartment_id, shape, image, subnet, availability_domains),
+                      requires=['image', 'subnet'] + availability_domain_tasks)
+
+    def _prepare_launch(self, graph, results, compartment_id, display_names, shape, ssh_authorized_keys_file,
+                        cloud_init_file, clone=False, freeform_tags=None, confirm=None):
+        """Return the launch details of a provisioning once its lookups have run.
+
+        The task timings, placements and instance timings of the
+        provisioning are reset.
+
+        Parameters:
+            graph: the lookup graph, see _add_launch_lookups
+            results: the results of the graph run
+            confirm: function called with the results when the lookups
+                     succeeded; the provisioning stops when it returns False
+
+        Returns:
+            Tuple (launch_instance_details, golden), None if a lookup failed.
+            golden is the golden.GoldenVolume to clone with clone, None
+            otherwise.
+
+        """
+        self._task_timings = graph.timings
+        for timing in sorted(graph.timings, key=lambda timing: timing.start or 0):
+            self._echo_message_kv('Task {}'.format(timing.name),
+                                  '{} ({:.3f}s)'.format(timing.status, timing.duration))
+        if not graph.succeeded or (confirm and not confirm(results)):
             return None
+        image = results['image']
+        availability_domain = results['availability domain']
+        subnet = results['subnet']
+
+        golden = None
+        if clone:
+            golden = image.source(availability_domain.name)
+            self._echo_header('Golden image selected:')
+            self._echo_message_kv('Name', image.name)
+            if not golden:
+                self._echo_error('No golden boot volume available in {}'.format(short_name(availability_domain.name)))
+                return None
+            self._echo_message_kv('Source', 'boot volume' if golden.kind == 'volume' else
+                                  'boot volume backup (not replicated to {})'.format(
+                                      short_name(availability_domain.name)))
+            self._echo_message_kv('Created', golden.time_created)
+            # Set for each instance, see _clone_golden
+            instance_source_details = None
+        else:
+            self._echo_header('Image selected:')
+            self._echo_message_kv('Name', image.display_name)
+            self._echo_message_kv('Created', image.time_created)
+            self._echo_message_kv('Operating System', image.operating_system)
+            self._echo_message_kv('Operating System version', image.operating_system_version)
+            instance_source_details = oci.core.models.InstanceSourceViaImageDetails(image_id=image.id)
 
         self._echo_header('Creating and launching instance')
-        instance_source_via_image_details = oci.core.models.InstanceSourceViaImageDetails(image_id=image.id)
         create_vnic_details = oci.core.models.CreateVnicDetails(subnet_id=subnet.id)
 
         # Metadata with the ssh keys and the cloud-init file
@@ -266,23 +1020,208 @@ class OciCompute(object):
             metadata['user_data'] = oci.util.file_content_as_launch_instance_user_data(cloud_init_file)
 
         launch_instance_details = oci.core.models.LaunchInstanceDetails(
-            display_name=display_name,
+            display_name=display_names[0],
             compartment_id=compartment_id,
             availability_domain=availability_domain.name,
             shape=shape,
             metadata=metadata,
-            source_details=instance_source_via_image_details,
-            create_vnic_details=create_vnic_details)
+            source_details=instance_source_details,
+            create_vnic_details=create_vnic_details,
+            freeform_tags=freeform_tags)
 
-        compute_client_composite_operations = oci.core.ComputeClientCompositeOperations(self._compute_client)
+        self._launch_timings = {}
+        self._placements = results.get('placement')
+        self._pool_hits = []
+        return launch_instance_details, golden
 
-        self._echo_message('Waiting for Running state', nl=False)
-        response = compute_client_composite_operations.launch_instance_and_wait_for_state(
-            launch_instance_details,
-            wait_for_states=[oci.core.models.Instance.LIFECYCLE_STATE_RUNNING],
-            waiter_kwargs={'wait_callback': self._wait_callback})
-        self._echo()
-        instance = response.data
+    def _provision_image(self,
+                         graph,
+                         compartment_id,
+                         display_name,
+                         shape,
+                         availability_domain,
+                         vcn_name,
+                         vcn_compartment_id,
+                         subnet_name,
+                         ssh_authorized_keys_file,
+                         cloud_init_file,
+                         count=None,
+                         callback=None,
+                         wait=True,
+                         readiness=None,
+                         placement=None,
+                         pool=None,
+                         clone=False,
+                         freeform_tags=None,
+                         confirm=None):
+        """Actual image provisioning.
+
+        The graph holds the image lookup tasks of the caller; its 'image' task
+        returns the image to launch. Availability Domain and subnet lookups
+        are added to the graph (see _add_launch_lookups), which is run before
+        the launch: all lookups run concurrently, subject to their
+        dependencies.
+
+        When the display name expands to more than one name (see
+        expand_display_names), instances are launched concurrently and a list
+        of (display_name, instance, error) tuples is returned; the optional
+        callback is invoked with the same arguments as each launch completes.
+
+        When wait is False, the instance(s) are returned as soon as they are
+        launched, without waiting for the Running state.
+
+        When waiting, readiness (readiness.ReadinessProbe) also waits for the
+        running instances to accept connections; an instance which is not
+        ready in time is terminated and is a failure (ReadinessError, see
+        _unready). The instance timings are recorded (see launch_timings).
+
+        With placement (placement.PlacementPolicy), the shape and
+        Availability Domain are the first choices of the policy: instances
+        are launched on the first placement with capacity, or hedged over
+        several placements when waiting (see _launch_instances). The
+        Availability Domains of the policy are resolved with the other
+        lookups, then the 'placement' task checks the shapes and capacity.
+
+        With pool (pool.WarmPool), instances are first handed out from the
+        warm pool of the launch profile (see _pool_handout); the others are
+        launched. The pool is refilled in the background, without being
+        waited for.
+
+        With clone, the 'image' task returns a golden image
+        (golden.GoldenImage) instead: each instance is launched from its own
+        clone of the golden boot volume of the Availability Domain (see
+        _clone_golden). Placement and pool do not apply.
+
+        freeform_tags are set on the instances, including those handed out
+        from a warm pool.
+
+        confirm is called on the calling thread with the results of the
+        lookups, when they succeeded: the provisioning stops when it returns
+        False (see provision_market).
+        """
+        display_names = expand_display_names(display_name, count)
+        self._add_launch_lookups(graph, compartment_id, shape, availability_domain, vcn_name, vcn_compartment_id,
+                                 subnet_name, placement)
+        with self._phase('lookups'):
+            results = graph.run()
+        prepared = self._prepare_launch(graph, results, compartment_id, display_names, shape,
+                                        ssh_authorized_keys_file, cloud_init_file, clone, freeform_tags, confirm)
+        if not prepared:
+            return None
+        launch_instance_details, golden = prepared
+        placements = self._placements
+
+        if clone:
+            # Launch timings include the clone
+            start = time.time()
+            sources = self._clone_golden(golden, compartment_id, launch_instance_details.availability_domain,
+                                         display_names)
+            results = None
+            try:
+                results = self._launch(launch_instance_details, display_names, callback, wait, readiness,
+                                       start=start, sources=sources)
+                return results
+            finally:
+                self._discard_clones(sources, results)
+        if not pool:
+            return self._launch(launch_instance_details, display_names, callback, wait, readiness, placements)
+        start = time.time()
+        pooled = self._pool_handout(pool, launch_instance_details, display_names)
+        return self._launch(launch_instance_details, display_names, callback, wait, readiness, placements, pooled,
+                            start)
+
+    def _launch(self,
+                launch_instance_details,
+                display_names,
+                callback=None,
+                wait=True,
+                readiness=None,
+                placements=None,
+                pooled=None,
+                start=None,
+                sources=None):
+        """Launch the instances of a provisioning, see _provision_image.
+
+        Instances handed out from a warm pool (pooled: {display_name:
+        instance}) are not launched; they are waited for like the others.
+        start is the time (time.time()) the launch timings are measured from,
+        now by default. sources are the boot volume clones of the instances
+        (see _clone_golden).
+        """
+        compartment_id = launch_instance_details.compartment_id
+        pooled = pooled or {}
+        start = start or time.time()
+        if len(display_names) > 1:
+            return self._launch_instances(launch_instance_details, display_names, callback, wait, readiness,
+                                          placements, pooled, start, sources)
+        if placements and placements.hedge > 1 and wait:
+            # Hedged instances are raced by the bulk launch
+            _, instance, error = self._launch_instances(launch_instance_details, display_names,
+                                                        readiness=readiness, placements=placements,
+                                                        pooled=pooled, start=start)[0]
+            if error:
+                self._echo_error(str(getattr(error, 'message', error)))
+                return None
+            self._echo_message_kv('Name', instance.display_name)
+            self._echo_message_kv('State', instance.lifecycle_state)
+            self._echo_message_kv('Time created', instance.time_created)
+            return instance
+
+        source = (sources or {}).get(display_names[0])
+        if isinstance(source, Exception):
+            self._echo_error('Boot volume clone failed: {}'.format(getattr(source, 'message', source)))
+            return None
+        if source:
+            launch_instance_details = copy(launch_instance_details)
+            launch_instance_details.source_details = source
+
+        response = None
+        instance = pooled.get(display_names[0])
+        if not instance:
+            with self._phase('launch'):
+                try:
+                    if placements:
+                        response, _ = self._launch_placed(launch_instance_details, placements)
+                    else:
+                        response = self._compute_client.launch_instance(launch_instance_details)
+                except oci.exceptions.ServiceError as e:
+                    if out_of_capacity(e):
+                        self._echo_error('Instance launch failed: {}'.format(e.message))
+                        return None
+                    if self._resolution_hits and stale_resolution(e):
+                        raise StaleResolutionError(e.code)
+                    raise
+                except PlacementError as e:
+                    self._echo_error('Instance launch failed: {}'.format(e))
+                    return None
+            instance = response.data
+        self._launch_timing(display_names[0], start, launched=time.time())
+
+        if instance and wait:
+            self._echo_message('Waiting for Running state', nl=False)
+            with self._phase('wait'):
+                waiter = self._waiter(tick_callback=lambda waiter: self._echo('.', nl=False))
+                waiter.add_instance(compartment_id, instance.id, [oci.core.models.Instance.LIFECYCLE_STATE_RUNNING])
+                instance, _, error = waiter.wait()[instance.id]
+            self._echo()
+            if error:
+                self._echo_error(str(error))
+                return None
+            running = time.time()
+            self._launch_timing(display_names[0], start, running=running)
+
+            if readiness:
+                self._echo_message('Waiting for port {}{}'.format(
+                    readiness.port, ' and cloud-init' if readiness.cloud_init else ''))
+                with self._phase('readiness'):
+                    self._probe_instance(readiness, compartment_id, instance)
+                    result = readiness.wait()[instance.display_name]
+                if result.error:
+                    self._echo_error(str(self._unready(instance, result.error)))
+                    return None
+                self._launch_timing(display_names[0], start,
+                                    port_open=running + result.port_open,
+                                    ready=running + result.ready)
 
         if not instance:
             self._echo_error('Instance launch failed')
@@ -295,8 +1234,694 @@ class OciCompute(object):
 
         return instance
 
+    def _launch_named(self, launch_instance_details, display_name, placements=None, claimed=None, sources=None):
+        """Launch one instance of a bulk provisioning.
+
+        Parameters:
+            launch_instance_details: launch details template
+            display_name: the display name of the instance
+            placements: placement.Placements (see _launch_placed)
+            claimed: placements claimed by the other hedged launches of the
+                     instance
+            sources: source details of the instances, see _launch_instances
+
+        Returns:
+            (instance, placement) tuple; placement is None without placements.
+
+        """
+        details = copy(launch_instance_details)
+        details.display_name = display_name
+        if sources:
+            if isinstance(sources[display_name], Exception):
+                raise sources[display_name]
+            details.source_details = sources[display_name]
+        if placements:
+            response, placement = self._launch_placed(details, placements, claimed)
+            return response.data, placement
+        return self._compute_client.launch_instance(details).data, None
+
+    def _launch_placed(self, launch_instance_details, placements, claimed=None):
+        """Launch an instance on the first placement with capacity.
+
+        Placements are tried in order, skipping those claimed by the other
+        hedged launches of the instance (see placement.Placements.claim). A
+        placement rejecting the launch for lack of capacity is exhausted for
+        all the launches of the provisioning.
+
+        Returns:
+            (response, placement) tuple.
+
+        Raises:
+            oci.exceptions.ServiceError: the launch failed, or the last
+                                         placement tried had no capacity.
+            placement.PlacementError: no placement was left to try.
+
+        """
+        error = None
+        claimed = set() if claimed is None else claimed
+        while True:
+            placement = placements.claim(claimed)
+            if placement is None:
+                raise error or PlacementError('No placement left for {}'.format(launch_instance_details.display_name))
+            details = copy(launch_instance_details)
+            details.shape, details.availability_domain, details.fault_domain = placement
+            try:
+                response = self._compute_client.launch_instance(details)
+            except oci.exceptions.ServiceError as e:
+                if not out_of_capacity(e):
+                    raise
+                placements.exhaust(placement)
+                self._echo_message_kv(details.display_name, 'No capacity: {}'.format(format_placement(placement)))
+                error = e
+                continue
+            placements.launched(placement)
+            self._echo_message_kv(details.display_name, 'Launched: {}'.format(format_placement(placement)))
+            return response, placement
+
+    def _launch_instances(self,
+                          launch_instance_details,
+                          display_names,
+                          callback=None,
+                          wait=True,
+                          readiness=None,
+                          placements=None,
+                          pooled=None,
+                          start=None,
+                          sources=None):
+        """Launch instances concurrently and wait for their Running state.
+
+        Launch requests are sent through a thread pool, then all instances are
+        tracked by a single LifecycleWaiter. With readiness, each instance is
+        probed as soon as it is running.
+
+        With placements, each instance is launched on the first placement
+        with capacity (see _launch_placed). When waiting with hedging, each
+        instance is launched on several placements at once: the first one
+        running is kept and the others are terminated.
+
+        Parameters:
+            launch_instance_details: launch details template
+            display_names: the display names of the instances to launch
+            callback: function called with (display_name, instance, error) as
+                      each instance is running, or ready with readiness (or
+                      launched when not waiting)
+            wait: wait for the Running state
+            readiness: readiness.ReadinessProbe, when waiting
+            placements: placement.Placements
+            pooled: instances handed out from a warm pool {display_name:
+                    instance}, not launched
+            start: time (time.time()) the launch timings are measured from
+            sources: source details of the instances {display_name:
+                     InstanceSourceViaBootVolumeDetails or clone error}, see
+                     _clone_golden
+
+        Returns:
+            List of (display_name, instance, error) tuples in display name
+            order. Either instance or error is None.
+
+        """
+        results = {}
+        instance_names = {}
+        hedge = placements.hedge if placements and wait else 1
+        # Launches of each display name: launch requests in progress, instances
+        # launched and not running yet {instance_id: placement}, placements
+        # claimed, first error
+        races = {display_name: {'launching': hedge, 'instances': {}, 'claimed': set(), 'launched': False,
+                                'error': None}
+                 for display_name in display_names}
+
+        def done(display_name, instance, error):
+            if instance:
+                self._echo_message_kv(display_name, instance.lifecycle_state)
+            else:
+                self._echo_message_kv(display_name, 'Launch failed: {}'.format(getattr(error, 'message', error)))
+            results[display_name] = (display_name, instance, error)
+            if callback:
+                callback(display_name, instance, error)
+
+        def failed(display_name, error):
+            # The instance failed once none of its launches is left
+            race = races[display_name]
+            race['error'] = race['error'] or error
+            if not race['launching'] and not race['instances']:
+                done(display_name, None, race['error'])
+
+        def cancel(display_name, instance_id, placement):
+            waiter.discard(instance_id)
+            placements.cancelled(placement)
+            self._echo_message_kv(display_name, 'Cancelled: {}'.format(format_placement(placement)))
+            try:
+                self._compute_client.terminate_instance(instance_id)
+            except oci.exceptions.ServiceError as e:
+                self._echo_error('Could not terminate hedged instance {}: {}'.format(instance_id, e.message))
+
+        def launched(display_name, instance, placement):
+            race = races[display_name]
+            if not race['launched']:
+                race['launched'] = True
+                self._launch_timing(display_name, start, launched=time.time())
+            if wait:
+                instance_names[instance.id] = display_name
+                race['instances'][instance.id] = placement
+                waiter.add_instance(launch_instance_details.compartment_id,
+                                    instance.id,
+                                    [oci.core.models.Instance.LIFECYCLE_STATE_RUNNING],
+                                    running)
+            else:
+                done(display_name, instance, None)
+
+        def running(instance_id, instance, elapsed, error):
+            display_name = instance_names[instance_id]
+            race = races[display_name]
+            race['instances'].pop(instance_id, None)
+            if error:
+                failed(display_name, error)
+                return
+            # First instance running: the other hedged instances are cancelled
+            for other_id, placement in race['instances'].items():
+                cancel(display_name, other_id, placement)
+            race['instances'] = {}
+            running_at = time.time()
+            self._launch_timing(display_name, start, running=running_at)
+            if not readiness:
+                done(display_name, instance, None)
+                return
+
+            def ready(_, result):
+                if result.error:
+                    done(display_name, None, self._unready(instance, result.error))
+                    return
+                self._launch_timing(display_name, start,
+                                    port_open=running_at + result.port_open,
+                                    ready=running_at + result.ready)
+                done(display_name, instance, None)
+
+            self._probe_instance(readiness, launch_instance_details.compartment_id, instance, ready)
+
+        pooled = pooled or {}
+        self._echo_message('Launching {} instances{}'.format(
+            len(display_names) - len(pooled),
+            ', {} from the warm pool'.format(len(pooled)) if pooled else ''))
+        waiter = self._waiter()
+        start = start or time.time()
+        # Pooled instances are only waited for
+        for display_name, instance in pooled.items():
+            races[display_name]['launching'] = 0
+            launched(display_name, instance, None)
+        with self._phase('launch'), ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {executor.submit(self._launch_named, launch_instance_details, display_name, placements,
+                                       races[display_name]['claimed'], sources): display_name
+                       for display_name in display_names if display_name not in pooled for _ in range(hedge)}
+            for future in as_completed(futures):
+                display_name = futures[future]
+                races[display_name]['launching'] -= 1
+                try:
+                    instance, placement = future.result()
+                except Exception as e:
+                    failed(display_name, e)
+                    continue
+                launched(display_name, instance, placement)
+
+        if waiter.pending:
+            self._echo_message('Waiting for Running state')
+            with self._phase('wait'):
+                waiter.wait()
+        if readiness and readiness.pending:
+            self._echo_message('Waiting for port {}{}'.format(
+                readiness.port, ' and cloud-init' if readiness.cloud_init else ''))
+            with self._phase('readiness'):
+                readiness.wait()
+
+        # Cached resolutions are presumably stale if every launch got rejected
+        if self._resolution_hits and all(stale_resolution(error) for _, _, error in results.values()):
+            raise StaleResolutionError(next(iter(results.values()))[2].code)
+
+        return [results[display_name] for display_name in display_names]
+
+    def _waiter(self, **kwargs):
+        """Return a LifecycleWaiter using our clients."""
+        return LifecycleWaiter(self._compute_client, lambda: self._work_request_client,
+                               blockstorage_client=lambda: self._blockstorage_client, **kwargs)
+
+    def _pool_instances(self, compartment_id, key=None):
+        """Return the pooled instances not terminated of a compartment.
+
+        Parameters:
+            key: only return the instances of this pool
+
+        Returns:
+            Dictionary {profile key: [SDK Instance]}.
+
+        """
+        pools = {}
+        for instance in oci.pagination.list_call_get_all_results(self._compute_client.list_instances,
+                                                                 compartment_id).data:
+            pool_key = (instance.freeform_tags or {}).get(POOL_TAG)
+            if pool_key and pool_key == (key or pool_key) and instance.lifecycle_state in POOL_STATES:
+                pools.setdefault(pool_key, []).append(instance)
+        return pools
+
+    def _take_pooled(self, key, available, lock, display_name, freeform_tags=None):
+        """Hand out the next available pooled instance, None if there is none left.
+
+        The instance is claimed by renaming it and removing its pool tag,
+        conditionally on its entity tag: a concurrent run cannot claim it
+        too. It is then started if it was stopped.
+
+        Parameters:
+            key: the profile key
+            available: pooled instances available, shared by the hand-outs
+                       (see pool.WarmPool.available)
+            lock: Lock protecting available
+            display_name: the new display name of the instance
+            freeform_tags: tags added to the instance
+
+        """
+        while True:
+            with lock:
+                if not available:
+                    return None
+                pooled = available.pop(0)
+            try:
+                response = self._compute_client.get_instance(pooled.id)
+                tags = dict(response.data.freeform_tags or {})
+                if tags.pop(POOL_TAG, None) != key or response.data.lifecycle_state not in ('STOPPED', 'RUNNING'):
+                    continue
+                tags.update(freeform_tags or {})
+                instance = self._compute_client.update_instance(
+                    pooled.id,
+                    oci.core.models.UpdateInstanceDetails(display_name=display_name, freeform_tags=tags),
+                    if_match=response.headers.get('etag')).data
+            except oci.exceptions.ServiceError as e:
+                # Terminated, or claimed by another run meanwhile
+                if e.status in (404, 409, 412):
+                    continue
+                raise
+            if instance.lifecycle_state == 'STOPPED':
+                try:
+                    instance.lifecycle_state = self._instance_action(instance.id, 'start')
+                except oci.exceptions.ServiceError as e:
+                    self._echo_error('Could not start pooled instance {}: {}'.format(instance.id, e.message))
+                    return None
+            self._echo_message_kv(display_name, 'Warm pool: {}'.format(instance.id))
+            return instance
+
+    def _pool_handout(self, pool, launch_instance_details, display_names):
+        """Hand out pooled instances for a provisioning, and start refilling the pool.
+
+        The pool is refilled in the background (see _background_refill): the
+        provisioning does not wait for it.
+
+        Returns:
+            The instances handed out: {display_name: instance}.
+
+        """
+        with self._phase('warm pool'):
+            key, instances, available = self._pool_candidates(pool, launch_instance_details)
+            lock = Lock()
+            names = display_names[:len(available)]
+            with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+                pooled = {display_name: instance
+                          for display_name, instance in zip(names, executor.map(
+                              lambda display_name: self._take_pooled(key, available, lock, display_name,
+                                                                     launch_instance_details.freeform_tags),
+                              names))
+                          if instance}
+        self._pool_handed_out(pool, key, launch_instance_details, display_names, instances, pooled)
+        return pooled
+
+    def _pool_candidates(self, pool, launch_instance_details):
+        """Return the pooled instances of the launch profile of a provisioning, see _pool_handout.
+
+        Returns:
+            Tuple (key, instances, available): the profile key, the pooled
+            instances not terminated and those available for hand-out (see
+            pool.WarmPool.available).
+
+        """
+        key = profile_key(pool_profile(launch_instance_details))
+        instances = self._pool_instances(launch_instance_details.compartment_id, key).get(key, [])
+        return key, instances, pool.available(instances)
+
+    def _pool_handed_out(self, pool, key, launch_instance_details, display_names, instances, pooled):
+        """Record the hand-outs of a provisioning and start refilling the pool, see _pool_handout."""
+        self._pool_hits = [display_name for display_name in display_names if display_name in pooled]
+        self._echo_message_kv('Warm pool', '{} of {} instance(s) handed out'.format(len(pooled),
+                                                                                    len(display_names)))
+        pool.record(key, launch_instance_details, hits=len(pooled), misses=len(display_names) - len(pooled))
+
+        handed_out = set(instance.id for instance in pooled.values())
+        self._background(self._background_refill, pool, key, launch_instance_details,
+                         [instance for instance in instances if instance.id not in handed_out])
+
+    @staticmethod
+    def _detached(function, *args):
+        """Run a function in its own thread, without waiting for it (default background runner)."""
+        executor = ThreadPoolExecutor(max_workers=1)
+        executor.submit(function, *args)
+        executor.shutdown(wait=False)
+
+    def _background_refill(self, pool, key, launch_instance_details, instances):
+        """Refill a pool after a hand-out, see _pool_handed_out.
+
+        Nobody waits for the refill, and it displays nothing: its errors are
+        kept in the pool file and reported by the next maintenance of the pool
+        (see maintain_pools).
+        """
+        try:
+            errors = self._refill_pool(pool, key, launch_instance_details, instances).errors
+        except Exception as e:
+            errors = [e]
+        if errors:
+            pool.record_errors(key, [str(getattr(error, 'message', error)) for error in errors])
+
+    def _refill_pool(self, pool, key, launch_instance_details, instances, size=None):
+        """Maintain a pool: stop the warmed up instances, evict and launch instances.
+
+        Launches are not waited for: the new instances are stopped by a later
+        maintenance, once warmed up (see pool.WarmPool.plan).
+
+        Parameters:
+            pool: the pool.WarmPool policy
+            key: the profile key
+            launch_instance_details: launch details of the profile, None when
+                                     the pool is drained
+            instances: the pooled instances not terminated
+            size: number of instances to keep (default: the policy size)
+
+        Returns:
+            pool.PoolMaintenance.
+
+        """
+        plan = pool.plan(instances, size)
+        details = None
+        if plan.launch and launch_instance_details:
+            details = copy(launch_instance_details)
+            details.display_name = POOL_DISPLAY_NAME.format(key)
+            details.freeform_tags = {POOL_TAG: key}
+            details.fault_domain = None
+        # (counter, function, arguments)
+        tasks = ([('stopped', self._instance_action, (instance.id, 'shutdown')) for instance in plan.stop]
+                 + [('evicted', self._instance_action, (instance.id, 'terminate')) for instance in plan.evict]
+                 + [('launched', self._compute_client.launch_instance, (details,))] * (plan.launch if details else 0))
+        counts = Counter()
+        errors = []
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {executor.submit(function, *arguments): counter for counter, function, arguments in tasks}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                counts[futures[future]] += 1
+        pool.record(key, launch_instance_details, launched=counts['launched'], evicted=counts['evicted'])
+        return PoolMaintenance(key, counts['stopped'], counts['evicted'], counts['launched'], errors)
+
+    @staticmethod
+    def _profile_details(profile):
+        """Return the LaunchInstanceDetails of a pool profile from the pool file."""
+        return oci.core.models.LaunchInstanceDetails(
+            compartment_id=profile['compartment_id'],
+            availability_domain=profile['availability_domain'],
+            shape=profile['shape'],
+            metadata=profile['metadata'],
+            source_details=oci.core.models.InstanceSourceViaImageDetails(image_id=profile['image_id']),
+            create_vnic_details=oci.core.models.CreateVnicDetails(subnet_id=profile['subnet_id']))
+
+    @_phased('boot volume clone')
+    def _clone_golden(self, golden, compartment_id, availability_domain, display_names):
+        """Clone a golden boot volume for each instance of a provisioning.
+
+        The clones are created concurrently and waited for with a single
+        LifecycleWaiter. A golden boot volume is cloned, a golden backup is
+        restored (when the Availability Domain has no replica).
+
+        Parameters:
+            golden: the golden.GoldenVolume to clone
+            compartment_id: the compartment OCID of the instances
+            availability_domain: the full Availability Domain name
+            display_names: the display names of the instances
+
+        Returns:
+            Dictionary {display_name: InstanceSourceViaBootVolumeDetails, or
+            the error of the clone}.
+
+        """
+        self._echo_message('Cloning {} boot volume(s) from the golden {}'.format(
+            len(display_names), 'boot volume' if golden.kind == 'volume' else 'backup'))
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            clones = dict(zip(display_names, executor.map(
+                lambda display_name: self._create_clone(golden, compartment_id, availability_domain, display_name),
+                display_names)))
+        waiter = self._clones_waiter(compartment_id, clones)
+        return self._clone_sources(display_names, clones, waiter.wait())
+
+    def _create_clone(self, golden, compartment_id, availability_domain, display_name):
+        """Create the boot volume clone of an instance, see _clone_golden.
+
+        Returns:
+            The SDK BootVolume, or the error of the request.
+
+        """
+        if golden.kind == 'volume':
+            source_details = oci.core.models.BootVolumeSourceFromBootVolumeDetails(id=golden.id)
+        else:
+            source_details = oci.core.models.BootVolumeSourceFromBootVolumeBackupDetails(id=golden.id)
+        try:
+            return self._blockstorage_client.create_boot_volume(oci.core.models.CreateBootVolumeDetails(
+                availability_domain=availability_domain,
+                compartment_id=compartment_id,
+                display_name='{} (Boot Volume)'.format(display_name),
+                source_details=source_details)).data
+        except oci.exceptions.ServiceError as e:
+            return e
+
+    def _clones_waiter(self, compartment_id, clones):
+        """Return a LifecycleWaiter tracking the boot volume clones {display_name: BootVolume or error}."""
+        waiter = self._waiter()
+        for clone in clones.values():
+            if not isinstance(clone, Exception):
+                waiter.add_boot_volume(compartment_id, clone.id)
+        return waiter
+
+    def _clone_sources(self, display_names, clones, waited):
+        """Return the source details of cloned instances, see _clone_golden.
+
+        Clones which are not available are deleted.
+
+        Parameters:
+            display_names: the display names of the instances
+            clones: the clones {display_name: BootVolume or error}
+            waited: the results of the clones waiter (see _clones_waiter)
+
+        """
+        sources = {}
+        for display_name, clone in clones.items():
+            if isinstance(clone, Exception):
+                sources[display_name] = clone
+                continue
+            _, _, error = waited[clone.id]
+            if error:
+                sources[display_name] = error
+                self._delete_boot_volume(clone.id)
+            else:
+                sources[display_name] = oci.core.models.InstanceSourceViaBootVolumeDetails(boot_volume_id=clone.id)
+        for display_name in display_names:
+            if isinstance(sources[display_name], Exception):
+                self._echo_message_kv(display_name, 'Boot volume clone failed: {}'.format(
+                    getattr(sources[display_name], 'message', sources[display_name])))
+        return sources
+
+    def _discard_clones(self, sources, results):
+        """Delete the boot volume clones of the instances which were not launched, see _clone_golden.
+
+        Parameters:
+            sources: the clones {display_name: source details or error}
+            results: the result of _launch
+
+        """
+        if isinstance(results, list):
+            launched = set(display_name for display_name, instance, _ in results if instance)
+        else:
+            launched = set([results.display_name]) if results else set()
+        for display_name, source in sources.items():
+            if display_name not in launched and not isinstance(source, Exception):
+                self._delete_boot_volume(source.boot_volume_id)
+
+    def _delete_boot_volume(self, boot_volume_id):
+        """Delete a boot volume, reporting failures."""
+        try:
+            self._blockstorage_client.delete_boot_volume(boot_volume_id)
+        except oci.exceptions.ServiceError as e:
+            # Attached to an instance which failed after its launch: the
+            # volume is deleted with the instance
+            if e.status != 409:
+                self._echo_error('Could not delete boot volume {}: {}'.format(boot_volume_id, e.message))
+
+    def _golden_volume_details(self, name, compartment_id, availability_domain, source_details):
+        """Return the CreateBootVolumeDetails of a golden boot volume."""
+        return oci.core.models.CreateBootVolumeDetails(
+            availability_domain=availability_domain,
+            compartment_id=compartment_id,
+            display_name=GOLDEN_DISPLAY_NAME.format(name),
+            freeform_tags={GOLDEN_TAG: name},
+            source_details=source_details)
+
+    def _wait_golden(self, compartment_id, resources, backup=False):
+        """Wait for golden boot volumes (or backups) to be available.
+
+        Returns:
+            The errors of the resources which are not available.
+
+        """
+        waiter = self._waiter(tick_callback=lambda waiter: self._echo('.', nl=False))
+        for resource in resources:
+            waiter.add_boot_volume(compartment_id, resource.id, backup=backup)
+        self._echo_message('Waiting for {} {}'.format(len(resources), 'backup(s)' if backup else 'boot volume(s)'),
+                           nl=False)
+        results = waiter.wait()
+        self._echo()
+        return [error for _, _, error in results.values() if error]
+
     """Public methods."""
 
+    @_phased('compartment lookup')
+    def resolve_compartment(self, compartment):
+        """Resolve a compartment name to its OCID.
+
+        Parameters:
+            compartment: compartment name or OCID
+
+        Returns:
+            The compartment OCID, None if the compartment cannot be found.
+
+        """
+        if not compartment or compartment.startswith('ocid1.'):
+            return compartment
+
+        def lookup():
+            tenancy_id = self._config['tenancy']
+            compartments = oci.pagination.list_call_get_all_results(
+                self._identity_client.list_compartments,
+                tenancy_id,
+                compartment_id_in_subtree=True,
+                access_level='ANY',
+                name=compartment,
+                lifecycle_state='ACTIVE').data
+            if compartments:
+                return compartments[0].id
+            # The root compartment is the tenancy
+            if self._identity_client.get_tenancy(tenancy_id).data.name == compartment:
+                return tenancy_id
+            return None
+
+        return self._resolve('resolution', ('compartment', compartment), lookup)
+
+    def subscribed_regions(self):
+        """Return the names of the regions the tenancy is subscribed to."""
+        return sorted(region.region_name
+                      for region in self._cached_call('compartments',
+                                                      self._identity_client.list_region_subscriptions,
+                                                      self._config['tenancy'],
+                                                      paginate=False)
+                      if region.status == 'READY')
+
+    @_phased('compartment tree lookup')
+    def compartment_tree(self, compartment_id):
+        """Return a compartment and all its active descendants.
+
+        The whole tenancy tree is retrieved in a single (paginated) call and
+        walked locally.
+
+        Parameters:
+            compartment_id: the OCID of the root of the subtree
+
+        Returns:
+            List of records.CompartmentRecord, starting with the compartment
+            itself (named after the tenancy for the root compartment).
+
+        """
+        tenancy_id = self._config['tenancy']
+        compartments = self._cached_call('compartments',
+                                         self._identity_client.list_compartments,
+                                         tenancy_id,
+                                         record=compartment_record,
+                                         compartment_id_in_subtree=True,
+                                         access_level='ANY',
+                                         lifecycle_state='ACTIVE')
+        children = {}
+        root = None
+        for compartment in compartments:
+            children.setdefault(compartment.compartment_id, []).append(compartment)
+            if compartment.id == compartment_id:
+                root = compartment
+        if root is None:
+            # The tenancy is not listed, other compartments should be
+            name = self._identity_client.get_tenancy(tenancy_id).data.name if compartment_id == tenancy_id else None
+            root = CompartmentRecord(compartment_id, None, name or compartment_id)
+        tree = [root]
+        for compartment in tree:
+            tree.extend(sorted(children.get(compartment.id, []), key=lambda child: child.name))
+        return tree
+
+    def fleet_scopes(self, compartment_id, regions=None, recursive=False):
+        """Return the scopes of a fleet query.
+
+        Parameters:
+            compartment_id: the compartment OCID
+            regions: list of region names, or ['all'] for all the subscribed
+                     regions (default: the profile region)
+            recursive: include the subcompartments
+
+        Returns:
+            List of (OciCompute, compartments) tuples, one per region, where
+            compartments is a list of records.CompartmentRecord; see
+            query_instances, query_images and fanout.merge_iterators.
+
+        """
+        if recursive:
+            compartments = self.compartment_tree(compartment_id)
+        else:
+            compartments = [CompartmentRecord(compartment_id, None, compartment_id)]
+        if regions and 'all' in regions:
+            regions = self.subscribed_regions()
+        views = [self.for_region(region) for region in regions] if regions else [self]
+        return [(view, compartments) for view in views]
+
+    def iter_images(self, compartment_id, custom=None, limit=None):
+        """Iterate over the images of a compartment as they are retrieved.
+
+        Parameters:
+            compartment_id: the compartment OCID
+            custom: only yield Custom images (True), Platform images (False)
+                    or both (None)
+            limit: stop after this number of images
+
+        Yields:
+            records.ImageRecord
+
+        """
+        count = 0
+        for image in self._iter_cached('images', self._compute_client.list_images, compartment_id,
+                                       record=image_record):
+            if limit is not None and count >= limit:
+                return
+            if custom is None or (image.operating_system in CUSTOM_OS) == custom:
+                count += 1
+                yield image
+
+    def iter_listings(self, limit=None):
+        """Iterate over the free Marketplace listings as they are retrieved.
+
+        Parameters:
+            limit: stop after this number of listings
+
+        """
+        listings = self._iter_cached('listings', self._marketplace_client.list_listings, pricing=['FREE'])
+        yield from islice(listings, limit)
+
+    @_phased('list platform images')
     def list_platform(self, compartment_id):
         """List platform images.
 
@@ -304,14 +1929,10 @@ class OciCompute(object):
             compartment_id: the compartment OCID
 
         """
-        response = oci.pagination.list_call_get_all_results(self._compute_client.list_images, compartment_id)
-        images = set()
-        for image in response.data:
-            if image.operating_system not in CUSTOM_OS:
-                images.add((image.operating_system, image.operating_system_version))
-
-        return sorted(images)
+        return sorted(set((image.operating_system, image.operating_system_version)
+                          for image in self.iter_images(compartment_id, custom=False)))
 
+    @_phased('list custom images')
     def list_custom(self, compartment_id):
         """List custom images.
 
@@ -319,22 +1940,80 @@ class OciCompute(object):
             compartment_id: the compartment OCID
 
         """
-        response = oci.pagination.list_call_get_all_results(self._compute_client.list_images, compartment_id)
-        images = set()
-        for image in response.data:
-            if image.operating_system in CUSTOM_OS:
-                images.add((image.display_name, image.time_created))
+        return sorted(set((image.display_name, image.time_created)
+                          for image in self.iter_images(compartment_id, custom=True)))
+
+    @_phased('list marketplace listings')
+    def list_market(self, name=None, publisher=None, shape=None, region=None):
+        """List images from the Marketplace.
+
+        Listings are queried from the local Marketplace index (see
+        search_market).
+        """
+        return sorted(set((listing.publisher.name, listing.name)
+                          for listing, _ in self.search_market(name, publisher, shape, region)))
+
+    def _market_index_key(self):
+        return ResponseCache.key(self._profile, self._config.get('region'), 'market-index')
+
+    def _get_market_index(self):
+        """Return the Marketplace index, synchronising it when stale."""
+        if self._market_index is None:
+            self._market_index = MarketIndex(self._marketplace_client,
+                                             lambda: self._compute_client,
+                                             max_workers=self._max_workers)
+            state = self._cache.get('market-index', self._market_index_key())
+            if state:
+                self._market_index.load(state)
+        if self._market_index.stale:
+            self._echo_message('Synchronising Marketplace index')
+            with self._phase('market index sync'):
+                added, changed, removed = self._market_index.sync()
+            self._echo_message_kv('Listings', '{} added, {} changed, {} removed'.format(added, changed, removed))
+            self._save_market_index()
+        return self._market_index
+
+    def _save_market_index(self):
+        if self._market_index.modified:
+            self._cache.set('market-index', self._market_index_key(), self._market_index.dump())
+            self._market_index.modified = False
+
+    def search_market(self, name=None, publisher=None, shape=None, region=None):
+        """Search the free Marketplace listings in the local index.
+
+        The index is synchronised when stale; listing details are only fetched
+        for shape and region queries, and then kept in the index.
+
+        Parameters:
+            name: substring of the listing name
+            publisher: substring of the publisher name (case insensitive)
+            shape: compatible shape
+            region: available region (e.g. 'us-ashburn-1')
 
-        return sorted(images)
+        Returns:
+            List of (listing summary, market_index.MarketDetails) tuples;
+            details are None when neither shape nor region is given.
 
-    def list_market(self):
-        """List images from the Marketplace."""
-        response = oci.pagination.list_call_get_all_results(self._marketplace_client.list_listings, pricing=['FREE'])
-        listings = set()
-        for listing in response.data:
-            listings.add((listing.publisher.name, listing.name))
+        """
+        index = self._get_market_index()
+        results = index.search(name, publisher, shape, region)
+        self._save_market_index()
+        return results
 
-        return sorted(listings)
+    def _get_primary_vnic(self, vnic_attachments):
+        """Walk through attachments to find the primary VNIC.
+
+        If no primary found (should not happen) returns last one.
+        """
+        vnic = None
+        for vnic_attachment in vnic_attachments:
+            try:
+                vnic = self._virtual_network_client.get_vnic(vnic_attachment.vnic_id).data
+            except oci.exceptions.ServiceError:
+                vnic = None
+            if vnic and vnic.is_primary:
+                break
+        return vnic
 
     def get_vnic(self,
                  compartment_id,
@@ -349,16 +2028,7 @@ class OciCompute(object):
             self._echo_error('Could not retrieve VNIC attachments')
             return None
 
-        # Walk through attachments to find primary. If no primary found (should
-        # not happen) returns last one.
-        vnic = None
-        for vnic_attachment in vnic_attachments:
-            try:
-                vnic = self._virtual_network_client.get_vnic(vnic_attachment.vnic_id).data
-            except oci.exceptions.ServiceError:
-                vnic = None
-            if vnic and vnic.is_primary:
-                break
+        vnic = self._get_primary_vnic(vnic_attachments)
 
         if not vnic:
             self._echo_error('  Could not retrieve VNIC data')
@@ -369,6 +2039,104 @@ class OciCompute(object):
 
         return vnic
 
+    def _vnic_attachments(self, compartment_id):
+        """Return the VNIC attachments of a compartment, by instance OCID."""
+        attachments = {}
+        for vnic_attachment in oci.pagination.list_call_get_all_results(
+                self._compute_client.list_vnic_attachments,
+                compartment_id=compartment_id).data:
+            attachments.setdefault(vnic_attachment.instance_id, []).append(vnic_attachment)
+        return attachments
+
+    def _vnic_resolver(self, compartment_id, attachments=None):
+        """Return a function resolving the primary VNIC of an instance.
+
+        Parameters:
+            compartment_id: the compartment OCID
+            attachments: VNIC attachments by instance OCID (see
+                         _vnic_attachments); when None, the attachments are
+                         retrieved for each instance
+
+        """
+        if attachments is not None:
+            def resolve(instance):
+                return self._get_primary_vnic(attachments.get(instance.id, []))
+        else:
+            def resolve(instance):
+                return self._get_primary_vnic(oci.pagination.list_call_get_all_results(
+                    self._compute_client.list_vnic_attachments,
+                    compartment_id=compartment_id, instance_id=instance.id).data)
+        return resolve
+
+    @_phased('VNIC lookup')
+    def get_vnics(self,
+                  compartment_id,
+                  instances,
+                  compartment_wide=None):
+        """Get VNIC data for a list of instances.
+
+        VNICs are resolved concurrently; the returned list is in the same order
+        as the instances (None for instances without VNIC data).
+
+        Parameters:
+            compartment_id: the compartment OCID
+            instances: list of instances
+            compartment_wide: retrieve the VNIC attachments for the whole
+                              compartment in a single call and join them to
+                              the instances in memory. Default is to do so
+                              when there are more than
+                              COMPARTMENT_WIDE_THRESHOLD instances.
+
+        """
+        if not instances:
+            return []
+        if len(instances) == 1 and not compartment_wide:
+            return [self.get_vnic(compartment_id, instances[0])]
+        if compartment_wide is None:
+            compartment_wide = len(instances) > COMPARTMENT_WIDE_THRESHOLD
+
+        self._echo_header('Retrieving VNIC attachments for {} instances'.format(len(instances)))
+        resolve = self._vnic_resolver(compartment_id,
+                                      self._vnic_attachments(compartment_id) if compartment_wide else None)
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            vnics = list(executor.map(resolve, instances))
+
+        self._echo_message_kv('VNICs retrieved', len([vnic for vnic in vnics if vnic]))
+        return vnics
+
+    def _platform_graph(self, compartment_id, operating_system, operating_system_version, shape):
+        """Return the lookup graph of provision_platform: its 'image' task returns the platform image."""
+        def lookup():
+            images = self._cached_call(
+                'images',
+                self._compute_client.list_images,
+                compartment_id,
+                paginate=False,
+                record=image_record,
+                operating_system=operating_system,
+                operating_system_version=operating_system_version,
+                shape=shape,
+                sort_by='TIMECREATED',
+                sort_order='DESC')
+            return images[0] if images else None
+
+        def image_task():
+            self._echo_header('Retrieving image details')
+            with self._phase('image lookup'):
+                image = self._resolve(
+                    'image-resolution',
+                    ('platform-image', compartment_id, operating_system, operating_system_version, shape),
+                    lookup)
+            if not image:
+                self._echo_error("No image found")
+            return image
+
+        graph = self._task_graph()
+        graph.add('image', image_task)
+        return graph
+
+    @_phased('provision platform')
+    @_resolution_retry
     def provision_platform(self,
                            display_name,
                            compartment_id,
@@ -380,21 +2148,21 @@ class OciCompute(object):
                            vcn_compartment_id,
                            subnet_name,
                            ssh_authorized_keys_file,
-                           cloud_init_file=None):
-        """Provision platform image."""
-        self._echo_header('Retrieving image details')
-        images = self._compute_client.list_images(
-            compartment_id,
-            operating_system=operating_system,
-            operating_system_version=operating_system_version,
-            shape=shape,
-            sort_by='TIMECREATED',
-            sort_order='DESC').data
-        if not images:
-            self._echo_error("No image found")
-            return None
-        image = images[0]
-        return self._provision_image(image,
+                           cloud_init_file=None,
+                           count=None,
+                           callback=None,
+                           wait=True,
+                           readiness=None,
+                           placement=None,
+                           pool=None,
+                           freeform_tags=None):
+        """Provision platform image.
+
+        See _provision_image for bulk provisioning (count/callback), wait,
+        readiness, placement, pool and freeform_tags.
+        """
+        graph = self._platform_graph(compartment_id, operating_system, operating_system_version, shape)
+        return self._provision_image(graph,
                                      compartment_id=compartment_id,
                                      display_name=display_name,
                                      shape=shape,
@@ -403,8 +2171,82 @@ class OciCompute(object):
                                      vcn_compartment_id=vcn_compartment_id,
                                      subnet_name=subnet_name,
                                      ssh_authorized_keys_file=ssh_authorized_keys_file,
-                                     cloud_init_file=cloud_init_file)
-
+                                     cloud_init_file=cloud_init_file,
+                                     count=count,
+                                     callback=callback,
+                                     wait=wait,
+                                     readiness=readiness,
+                                     placement=placement,
+                                     pool=pool,
+                                     freeform_tags=freeform_tags)
+
+    def _single_custom_image(self, images):
+        """Return the only image of the list, None (with error) otherwise."""
+        if not images:
+            self._echo_error("No image found")
+            return None
+        elif len(images) > 1:
+            self._echo_error("More than one image found: {}".format(
+                (', ').join([i.display_name for i in images])))
+            return None
+        return images[0]
+
+    def _custom_graph(self, compartment_id, custom_image_name, shape):
+        """Return the lookup graph of provision_custom: its 'image' task returns the custom image."""
+        def search():
+            # Single indexed query for the matching names, then shape
+            # compatibility check of the candidates
+            pages = self._search_pages('image', [compartment_id], None, summary_image_record,
+                                       name_contains=custom_image_name)
+            if pages is None:
+                return None
+            images = []
+            for image in (image for page in pages for image in page if custom_image_name in image.display_name):
+                try:
+                    self._compute_client.get_image_shape_compatibility_entry(image.id, shape)
+                except oci.exceptions.ServiceError as e:
+                    if e.status != 404:
+                        raise
+                    continue
+                images.append(image)
+            if len(images) == 1:
+                # Search results do not have the operating system details
+                return [image_record(self._compute_client.get_image(images[0].id).data)]
+            return images
+
+        def lookup():
+            # The search index may lag recent images, list them when nothing
+            # is found
+            images = search() if self._query_backend != BACKEND_LIST else None
+            if images:
+                return self._single_custom_image(images)
+            shape_images = self._cached_call(
+                'images',
+                self._compute_client.list_images,
+                compartment_id,
+                record=image_record,
+                shape=shape,
+                sort_by='DISPLAYNAME',
+                sort_order='ASC')
+            # Find matching names
+            images = []
+            for image in shape_images:
+                if image.operating_system in CUSTOM_OS and custom_image_name in image.display_name:
+                    images.append(image)
+            return self._single_custom_image(images)
+
+        def image_task():
+            self._echo_header('Retrieving image details')
+            with self._phase('image lookup'):
+                return self._resolve('image-resolution', ('custom-image', compartment_id, custom_image_name, shape),
+                                     lookup)
+
+        graph = self._task_graph()
+        graph.add('image', image_task)
+        return graph
+
+    @_phased('provision custom')
+    @_resolution_retry
     def provision_custom(self,
                          display_name,
                          compartment_id,
@@ -415,28 +2257,25 @@ class OciCompute(object):
                          vcn_compartment_id,
                          subnet_name,
                          ssh_authorized_keys_file,
-                         cloud_init_file=None):
-        """Provision Custom image."""
-        self._echo_header('Retrieving image details')
-        response = self._compute_client.list_images(
-            compartment_id,
-            shape=shape,
-            sort_by='DISPLAYNAME',
-            sort_order='ASC')
-        # Find matching names
-        images = []
-        for image in response.data:
-            if image.operating_system in CUSTOM_OS and custom_image_name in image.display_name:
-                images.append(image)
-        if not images:
-            self._echo_error("No image found")
-            return None
-        elif len(images) > 1:
-            self._echo_error("More than one image found: {}".format(
-                (', ').join([i.display_name for i in images])))
-            return None
-
-        return self._provision_image(images[0],
+                         cloud_init_file=None,
+                         count=None,
+                         callback=None,
+                         wait=True,
+                         readiness=None,
+                         placement=None,
+                         pool=None,
+                         freeform_tags=None):
+        """Provision Custom image.
+
+        See _provision_image for bulk provisioning (count/callback), wait,
+        readiness, placement, pool and freeform_tags.
+
+        Unless the query backend is BACKEND_LIST, the image is looked up with
+        Resource Search rather than by listing all the images compatible with
+        the shape.
+        """
+        graph = self._custom_graph(compartment_id, custom_image_name, shape)
+        return self._provision_image(graph,
                                      compartment_id=compartment_id,
                                      display_name=display_name,
                                      shape=shape,
@@ -445,8 +2284,120 @@ class OciCompute(object):
                                      vcn_compartment_id=vcn_compartment_id,
                                      subnet_name=subnet_name,
                                      ssh_authorized_keys_file=ssh_authorized_keys_file,
-                                     cloud_init_file=cloud_init_file)
+                                     cloud_init_file=cloud_init_file,
+                                     count=count,
+                                     callback=callback,
+                                     wait=wait,
+                                     readiness=readiness,
+                                     placement=placement,
+                                     pool=pool,
+                                     freeform_tags=freeform_tags)
+
+    def _market_graph(self, compartment_id, market_image_name, shape, accept_agreements):
+        """Return the lookup graph of provision_market: the Marketplace chain, its 'image' task returns the image."""
+        def listing_task():
+            self._echo_header('Retrieving Marketplace listing')
+            with self._phase('listing lookup'):
+                listings = self._get_market_index().find(name=market_image_name)
+            if not listings:
+                self._echo_error("No image found")
+                return None
+            elif len(listings) > 1:
+                self._echo_error("More than one image found:")
+                for name in sorted(listing.name for listing in listings):
+                    self._echo_error('    {}'.format(name))
+                return None
+            listing = listings[0]
+            self._echo_message_kv('Publisher', listing.publisher.name)
+            self._echo_message_kv('Image', listing.name)
+            self._echo_message_kv('Description', listing.short_description)
+            return listing
+
+        def details_task(listing):
+            self._echo_header('Retrieving listing details')
+            # Latest package, Application Catalog resource version (for
+            # shape/region compatibility) and image, from the index
+            with self._phase('listing details lookup'):
+                index = self._get_market_index()
+                cached = not self._resolution_bypass and index.has_details(listing.id, image=True)
+                details = index.details(listing.id, image=True, refresh=self._resolution_bypass)
+                self._save_market_index()
+            if not details:
+                self._echo_error('Could not get package details for this listing')
+                return None
+            if cached:
+                self._echo_message_kv('Cached resolution', listing.name)
+                self._resolution_hits.append(self._market_index_key())
+            self._echo_message_kv('Latest version', details.package.version)
+            self._echo_message_kv('Released', details.package.time_created)
+
+            if self._config['region'] not in details.resource_version.available_regions:
+                self._echo_error('This image is not available in your region')
+                return None
+
+            if shape not in details.resource_version.compatible_shapes:
+                self._echo_error('This image is not compatible with the selected shape')
+                return None
+            return details
+
+        def agreements_task(details):
+            # Marketplace Terms of Use not accepted yet: the user is prompted
+            # once the graph has run (see _market_confirm), unless they are
+            # accepted or refused upfront
+            not_accepted = self._market_agreements(compartment_id,
+                                                   details.package.listing_id,
+                                                   details.package.version)
+            if not_accepted and accept_agreements is not None:
+                return [] if self._accept_agreements(compartment_id,
+                                                     details.package.listing_id,
+                                                     details.package.version,
+                                                     not_accepted,
+                                                     accept_agreements) else None
+            return not_accepted
+
+        def subscription_task(details, not_accepted):
+            # Subscribe to the listing in the Application Catalog, once the
+            # Terms of Use are accepted: after the prompt if there is one
+            if not_accepted:
+                return False
+            self._app_catalog_subscribe(
+                compartment_id,
+                details.resource_version.listing_id,
+                details.resource_version.listing_resource_version)
+            return True
+
+        graph = self._task_graph()
+        graph.add('listing', listing_task)
+        graph.add('listing details', details_task, requires=('listing',))
+        graph.add('agreements', agreements_task, requires=('listing details',))
+        graph.add('subscription', subscription_task, requires=('listing details', 'agreements'))
+        graph.add('image', lambda details: details.image, requires=('listing details',))
+        return graph
+
+    def _market_confirm(self, compartment_id, results):
+        """Prompt for the Terms of Use left by the lookup graph of provision_market, see _market_graph.
+
+        The prompt runs on the calling thread once the lookups have run, then
+        the listing is subscribed to in the Application Catalog.
+
+        Returns:
+            True if the image can be launched.
+
+        """
+        not_accepted = results['agreements']
+        if not not_accepted:
+            return True
+        details = results['listing details']
+        if not self._accept_agreements(compartment_id, details.package.listing_id, details.package.version,
+                                       not_accepted):
+            return False
+        self._app_catalog_subscribe(compartment_id,
+                                    details.resource_version.listing_id,
+                                    details.resource_version.listing_resource_version)
+        return True
 
+    @_phased('provision market')
+    @_resolution_retry
     def provision_market(self,
                          display_name,
                          compartment_id,
@@ -457,75 +2408,32 @@ class OciCompute(object):
                          vcn_compartment_id,
                          subnet_name,
                          ssh_authorized_keys_file,
-                         cloud_init_file=None):
-        """Provision Marketplace image."""
-        self._echo_header('Retrieving Marketplace listing')
-        response = oci.pagination.list_call_get_all_results(self._marketplace_client.list_listings, pricing=['FREE'])
-        listings = []
-        for listing in response.data:
-            if market_image_name in listing.name:
-                listings.append(listing)
-        if not listings:
-            self._echo_error("No image found")
-            return None
-        elif len(listings) > 1:
-            self._echo_error("More than one image found:")
-            for name in sorted(listing.name for listing in listings):
-                self._echo_error('    {}'.format(name))
-            return None
-        listing = listings[0]
-        self._echo_message_kv('Publisher', listing.publisher.name)
-        self._echo_message_kv('Image', listing.name)
-        self._echo_message_kv('Description', listing.short_description)
-
-        self._echo_header('Retrieving listing details')
-        packages = self._marketplace_client.list_packages(listing.id, sort_by='TIMERELEASED', sort_order='DESC').data
-        if not packages:
-            self._echo_error('Could not get package for this listing')
-            return None
-        package = packages[0]
-
-        # Get package detailed info
-        package = self._marketplace_client.get_package(package.listing_id, package.package_version).data
-        if not package:
-            self._echo_error('Could not get package details')
-            return None
-
-        # Query the Application Catalog for shape/region compatibility
-        # Note that the listing_id/version are different in the Marketplace and
-        # in the Application Catalog!
-        app_catalog_listing_resource_version = self._compute_client.get_app_catalog_listing_resource_version(
-            package.app_catalog_listing_id,
-            package.app_catalog_listing_resource_version).data
-        if not app_catalog_listing_resource_version:
-            self._echo_error('Could not get details from the App Catalog')
-            return None
-        self._echo_message_kv('Latest version', package.version)
-        self._echo_message_kv('Released', package.time_created)
-
-        if self._config['region'] not in app_catalog_listing_resource_version.available_regions:
-            self._echo_error('This image is not available in your region')
-            return None
-
-        if shape not in app_catalog_listing_resource_version.compatible_shapes:
-            self._echo_error('This image is not compatible with the selected shape')
-            return None
-
-        # Accept Marketplace Terms of Use
-        if not self._market_agreements(compartment_id, package.listing_id, package.version):
-            return None
-
-        # Subscribe to the listing in the Application Catalog
-        self._app_catalog_subscribe(
-            compartment_id,
-            app_catalog_listing_resource_version.listing_id,
-            app_catalog_listing_resource_version.listing_resource_version)
-
-        # Retrieve image from the Application Catalog
-        image = self._compute_client.get_image(app_catalog_listing_resource_version.listing_resource_id).data
+                         cloud_init_file=None,
+                         count=None,
+                         callback=None,
+                         wait=True,
+                         accept_agreements=None,
+                         readiness=None,
+                         placement=None,
+                         pool=None,
+                         freeform_tags=None):
+        """Provision Marketplace image.
+
+        See _provision_image for bulk provisioning (count/callback), wait,
+        readiness, placement, pool and freeform_tags.
+
+        The Marketplace chain (listing, details, agreements, subscription)
+        runs alongside the Availability Domain and subnet lookups.
+
+        Agreements which are not accepted yet are accepted without prompting
+        when accept_agreements is True, refused when it is False; the user is
+        prompted by default.
+        """
+        graph = self._market_graph(compartment_id, market_image_name, shape, accept_agreements)
 
-        # Actual provisioning
-        return self._provision_image(image,
+        # Actual provisioning, prompting for the agreements once the lookups
+        # have run
+        return self._provision_image(graph,
                                      compartment_id=compartment_id,
                                      display_name=display_name,
                                      shape=shape,
@@ -534,8 +2442,73 @@ class OciCompute(object):
                                      vcn_compartment_id=vcn_compartment_id,
                                      subnet_name=subnet_name,
                                      ssh_authorized_keys_file=ssh_authorized_keys_file,
-                                     cloud_init_file=cloud_init_file)
-
+                                     cloud_init_file=cloud_init_file,
+                                     count=count,
+                                     callback=callback,
+                                     wait=wait,
+                                     readiness=readiness,
+                                     placement=placement,
+                                     pool=pool,
+                                     freeform_tags=freeform_tags,
+                                     confirm=lambda results: self._market_confirm(compartment_id, results))
+
+    def _clone_graph(self, compartment_id, golden_name):
+        """Return the lookup graph of provision_clone: its 'image' task returns the golden.GoldenImage."""
+        def image_task():
+            self._echo_header('Retrieving golden image')
+            image = self.golden_images(compartment_id, golden_name).get(golden_name)
+            if not image:
+                self._echo_error("No golden image found")
+            return image
+
+        graph = self._task_graph()
+        graph.add('image', image_task)
+        return graph
+
+    @_phased('provision clone')
+    def provision_clone(self,
+                        display_name,
+                        compartment_id,
+                        golden_name,
+                        shape,
+                        availability_domain,
+                        vcn_name,
+                        vcn_compartment_id,
+                        subnet_name,
+                        ssh_authorized_keys_file,
+                        cloud_init_file=None,
+                        count=None,
+                        callback=None,
+                        wait=True,
+                        readiness=None):
+        """Provision clones of a golden image.
+
+        Each instance is launched from a clone of the golden boot volume of
+        the Availability Domain, or from a restore of the golden backup when
+        the image is not replicated there (see replicate_golden): the
+        software of the golden instance is already installed.
+
+        See _provision_image for bulk provisioning (count/callback), wait and
+        readiness.
+        """
+        graph = self._clone_graph(compartment_id, golden_name)
+        return self._provision_image(graph,
+                                     compartment_id=compartment_id,
+                                     display_name=display_name,
+                                     shape=shape,
+                                     availability_domain=availability_domain,
+                                     vcn_name=vcn_name,
+                                     vcn_compartment_id=vcn_compartment_id,
+                                     subnet_name=subnet_name,
+                                     ssh_authorized_keys_file=ssh_authorized_keys_file,
+                                     cloud_init_file=cloud_init_file,
+                                     count=count,
+                                     callback=callback,
+                                     wait=wait,
+                                     readiness=readiness,
+                                     clone=True)
+
+    @_phased('list instances')
     def instance_list(self, compartment_id, display_name=None):
         """List Compute Instances.
 
@@ -545,26 +2518,665 @@ class OciCompute(object):
                           given display name exactly
 
         """
-        response = oci.pagination.list_call_get_all_results(
-            self._compute_client.list_instances,
-            compartment_id,
-            display_name=display_name)
-        instances = []
-        for instance in response.data:
-            if instance.lifecycle_state == 'TERMINATED':
+        return [instance_row(instance, vnic) for instance, vnic in self.iter_instances(compartment_id, display_name)]
+
+    def iter_instances(self, compartment_id, display_name=None, limit=None, vnics=True, name_prefix=None, state=None):
+        """Iterate over the instances of a compartment as they are retrieved.
+
+        Terminated instances are skipped. The primary VNIC of the instances
+        of each page is looked up concurrently and instances are yielded as
+        their VNIC is retrieved, without waiting for the next pages.
+
+        Parameters:
+            compartment_id: the compartment OCID
+            display_name: A filter to return only resources that match the
+                          given display name exactly
+            limit: stop after this number of instances; smaller pages are
+                   requested accordingly
+            vnics: look up the primary VNICs
+            name_prefix: only yield instances whose display name starts
+                         with this prefix
+            state: only yield instances in this lifecycle state
+
+        Yields:
+            (records.InstanceRecord, records.VnicRecord) tuples; vnic is None
+            when not available.
+
+        """
+        kwargs = {'display_name': display_name}
+        if state:
+            kwargs['lifecycle_state'] = state.upper()
+        if limit is not None and limit < LIST_PAGE_SIZE and not name_prefix:
+            kwargs['limit'] = limit
+
+        def pages():
+            for response in oci.pagination.list_call_get_all_results_generator(
+                    self._compute_client.list_instances,
+                    'response',
+                    compartment_id,
+                    **kwargs):
+                # Keep compact records only, not the SDK models of the page
+                yield [instance_record(instance) for instance in response.data
+                       if instance.lifecycle_state != 'TERMINATED'
+                       and (not name_prefix or instance.display_name.startswith(name_prefix))]
+
+        yield from self._with_vnics(pages(), limit, vnics)
+
+    def _with_vnics(self, pages, limit=None, vnics=True):
+        """Look up the primary VNICs of pages of instances.
+
+        The VNICs of each page are looked up concurrently, switching to
+        compartment wide lookups for compartments with many instances (see
+        get_vnics).
+
+        Parameters:
+            pages: iterable of lists of records.InstanceRecord
+            limit: stop after this number of instances
+            vnics: look up the primary VNICs
+
+        Yields:
+            (records.InstanceRecord, records.VnicRecord) tuples.
+
+        """
+        count = 0
+        # VNIC attachments by compartment, for compartment wide lookups
+        attachments = {}
+
+        def resolve(instance):
+            return self._vnic_resolver(instance.compartment_id, attachments.get(instance.compartment_id))(instance)
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            for instances in pages:
+                if limit is not None:
+                    instances = instances[:limit - count]
+                if not vnics:
+                    results = [None] * len(instances)
+                else:
+                    compartments = Counter(instance.compartment_id for instance in instances)
+                    compartment_ids = [compartment_id for compartment_id, instance_count in compartments.items()
+                                       if compartment_id not in attachments
+                                       and instance_count > COMPARTMENT_WIDE_THRESHOLD]
+                    attachments.update(zip(compartment_ids,
+                                           executor.map(self._vnic_attachments, compartment_ids)))
+                    results = executor.map(resolve, instances)
+                for instance, vnic in zip(instances, results):
+                    count += 1
+                    yield instance, vnic_record(vnic)
+                if limit is not None and count >= limit:
+                    return
+
+    """Queries across compartments."""
+
+    def _use_search(self, backend, compartment_ids, selective=True):
+        """Return True if a query should use the Resource Search backend.
+
+        Automatic selection uses Resource Search for selective queries
+        spanning several compartments, where list calls would be needed for
+        each of them.
+        """
+        backend = backend or self._query_backend
+        return backend == BACKEND_SEARCH or (backend == BACKEND_AUTO and selective and len(compartment_ids) > 1)
+
+    def _iter_search(self, resource_type, compartment_ids, record, **conditions):
+        """Yield the pages of records of a Resource Search structured query.
+
+        Compartments are split in batches of SEARCH_BATCH.
+        """
+        for start in range(0, len(compartment_ids), SEARCH_BATCH):
+            details = oci.resource_search.models.StructuredSearchDetails(
+                type='Structured',
+                matching_context_type='NONE',
+                query=structured_query(resource_type, compartment_ids[start:start + SEARCH_BATCH], **conditions))
+            self._echo_message_kv('Search query', details.query)
+            for response in oci.pagination.list_call_get_all_results_generator(
+                    self._search_client.search_resources, 'response', details):
+                yield [record(summary) for summary in response.data.items]
+
+    def _search_pages(self, resource_type, compartment_ids, backend, record, **conditions):
+        """Run a Resource Search query, falling back when search is unavailable.
+
+        The first page is retrieved upfront: if Resource Search cannot be
+        used (e.g. not available in the realm, or not authorized) and the
+        backend is not forced, None is returned and the caller falls back to
+        list calls.
+
+        Returns:
+            Iterator over pages of records, or None.
+
+        """
+        pages = self._iter_search(resource_type, compartment_ids, record, **conditions)
+        try:
+            first = next(pages, None)
+        except oci.exceptions.ServiceError as e:
+            if (backend or self._query_backend) == BACKEND_SEARCH:
+                raise
+            self._echo_message('Resource Search unavailable ({}), using list calls'.format(e.code))
+            return None
+        return chain([first] if first is not None else [], pages)
+
+    def query_instances(self,
+                        compartment_ids,
+                        display_name=None,
+                        name_prefix=None,
+                        state=None,
+                        limit=None,
+                        vnics=True,
+                        backend=None):
+        """Iterate over the instances of several compartments.
+
+        With the Resource Search backend, a single indexed query answers for
+        all the compartments; note that the search index is eventually
+        consistent and may lag recent changes. With the list backend, the
+        compartments are listed concurrently (see iter_instances).
+
+        Automatic selection only uses Resource Search for filtered queries
+        or when VNICs are not needed: unfiltered listings are dominated by
+        the VNIC lookups, which list calls resolve for each compartment
+        concurrently.
+
+        Parameters:
+            compartment_ids: OCIDs of the compartments
+            display_name, name_prefix, state, limit, vnics: see
+                                                            iter_instances
+            backend: search.BACKEND_SEARCH, BACKEND_LIST or BACKEND_AUTO
+                     (default: the OciCompute query_backend)
+
+        Yields:
+            (records.InstanceRecord, records.VnicRecord) tuples.
+
+        """
+        selective = bool(display_name or name_prefix or state) or not vnics
+        if self._use_search(backend, compartment_ids, selective):
+            pages = self._search_pages('instance', compartment_ids, backend, summary_instance_record,
+                                       display_name=display_name,
+                                       name_contains=name_prefix,
+                                       state=state.upper() if state else None,
+                                       exclude_state=None if state else 'TERMINATED')
+            if pages is not None:
+                # Search conditions are case insensitive: keep the exact
+                # matches only, as the list backend does
+                yield from self._with_vnics(
+                    ([instance for instance in page
+                      if (not display_name or instance.display_name == display_name)
+                      and (not name_prefix or instance.display_name.startswith(name_prefix))] for page in pages),
+                    limit,
+                    vnics)
+                return
+
+        def iterate(compartment_id):
+            return self.iter_instances(compartment_id, display_name, limit, vnics, name_prefix, state)
+
+        if len(compartment_ids) == 1:
+            yield from iterate(compartment_ids[0])
+            return
+        merged = merge_iterators(compartment_ids, iterate, self._max_workers)
+        try:
+            yield from islice((item for _, item in merged), limit)
+        finally:
+            merged.close()
+
+    def query_images(self, compartment_ids, custom=None, name=None, limit=None, backend=None):
+        """Iterate over the images of several compartments.
+
+        Only Custom images are indexed by Resource Search; Platform images
+        are always listed, from the first compartment (they are the same in
+        all compartments).
+
+        Parameters:
+            compartment_ids: OCIDs of the compartments
+            custom: see iter_images
+            name: only yield images whose display name contains name
+            limit: stop after this number of images
+            backend: see query_instances
+
+        Yields:
+            records.ImageRecord; operating system fields are None for Custom
+            images found through Resource Search.
+
+        """
+        if custom is False:
+            compartment_ids = compartment_ids[:1]
+        elif custom and self._use_search(backend, compartment_ids):
+            pages = self._search_pages('image', compartment_ids, backend, summary_image_record,
+                                       name_contains=name)
+            if pages is not None:
+                images = (image for page in pages for image in page if not name or name in image.display_name)
+                yield from islice(images, limit)
+                return
+
+        def iterate(compartment_id):
+            return (image for image in self.iter_images(compartment_id, custom)
+                    if not name or name in image.display_name)
+
+        if len(compartment_ids) == 1:
+            yield from islice(iterate(compartment_ids[0]), limit)
+            return
+        merged = merge_iterators(compartment_ids, iterate, self._max_workers)
+        try:
+            yield from islice((image for _, image in merged), limit)
+        finally:
+            merged.close()
+
+    def instance_states(self, compartment_id, instance_ids=None):
+        """Return the current state of the instances of a compartment.
+
+        Terminated instances are included. All the instances are retrieved
+        with a single (paginated) list call, unless only a few instances are
+        wanted (see waiter.use_get): these are retrieved with a get call
+        each, see LifecycleWaiter.
+
+        Parameters:
+            compartment_id: the compartment OCID
+            instance_ids: the OCIDs of the instances wanted (default: all);
+                          other instances may be returned as well
+
+        Returns:
+            Dictionary {instance_id: records.InstanceRecord}.
+
+        """
+        if instance_ids is not None and use_get(len(instance_ids), self._list_pages.get(compartment_id)):
+            states = {}
+            for instance_id in instance_ids:
+                try:
+                    states[instance_id] = instance_record(self._compute_client.get_instance(instance_id).data)
+                except oci.exceptions.ServiceError as e:
+                    # Newly launched instances might not be visible yet
+                    if e.status != 404:
+                        raise
+            return states
+        instances, self._list_pages[compartment_id] = list_pages(self._compute_client.list_instances, compartment_id)
+        return {instance.id: instance_record(instance) for instance in instances}
+
+    def _instance_action(self, instance_id, action_name, wait=False, wait_callback=None):
+        """Perform an action on an instance, optionally waiting for completion.
+
+        Parameters:
+            instance_id: the OCID of the instance
+            action_name: one of INSTANCE_ACTIONS
+            wait: wait for completion (True/False)
+            wait_callback: oci.wait_until callback
+
+        Returns:
+            The resulting lifecycle state.
+
+        """
+        action, target_state = INSTANCE_ACTIONS[action_name]
+        if wait:
+            compute_client_composite_operations = self._compute_composite
+            waiter_kwargs = {'wait_callback': wait_callback} if wait_callback else {}
+            if action:
+                response = compute_client_composite_operations.instance_action_and_wait_for_state(
+                    instance_id=instance_id,
+                    action=action,
+                    wait_for_states=[target_state],
+                    waiter_kwargs=waiter_kwargs)
+            else:
+                response = compute_client_composite_operations.terminate_instance_and_wait_for_state(
+                    instance_id=instance_id,
+                    wait_for_states=[target_state],
+                    waiter_kwargs=waiter_kwargs)
+            return response.data.lifecycle_state if response and response.data else target_state
+        elif action:
+            return self._compute_client.instance_action(instance_id, action=action).data.lifecycle_state
+        else:
+            self._compute_client.terminate_instance(instance_id, preserve_boot_volume=False)
+            return 'TERMINATING'
+
+    @_phased('instance actions')
+    def instance_actions(self, action_name, compartment_id, instance_ids, wait=False, callback=None):
+        """Perform an action on several instances concurrently.
+
+        Actions are requested through a thread pool; when waiting, all
+        instances are then tracked by a single LifecycleWaiter.
+
+        Parameters:
+            action_name: one of INSTANCE_ACTIONS ('terminate', 'start' or
+                         'shutdown')
+            compartment_id: the compartment OCID of the instances
+            instance_ids: the OCIDs of the instances
+            wait: wait for completion (True/False)
+            callback: function called with (instance_id, state, elapsed, error)
+                      as each action completes
+
+        Returns:
+            List of (instance_id, state, elapsed, error) tuples in the
+            instance_ids order. state is None when the action failed.
+
+        """
+        self._echo_header('{} initiated for {} instance(s)'.format(action_name.title(), len(instance_ids)))
+        target_state = INSTANCE_ACTIONS[action_name][1]
+        results = {}
+        start = time.time()
+
+        def done(instance_id, state, elapsed, error):
+            results[instance_id] = (instance_id, state, elapsed, error)
+            if callback:
+                callback(instance_id, state, elapsed, error)
+
+        def completed(instance_id, instance, elapsed, error):
+            done(instance_id, instance.lifecycle_state if instance else None, time.time() - start, error)
+
+        waiter = self._waiter()
+        with self._phase('{} requests'.format(action_name)), \
+                ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {executor.submit(self._instance_action, instance_id, action_name): instance_id
+                       for instance_id in instance_ids}
+            for future in as_completed(futures):
+                instance_id = futures[future]
+                try:
+                    state = future.result()
+                except Exception as e:
+                    done(instance_id, None, time.time() - start, e)
+                    continue
+                if wait:
+                    waiter.add_instance(compartment_id, instance_id, [target_state], completed)
+                else:
+                    done(instance_id, state, time.time() - start, None)
+
+        if waiter.pending:
+            with self._phase('wait'):
+                waiter.wait()
+
+        return [results[instance_id] for instance_id in instance_ids]
+
+    @_phased('wait for resources')
+    def wait_for(self,
+                 compartment_id,
+                 display_names=None,
+                 state='RUNNING',
+                 work_request_ids=None,
+                 max_wait_seconds=None,
+                 callback=None):
+        """Wait for instances and/or work requests.
+
+        Parameters:
+            compartment_id: the compartment OCID
+            display_names: display names of the instances to wait for
+            state: the lifecycle state to wait for
+            work_request_ids: OCIDs of the work requests to wait for
+            max_wait_seconds: maximum time to wait
+            callback: function called with (resource_id, display_name, state,
+                      elapsed, error) as each resource completes
+
+        Returns:
+            List of (resource_id, display_name, state, elapsed, error) tuples.
+            An empty list if there is nothing to wait for.
+
+        """
+        waiter = self._waiter(**({'max_wait_seconds': max_wait_seconds} if max_wait_seconds else {}))
+        names = {}
+        results = []
+
+        def completed(resource_id, resource, elapsed, error):
+            resource_state = getattr(resource, 'lifecycle_state', None) or getattr(resource, 'status', None)
+            result = (resource_id, names.get(resource_id, resource_id), resource_state, elapsed, error)
+            results.append(result)
+            if callback:
+                callback(*result)
+
+        if display_names:
+            self._echo_header('Retrieving instances')
+            for instance in oci.pagination.list_call_get_all_results(
+                    self._compute_client.list_instances,
+                    compartment_id).data:
+                if instance.display_name not in display_names:
+                    continue
+                if instance.lifecycle_state == 'TERMINATED' and state.upper() != 'TERMINATED':
+                    continue
+                names[instance.id] = instance.display_name
+                waiter.add_instance(compartment_id, instance.id, [state], completed)
+        for work_request_id in work_request_ids or []:
+            waiter.add_work_request(compartment_id, work_request_id, completed)
+
+        if waiter.pending:
+            self._echo_header('Waiting for {} resource(s)'.format(waiter.pending))
+            with self._phase('wait'):
+                waiter.wait()
+        return results
+
+    @_phased('wait for instances')
+    def wait_for_instances(self, instances, callback=None):
+        """Wait for instances to reach their target lifecycle state.
+
+        All the instances are tracked by a single LifecycleWaiter.
+
+        Parameters:
+            instances: list of (compartment_id, instance_id, state) tuples
+            callback: function called with (instance_id, instance, elapsed,
+                      error) as each instance completes
+
+        Returns:
+            Dictionary {instance_id: (instance, elapsed, error)}.
+
+        """
+        waiter = self._waiter()
+        for compartment_id, instance_id, state in instances:
+            waiter.add_instance(compartment_id, instance_id, [state], callback)
+        return waiter.wait() if waiter.pending else {}
+
+    @_phased('warm pools')
+    def pool_stats(self, pool, compartment_id):
+        """Return the state of the warm pools of a compartment.
+
+        Pools of the pool file and pools with instances in the compartment
+        are reported.
+
+        Parameters:
+            pool: the pool.WarmPool policy
+
+        Returns:
+            List of pool.PoolStats.
+
+        """
+        pools = pool.pools()
+        instances = self._pool_instances(compartment_id)
+        keys = set(instances) | set(key for key, entry in pools.items()
+                                    if entry.get('profile', {}).get('compartment_id') == compartment_id)
+        return [pool.stats(key, pools.get(key), instances.get(key, [])) for key in sorted(keys)]
+
+    @_phased('maintain warm pools')
+    def maintain_pools(self, pool, compartment_id, keys=None, drain=False):
+        """Maintain the warm pools of a compartment.
+
+        Warmed up instances are stopped, old and excess instances are
+        evicted, and the pools are refilled to their size. Pools idle for
+        longer than the max_idle of the policy are drained, then forgotten.
+        Pools which are not in the pool file (e.g. created on another host)
+        are only drained on request.
+
+        Parameters:
+            pool: the pool.WarmPool policy
+            keys: only maintain these pools
+            drain: terminate all the pooled instances and forget the pools
+
+        Returns:
+            List of pool.PoolMaintenance; the errors include those of the
+            background refills since the last maintenance.
+
+        """
+        pools = pool.pools()
+        instances = self._pool_instances(compartment_id)
+        results = []
+        forget = []
+        for key in sorted(set(instances) | set(key for key, entry in pools.items()
+                                               if entry.get('profile', {}).get('compartment_id') == compartment_id)):
+            if keys and key not in keys:
+                continue
+            entry = pools.get(key)
+            if not drain and not (entry and entry.get('profile')):
                 continue
-            vnic = self.get_vnic(compartment_id, instance)
-            instances.append((
-                instance.id,
-                instance.display_name,
-                instance.availability_domain[-4:],
-                instance.time_created.strftime("%Y-%m-%d %H:%M:%S %Z"),
-                instance.lifecycle_state.title(),
-                vnic.private_ip if vnic else 'None',
-                vnic.public_ip if vnic else 'None'
-            ))
-
-        return instances
+            details = None
+            if drain or pool.is_idle(entry):
+                size = 0
+                forget.append(key)
+            else:
+                size = entry['size']
+                details = self._profile_details(entry['profile'])
+            self._echo_message_kv('Warm pool {}'.format(key), 'drain' if not size else 'size {}'.format(size))
+            maintenance = self._refill_pool(pool, key, details, instances.get(key, []), size)
+            # Errors of the background refills since the last maintenance
+            results.append(maintenance._replace(errors=pool.take_errors(key) + maintenance.errors))
+        pool.forget(forget)
+        return results
+
+    @_phased('golden catalog')
+    def golden_images(self, compartment_id, name=None):
+        """Return the golden images of a compartment.
+
+        Parameters:
+            compartment_id: the compartment OCID
+            name: only return this golden image
+
+        Returns:
+            Dictionary {name: golden.GoldenImage}.
+
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            boot_volumes = executor.submit(oci.pagination.list_call_get_all_results,
+                                           self._blockstorage_client.list_boot_volumes,
+                                           compartment_id=compartment_id)
+            backups = executor.submit(oci.pagination.list_call_get_all_results,
+                                      self._blockstorage_client.list_boot_volume_backups,
+                                      compartment_id)
+            catalog = golden_catalog(boot_volumes.result().data, backups.result().data)
+        return {key: image for key, image in catalog.items() if key == (name or key)}
+
+    @_phased('create golden image')
+    def create_golden(self, compartment_id, name, instance_id=None, boot_volume_id=None):
+        """Create a golden image from the boot volume of a prepared instance.
+
+        The boot volume is cloned into the golden boot volume of its
+        Availability Domain, then backed up so that it can be replicated to
+        other Availability Domains (see replicate_golden). The instance can
+        be terminated afterwards; stop it before for a consistent copy.
+
+        Parameters:
+            compartment_id: the compartment OCID
+            name: the golden image name
+            instance_id: the prepared instance OCID
+            boot_volume_id: the boot volume OCID, instead of instance_id
+
+        Returns:
+            golden.GoldenImage, None on failure.
+
+        """
+        if self.golden_images(compartment_id, name):
+            self._echo_error('Golden image {} already exists'.format(name))
+            return None
+        if instance_id:
+            instance = self._compute_client.get_instance(instance_id).data
+            attachments = oci.pagination.list_call_get_all_results(
+                self._compute_client.list_boot_volume_attachments,
+                instance.availability_domain,
+                compartment_id,
+                instance_id=instance_id).data
+            if not attachments:
+                self._echo_error('No boot volume attached to {}'.format(instance.display_name))
+                return None
+            boot_volume_id = attachments[0].boot_volume_id
+        boot_volume = self._blockstorage_client.get_boot_volume(boot_volume_id).data
+        self._echo_message_kv('Boot volume', boot_volume.display_name)
+
+        volume = self._blockstorage_client.create_boot_volume(self._golden_volume_details(
+            name, compartment_id, boot_volume.availability_domain,
+            oci.core.models.BootVolumeSourceFromBootVolumeDetails(id=boot_volume.id))).data
+        errors = self._wait_golden(compartment_id, [volume])
+        if not errors:
+            backup = self._blockstorage_client.create_boot_volume_backup(
+                oci.core.models.CreateBootVolumeBackupDetails(boot_volume_id=volume.id,
+                                                              display_name=GOLDEN_DISPLAY_NAME.format(name),
+                                                              freeform_tags={GOLDEN_TAG: name},
+                                                              type='FULL')).data
+            errors = self._wait_golden(compartment_id, [backup], backup=True)
+        for error in errors:
+            self._echo_error(str(error))
+        return self.golden_images(compartment_id, name).get(name)
+
+    @_phased('replicate golden image')
+    def replicate_golden(self, compartment_id, name, availability_domains):
+        """Replicate a golden image to Availability Domains, ahead of provisioning.
+
+        The golden backup is restored into each Availability Domain without
+        replica: instances provisioned there are then cloned from a boot
+        volume of their Availability Domain rather than restored from the
+        backup. The backup is created first if it is missing.
+
+        Parameters:
+            compartment_id: the compartment OCID
+            name: the golden image name
+            availability_domains: abbreviated Availability Domains (e.g.
+                                  'AD-2')
+
+        Returns:
+            golden.GoldenImage, None on failure.
+
+        """
+        image = self.golden_images(compartment_id, name).get(name)
+        if not image:
+            self._echo_error('No golden image found')
+            return None
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            domains = list(executor.map(lambda domain: self._get_availability_domain(compartment_id, domain),
+                                        availability_domains))
+        if None in domains:
+            return None
+        if not (image.backup and image.backup.lifecycle_state == 'AVAILABLE'):
+            replica = next((replica for replica in image.replicas.values() if replica.lifecycle_state == 'AVAILABLE'),
+                           None)
+            if not replica:
+                self._echo_error('No golden boot volume available to back up')
+                return None
+            backup = self._blockstorage_client.create_boot_volume_backup(
+                oci.core.models.CreateBootVolumeBackupDetails(boot_volume_id=replica.id,
+                                                              display_name=GOLDEN_DISPLAY_NAME.format(name),
+                                                              freeform_tags={GOLDEN_TAG: name},
+                                                              type='FULL')).data
+            errors = self._wait_golden(compartment_id, [backup], backup=True)
+            if errors:
+                self._echo_error(str(errors[0]))
+                return None
+            image = image._replace(backup=golden_volume(backup, 'backup'))
+
+        source_details = oci.core.models.BootVolumeSourceFromBootVolumeBackupDetails(id=image.backup.id)
+        volumes = []
+        for domain in domains:
+            if domain.name in image.replicas:
+                self._echo_message_kv(short_name(domain.name), 'already replicated')
+                continue
+            volumes.append(self._blockstorage_client.create_boot_volume(self._golden_volume_details(
+                name, compartment_id, domain.name, source_details)).data)
+            self._echo_message_kv(short_name(domain.name), 'restoring')
+        for error in self._wait_golden(compartment_id, volumes) if volumes else []:
+            self._echo_error(str(error))
+        return self.golden_images(compartment_id, name).get(name)
+
+    @_phased('delete golden image')
+    def delete_golden(self, compartment_id, name):
+        """Delete the boot volumes and backup of a golden image.
+
+        Returns:
+            The number of boot volumes and backups deleted, None if there is
+            no such golden image.
+
+        """
+        image = self.golden_images(compartment_id, name).get(name)
+        if not image:
+            self._echo_error('No golden image found')
+            return None
+        tasks = [(self._blockstorage_client.delete_boot_volume, replica.id) for replica in image.replicas.values()]
+        if image.backup:
+            tasks.append((self._blockstorage_client.delete_boot_volume_backup, image.backup.id))
+        deleted = 0
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {executor.submit(function, resource_id): resource_id for function, resource_id in tasks}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except oci.exceptions.ServiceError as e:
+                    self._echo_error('Could not delete {}: {}'.format(futures[future], e.message))
+                    continue
+                deleted += 1
+        return deleted
 
     def instance_terminate(self, instance_id, wait=False):
         """Terminate Compute Instance.
@@ -576,15 +3188,10 @@ class OciCompute(object):
         """
         self._echo_header('Termination initiated')
         if wait:
-            compute_client_composite_operations = oci.core.ComputeClientCompositeOperations(self._compute_client)
             self._echo_message('Waiting for termination', nl=False)
-            compute_client_composite_operations.terminate_instance_and_wait_for_state(
-                instance_id=instance_id,
-                wait_for_states=[oci.core.models.Instance.LIFECYCLE_STATE_TERMINATED],
-                waiter_kwargs={'wait_callback': self._wait_callback})
+        self._instance_action(instance_id, 'terminate', wait=wait, wait_callback=self._wait_callback)
+        if wait:
             self._echo()
-        else:
-            self._compute_client.terminate_instance(instance_id, preserve_boot_volume=False)
 
     def instance_start(self, instance_id, wait=False):
         """Start Compute Instance.
@@ -596,16 +3203,10 @@ class OciCompute(object):
         """
         self._echo_header('Startup initiated')
         if wait:
-            compute_client_composite_operations = oci.core.ComputeClientCompositeOperations(self._compute_client)
             self._echo_message('Waiting for Running state', nl=False)
-            compute_client_composite_operations.instance_action_and_wait_for_state(
-                instance_id=instance_id,
-                action='START',
-                wait_for_states=[oci.core.models.Instance.LIFECYCLE_STATE_RUNNING],
-                waiter_kwargs={'wait_callback': self._wait_callback})
+        self._instance_action(instance_id, 'start', wait=wait, wait_callback=self._wait_callback)
+        if wait:
             self._echo()
-        else:
-            self._compute_client.instance_action(instance_id, action='START')
 
     def instance_shutdown(self, instance_id, wait=False):
         """Shutdown Compute Instance.
@@ -617,13 +3218,7 @@ class OciCompute(object):
         """
         self._echo_header('Shutdown initiated')
         if wait:
-            compute_client_composite_operations = oci.core.ComputeClientCompositeOperations(self._compute_client)
             self._echo_message('Waiting for Stopped state', nl=False)
-            compute_client_composite_operations.instance_action_and_wait_for_state(
-                instance_id=instance_id,
-                action='SOFTSTOP',
-                wait_for_states=[oci.core.models.Instance.LIFECYCLE_STATE_STOPPED],
-                waiter_kwargs={'wait_callback': self._wait_callback})
+        self._instance_action(instance_id, 'shutdown', wait=wait, wait_callback=self._wait_callback)
+        if wait:
             self._echo()
-        else:
-            self._compute_client.instance_action(instance_id, action='SOFTSTOP')
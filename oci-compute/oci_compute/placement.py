@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+"""OCI Compute instance placement.
+
+PlacementPolicy helper class describing where instances may be launched: an
+ordered list of shapes, Availability Domains and fault domains, tried in turn
+when a launch is rejected for lack of capacity (failover), or several at once
+keeping the first instance running (hedging).
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import namedtuple
+from itertools import product
+import threading
+
+# Launch errors worth retrying on another placement: out of host capacity
+# (500 InternalError), or service limit of the shape reached in the
+# Availability Domain
+OUT_OF_CAPACITY_STATUS = 500
+OUT_OF_CAPACITY_MESSAGE = 'out of host capacity'
+LIMIT_EXCEEDED_CODE = 'LimitExceeded'
+
+# Compute capacity report statuses
+CAPACITY_AVAILABLE = 'AVAILABLE'
+CAPACITY_OUT_OF_HOST = 'OUT_OF_HOST_CAPACITY'
+CAPACITY_NOT_SUPPORTED = 'HARDWARE_NOT_SUPPORTED'
+
+# A launch target; availability_domain is the full Availability Domain name,
+# fault_domain is None to let the service choose
+Placement = namedtuple('Placement', [
+    'shape',
+    'availability_domain',
+    'fault_domain',
+])
+
+# Outcome of the placements of the last provisioning: capacity is the status
+# reported by the capacity check (None when not checked), launched and
+# out_of_capacity the launch requests accepted and rejected for lack of
+# capacity, cancelled the hedged instances terminated once another one was
+# running.
+PlacementStats = namedtuple('PlacementStats', [
+    'shape',
+    'availability_domain',
+    'fault_domain',
+    'capacity',
+    'launched',
+    'out_of_capacity',
+    'cancelled',
+])
+
+
+def out_of_capacity(error):
+    """Return True if a launch error denotes a lack of capacity at the placement."""
+    if getattr(error, 'code', None) == LIMIT_EXCEEDED_CODE:
+        return True
+    return (getattr(error, 'status', None) == OUT_OF_CAPACITY_STATUS
+            and OUT_OF_CAPACITY_MESSAGE in str(getattr(error, 'message', '') or '').lower())
+
+
+def short_name(availability_domain):
+    """Return the Availability Domain name without its tenancy prefix (e.g. 'US-ASHBURN-AD-1')."""
+    return availability_domain.split(':')[-1] if availability_domain else availability_domain
+
+
+def format_placement(placement):
+    """Return a placement as 'shape in AD[/fault domain]'."""
+    where = short_name(placement.availability_domain)
+    if placement.fault_domain:
+        where = '{}/{}'.format(where, placement.fault_domain)
+    return '{} in {}'.format(placement.shape, where)
+
+
+class PlacementError(Exception):
+    """No placement is left to launch an instance."""
+
+    pass
+
+
+class PlacementPolicy(object):
+    """Where and how to launch instances.
+
+    Candidate placements are all the combinations of shapes, Availability
+    Domains and fault domains, in this order of preference: the preferred
+    shape is tried in every Availability Domain before the next shape.
+    """
+
+    def __init__(self, availability_domains=(), shapes=(), fault_domains=(), hedge=1, capacity_check=False):
+        """Initialise the policy.
+
+        Parameters:
+            availability_domains: abbreviated Availability Domains (e.g.
+                                  'AD-2'), after the Availability Domain of
+                                  the provisioning
+            shapes: compatible shapes, after the shape of the provisioning;
+                    shapes incompatible with the image are skipped
+            fault_domains: fault domains (e.g. 'FAULT-DOMAIN-1'), none to let
+                           the service choose
+            hedge: number of placements each instance is launched on at
+                   once; the first instance running is kept and the others
+                   are terminated. Only applies when waiting for the
+                   instances.
+            capacity_check: order the placements with the compute capacity
+                            report before launching
+
+        """
+        self._availability_domains = tuple(availability_domains)
+        self._shapes = tuple(shapes)
+        self._fault_domains = tuple(fault_domains)
+        self._hedge = hedge
+        self._capacity_check = capacity_check
+
+    @staticmethod
+    def _ordered(first, others):
+        """Return first followed by others, without duplicates."""
+        values = []
+        for value in (first,) + others:
+            if value and value not in values:
+                values.append(value)
+        return values
+
+    def availability_domains(self, availability_domain):
+        """Return the abbreviated Availability Domains, in order."""
+        return self._ordered(availability_domain, self._availability_domains)
+
+    def shapes(self, shape):
+        """Return the shapes, in order."""
+        return self._ordered(shape, self._shapes)
+
+    @property
+    def fault_domains(self):
+        """Return the fault domains, in order (empty: any)."""
+        return list(self._fault_domains)
+
+    @property
+    def hedge(self):
+        """Return the number of placements each instance is launched on at once."""
+        return self._hedge
+
+    @property
+    def capacity_check(self):
+        """Return whether the capacity is checked before launching."""
+        return self._capacity_check
+
+    def placements(self, shapes, availability_domains):
+        """Return the Placements of the candidates.
+
+        Parameters:
+            shapes: the shapes, in order
+            availability_domains: the full Availability Domain names, in order
+
+        """
+        return Placements([Placement(shape, availability_domain, fault_domain)
+                           for shape, availability_domain, fault_domain
+                           in product(shapes, availability_domains, self._fault_domains or (None,))],
+                          self._hedge)
+
+
+class Placements(object):
+    """Candidate placements of a provisioning, shared by its launches.
+
+    A placement which rejects a launch for lack of capacity is exhausted: the
+    following launches of the provisioning skip it.
+    """
+
+    def __init__(self, candidates, hedge=1):
+        """Initialise the candidates.
+
+        Parameters:
+            candidates: Placement list, in order of preference
+            hedge: number of placements each instance is launched on at once
+
+        """
+        self._candidates = list(candidates)
+        self._hedge = max(1, min(hedge, len(self._candidates)))
+        self._lock = threading.Lock()
+        self._exhausted = set()
+        # {placement: {counter: value}}
+        self._stats = {placement: {'capacity': None, 'launched': 0, 'out_of_capacity': 0, 'cancelled': 0}
+                       for placement in self._candidates}
+
+    @property
+    def candidates(self):
+        """Return the candidate placements, in order."""
+        return list(self._candidates)
+
+    @property
+    def hedge(self):
+        """Return the number of placements each instance is launched on at once."""
+        return self._hedge
+
+    def order_by_capacity(self, capacity):
+        """Order the candidates by reported capacity.
+
+        Available placements come first, then the placements which were not
+        reported, then those out of capacity (the report may be outdated);
+        placements without hardware for the shape are dropped.
+
+        Parameters:
+            capacity: dictionary {Placement: capacity status}
+
+        """
+        rank = {CAPACITY_AVAILABLE: 0, None: 1, CAPACITY_OUT_OF_HOST: 2}
+        with self._lock:
+            for placement, status in capacity.items():
+                if placement in self._stats:
+                    self._stats[placement]['capacity'] = status
+            self._candidates = sorted((placement for placement in self._candidates
+                                       if capacity.get(placement) != CAPACITY_NOT_SUPPORTED),
+                                      key=lambda placement: rank.get(capacity.get(placement), 1))
+            self._hedge = max(1, min(self._hedge, len(self._candidates)))
+
+    def claim(self, claimed):
+        """Return the next placement to launch an instance on, None if there is none.
+
+        Hedged launches of an instance share their claimed set: they claim
+        different placements, preferably in different Availability Domains.
+
+        Parameters:
+            claimed: set of the placements claimed for the instance, updated
+
+        """
+        with self._lock:
+            available = [placement for placement in self._candidates
+                         if placement not in self._exhausted and placement not in claimed]
+            if not available:
+                return None
+            used = set(placement.availability_domain for placement in claimed if placement not in self._exhausted)
+            placement = next((placement for placement in available if placement.availability_domain not in used),
+                             available[0])
+            claimed.add(placement)
+            return placement
+
+    def launched(self, placement):
+        """Record a launch accepted at a placement."""
+        with self._lock:
+            self._stats[placement]['launched'] += 1
+
+    def exhaust(self, placement):
+        """Record a launch rejected for lack of capacity: skip the placement from now on."""
+        with self._lock:
+            self._exhausted.add(placement)
+            self._stats[placement]['out_of_capacity'] += 1
+
+    def cancelled(self, placement):
+        """Record a hedged instance terminated in favour of another one."""
+        with self._lock:
+            self._stats[placement]['cancelled'] += 1
+
+    def stats(self):
+        """Return the PlacementStats of the candidates, in order of preference."""
+        with self._lock:
+            return [PlacementStats(*placement, **self._stats[placement])
+                    for placement in self._candidates + sorted(set(self._stats) - set(self._candidates))]
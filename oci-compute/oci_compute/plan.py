@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+
+"""OCI Compute fleet plans.
+
+Declarative description of groups of instances (image, shape, placement,
+count and state), and FleetPlan helper class reconciling the instances of a
+tenancy with it: the current state is retrieved with a single batched
+listing, then the instances to create, start, shut down and terminate are
+processed in concurrent waves.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import namedtuple, OrderedDict
+import json
+import os
+from os.path import dirname, expanduser, expandvars
+import time
+
+from .oci_compute import expand_display_names, INSTANCE_ACTIONS
+from .search import BACKEND_LIST
+
+# Plan actions, in execution order
+ACTION_TERMINATE = 'terminate'
+ACTION_START = 'start'
+ACTION_SHUTDOWN = 'shutdown'
+ACTION_CREATE = 'create'
+ACTIONS = (ACTION_TERMINATE, ACTION_START, ACTION_SHUTDOWN, ACTION_CREATE)
+
+# Freeform tag of the instances launched by a plan; its value is the group
+# name. Only tagged instances are terminated by a plan.
+PLAN_TAG = 'oci-compute-plan'
+
+# Image sources
+SOURCE_PLATFORM = 'platform'
+SOURCE_CUSTOM = 'custom'
+SOURCE_MARKET = 'market'
+SOURCES = (SOURCE_PLATFORM, SOURCE_CUSTOM, SOURCE_MARKET)
+
+# Desired states, and the lifecycle states satisfying them (instances in
+# other states are considered gone)
+STATE_RUNNING = 'RUNNING'
+STATE_STOPPED = 'STOPPED'
+LIFECYCLE_STATES = {
+    STATE_RUNNING: ('PROVISIONING', 'STARTING', 'RUNNING'),
+    STATE_STOPPED: ('STOPPING', 'STOPPED'),
+}
+
+# Group settings, with the same names as the provision options and rc file
+# variables
+GROUP_KEYS = (
+    'source',
+    'image-name',
+    'operating-system',
+    'operating-system-version',
+    'display-name',
+    'count',
+    'state',
+    'compartment-id',
+    'shape',
+    'availability-domain',
+    'vcn-name',
+    'vcn-compartment-id',
+    'subnet-name',
+    'ssh-authorized-keys-file',
+    'cloud-init-file',
+)
+REQUIRED_KEYS = (
+    'compartment-id',
+    'shape',
+    'availability-domain',
+    'vcn-name',
+    'subnet-name',
+    'ssh-authorized-keys-file',
+)
+SOURCE_KEYS = {
+    SOURCE_PLATFORM: ('operating-system', 'operating-system-version'),
+    SOURCE_CUSTOM: ('image-name',),
+    SOURCE_MARKET: ('image-name',),
+}
+
+# Group of instances; display_name may contain a range (see
+# expand_display_names), state is STATE_RUNNING or STATE_STOPPED
+InstanceGroup = namedtuple('InstanceGroup', [
+    'name',
+    'source',
+    'image_name',
+    'operating_system',
+    'operating_system_version',
+    'display_name',
+    'count',
+    'state',
+    'compartment_id',
+    'shape',
+    'availability_domain',
+    'vcn_name',
+    'vcn_compartment_id',
+    'subnet_name',
+    'ssh_authorized_keys_file',
+    'cloud_init_file',
+])
+
+# Change to an instance; instance_id and state (current lifecycle state) are
+# None for creations
+PlanChange = namedtuple('PlanChange', [
+    'action',
+    'group',
+    'display_name',
+    'compartment_id',
+    'instance_id',
+    'state',
+])
+
+# Outcome of a change: state is the final lifecycle state (None on failure),
+# elapsed the time since the start of the apply (seconds)
+PlanResult = namedtuple('PlanResult', [
+    'change',
+    'state',
+    'elapsed',
+    'error',
+])
+
+
+class PlanError(Exception):
+    """Invalid plan."""
+
+    pass
+
+
+def load_plan(path, defaults=None):
+    """Load a plan file.
+
+    The plan is a YAML (or JSON) mapping with a 'groups' mapping of group
+    names to settings, and optional 'defaults' settings for all the groups:
+
+        defaults:
+          compartment-id: dev
+          vcn-name: dev-vcn
+        groups:
+          web:
+            display-name: web-{01..20}
+            operating-system-version: '8'
+          batch:
+            source: custom
+            image-name: batch-image
+            count: 4
+            state: stopped
+
+    Relative file paths are relative to the plan file.
+
+    Parameters:
+        path: the plan file
+        defaults: function returning the default value of a setting (e.g.
+                  from the rc file), or None
+
+    Returns:
+        List of InstanceGroup.
+
+    """
+    with open(path) as f:
+        text = f.read()
+    try:
+        import yaml
+    except ImportError:
+        # JSON plans do not need PyYAML
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            if path.endswith('.json'):
+                raise PlanError('Cannot parse {}: {}'.format(path, e))
+            raise PlanError('PyYAML is needed for YAML plans (pip install oci-compute[yaml])')
+    else:
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise PlanError('Cannot parse {}: {}'.format(path, e))
+    return parse_plan(data, defaults, dirname(os.path.abspath(path)))
+
+
+def _check_keys(settings, where):
+    if not isinstance(settings, dict):
+        raise PlanError('{}: settings must be a mapping'.format(where))
+    unknown = sorted(set(settings) - set(GROUP_KEYS))
+    if unknown:
+        raise PlanError('{}: unknown setting(s) {}'.format(where, ', '.join(unknown)))
+
+
+def parse_plan(data, defaults=None, directory=None):
+    """Return the instance groups of a plan (see load_plan).
+
+    Parameters:
+        data: the plan mapping
+        defaults: function returning the default value of a setting, or None
+        directory: base directory of relative file paths
+
+    Returns:
+        List of InstanceGroup.
+
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('groups'), dict) or not data['groups']:
+        raise PlanError('The plan must have a "groups" mapping')
+    unknown = sorted(set(data) - {'defaults', 'groups'})
+    if unknown:
+        raise PlanError('Unknown plan section(s) {}'.format(', '.join(unknown)))
+    plan_defaults = data.get('defaults') or {}
+    _check_keys(plan_defaults, 'defaults')
+
+    groups = []
+    for name, settings in data['groups'].items():
+        name = str(name)
+        where = 'Group {}'.format(name)
+        _check_keys(settings or {}, where)
+        settings = dict(plan_defaults, **(settings or {}))
+        source = str(settings.get('source') or SOURCE_PLATFORM).lower()
+        if source not in SOURCES:
+            raise PlanError('{}: source must be one of {}'.format(where, ', '.join(SOURCES)))
+
+        def get(key):
+            value = settings.get(key)
+            if value is None and defaults:
+                # The rc file has an image name per source
+                value = defaults('{}-{}'.format(source, key) if key == 'image-name' else key)
+            return str(value) if value is not None else None
+
+        for key in REQUIRED_KEYS + SOURCE_KEYS[source]:
+            if not get(key):
+                raise PlanError('{}: missing "{}"'.format(where, key))
+
+        def path(key):
+            value = get(key)
+            return os.path.join(directory or '', expandvars(expanduser(value))) if value else None
+
+        state = str(settings.get('state') or STATE_RUNNING).upper()
+        if state not in LIFECYCLE_STATES:
+            raise PlanError('{}: state must be running or stopped'.format(where))
+        count = settings.get('count')
+        if count is not None and (not isinstance(count, int) or count < 1):
+            raise PlanError('{}: count must be a positive integer'.format(where))
+        display_name = str(settings.get('display-name') or name)
+        try:
+            expand_display_names(display_name, count)
+        except ValueError as e:
+            raise PlanError('{}: {}'.format(where, e))
+
+        groups.append(InstanceGroup(
+            name=name,
+            source=source,
+            image_name=get('image-name') if source != SOURCE_PLATFORM else None,
+            operating_system=get('operating-system') if source == SOURCE_PLATFORM else None,
+            operating_system_version=get('operating-system-version') if source == SOURCE_PLATFORM else None,
+            display_name=display_name,
+            count=count,
+            state=state,
+            compartment_id=get('compartment-id'),
+            shape=get('shape'),
+            availability_domain=get('availability-domain'),
+            vcn_name=get('vcn-name'),
+            vcn_compartment_id=get('vcn-compartment-id'),
+            subnet_name=get('subnet-name'),
+            ssh_authorized_keys_file=path('ssh-authorized-keys-file'),
+            cloud_init_file=path('cloud-init-file')))
+    return groups
+
+
+def group_names(group):
+    """Return the display names of the instances of a group."""
+    return expand_display_names(group.display_name, group.count)
+
+
+def plan_group(instance):
+    """Return the name of the group which launched an instance, None if no plan did."""
+    return (instance.freeform_tags or {}).get(PLAN_TAG)
+
+
+def diff_plan(groups, instances):
+    """Return the changes bringing the instances to the state of the groups.
+
+    Instances are matched by compartment and display name: missing instances
+    are created, and instances in the wrong state are started or shut down.
+    Only the instances the plan launched (tagged with PLAN_TAG) are
+    terminated: duplicates, and instances of a group which are no longer
+    part of it (e.g. after the count was reduced). Other instances are
+    never terminated, whatever their name.
+
+    Parameters:
+        groups: list of InstanceGroup, with compartment OCIDs
+        instances: iterable of records.InstanceRecord
+
+    Returns:
+        Tuple (list of PlanChange in ACTIONS order, number of instances
+        already in their desired state).
+
+    """
+    desired = OrderedDict()
+    for group in groups:
+        for display_name in group_names(group):
+            key = (group.compartment_id, display_name)
+            if key in desired:
+                raise PlanError('Instance {} is part of groups {} and {}'.format(
+                    display_name, desired[key].name, group.name))
+            desired[key] = group
+
+    current = OrderedDict()
+    for instance in instances:
+        if any(instance.lifecycle_state in states for states in LIFECYCLE_STATES.values()):
+            current.setdefault((instance.compartment_id, instance.display_name), []).append(instance)
+
+    changes = []
+    claimed = set()
+    unchanged = 0
+    for (compartment_id, display_name), group in desired.items():
+        target_states = LIFECYCLE_STATES[group.state]
+        # Keep the instance closest to the desired state
+        existing = sorted(current.get((compartment_id, display_name), []),
+                          key=lambda instance: instance.lifecycle_state not in target_states)
+        claimed.update(instance.id for instance in existing)
+        if not existing:
+            changes.append(PlanChange(ACTION_CREATE, group.name, display_name, compartment_id, None, None))
+            continue
+        kept = existing[0]
+        if kept.lifecycle_state in target_states:
+            unchanged += 1
+        else:
+            changes.append(PlanChange(ACTION_START if group.state == STATE_RUNNING else ACTION_SHUTDOWN,
+                                      group.name, display_name, compartment_id, kept.id, kept.lifecycle_state))
+        for duplicate in existing[1:]:
+            if plan_group(duplicate) == group.name:
+                changes.append(PlanChange(ACTION_TERMINATE, group.name, display_name, compartment_id, duplicate.id,
+                                          duplicate.lifecycle_state))
+
+    for group in groups:
+        for (compartment_id, display_name), existing in current.items():
+            if compartment_id != group.compartment_id:
+                continue
+            for instance in existing:
+                if instance.id not in claimed and plan_group(instance) == group.name:
+                    claimed.add(instance.id)
+                    changes.append(PlanChange(ACTION_TERMINATE, group.name, display_name, compartment_id,
+                                              instance.id, instance.lifecycle_state))
+
+    changes.sort(key=lambda change: ACTIONS.index(change.action))
+    return changes, unchanged
+
+
+class FleetPlan(object):
+    """Reconcile groups of instances with their desired state.
+
+    The changes are applied in waves, each running concurrently (up to the
+    OciCompute max_workers, and the request scheduler limits):
+    1. terminate, start and shut down requests;
+    2. launches, group by group (the lookups of a group are resolved once);
+    3. a single wait for all the instances to reach their target state;
+    4. shutdown of the created instances of stopped groups, and wait.
+    """
+
+    def __init__(self, oci, groups):
+        """Initialise the plan.
+
+        Parameters:
+            oci: the OciCompute instance
+            groups: list of InstanceGroup, with compartment OCIDs
+
+        """
+        self._oci = oci
+        self._groups = OrderedDict((group.name, group) for group in groups)
+        self.changes = []
+        self.unchanged = 0
+
+    def refresh(self):
+        """Retrieve the instances and compute the changes.
+
+        The instances of all the compartments are retrieved by one batched
+        listing, with list calls: the Resource Search index may lag recent
+        launches, which would then be launched again.
+
+        Returns:
+            List of PlanChange.
+
+        """
+        compartment_ids = sorted({group.compartment_id for group in self._groups.values()})
+        with self._oci.instrumentation.phase('plan'):
+            instances = [instance for instance, _ in self._oci.query_instances(compartment_ids,
+                                                                               vnics=False,
+                                                                               backend=BACKEND_LIST)]
+        self.changes, self.unchanged = diff_plan(self._groups.values(), instances)
+        return self.changes
+
+    def _launch(self, group, display_names):
+        """Launch instances of a group without waiting, tagged with the group name (PLAN_TAG).
+
+        Returns:
+            List of (display_name, instance, error) tuples.
+
+        """
+        kwargs = {
+            'display_name': display_names,
+            'compartment_id': group.compartment_id,
+            'shape': group.shape,
+            'availability_domain': group.availability_domain,
+            'vcn_name': group.vcn_name,
+            'vcn_compartment_id': group.vcn_compartment_id,
+            'subnet_name': group.subnet_name,
+            'ssh_authorized_keys_file': group.ssh_authorized_keys_file,
+            'cloud_init_file': group.cloud_init_file,
+            'wait': False,
+            'freeform_tags': {PLAN_TAG: group.name},
+        }
+        try:
+            if group.source == SOURCE_PLATFORM:
+                result = self._oci.provision_platform(operating_system=group.operating_system,
+                                                      operating_system_version=group.operating_system_version,
+                                                      **kwargs)
+            elif group.source == SOURCE_CUSTOM:
+                result = self._oci.provision_custom(custom_image_name=group.image_name, **kwargs)
+            else:
+                result = self._oci.provision_market(market_image_name=group.image_name, **kwargs)
+        except Exception as e:
+            return [(display_name, None, e) for display_name in display_names]
+        if result is None:
+            error = PlanError('Image, availability domain or subnet lookup failed for group {}'.format(group.name))
+            return [(display_name, None, error) for display_name in display_names]
+        if isinstance(result, list):
+            return result
+        # Single launch
+        return [(display_names[0], result, None)]
+
+    def apply(self, callback=None):
+        """Apply the changes computed by refresh.
+
+        Parameters:
+            callback: function called with a PlanResult as each change
+                      completes
+
+        Returns:
+            List of PlanResult, in the changes order.
+
+        """
+        results = {}
+        start = time.time()
+        # Instances to wait for: {instance_id: (change, target state)}
+        pending = OrderedDict()
+
+        def done(change, state, error):
+            result = results[change] = PlanResult(change, state, time.time() - start, error)
+            if callback:
+                callback(result)
+
+        def request(action_name, targets):
+            """Request an action on (change, instance_id) targets, by compartment."""
+            by_compartment = OrderedDict()
+            for change, instance_id in targets:
+                by_compartment.setdefault(change.compartment_id, OrderedDict())[instance_id] = change
+            for compartment_id, changes in by_compartment.items():
+                for instance_id, _, _, error in self._oci.instance_actions(action_name, compartment_id, list(changes)):
+                    if error:
+                        done(changes[instance_id], None, error)
+                    else:
+                        pending[instance_id] = (changes[instance_id], INSTANCE_ACTIONS[action_name][1])
+
+        def wait(completed):
+            waiting = OrderedDict(pending)
+            pending.clear()
+            self._oci.wait_for_instances(
+                [(change.compartment_id, instance_id, state) for instance_id, (change, state) in waiting.items()],
+                lambda instance_id, instance, elapsed, error: completed(waiting[instance_id][0],
+                                                                        instance_id,
+                                                                        instance.lifecycle_state if instance else None,
+                                                                        error))
+
+        # Wave 1: terminate, start and shutdown requests
+        for action_name in (ACTION_TERMINATE, ACTION_START, ACTION_SHUTDOWN):
+            targets = [(change, change.instance_id) for change in self.changes if change.action == action_name]
+            if targets:
+                request(action_name, targets)
+
+        # Wave 2: launches
+        creations = OrderedDict()
+        for change in self.changes:
+            if change.action == ACTION_CREATE:
+                creations.setdefault(change.group, OrderedDict())[change.display_name] = change
+        for group_name, changes in creations.items():
+            for display_name, instance, error in self._launch(self._groups[group_name], list(changes)):
+                if error or not instance:
+                    done(changes[display_name], None, error or PlanError('Launch failed'))
+                else:
+                    pending[instance.id] = (changes[display_name], STATE_RUNNING)
+
+        # Wave 3: wait for all the instances
+        stop = []
+
+        def completed(change, instance_id, state, error):
+            if not error and change.action == ACTION_CREATE and self._groups[change.group].state == STATE_STOPPED:
+                stop.append((change, instance_id))
+            else:
+                done(change, state, error)
+
+        wait(completed)
+
+        # Wave 4: shut down the new instances of stopped groups
+        if stop:
+            request(ACTION_SHUTDOWN, stop)
+            wait(lambda change, instance_id, state, error: done(change, state, error))
+
+        return [results[change] for change in self.changes if change in results]
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+"""OCI Compute warm instance pool.
+
+WarmPool helper class keeping pre-provisioned instances of a launch profile
+(compartment, Availability Domain, shape, image, subnet and metadata) ready
+to be handed out: instances are launched with a freeform tag identifying
+their profile, left running until their first boot is complete, then
+stopped. Provisioning renames a pooled instance and starts it instead of
+launching a new one, then refills the pool.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import namedtuple
+from datetime import timezone
+from hashlib import sha256
+import json
+import os
+import tempfile
+import time
+
+from .cache import CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non POSIX platforms
+    fcntl = None
+
+# Freeform tag of the pooled instances; its value is the profile key
+POOL_TAG = 'oci-compute-pool'
+
+# Display name of the pooled instances
+POOL_DISPLAY_NAME = 'oci-compute-pool-{}'
+
+# Default number of instances kept per profile
+POOL_SIZE = 1
+
+# Pooled instances older than this are evicted (seconds): they would be
+# handed out with an outdated system
+MAX_AGE = 24 * 3600
+
+# Time a pooled instance runs before being stopped (seconds), so that its
+# first boot (cloud-init) completes while in the pool
+WARM_UP = 300
+
+# Pools without hand-out requests for this long are drained (seconds)
+MAX_IDLE = 7 * 86400
+
+# Profiles and counters of the pools
+POOL_FILE = os.path.join(CACHE_DIR, 'warm-pools.json')
+
+# Number of background refill errors kept per pool until its next
+# maintenance
+MAX_ERRORS = 10
+
+# Lifecycle states of the instances in a pool
+POOL_STATES = ('PROVISIONING', 'STARTING', 'RUNNING', 'STOPPING', 'STOPPED')
+
+# What identifies the instances a pool can hand out. The SSH keys and
+# cloud-init data are applied at first boot and cannot be updated after
+# launch: they are part of the profile (as a digest).
+PoolProfile = namedtuple('PoolProfile', [
+    'compartment_id',
+    'availability_domain',
+    'shape',
+    'image_id',
+    'subnet_id',
+    'metadata_digest',
+])
+
+# Maintenance of a pool: pooled instances to stop (warmed up), to terminate
+# (too old, or in excess of the size) and number of instances to launch
+PoolPlan = namedtuple('PoolPlan', [
+    'stop',
+    'evict',
+    'launch',
+])
+
+# Outcome of a pool maintenance: number of pooled instances stopped, evicted
+# and launched, and the errors of the failed requests
+PoolMaintenance = namedtuple('PoolMaintenance', [
+    'key',
+    'stopped',
+    'evicted',
+    'launched',
+    'errors',
+])
+
+# State of a pool: instances ready to be handed out and warming up, and
+# counters since the pool was created. last_used is the time (time.time()) of
+# the last hand-out request.
+PoolStats = namedtuple('PoolStats', [
+    'key',
+    'compartment_id',
+    'availability_domain',
+    'shape',
+    'image_id',
+    'size',
+    'ready',
+    'warming',
+    'hits',
+    'misses',
+    'launched',
+    'evicted',
+    'last_used',
+])
+
+
+def pool_profile(launch_instance_details):
+    """Return the PoolProfile of launch details."""
+    metadata = json.dumps(launch_instance_details.metadata or {}, sort_keys=True)
+    return PoolProfile(launch_instance_details.compartment_id,
+                       launch_instance_details.availability_domain,
+                       launch_instance_details.shape,
+                       launch_instance_details.source_details.image_id,
+                       launch_instance_details.create_vnic_details.subnet_id,
+                       sha256(metadata.encode('utf-8')).hexdigest())
+
+
+def profile_key(profile):
+    """Return the key of a PoolProfile, used as POOL_TAG value."""
+    return sha256('\n'.join(profile).encode('utf-8')).hexdigest()[:16]
+
+
+def hit_rate(stats):
+    """Return the hand-out hit rate of PoolStats, None without request."""
+    requests = stats.hits + stats.misses
+    return stats.hits / requests if requests else None
+
+
+def _age(instance, now):
+    """Return the age of an instance in seconds."""
+    created = instance.time_created
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return now - created.timestamp()
+
+
+class WarmPool(object):
+    """Warm pool policy and counters.
+
+    Pools are created on first use by provisioning, one per profile. Their
+    profile, size and counters are kept in a file shared by the CLI runs, so
+    that the pools can be maintained (see OciCompute.maintain_pools) and
+    reported on between provisionings.
+
+    Eviction policies: pooled instances older than max_age are terminated,
+    as are the oldest instances in excess of the size; pools idle for longer
+    than max_idle are drained.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_age=MAX_AGE, warm_up=WARM_UP, max_idle=MAX_IDLE, pool_file=POOL_FILE):
+        """Initialise the policy.
+
+        Parameters:
+            size: number of instances kept per profile
+            max_age: age (seconds) above which pooled instances are evicted
+            warm_up: time (seconds) a pooled instance runs before being
+                     stopped; it is only handed out afterwards
+            max_idle: time (seconds) without hand-out request after which
+                      a pool is drained
+            pool_file: file where pool profiles and counters are kept
+
+        """
+        self._size = size
+        self._max_age = max_age
+        self._warm_up = warm_up
+        self._max_idle = max_idle
+        self._pool_file = os.path.expanduser(pool_file)
+
+    @property
+    def size(self):
+        """Return the number of instances kept per profile."""
+        return self._size
+
+    @property
+    def max_age(self):
+        """Return the age above which pooled instances are evicted."""
+        return self._max_age
+
+    @property
+    def warm_up(self):
+        """Return the time a pooled instance runs before being stopped."""
+        return self._warm_up
+
+    def is_ready(self, instance, now=None):
+        """Return True if a pooled instance can be handed out."""
+        age = _age(instance, now or time.time())
+        if age > self._max_age:
+            return False
+        return instance.lifecycle_state == 'STOPPED' or (
+            instance.lifecycle_state == 'RUNNING' and age >= self._warm_up)
+
+    def available(self, instances, now=None):
+        """Return the pooled instances which can be handed out, oldest first."""
+        now = now or time.time()
+        return sorted((instance for instance in instances if self.is_ready(instance, now)),
+                      key=lambda instance: instance.time_created)
+
+    def plan(self, instances, size=None, now=None):
+        """Return the PoolPlan of a pool.
+
+        Parameters:
+            instances: pooled instances not terminated (SDK Instance)
+            size: number of instances to keep (default: the policy size)
+
+        """
+        now = now or time.time()
+        size = self._size if size is None else size
+        evict = [instance for instance in instances if _age(instance, now) > self._max_age]
+        live = [instance for instance in instances
+                if _age(instance, now) <= self._max_age
+                and instance.lifecycle_state in POOL_STATES]
+        # Keep the instances closest to be handed out, newest first
+        live.sort(key=lambda instance: (not self.is_ready(instance, now), -_age(instance, now)))
+        evict.extend(live[size:])
+        kept = live[:size]
+        stop = [instance for instance in kept
+                if instance.lifecycle_state == 'RUNNING' and _age(instance, now) >= self._warm_up]
+        return PoolPlan(stop, evict, max(0, size - len(kept)))
+
+    """Pool file."""
+
+    def _update(self, update):
+        """Apply update to the pools of the pool file; return the pools."""
+        directory = os.path.dirname(self._pool_file)
+        os.makedirs(directory, exist_ok=True)
+        with open(self._pool_file + '.lock', 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self._pool_file) as f:
+                    pools = json.load(f)
+            except (OSError, ValueError):
+                pools = {}
+            if update:
+                update(pools)
+                fd, path = tempfile.mkstemp(dir=directory, prefix='.warm-pools-')
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(pools, f, indent=1, sort_keys=True)
+                os.replace(path, self._pool_file)
+        return pools
+
+    def pools(self):
+        """Return the pools of the pool file: {key: pool dictionary}."""
+        return self._update(None)
+
+    def record(self, key, launch_instance_details=None, **counters):
+        """Add to the counters of a pool, creating it if needed.
+
+        Parameters:
+            key: the profile key
+            launch_instance_details: launch details of the profile, kept to
+                                     refill the pool; a hand-out request also
+                                     sets the size of the pool
+            counters: hits, misses, launched, evicted increments
+
+        """
+        def update(pools):
+            pool = pools.setdefault(key, {'hits': 0, 'misses': 0, 'launched': 0, 'evicted': 0,
+                                          'size': self._size, 'last_used': time.time()})
+            if launch_instance_details is not None:
+                pool['profile'] = {
+                    'compartment_id': launch_instance_details.compartment_id,
+                    'availability_domain': launch_instance_details.availability_domain,
+                    'shape': launch_instance_details.shape,
+                    'image_id': launch_instance_details.source_details.image_id,
+                    'subnet_id': launch_instance_details.create_vnic_details.subnet_id,
+                    'metadata': launch_instance_details.metadata or {},
+                }
+            if counters.get('hits') or counters.get('misses'):
+                pool['size'] = self._size
+                pool['last_used'] = time.time()
+            for counter, value in counters.items():
+                pool[counter] = pool.get(counter, 0) + value
+
+        self._update(update)
+
+    def record_errors(self, key, errors):
+        """Keep the errors of a background refill of a pool, until its next maintenance (see take_errors).
+
+        Parameters:
+            key: the profile key
+            errors: the error messages
+
+        """
+        def update(pools):
+            pool = pools.get(key)
+            if pool is not None:
+                pool['errors'] = (pool.get('errors', []) + errors)[-MAX_ERRORS:]
+
+        self._update(update)
+
+    def take_errors(self, key):
+        """Return and forget the errors kept for a pool by record_errors."""
+        errors = []
+
+        def update(pools):
+            errors.extend(pools.get(key, {}).pop('errors', []))
+
+        self._update(update)
+        return errors
+
+    def forget(self, keys):
+        """Remove pools from the pool file."""
+        def update(pools):
+            for key in keys:
+                pools.pop(key, None)
+
+        self._update(update)
+
+    def is_idle(self, pool, now=None):
+        """Return True if a pool of the pool file has been idle for longer than max_idle."""
+        return (now or time.time()) - pool.get('last_used', 0) > self._max_idle
+
+    def stats(self, key, pool, instances, now=None):
+        """Return the PoolStats of a pool.
+
+        Parameters:
+            key: the profile key
+            pool: the pool dictionary of the pool file, None if unknown
+            instances: the pooled instances not terminated
+
+        """
+        pool = pool or {}
+        profile = pool.get('profile') or {}
+        instance = instances[0] if instances else None
+        ready = len(self.available(instances, now))
+        return PoolStats(key,
+                         profile.get('compartment_id') or getattr(instance, 'compartment_id', None),
+                         profile.get('availability_domain') or getattr(instance, 'availability_domain', None),
+                         profile.get('shape') or getattr(instance, 'shape', None),
+                         profile.get('image_id') or getattr(instance, 'image_id', None),
+                         pool.get('size'),
+                         ready,
+                         len(instances) - ready,
+                         pool.get('hits', 0),
+                         pool.get('misses', 0),
+                         pool.get('launched', 0),
+                         pool.get('evicted', 0),
+                         pool.get('last_used'))
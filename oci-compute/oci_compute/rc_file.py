@@ -19,6 +19,11 @@ DEFAULT_RC_VARS = {
     'availability-domain': 'AD-1',
     'subnet-name': 'Public Subnet',
     'ssh-authorized-keys-file': '~/.ssh/id_rsa.pub',
+    'ready-port': '22',
+    'ready-timeout': '600',
+    'ssh-user': 'opc',
+    'warm-pool': '0',
+    'warm-pool-max-age': '24',
 }
 
 
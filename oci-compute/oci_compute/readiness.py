@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+"""OCI Compute readiness probe.
+
+ReadinessProbe helper class to wait until running instances accept
+connections (SSH by default), and optionally until cloud-init has completed.
+All the instances are probed concurrently from a single event loop.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import asyncio
+from collections import namedtuple
+from math import ceil
+import queue
+import subprocess
+import threading
+import time
+
+# Default port probed
+SSH_PORT = 22
+
+# Maximum time for an instance to be ready once running (seconds)
+READY_TIMEOUT = 600
+
+# Probing schedule (seconds): an attempt gives up after CONNECT_TIMEOUT, and
+# is retried after MIN_INTERVAL, backing off up to MAX_INTERVAL
+CONNECT_TIMEOUT = 3.0
+MIN_INTERVAL = 1.0
+MAX_INTERVAL = 3.0
+BACKOFF_FACTOR = 1.5
+
+# cloud-init completion: the marker file is checked with the ssh client, as
+# SSH_USER by default; the check gives up after SSH_COMMAND_TIMEOUT seconds
+CLOUD_INIT_MARKER = '/var/lib/cloud/instance/boot-finished'
+SSH_USER = 'opc'
+SSH_COMMAND_TIMEOUT = 15.0
+
+# Outcome of a probe; port_open and ready are the seconds elapsed from the
+# start of the probe until the port was open and until the instance was
+# ready (cloud-init completed, or port open when not checked), None when not
+# reached.
+ProbeResult = namedtuple('ProbeResult', [
+    'address',
+    'port_open',
+    'ready',
+    'error',
+])
+
+
+class ReadinessError(Exception):
+    """Instance did not become ready."""
+
+    pass
+
+
+class ReadinessProbe(object):
+    """Wait for instances to accept connections.
+
+    The port is probed with TCP connections, waiting for the server banner
+    when it serves SSH (sshd accepts connections shortly before it serves
+    them). Failed attempts are retried with backoff.
+
+    Probes run either on the caller's event loop (ready coroutine), or in a
+    background event loop (add, then wait).
+    """
+
+    def __init__(self,
+                 port=SSH_PORT,
+                 banner=None,
+                 private_ip=False,
+                 cloud_init=False,
+                 ssh_user=SSH_USER,
+                 identity_file=None,
+                 timeout=READY_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT,
+                 min_interval=MIN_INTERVAL,
+                 max_interval=MAX_INTERVAL):
+        """Initialise the probe.
+
+        Parameters:
+            port: the port to probe
+            banner: wait for the SSH banner (default: when port is SSH_PORT
+                    or cloud_init is set)
+            private_ip: probe the private IP of the instances, instead of
+                        their public IP (if any)
+            cloud_init: also wait for the cloud-init completion marker; the
+                        ssh client must be able to log in without prompting
+            ssh_user: the user name to log in with
+            identity_file: the private key to log in with (default: the
+                           keys of the ssh client configuration)
+            timeout: give up after this delay
+            connect_timeout: timeout of each attempt
+            min_interval: delay before the first retry
+            max_interval: maximum delay between attempts
+
+        """
+        self._port = port
+        self._banner = banner if banner is not None else port == SSH_PORT or cloud_init
+        self._private_ip = private_ip
+        self._cloud_init = cloud_init
+        self._ssh_user = ssh_user
+        self._identity_file = identity_file
+        self._timeout = timeout
+        self._connect_timeout = connect_timeout
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        # Background probes
+        self._loop = None
+        self._thread = None
+        self._pending = 0
+        self._completed = queue.Queue()
+        self._results = {}
+
+    @property
+    def port(self):
+        """Return the probed port."""
+        return self._port
+
+    @property
+    def cloud_init(self):
+        """Return whether cloud-init completion is waited for."""
+        return self._cloud_init
+
+    def address(self, vnic):
+        """Return the address to probe for a VNIC.
+
+        Parameters:
+            vnic: the primary VNIC of the instance (SDK Vnic or
+                  records.VnicRecord)
+
+        Raises:
+            ReadinessError: the VNIC is not available.
+
+        """
+        if vnic is None:
+            raise ReadinessError('VNIC not available')
+        if self._private_ip or not vnic.public_ip:
+            return vnic.private_ip
+        return vnic.public_ip
+
+    async def _port_open(self, address):
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(address, self._port),
+                                                    self._connect_timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        try:
+            if not self._banner:
+                return True
+            banner = await asyncio.wait_for(reader.readline(), self._connect_timeout)
+            return banner.startswith(b'SSH-')
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            writer.close()
+
+    async def _cloud_init_done(self, address):
+        args = ['ssh',
+                '-o', 'BatchMode=yes',
+                # New instances have unknown host keys; the probe only tests
+                # for a file
+                '-o', 'StrictHostKeyChecking=no',
+                '-o', 'UserKnownHostsFile=/dev/null',
+                '-o', 'LogLevel=ERROR',
+                # The instance is not trusted yet
+                '-o', 'ForwardAgent=no',
+                '-o', 'ConnectTimeout={}'.format(int(ceil(self._connect_timeout))),
+                '-p', str(self._port)]
+        if self._identity_file:
+            args += ['-i', self._identity_file]
+        args += ['{}@{}'.format(self._ssh_user, address), 'test', '-e', CLOUD_INIT_MARKER]
+        try:
+            process = await asyncio.create_subprocess_exec(*args,
+                                                           stdin=subprocess.DEVNULL,
+                                                           stdout=subprocess.DEVNULL,
+                                                           stderr=subprocess.DEVNULL)
+        except OSError as e:
+            raise ReadinessError('Cannot run ssh: {}'.format(e))
+        try:
+            return await asyncio.wait_for(process.wait(), self._connect_timeout + SSH_COMMAND_TIMEOUT) == 0
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return False
+
+    async def _until(self, check, address, deadline, what):
+        """Run check until it succeeds, with backoff."""
+        interval = self._min_interval
+        while not await check(address):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise ReadinessError('{} not {} after {:.0f}s'.format(address, what, self._timeout))
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(self._max_interval, interval * BACKOFF_FACTOR)
+
+    async def ready(self, address, start=None):
+        """Wait until an instance is ready.
+
+        Parameters:
+            address: the IP address of the instance
+            start: start time of the probe (time.time(), default: now)
+
+        Returns:
+            ProbeResult, error is None.
+
+        Raises:
+            ReadinessError: the instance was not ready in time.
+
+        """
+        start = start or time.time()
+        deadline = start + self._timeout
+        await self._until(self._port_open, address, deadline, 'accepting connections on port {}'.format(self._port))
+        port_open = time.time() - start
+        if self._cloud_init:
+            await self._until(self._cloud_init_done, address, deadline, 'done with cloud-init')
+        return ProbeResult(address, port_open, time.time() - start, None)
+
+    """Background probes."""
+
+    def _start(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name='readiness-probe', daemon=True)
+            self._thread.start()
+
+    def _stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = self._thread = None
+
+    async def _probe(self, key, resolve, callback):
+        start = time.time()
+        address = None
+        try:
+            # The address lookup (SDK calls) must not block the loop
+            address = await asyncio.get_running_loop().run_in_executor(None, resolve)
+            result = await self.ready(address, start)
+        except Exception as e:
+            result = ProbeResult(address, None, None, e)
+        self._completed.put((key, result, callback))
+
+    def add(self, key, resolve, callback=None):
+        """Probe an instance in the background.
+
+        Parameters:
+            key: the key of the result (e.g. the instance display name)
+            resolve: function returning the address to probe, called from a
+                     worker thread (e.g. lookup of the instance VNIC)
+            callback: function called with (key, ProbeResult) by wait, as
+                      the probe completes
+
+        """
+        self._start()
+        self._pending += 1
+        asyncio.run_coroutine_threadsafe(self._probe(key, resolve, callback), self._loop)
+
+    @property
+    def pending(self):
+        """Return the number of background probes still running."""
+        return self._pending
+
+    def wait(self):
+        """Wait for the background probes.
+
+        Callbacks are called from this thread as the probes complete.
+
+        Returns:
+            Dictionary {key: ProbeResult} of all the probes.
+
+        """
+        try:
+            while self._pending:
+                key, result, callback = self._completed.get()
+                self._pending -= 1
+                self._results[key] = result
+                if callback:
+                    callback(key, result)
+        finally:
+            if not self._pending:
+                self._stop()
+        return dict(self._results)
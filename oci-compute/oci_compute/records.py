@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""OCI Compute records.
+
+Compact, tuple-backed records holding the fields of the SDK models used by
+oci-compute, for large image catalogs and instance fleets.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import namedtuple
+import sys
+
+# SDK models carry a swagger type map, an attribute map and every attribute
+# of the resource in a per-object __dict__. These records only keep what the
+# CLI and the OciCompute callers use; values with few distinct values
+# (compartment, operating system, state...) are interned; empty tags are
+# None.
+
+ImageRecord = namedtuple('ImageRecord', [
+    'id',
+    'compartment_id',
+    'display_name',
+    'operating_system',
+    'operating_system_version',
+    'lifecycle_state',
+    'time_created',
+])
+
+InstanceRecord = namedtuple('InstanceRecord', [
+    'id',
+    'compartment_id',
+    'display_name',
+    'availability_domain',
+    'shape',
+    'lifecycle_state',
+    'time_created',
+    'freeform_tags',
+])
+
+CompartmentRecord = namedtuple('CompartmentRecord', [
+    'id',
+    'compartment_id',
+    'name',
+])
+
+VnicRecord = namedtuple('VnicRecord', [
+    'id',
+    'private_ip',
+    'public_ip',
+    'is_primary',
+])
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def image_record(image):
+    """Return the ImageRecord of an SDK Image (or of an ImageRecord)."""
+    if isinstance(image, ImageRecord):
+        return image
+    return ImageRecord(image.id,
+                       _intern(image.compartment_id),
+                       image.display_name,
+                       _intern(image.operating_system),
+                       _intern(image.operating_system_version),
+                       _intern(image.lifecycle_state),
+                       image.time_created)
+
+
+def instance_record(instance):
+    """Return the InstanceRecord of an SDK Instance (or of an InstanceRecord)."""
+    if isinstance(instance, InstanceRecord):
+        return instance
+    return InstanceRecord(instance.id,
+                          _intern(instance.compartment_id),
+                          instance.display_name,
+                          _intern(instance.availability_domain),
+                          _intern(instance.shape),
+                          _intern(instance.lifecycle_state),
+                          instance.time_created,
+                          instance.freeform_tags or None)
+
+
+def summary_image_record(summary):
+    """Return the ImageRecord of a Resource Search ResourceSummary.
+
+    Search results do not include the operating system.
+    """
+    return ImageRecord(summary.identifier,
+                       _intern(summary.compartment_id),
+                       summary.display_name,
+                       None,
+                       None,
+                       _intern(summary.lifecycle_state),
+                       summary.time_created)
+
+
+def summary_instance_record(summary):
+    """Return the InstanceRecord of a Resource Search ResourceSummary.
+
+    Search results do not include the shape.
+    """
+    return InstanceRecord(summary.identifier,
+                          _intern(summary.compartment_id),
+                          summary.display_name,
+                          _intern(summary.availability_domain),
+                          None,
+                          _intern(summary.lifecycle_state),
+                          summary.time_created,
+                          summary.freeform_tags or None)
+
+
+def compartment_record(compartment):
+    """Return the CompartmentRecord of an SDK Compartment."""
+    if isinstance(compartment, CompartmentRecord):
+        return compartment
+    return CompartmentRecord(compartment.id, _intern(compartment.compartment_id), compartment.name)
+
+
+def vnic_record(vnic):
+    """Return the VnicRecord of an SDK Vnic, None if vnic is None."""
+    if vnic is None or isinstance(vnic, VnicRecord):
+        return vnic
+    return VnicRecord(vnic.id, vnic.private_ip, vnic.public_ip, vnic.is_primary)
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+
+"""OCI Compute request scheduler.
+
+RequestScheduler helper class through which the HTTP requests of all the SDK
+clients are sent, so that concurrent operations share the API rate limits
+instead of failing with 429 TooManyRequests:
+- per-service token buckets, slowed down when the service throttles;
+- retries with jittered exponential backoff, honoring Retry-After, within a
+  retry budget shared by all the requests;
+- a global cap on the number of requests in flight;
+- per-service circuit breakers, failing fast after repeated 5xx responses.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import deque, namedtuple
+from functools import wraps
+import random
+import threading
+import time
+
+from .lazy import lazy_import
+from .placement import out_of_capacity
+
+oci = lazy_import('oci')
+
+# Maximum number of requests in flight, all services included
+MAX_IN_FLIGHT = 32
+
+# Request rate per service, in requests per second. Services are not rate
+# limited until they throttle: the rate is then set to half the observed rate
+# (halved again on further 429 responses, at most once per THROTTLE_WINDOW
+# seconds as concurrent requests are throttled together), and recovers
+# additively.
+SERVICE_BURST = 20
+MIN_SERVICE_RATE = 1.0
+THROTTLE_WINDOW = 1.0
+
+# Retries: maximum attempts per request and backoff bounds (seconds)
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# Out of host capacity responses (500) are not retried and do not count as
+# server errors: the launch fails over to another placement instead (see
+# placement)
+
+# Retry budget shared by all the requests: each request adds RETRY_RATIO
+# retries to the budget (up to RETRY_BUDGET_MAX), each retry uses one.
+RETRY_BUDGET = 20.0
+RETRY_BUDGET_MAX = 100.0
+RETRY_RATIO = 0.2
+
+# Circuit breakers: consecutive 5xx responses (or connection errors) of a
+# service opening its circuit, and time before a probe request is allowed
+CIRCUIT_THRESHOLD = 5
+CIRCUIT_RESET = 30.0
+
+# Circuit states
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half-open'
+
+# Scheduler counters. queued and in_flight are current values; wait_time is
+# the total time requests waited for a token or an in-flight slot, and
+# backoff_time the total time slept before retries (seconds).
+SchedulerStats = namedtuple('SchedulerStats', [
+    'requests',
+    'retries',
+    'throttled',
+    'server_errors',
+    'budget_exhausted',
+    'circuit_opens',
+    'rejected',
+    'in_flight',
+    'queued',
+    'max_queued',
+    'wait_time',
+    'backoff_time',
+])
+
+# Counters of a service (SDK client and region); rate is the current request
+# rate of its token bucket, None while not rate limited
+ServiceStats = namedtuple('ServiceStats', [
+    'service',
+    'region',
+    'rate',
+    'requests',
+    'throttled',
+    'server_errors',
+    'circuit',
+])
+
+
+class CircuitOpenError(Exception):
+    """Request rejected while the circuit of its service is open."""
+
+    status = 503
+    code = 'CircuitOpen'
+
+    def __init__(self, service, region, retry_in):
+        """Initialise the error."""
+        self.message = 'Too many {} errors in {}, requests suspended for {:.0f}s'.format(
+            service, region, retry_in)
+        super().__init__(self.message)
+
+
+class _Service(object):
+    """Token bucket and circuit breaker of a service."""
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+        self.throttled_at = None
+        # Start times of the requests of the last THROTTLE_WINDOW, while not
+        # rate limited
+        self.recent = deque()
+        self.requests = 0
+        self.throttled = 0
+        self.server_errors = 0
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+
+    def reserve(self, now):
+        """Take a token, return the time to wait for it."""
+        if self.rate is None:
+            self.recent.append(now)
+            while self.recent[0] < now - THROTTLE_WINDOW:
+                self.recent.popleft()
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def throttle(self, now):
+        """Halve the rate and drop the burst after a 429 response."""
+        if self.throttled_at is not None and now - self.throttled_at < THROTTLE_WINDOW:
+            return
+        self.throttled_at = now
+        if self.rate is None:
+            rate = len(self.recent) / THROTTLE_WINDOW
+            self.recent.clear()
+            self.refilled = now
+        else:
+            rate = self.rate
+        self.rate = max(MIN_SERVICE_RATE, rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+
+    def recover(self):
+        """Increase the rate after a successful request (about 1/s per second)."""
+        if self.rate is not None and (self.max_rate is None or self.rate < self.max_rate):
+            self.rate += 1 / self.rate
+            if self.max_rate is not None:
+                self.rate = min(self.max_rate, self.rate)
+
+    def state(self, now):
+        if self.opened is None:
+            return CIRCUIT_CLOSED
+        return CIRCUIT_HALF_OPEN if now - self.opened >= CIRCUIT_RESET else CIRCUIT_OPEN
+
+
+def _retry_after(error):
+    """Return the Retry-After delay of an error response (seconds), or None."""
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return max(0.0, float(headers.get('retry-after') or headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        # Missing, or an HTTP date
+        return None
+
+
+class RequestScheduler(object):
+    """Schedule the HTTP requests of the SDK clients.
+
+    The scheduler is shared by all the clients of an OciCompute instance, its
+    region views and the instances of other profiles. The SDK retry strategy
+    and circuit breakers must be disabled on the clients (see
+    client_kwargs): requests are retried here, within a shared budget.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, rate=None, rates=None, max_attempts=MAX_ATTEMPTS):
+        """Initialise the scheduler.
+
+        Parameters:
+            max_in_flight: maximum number of requests in flight
+            rate: maximum request rate per service (requests per second);
+                  default is to only limit the rate of services which
+                  throttle
+            rates: rate overrides per service name (e.g. {'search': 5.0})
+            max_attempts: maximum number of attempts per request
+
+        """
+        self._max_in_flight = max_in_flight
+        self._rate = rate
+        self._rates = rates or {}
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._random = random.Random()
+        # {(service, region): _Service}
+        self._services = {}
+        self._budget = RETRY_BUDGET
+        self._requests = 0
+        self._retries = 0
+        self._throttled = 0
+        self._server_errors = 0
+        self._budget_exhausted = 0
+        self._circuit_opens = 0
+        self._rejected = 0
+        self._in_flight = 0
+        self._queued = 0
+        self._max_queued = 0
+        self._wait_time = 0.0
+        self._backoff_time = 0.0
+
+    @property
+    def max_in_flight(self):
+        """Return the maximum number of requests in flight."""
+        return self._max_in_flight
+
+    @staticmethod
+    def client_kwargs():
+        """Return the SDK client parameters disabling its own retries and circuit breaker."""
+        return {
+            'retry_strategy': oci.retry.NoneRetryStrategy(),
+            'circuit_breaker_strategy': oci.circuit_breaker.NoCircuitBreakerStrategy(),
+        }
+
+    def wrap(self, service, region, base_client):
+        """Send the HTTP requests of an SDK client through the scheduler.
+
+        Parameters:
+            service: the service (client) name
+            region: the region of the client
+            base_client: the SDK BaseClient of the client
+
+        """
+        request = base_client.request
+
+        @wraps(request)
+        def scheduled_request(sdk_request, *args, **kwargs):
+            if sdk_request.method != 'GET':
+                # Retried requests must not be applied twice
+                base_client.add_opc_retry_token_if_needed(sdk_request.header_params)
+            return self._send((service, region), request, sdk_request, args, kwargs)
+
+        base_client.request = scheduled_request
+
+    def _service(self, key):
+        service = self._services.get(key)
+        if service is None:
+            service = self._services[key] = _Service(self._rates.get(key[0], self._rate), SERVICE_BURST)
+        return service
+
+    def _acquire(self, key):
+        """Wait for a token of the service and an in-flight slot."""
+        with self._lock:
+            now = time.monotonic()
+            service = self._service(key)
+            state = service.state(now)
+            if state == CIRCUIT_OPEN or (state == CIRCUIT_HALF_OPEN and service.probing):
+                self._rejected += 1
+                raise CircuitOpenError(key[0], key[1], max(0.0, CIRCUIT_RESET - (now - service.opened)))
+            if state == CIRCUIT_HALF_OPEN:
+                # Single probe request
+                service.probing = True
+            delay = service.reserve(now)
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        start = time.monotonic()
+        try:
+            if delay:
+                time.sleep(delay)
+            self._slots.acquire()
+        finally:
+            with self._lock:
+                self._queued -= 1
+                self._wait_time += time.monotonic() - start
+        with self._lock:
+            self._in_flight += 1
+            self._requests += 1
+            service.requests += 1
+
+    def _release(self, key, status):
+        """Release the in-flight slot and account for the response status."""
+        self._slots.release()
+        with self._lock:
+            self._in_flight -= 1
+            service = self._service(key)
+            if status == 429:
+                self._throttled += 1
+                service.throttled += 1
+                service.throttle(time.monotonic())
+            elif status is not None and status >= 500:
+                self._server_errors += 1
+                service.server_errors += 1
+                service.failures += 1
+                service.probing = False
+                if service.failures >= CIRCUIT_THRESHOLD:
+                    if service.opened is None or service.state(time.monotonic()) == CIRCUIT_HALF_OPEN:
+                        self._circuit_opens += 1
+                    service.opened = time.monotonic()
+            else:
+                service.failures = 0
+                service.opened = None
+                service.probing = False
+                service.recover()
+
+    def _take_retry(self):
+        """Take a retry from the shared budget, return False if exhausted."""
+        with self._lock:
+            if self._budget < 1:
+                self._budget_exhausted += 1
+                return False
+            self._budget -= 1
+            self._retries += 1
+            return True
+
+    def _backoff(self, attempt, retry_after):
+        """Return the delay before a retry: full jitter, at least Retry-After."""
+        delay = self._random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _send(self, key, request, sdk_request, args, kwargs):
+        with self._lock:
+            self._budget = min(RETRY_BUDGET_MAX, self._budget + RETRY_RATIO)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._acquire(key)
+            try:
+                response = request(sdk_request, *args, **kwargs)
+            except Exception as e:
+                status = getattr(e, 'status', None)
+                connection_error = isinstance(e, (oci.exceptions.RequestException, oci.exceptions.ConnectTimeout))
+                no_capacity = not connection_error and out_of_capacity(e)
+                # Connection errors count as server errors for the circuit
+                self._release(key, 599 if connection_error else None if no_capacity else status)
+                retryable = connection_error or (status in RETRY_STATUS and not no_capacity)
+                if not retryable or attempt >= self._max_attempts:
+                    raise
+                if not self._take_retry():
+                    raise
+                delay = self._backoff(attempt, _retry_after(e))
+                with self._lock:
+                    self._backoff_time += delay
+                time.sleep(delay)
+                continue
+            self._release(key, response.status)
+            return response
+
+    def reset_stats(self):
+        """Reset the counters, keeping the service rates and circuits."""
+        with self._lock:
+            self._requests = self._retries = self._throttled = self._server_errors = 0
+            self._budget_exhausted = self._circuit_opens = self._rejected = self._max_queued = 0
+            self._wait_time = self._backoff_time = 0.0
+            for service in self._services.values():
+                service.requests = service.throttled = service.server_errors = 0
+
+    def stats(self):
+        """Return the scheduler counters (SchedulerStats)."""
+        with self._lock:
+            return SchedulerStats(self._requests,
+                                  self._retries,
+                                  self._throttled,
+                                  self._server_errors,
+                                  self._budget_exhausted,
+                                  self._circuit_opens,
+                                  self._rejected,
+                                  self._in_flight,
+                                  self._queued,
+                                  self._max_queued,
+                                  self._wait_time,
+                                  self._backoff_time)
+
+    def service_stats(self):
+        """Return the counters of each service (list of ServiceStats)."""
+        now = time.monotonic()
+        with self._lock:
+            return [ServiceStats(key[0], key[1], service.rate, service.requests, service.throttled,
+                                 service.server_errors, service.state(now))
+                    for key, service in sorted(self._services.items())]
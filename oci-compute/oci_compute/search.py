@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""OCI Compute Resource Search queries.
+
+Helpers to build Resource Search structured queries for the instance and
+image lookups of OciCompute.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+
+# Query backends: Resource Search, list calls, or automatic selection
+BACKEND_AUTO = 'auto'
+BACKEND_SEARCH = 'search'
+BACKEND_LIST = 'list'
+BACKENDS = (BACKEND_AUTO, BACKEND_SEARCH, BACKEND_LIST)
+
+# Maximum number of compartments per query, larger sets are split to keep
+# the queries within the service limits
+SEARCH_BATCH = 50
+
+
+def quote(value):
+    """Return value as a query language string literal."""
+    return "'{}'".format(str(value).replace('\\', '\\\\').replace("'", "\\'"))
+
+
+def structured_query(resource_type,
+                     compartment_ids=None,
+                     display_name=None,
+                     name_contains=None,
+                     state=None,
+                     exclude_state=None):
+    """Return a structured query for resources matching all the conditions.
+
+    Parameters:
+        resource_type: the resource type (e.g. 'instance', 'image')
+        compartment_ids: OCIDs of the compartments to search in
+        display_name: display name (case insensitive)
+        name_contains: substring of the display name (case insensitive)
+        state: lifecycle state
+        exclude_state: lifecycle state to exclude
+
+    """
+    conditions = []
+    if compartment_ids:
+        conditions.append('({})'.format(' || '.join(
+            'compartmentId = {}'.format(quote(compartment_id)) for compartment_id in compartment_ids)))
+    if display_name:
+        conditions.append('displayName = {}'.format(quote(display_name)))
+    if name_contains:
+        conditions.append('displayName =~ {}'.format(quote(name_contains)))
+    if state:
+        conditions.append('lifeCycleState = {}'.format(quote(state)))
+    if exclude_state:
+        conditions.append('lifeCycleState != {}'.format(quote(exclude_state)))
+    query = 'query {} resources'.format(resource_type)
+    if conditions:
+        query += ' where ' + ' && '.join(conditions)
+    return query
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+"""OCI Compute task graph.
+
+TaskGraph helper class to run a small graph of interdependent lookups
+concurrently, e.g. the resolutions needed before an instance launch.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import asyncio
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import time
+
+# Task outcomes
+TASK_OK = 'ok'
+TASK_FAILED = 'failed'
+TASK_ERROR = 'error'
+TASK_SKIPPED = 'skipped'
+
+# Execution of a task; start is relative to the start of the graph run. Tasks
+# which were not run (failed dependency) have no start time.
+TaskTiming = namedtuple('TaskTiming', [
+    'name',
+    'requires',
+    'start',
+    'duration',
+    'status',
+])
+
+
+@contextmanager
+def _no_context(name):
+    yield
+
+
+class TaskGraph(object):
+    """Run interdependent tasks concurrently.
+
+    A task is a function called with the results of its dependencies, in the
+    order they were declared. It is started as soon as all its dependencies
+    have completed, so that the graph completes in the time of its longest
+    dependency chain.
+
+    A task returning None has failed (e.g. a name could not be resolved): its
+    dependents are skipped, but the other tasks still run. If a task raises
+    an exception, no new task is started and the exception is re-raised once
+    the running tasks have completed.
+    """
+
+    def __init__(self, max_workers=8, context=None):
+        """Initialise an empty graph.
+
+        Parameters:
+            max_workers: maximum number of tasks running concurrently
+            context: function called with the task name, returning a context
+                     manager entered around the task in its worker thread
+
+        """
+        self._max_workers = max_workers
+        self._context = context or _no_context
+        # {name: (func, requires)}, in insertion order
+        self._tasks = {}
+        self.timings = []
+
+    def add(self, name, func, requires=()):
+        """Add a task to the graph.
+
+        Dependencies must have been added first, which rules out cycles.
+
+        Parameters:
+            name: the task name
+            func: function called with the results of the dependencies
+            requires: names of the tasks this task depends on
+
+        """
+        if name in self._tasks:
+            raise ValueError('Duplicate task "{}"'.format(name))
+        for required in requires:
+            if required not in self._tasks:
+                raise ValueError('Task "{}" requires unknown task "{}"'.format(name, required))
+        self._tasks[name] = (func, tuple(requires))
+
+    def __contains__(self, name):
+        """Return True if the graph has a task with this name."""
+        return name in self._tasks
+
+    def _run_task(self, start, name, func, args):
+        task_start = time.time()
+        status = TASK_ERROR
+        try:
+            with self._context(name):
+                result = func(*args)
+            status = TASK_OK if result is not None else TASK_FAILED
+            return result
+        finally:
+            self.timings.append(TaskTiming(name, self._tasks[name][1], task_start - start,
+                                           time.time() - task_start, status))
+
+    def _startable(self, pending, results, failed):
+        """Return the pending tasks which can start, as (name, func, args) tuples.
+
+        Tasks are in dependency order: a single pass schedules or skips
+        everything which can be. Tasks with a failed dependency are skipped.
+        """
+        startable = []
+        for name, (func, requires) in list(pending.items()):
+            if any(required in failed for required in requires):
+                del pending[name]
+                failed.add(name)
+                self.timings.append(TaskTiming(name, requires, None, 0.0, TASK_SKIPPED))
+            elif all(required in results for required in requires):
+                del pending[name]
+                startable.append((name, func, [results[required] for required in requires]))
+        return startable
+
+    @staticmethod
+    def _collect(name, future, results, failed):
+        """Record the outcome of a completed task, return the exception it raised (None if it did not)."""
+        try:
+            result = future.result()
+        except Exception as e:
+            failed.add(name)
+            return e
+        if result is None:
+            failed.add(name)
+        else:
+            results[name] = result
+        return None
+
+    def run(self):
+        """Run all the tasks.
+
+        Returns:
+            Dictionary {name: result} of the successful tasks. The graph
+            succeeded if all tasks are in the dictionary.
+
+        """
+        start = time.time()
+        self.timings = []
+        results = {}
+        failed = set()
+        pending = dict(self._tasks)
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while True:
+                if error is None:
+                    for name, func, args in self._startable(pending, results, failed):
+                        running[executor.submit(self._run_task, start, name, func, args)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    failure = self._collect(running.pop(future), future, results, failed)
+                    error = error or failure
+        if error is not None:
+            raise error
+        return results
+
+    async def run_async(self, call):
+        """Run all the tasks from an event loop, see run.
+
+        The graph is driven by the event loop: no thread waits for the
+        dependencies of a task, and max_workers does not apply.
+        Cancelling the run cancels the running tasks.
+
+        Parameters:
+            call: coroutine function running a function with its arguments
+                  (e.g. in a thread pool), awaited for each task
+
+        """
+        start = time.time()
+        self.timings = []
+        results = {}
+        failed = set()
+        pending = dict(self._tasks)
+        running = {}
+        error = None
+        while True:
+            if error is None:
+                for name, func, args in self._startable(pending, results, failed):
+                    running[asyncio.ensure_future(call(self._run_task, start, name, func, args))] = name
+            if not running:
+                break
+            try:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                # The tasks still pending are never started
+                for future in running:
+                    future.cancel()
+                raise
+            for future in done:
+                failure = self._collect(running.pop(future), future, results, failed)
+                error = error or failure
+        if error is not None:
+            raise error
+        return results
+
+    @property
+    def succeeded(self):
+        """Return True if all tasks of the last run succeeded."""
+        return (len(self.timings) == len(self._tasks)
+                and all(timing.status == TASK_OK for timing in self.timings))
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+"""OCI Compute lifecycle waiter.
+
+LifecycleWaiter helper class to wait for many instances, boot volumes and
+work requests at once.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import time
+
+from .lazy import lazy_import
+
+oci = lazy_import('oci')
+
+# Maximum time to wait (seconds), same as the SDK waiters
+MAX_WAIT_SECONDS = 1200
+
+# Polling schedule (seconds): poll every FAST_INTERVAL during the typical boot
+# window, then back off up to MAX_INTERVAL
+FAST_INTERVAL = 3
+FAST_WINDOW = 90
+MAX_INTERVAL = 30
+BACKOFF_FACTOR = 1.5
+
+# Up to this number of resources of a type tracked in a compartment, each is
+# polled with a get call: a list call returns the whole compartment, which is
+# more expensive for a few resources in a large compartment. Beyond it, get
+# calls are still used while they are fewer than the pages of the last
+# listing of the compartment
+GET_THRESHOLD = 3
+
+# Work request states
+WORK_REQUEST_SUCCEEDED = 'SUCCEEDED'
+WORK_REQUEST_FAILED = ('FAILED', 'CANCELED')
+
+# Boot volume and boot volume backup states
+VOLUME_AVAILABLE = 'AVAILABLE'
+VOLUME_FAILED = ('FAULTY', 'TERMINATING', 'TERMINATED')
+
+
+def list_pages(list_func, *args, **kwargs):
+    """Return all the results of a paginated list call, and its number of pages."""
+    results = []
+    pages = 0
+    for response in oci.pagination.list_call_get_all_results_generator(list_func, 'response', *args, **kwargs):
+        results.extend(response.data)
+        pages += 1
+    return results, pages
+
+
+def use_get(count, pages, get_threshold=GET_THRESHOLD):
+    """Return True if count resources are cheaper to poll with get calls than with a list call.
+
+    Parameters:
+        count: number of resources polled
+        pages: number of pages of the last listing of their compartment
+               (None if unknown)
+        get_threshold: number of resources always polled with get calls
+
+    """
+    return count <= max(get_threshold, pages or 0)
+
+
+class WaitError(Exception):
+    """Resource did not reach the expected state."""
+
+    pass
+
+
+class LifecycleWaiter(object):
+    """Wait for instances, boot volumes and work requests to reach their target state.
+
+    All tracked resources are polled together: each tick makes a single
+    (paginated) list call per compartment and resource type, regardless of the
+    number of resources tracked. When only a few resources of a type are
+    tracked in a compartment (get_threshold, or fewer than the pages of its
+    last listing), they are polled with a get call each instead.
+    """
+
+    def __init__(self,
+                 compute_client,
+                 work_request_client=None,
+                 blockstorage_client=None,
+                 max_wait_seconds=MAX_WAIT_SECONDS,
+                 fast_interval=FAST_INTERVAL,
+                 fast_window=FAST_WINDOW,
+                 max_interval=MAX_INTERVAL,
+                 get_threshold=GET_THRESHOLD,
+                 tick_callback=None):
+        """Initialise the waiter.
+
+        Parameters:
+            compute_client: SDK ComputeClient
+            work_request_client: SDK WorkRequestClient (or function returning
+                                 it), needed to track work requests
+            blockstorage_client: SDK BlockstorageClient (or function returning
+                                 it), needed to track boot volumes and their
+                                 backups
+            max_wait_seconds: give up after this delay
+            fast_interval: polling interval during the fast window
+            fast_window: duration of the fast polling window
+            max_interval: maximum polling interval
+            get_threshold: maximum number of resources of a type and
+                           compartment polled with get calls rather than a
+                           list call
+            tick_callback: function called after each polling round
+
+        """
+        self._compute_client = compute_client
+        self._work_request_client = work_request_client
+        self._blockstorage_client = blockstorage_client
+        self._max_wait_seconds = max_wait_seconds
+        self._fast_interval = fast_interval
+        self._fast_window = fast_window
+        self._max_interval = max_interval
+        self._get_threshold = get_threshold
+        self._tick_callback = tick_callback
+        # Pending resources: {(kind, compartment_id): {resource_id: (states, callback, start)}}
+        self._pending = {}
+        self._results = {}
+        # Number of pages of the last listing: {(kind, compartment_id): pages}
+        self._pages = {}
+
+    def add_instance(self, compartment_id, instance_id, states, callback=None):
+        """Track an instance until it reaches one of the given states.
+
+        Parameters:
+            compartment_id: the compartment OCID of the instance
+            instance_id: the instance OCID
+            states: list of target lifecycle states
+            callback: function called with (instance_id, instance, elapsed,
+                      error) when the instance reaches its target state or
+                      fails to
+
+        """
+        self._pending.setdefault(('instance', compartment_id), {})[instance_id] = (
+            [state.upper() for state in states], callback, time.time())
+
+    def add_work_request(self, compartment_id, work_request_id, callback=None):
+        """Track a work request until it completes.
+
+        Parameters:
+            compartment_id: the compartment OCID of the work request
+            work_request_id: the work request OCID
+            callback: function called with (work_request_id, work_request,
+                      elapsed, error) on completion
+
+        """
+        if not self._work_request_client:
+            raise ValueError('A WorkRequestClient is needed to track work requests')
+        if callable(self._work_request_client):
+            self._work_request_client = self._work_request_client()
+        self._pending.setdefault(('work_request', compartment_id), {})[work_request_id] = (
+            [WORK_REQUEST_SUCCEEDED], callback, time.time())
+
+    def add_boot_volume(self, compartment_id, boot_volume_id, callback=None, backup=False):
+        """Track a boot volume (or boot volume backup) until it is available.
+
+        Parameters:
+            compartment_id: the compartment OCID of the boot volume
+            boot_volume_id: the boot volume (or backup) OCID
+            callback: function called with (boot_volume_id, boot_volume,
+                      elapsed, error) once available or failed
+            backup: boot_volume_id is a boot volume backup
+
+        """
+        if not self._blockstorage_client:
+            raise ValueError('A BlockstorageClient is needed to track boot volumes')
+        if callable(self._blockstorage_client):
+            self._blockstorage_client = self._blockstorage_client()
+        self._pending.setdefault(('boot_volume_backup' if backup else 'boot_volume', compartment_id), {})[
+            boot_volume_id] = ([VOLUME_AVAILABLE], callback, time.time())
+
+    def discard(self, resource_id):
+        """Stop tracking a resource, without calling its callback.
+
+        May be called from a callback.
+        """
+        for resources in self._pending.values():
+            resources.pop(resource_id, None)
+
+    @property
+    def pending(self):
+        """Return the number of resources still tracked."""
+        return sum(len(resources) for resources in self._pending.values())
+
+    def _list(self, kind, compartment_id):
+        """Return the current state of the resources in a compartment."""
+        if kind == 'instance':
+            resources, pages = list_pages(self._compute_client.list_instances, compartment_id)
+        elif kind in ('boot_volume', 'boot_volume_backup'):
+            resources, pages = list_pages(
+                self._blockstorage_client.list_boot_volumes if kind == 'boot_volume'
+                else self._blockstorage_client.list_boot_volume_backups,
+                compartment_id=compartment_id)
+        else:
+            resources, pages = list_pages(self._work_request_client.list_work_requests, compartment_id)
+        self._pages[(kind, compartment_id)] = pages
+        return {resource.id: (resource, resource.status if kind == 'work_request' else resource.lifecycle_state)
+                for resource in resources}
+
+    def _get(self, kind, resource_ids):
+        """Return the current state of some resources, retrieved one by one."""
+        current = {}
+        for resource_id in resource_ids:
+            try:
+                if kind == 'instance':
+                    resource = self._compute_client.get_instance(resource_id).data
+                elif kind == 'boot_volume':
+                    resource = self._blockstorage_client.get_boot_volume(resource_id).data
+                elif kind == 'boot_volume_backup':
+                    resource = self._blockstorage_client.get_boot_volume_backup(resource_id).data
+                else:
+                    resource = self._work_request_client.get_work_request(resource_id).data
+            except oci.exceptions.ServiceError as e:
+                # Newly created resources might not be visible yet
+                if e.status == 404:
+                    continue
+                raise
+            current[resource_id] = (resource, resource.status if kind == 'work_request' else resource.lifecycle_state)
+        return current
+
+    def _complete(self, resources, resource_id, resource, start, error, callback):
+        elapsed = time.time() - start
+        self._results[resource_id] = (resource, elapsed, error)
+        del resources[resource_id]
+        if callback:
+            callback(resource_id, resource, elapsed, error)
+
+    def poll(self):
+        """Poll all tracked resources once."""
+        for (kind, compartment_id), resources in list(self._pending.items()):
+            try:
+                if use_get(len(resources), self._pages.get((kind, compartment_id)), self._get_threshold):
+                    current = self._get(kind, list(resources))
+                else:
+                    current = self._list(kind, compartment_id)
+            except (oci.exceptions.ServiceError, oci.exceptions.RequestException):
+                # Transient error: try again at next tick
+                continue
+            for resource_id, (states, callback, start) in list(resources.items()):
+                # Discarded by a previous callback
+                if resource_id not in resources:
+                    continue
+                # Newly created resources might not be listed yet
+                resource, state = current.get(resource_id, (None, None))
+                if state is None:
+                    continue
+                state = state.upper()
+                if state in states:
+                    self._complete(resources, resource_id, resource, start, None, callback)
+                elif ((kind == 'instance' and state == 'TERMINATED') or state in WORK_REQUEST_FAILED
+                      or (kind != 'instance' and state in VOLUME_FAILED)):
+                    self._complete(resources, resource_id, resource, start,
+                                   WaitError('{} is {}'.format(resource_id, state)), callback)
+            if not resources:
+                self._pending.pop((kind, compartment_id), None)
+        if self._tick_callback:
+            self._tick_callback(self)
+
+    def _timeout(self):
+        for resources in list(self._pending.values()):
+            for resource_id, (_, callback, start) in list(resources.items()):
+                self._complete(resources, resource_id, None, start,
+                               WaitError('Timed out waiting for {}'.format(resource_id)), callback)
+        self._pending = {}
+
+    def rounds(self):
+        """Poll until all tracked resources complete, fail or time out.
+
+        Generator polling once per iteration, and yielding the delay until
+        the next poll: wait sleeps it, asynchronous callers can await it
+        instead (see aio.AsyncOciCompute).
+        """
+        start = time.time()
+        interval = self._fast_interval
+        while True:
+            self.poll()
+            if not self.pending:
+                return
+            elapsed = time.time() - start
+            if elapsed >= self._max_wait_seconds:
+                self._timeout()
+                return
+            if elapsed >= self._fast_window:
+                interval = min(self._max_interval, interval * BACKOFF_FACTOR)
+            yield min(interval, self._max_wait_seconds - elapsed)
+
+    @property
+    def results(self):
+        """Return the completed resources: {resource_id: (resource, elapsed, error)}."""
+        return self._results
+
+    def wait(self):
+        """Wait until all tracked resources complete, fail or time out.
+
+        Returns:
+            Dictionary {resource_id: (resource, elapsed, error)} for all the
+            resources tracked by this waiter.
+
+        """
+        for delay in self.rounds():
+            time.sleep(delay)
+        return self._results
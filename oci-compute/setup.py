@@ -43,9 +43,13 @@ setup(
         'oci>=2.23',
         'terminaltables>=3.1',
     ],
+    extras_require={
+        # YAML plan files (JSON plans do not need it)
+        'yaml': ['PyYAML>=5.1'],
+    },
     entry_points={
         'console_scripts': [
-            'oci-compute=oci_compute.cli:cli',
+            'oci-compute=oci_compute.cli:main',
         ],
     },
 
@@ -0,0 +1,26 @@
+"""Tests of the command line helpers.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from oci_compute.cli import split_global_options
+
+
+def test_split_global_options():
+    assert split_global_options(['serve']) == ([], ['serve'])
+    assert split_global_options(['-v', '--profile', 'dev', 'serve', '--socket', 's']) == (
+        ['-v', '--profile', 'dev'], ['serve', '--socket', 's'])
+    assert split_global_options(['--max-workers=4', '--no-daemon', 'list', 'custom']) == (
+        ['--max-workers=4', '--no-daemon'], ['list', 'custom'])
+    assert split_global_options(['--stats']) == (['--stats'], [])
+
+
+def test_split_global_options_ignores_values_named_like_commands():
+    # Neither a profile named serve nor an instance named serve is the serve command
+    assert split_global_options(['--profile', 'serve', 'instance', 'list']) == (
+        ['--profile', 'serve'], ['instance', 'list'])
+    assert split_global_options(['instance', 'list', '--display-name', 'serve', '--no-daemon']) == (
+        [], ['instance', 'list', '--display-name', 'serve', '--no-daemon'])
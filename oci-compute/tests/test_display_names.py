@@ -0,0 +1,37 @@
+"""Tests of the display name expansion of bulk provisioning.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import pytest
+
+from oci_compute.oci_compute import expand_display_names
+
+
+def test_single_name():
+    assert expand_display_names('web') == ['web']
+    assert expand_display_names('web', 1) == ['web']
+
+
+def test_count_suffixes_names():
+    assert expand_display_names('web', 3) == ['web-1', 'web-2', 'web-3']
+    assert expand_display_names('web', 10)[0] == 'web-01'
+
+
+def test_range_keeps_padding():
+    assert expand_display_names('web-{08..11}.example') == ['web-08.example', 'web-09.example', 'web-10.example',
+                                                            'web-11.example']
+    assert expand_display_names('web-{1..3}', 3) == ['web-1', 'web-2', 'web-3']
+
+
+def test_list_is_returned_as_is():
+    assert expand_display_names(('a', 'b')) == ['a', 'b']
+
+
+@pytest.mark.parametrize('display_name, count', [('web-{3..1}', None), ('web-{1..3}', 2)])
+def test_invalid_ranges(display_name, count):
+    with pytest.raises(ValueError):
+        expand_display_names(display_name, count)
@@ -0,0 +1,53 @@
+"""Tests of the placement candidates.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from oci_compute.placement import Placement, Placements
+
+AD1_FD1 = Placement('VM.Standard2.1', 'AD-1', 'FAULT-DOMAIN-1')
+AD1_FD2 = Placement('VM.Standard2.1', 'AD-1', 'FAULT-DOMAIN-2')
+AD2_FD1 = Placement('VM.Standard2.1', 'AD-2', 'FAULT-DOMAIN-1')
+
+
+def test_claim_in_order():
+    placements = Placements([AD1_FD1, AD1_FD2, AD2_FD1])
+    claimed = set()
+    assert placements.claim(claimed) == AD1_FD1
+    assert claimed == {AD1_FD1}
+    # Other instances start over from the first choice
+    assert placements.claim(set()) == AD1_FD1
+
+
+def test_claim_hedged_prefers_other_availability_domains():
+    placements = Placements([AD1_FD1, AD1_FD2, AD2_FD1], hedge=2)
+    claimed = set()
+    assert placements.claim(claimed) == AD1_FD1
+    assert placements.claim(claimed) == AD2_FD1
+    assert placements.claim(claimed) == AD1_FD2
+    assert placements.claim(claimed) is None
+
+
+def test_claim_skips_exhausted_placements():
+    placements = Placements([AD1_FD1, AD1_FD2, AD2_FD1])
+    claimed = set()
+    assert placements.claim(claimed) == AD1_FD1
+    placements.exhaust(AD1_FD1)
+    # The exhausted placement no longer counts for the Availability Domain
+    assert placements.claim(claimed) == AD1_FD2
+    assert placements.claim(set()) == AD1_FD2
+    stats = {stat[:3]: stat for stat in placements.stats()}
+    assert stats[AD1_FD1].out_of_capacity == 1
+
+
+def test_claim_after_capacity_order():
+    placements = Placements([AD1_FD1, AD1_FD2, AD2_FD1])
+    placements.order_by_capacity({AD1_FD1: 'OUT_OF_HOST_CAPACITY', AD1_FD2: 'HARDWARE_NOT_SUPPORTED',
+                                  AD2_FD1: 'AVAILABLE'})
+    claimed = set()
+    assert placements.claim(claimed) == AD2_FD1
+    assert placements.claim(claimed) == AD1_FD1
+    assert placements.claim(claimed) is None
@@ -0,0 +1,90 @@
+"""Tests of the fleet plan diff.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from datetime import datetime
+
+import pytest
+
+from oci_compute.plan import (ACTION_CREATE, ACTION_SHUTDOWN, ACTION_START, ACTION_TERMINATE, diff_plan,
+                              InstanceGroup, PLAN_TAG, plan_group, PlanError)
+from oci_compute.records import InstanceRecord
+
+COMPARTMENT_ID = 'ocid1.compartment.oc1..test'
+
+
+def group(name='web', display_name='web-{1..2}', state='RUNNING', compartment_id=COMPARTMENT_ID):
+    return InstanceGroup(name, 'platform', None, 'Oracle Linux', '8', display_name, None, state, compartment_id,
+                         'VM.Standard2.1', 'AD-1', 'vcn', None, 'subnet', 'key.pub', None)
+
+
+def instance(instance_id, display_name, state='RUNNING', plan=None, compartment_id=COMPARTMENT_ID):
+    return InstanceRecord(instance_id, compartment_id, display_name, 'AD-1', 'VM.Standard2.1', state,
+                          datetime(2022, 1, 1), {PLAN_TAG: plan} if plan else {})
+
+
+def actions(changes):
+    return [(change.action, change.display_name, change.instance_id) for change in changes]
+
+
+def test_plan_group():
+    assert plan_group(instance('a', 'web-1', plan='web')) == 'web'
+    assert plan_group(instance('a', 'web-1')) is None
+    assert plan_group(instance('a', 'web-1')._replace(freeform_tags=None)) is None
+
+
+def test_diff_creates_missing_instances():
+    changes, unchanged = diff_plan([group()], [instance('a', 'web-1', plan='web')])
+    assert actions(changes) == [(ACTION_CREATE, 'web-2', None)]
+    assert unchanged == 1
+
+
+def test_diff_starts_and_stops():
+    changes, unchanged = diff_plan([group(), group('db', 'db-1', state='STOPPED')],
+                                   [instance('a', 'web-1', 'STOPPED'),
+                                    instance('b', 'web-2'),
+                                    instance('c', 'db-1')])
+    assert actions(changes) == [(ACTION_START, 'web-1', 'a'), (ACTION_SHUTDOWN, 'db-1', 'c')]
+    assert unchanged == 1
+
+
+def test_diff_keeps_the_instance_closest_to_the_desired_state():
+    changes, _ = diff_plan([group(display_name='web-1')],
+                           [instance('a', 'web-1', 'STOPPED', plan='web'), instance('b', 'web-1', plan='web')])
+    assert actions(changes) == [(ACTION_TERMINATE, 'web-1', 'a')]
+
+
+def test_diff_only_terminates_instances_launched_by_the_group():
+    changes, _ = diff_plan([group(display_name='web-1')],
+                           [instance('a', 'web-1', plan='web'),
+                            instance('b', 'web-1'),
+                            instance('c', 'web-1', plan='other'),
+                            instance('d', 'web-2', plan='web'),
+                            instance('e', 'web-3')])
+    assert actions(changes) == [(ACTION_TERMINATE, 'web-2', 'd')]
+
+
+def test_diff_never_terminates_untagged_instances_with_the_same_name():
+    # Whether or not the untagged instance is kept for the group
+    for states in (('STOPPED', 'RUNNING'), ('RUNNING', 'STOPPED')):
+        untagged, tagged = (instance('a', 'web-1', states[0]), instance('b', 'web-1', states[1], plan='web'))
+        changes, _ = diff_plan([group(display_name='web-1')], [untagged, tagged])
+        assert 'a' not in [change.instance_id for change in changes if change.action == ACTION_TERMINATE]
+    changes, _ = diff_plan([group(display_name='web-1')], [instance('a', 'web-1'), instance('b', 'web-1')])
+    assert actions(changes) == []
+
+
+def test_diff_ignores_gone_instances_and_other_compartments():
+    changes, _ = diff_plan([group(display_name='web-1')],
+                           [instance('a', 'web-1', 'TERMINATED', plan='web'),
+                            instance('b', 'web-1', plan='web', compartment_id='ocid1.compartment.oc1..other')])
+    assert actions(changes) == [(ACTION_CREATE, 'web-1', None)]
+
+
+def test_diff_rejects_overlapping_groups():
+    with pytest.raises(PlanError):
+        diff_plan([group(), group('other', 'web-2')], [])
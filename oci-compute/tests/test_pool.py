@@ -0,0 +1,67 @@
+"""Tests of the warm pool policy.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from oci_compute.pool import WarmPool
+
+NOW = datetime(2022, 1, 2, tzinfo=timezone.utc).timestamp()
+
+PooledInstance = namedtuple('PooledInstance', ['id', 'lifecycle_state', 'time_created'])
+
+
+def pooled(instance_id, state, age):
+    """Return a pooled instance created age seconds ago."""
+    return PooledInstance(instance_id, state, datetime.fromtimestamp(NOW - age, timezone.utc))
+
+
+def ids(instances):
+    return [instance.id for instance in instances]
+
+
+def test_plan_fills_an_empty_pool(tmp_path):
+    pool = WarmPool(size=2, pool_file=str(tmp_path / 'pools.json'))
+    assert pool.plan([], now=NOW) == ([], [], 2)
+
+
+def test_plan_stops_warmed_up_instances(tmp_path):
+    pool = WarmPool(size=3, warm_up=300, pool_file=str(tmp_path / 'pools.json'))
+    plan = pool.plan([pooled('warm', 'RUNNING', 600), pooled('warming', 'RUNNING', 60),
+                      pooled('stopped', 'STOPPED', 600)], now=NOW)
+    assert ids(plan.stop) == ['warm']
+    assert plan.evict == []
+    assert plan.launch == 0
+
+
+def test_plan_evicts_old_and_excess_instances(tmp_path):
+    pool = WarmPool(size=2, max_age=3600, warm_up=300, pool_file=str(tmp_path / 'pools.json'))
+    plan = pool.plan([pooled('old', 'STOPPED', 7200), pooled('ready', 'STOPPED', 1200),
+                      pooled('newer', 'STOPPED', 600), pooled('warming', 'RUNNING', 60)], now=NOW)
+    # Ready instances are kept first
+    assert ids(plan.stop) == []
+    assert ids(plan.evict) == ['old', 'warming']
+    assert plan.launch == 0
+
+
+def test_plan_drains(tmp_path):
+    pool = WarmPool(size=2, pool_file=str(tmp_path / 'pools.json'))
+    plan = pool.plan([pooled('a', 'STOPPED', 600), pooled('b', 'RUNNING', 60)], size=0, now=NOW)
+    assert sorted(ids(plan.evict)) == ['a', 'b']
+    assert plan.launch == 0
+
+
+def test_refill_errors_are_kept_until_taken(tmp_path):
+    pool = WarmPool(pool_file=str(tmp_path / 'pools.json'))
+    pool.record('key', hits=1)
+    pool.record_errors('key', ['first'])
+    pool.record_errors('key', ['second'])
+    pool.record_errors('unknown', ['ignored'])
+    assert pool.take_errors('key') == ['first', 'second']
+    assert pool.take_errors('key') == []
+    assert pool.take_errors('unknown') == []
@@ -0,0 +1,65 @@
+"""Tests of the compact records of images, instances and VNICs.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from datetime import datetime, timezone
+import pickle
+
+import oci
+
+from oci_compute.records import image_record, ImageRecord, instance_record, InstanceRecord, vnic_record, VnicRecord
+
+TIME_CREATED = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+
+def sdk_image(**kwargs):
+    fields = dict(id='ocid1.image.1', compartment_id='ocid1.compartment.1', display_name='image-1',
+                  operating_system='Oracle Linux', operating_system_version='8', lifecycle_state='AVAILABLE',
+                  time_created=TIME_CREATED)
+    fields.update(kwargs)
+    return oci.core.models.Image(**fields)
+
+
+def sdk_instance():
+    return oci.core.models.Instance(id='ocid1.instance.1', compartment_id='ocid1.compartment.1',
+                                    display_name='web-1', availability_domain='AD-1', shape='VM.Standard2.1',
+                                    lifecycle_state='RUNNING', time_created=TIME_CREATED,
+                                    freeform_tags={'oci-compute-plan': 'web'})
+
+
+def test_image_record_keeps_used_fields():
+    record = image_record(sdk_image(size_in_mbs=47694))
+    assert record == ImageRecord('ocid1.image.1', 'ocid1.compartment.1', 'image-1', 'Oracle Linux', '8',
+                                 'AVAILABLE', TIME_CREATED)
+    assert image_record(record) is record
+
+
+def test_instance_record_keeps_used_fields():
+    record = instance_record(sdk_instance())
+    assert record == InstanceRecord('ocid1.instance.1', 'ocid1.compartment.1', 'web-1', 'AD-1', 'VM.Standard2.1',
+                                    'RUNNING', TIME_CREATED, {'oci-compute-plan': 'web'})
+    assert instance_record(record) is record
+
+
+def test_low_cardinality_values_are_interned():
+    # Built at runtime so that the values are not constants shared by the compiler
+    first = image_record(sdk_image(compartment_id='ocid1.compartment.' + str(2)))
+    second = image_record(sdk_image(compartment_id='ocid1.compartment.' + str(2)))
+    assert first.compartment_id is second.compartment_id
+
+
+def test_vnic_record():
+    vnic = oci.core.models.Vnic(id='ocid1.vnic.1', private_ip='10.0.0.2', public_ip=None, is_primary=True)
+    record = vnic_record(vnic)
+    assert record == VnicRecord('ocid1.vnic.1', '10.0.0.2', None, True)
+    assert vnic_record(record) is record
+    assert vnic_record(None) is None
+
+
+def test_records_can_be_cached():
+    record = image_record(sdk_image())
+    assert pickle.loads(pickle.dumps(record)) == record
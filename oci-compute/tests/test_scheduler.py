@@ -0,0 +1,130 @@
+"""Tests of the request scheduler retries and circuit breaker.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+from collections import namedtuple
+import random
+
+import oci
+import pytest
+
+from oci_compute import scheduler as scheduler_module
+from oci_compute.scheduler import (BACKOFF_BASE, BACKOFF_MAX, CIRCUIT_CLOSED, CIRCUIT_OPEN, CIRCUIT_RESET,
+                                   CIRCUIT_THRESHOLD, CircuitOpenError, RequestScheduler)
+
+KEY = ('compute', 'eu-frankfurt-1')
+
+Response = namedtuple('Response', ['status'])
+
+
+def error(status, code='InternalError', message='error', headers=None):
+    return oci.exceptions.ServiceError(status, code, headers or {}, message)
+
+
+class Request(object):
+    """SDK request raising the given errors in turn, then succeeding."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, sdk_request):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return Response(200)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the delays slept by the scheduler instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(scheduler_module.time, 'sleep', delays.append)
+    return delays
+
+
+def send(scheduler, request):
+    return scheduler._send(KEY, request, None, (), {})
+
+
+def test_backoff_full_jitter():
+    scheduler = RequestScheduler()
+    scheduler._random = random.Random(0)
+    for attempt in range(1, 10):
+        cap = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+        assert all(0 <= scheduler._backoff(attempt, None) <= cap for _ in range(20))
+
+
+def test_backoff_honours_retry_after():
+    scheduler = RequestScheduler()
+    assert scheduler._backoff(1, 10.0) >= 10.0
+
+
+def test_retries_server_errors(sleeps):
+    scheduler = RequestScheduler()
+    request = Request(error(503), error(429, headers={'retry-after': '2'}))
+    assert send(scheduler, request).status == 200
+    assert request.calls == 3
+    # Backoff delays, then the wait for a token of the throttled service
+    assert sleeps[1] == 2.0
+    assert len(sleeps) == 3
+    stats = scheduler.stats()
+    assert (stats.requests, stats.retries, stats.throttled, stats.server_errors) == (3, 2, 1, 1)
+
+
+def test_does_not_retry_client_errors_or_lack_of_capacity(sleeps):
+    scheduler = RequestScheduler()
+    for failure in (error(404, 'NotAuthorizedOrNotFound'), error(500, message='Out of host capacity.')):
+        request = Request(failure)
+        with pytest.raises(oci.exceptions.ServiceError):
+            send(scheduler, request)
+        assert request.calls == 1
+    assert sleeps == []
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    scheduler = RequestScheduler(max_attempts=3)
+    request = Request(*[error(503)] * 5)
+    with pytest.raises(oci.exceptions.ServiceError):
+        send(scheduler, request)
+    assert request.calls == 3
+
+
+def test_circuit_opens_after_consecutive_server_errors(sleeps):
+    scheduler = RequestScheduler(max_attempts=1)
+    for _ in range(CIRCUIT_THRESHOLD):
+        with pytest.raises(oci.exceptions.ServiceError):
+            send(scheduler, Request(error(500)))
+    assert scheduler.service_stats()[0].circuit == CIRCUIT_OPEN
+    request = Request()
+    with pytest.raises(CircuitOpenError):
+        send(scheduler, request)
+    assert request.calls == 0
+    assert scheduler.stats().circuit_opens == 1
+
+
+def test_circuit_closes_after_a_successful_probe(sleeps):
+    scheduler = RequestScheduler(max_attempts=1)
+    for _ in range(CIRCUIT_THRESHOLD):
+        with pytest.raises(oci.exceptions.ServiceError):
+            send(scheduler, Request(error(500)))
+    # Half-open once the reset delay has elapsed
+    scheduler._services[KEY].opened -= CIRCUIT_RESET
+    assert send(scheduler, Request()).status == 200
+    assert scheduler.service_stats()[0].circuit == CIRCUIT_CLOSED
+
+
+def test_circuit_reopens_after_a_failed_probe(sleeps):
+    scheduler = RequestScheduler(max_attempts=1)
+    for _ in range(CIRCUIT_THRESHOLD):
+        with pytest.raises(oci.exceptions.ServiceError):
+            send(scheduler, Request(error(500)))
+    scheduler._services[KEY].opened -= CIRCUIT_RESET
+    with pytest.raises(oci.exceptions.ServiceError):
+        send(scheduler, Request(error(500)))
+    assert scheduler.service_stats()[0].circuit == CIRCUIT_OPEN
+    assert scheduler.stats().circuit_opens == 2
@@ -0,0 +1,137 @@
+"""Tests of the task graph.
+
+Copyright (c) 2020-2022 Oracle and/or its affiliates.
+Licensed under the Universal Permissive License v 1.0 as shown at
+https://oss.oracle.com/licenses/upl
+
+SPDX-License-Identifier: UPL-1.0
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import threading
+import time
+
+import pytest
+
+from oci_compute.task_graph import TASK_ERROR, TASK_FAILED, TASK_OK, TASK_SKIPPED, TaskGraph
+
+
+def run_sync(graph):
+    return graph.run()
+
+
+def run_async(graph):
+    async def run():
+        executor = ThreadPoolExecutor(max_workers=4)
+
+        async def call(func, *args):
+            return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args))
+
+        try:
+            return await graph.run_async(call)
+        finally:
+            executor.shutdown()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(params=[run_sync, run_async], ids=['run', 'run_async'])
+def run(request):
+    return request.param
+
+
+def statuses(graph):
+    return {timing.name: timing.status for timing in graph.timings}
+
+
+def test_results_of_dependencies(run):
+    graph = TaskGraph()
+    graph.add('a', lambda: 1)
+    graph.add('b', lambda: 2)
+    graph.add('sum', lambda a, b: a + b, requires=('a', 'b'))
+    graph.add('double', lambda total: total * 2, requires=('sum',))
+    assert run(graph) == {'a': 1, 'b': 2, 'sum': 3, 'double': 6}
+    assert graph.succeeded
+
+
+def test_independent_tasks_run_concurrently(run):
+    barrier = threading.Barrier(2, timeout=5)
+    graph = TaskGraph()
+    graph.add('a', lambda: barrier.wait() is not None)
+    graph.add('b', lambda: barrier.wait() is not None)
+    assert run(graph) == {'a': True, 'b': True}
+
+
+def test_failed_task_skips_its_dependents(run):
+    graph = TaskGraph()
+    graph.add('missing', lambda: None)
+    graph.add('other', lambda: 'ok')
+    graph.add('dependent', lambda missing: 'never', requires=('missing',))
+    graph.add('indirect', lambda dependent: 'never', requires=('dependent',))
+    assert run(graph) == {'other': 'ok'}
+    assert statuses(graph) == {'missing': TASK_FAILED, 'other': TASK_OK, 'dependent': TASK_SKIPPED,
+                               'indirect': TASK_SKIPPED}
+    assert not graph.succeeded
+
+
+def test_exception_is_raised_after_running_tasks(run):
+    done = []
+
+    def fail():
+        raise KeyError('boom')
+
+    def slow():
+        time.sleep(0.1)
+        done.append('slow')
+        return 'slow'
+
+    graph = TaskGraph()
+    graph.add('fail', fail)
+    graph.add('slow', slow)
+    graph.add('after', lambda slow: done.append('after') or 'after', requires=('slow',))
+    with pytest.raises(KeyError):
+        run(graph)
+    # Running tasks complete, no new task is started
+    assert done == ['slow']
+    assert statuses(graph)['fail'] == TASK_ERROR
+
+
+def test_cancelled_run_async_cancels_running_tasks():
+    started = []
+    cancelled = []
+
+    async def call(func, start, name, *args):
+        started.append(name)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+        return func(start, name, *args)
+
+    async def run():
+        graph = TaskGraph()
+        graph.add('a', lambda: 1)
+        graph.add('b', lambda: 2)
+        graph.add('after', lambda a: a, requires=('a',))
+        task = asyncio.ensure_future(graph.run_async(call))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Give the cancelled tasks a chance to run their handlers
+        await asyncio.sleep(0)
+        assert sorted(started) == ['a', 'b']
+        assert sorted(cancelled) == ['a', 'b']
+
+    asyncio.run(run())
+
+
+def test_invalid_graphs():
+    graph = TaskGraph()
+    graph.add('a', lambda: 1)
+    with pytest.raises(ValueError):
+        graph.add('a', lambda: 1)
+    with pytest.raises(ValueError):
+        graph.add('b', lambda c: 1, requires=('c',))